@@ -8,10 +8,15 @@ import json
 import traceback
 import decimal
 import base64
+import binascii
+import contextlib
 import copy
 import functools
 import datetime
+import threading
+import time
 from collections import defaultdict
+from collections import OrderedDict
 
 # Implementation note:  This file is intended to be a standalone file
 # that gets copied into the lambda deployment package.  It has no dependencies
@@ -25,12 +30,15 @@ from collections.abc import MutableMapping
 __version__: str = '1.32.0'
 
 from typing import List, Dict, Any, Optional, Sequence, Union, Callable, Set, \
-    Iterator, TYPE_CHECKING, Tuple
+    Iterator, Iterable, TYPE_CHECKING, Tuple, FrozenSet, Pattern, TypeVar, \
+    Generic
 
 if TYPE_CHECKING:
     from chalice.local import LambdaContext
 
+_LOGGER = logging.getLogger(__name__)
 _PARAMS = re.compile(r'{\w+}')
+_CONTENT_TYPE_DELIMITERS = re.compile('[,;]')
 MiddlewareFuncType = Callable[[Any, Callable[[Any], Any]], Any]
 UserHandlerFuncType = Callable[..., Any]
 HeadersType = Dict[str, Union[str, List[str]]]
@@ -55,6 +63,63 @@ def handle_extra_types(
                     % obj.__class__.__name__)
 
 
+class JSONCodec(object):
+    """Serialize and parse JSON bodies using the stdlib ``json`` module.
+
+    This is the default codec used by a Chalice app.  You can provide
+    your own codec with ``Chalice(..., json_codec=...)``; it just needs
+    to implement ``dumps`` and ``loads``.
+    """
+
+    def dumps(self, obj: Any) -> str:
+        return json.dumps(obj, separators=(',', ':'),
+                          default=handle_extra_types)
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return json.loads(data)
+
+
+class OrjsonCodec(JSONCodec):
+    """Serialize and parse JSON bodies using ``orjson`` if it's installed.
+
+    If ``orjson`` can't be imported this falls back to the stdlib
+    ``json`` module, so an app can opt into this codec without requiring
+    the dependency everywhere it runs.
+    """
+
+    def __init__(self) -> None:
+        self._orjson: Any = None
+        try:
+            import orjson
+            self._orjson = orjson
+        except ImportError:
+            pass
+
+    def dumps(self, obj: Any) -> str:
+        if self._orjson is None:
+            return super(OrjsonCodec, self).dumps(obj)
+        try:
+            return self._orjson.dumps(
+                obj, default=handle_extra_types,
+                option=self._orjson.OPT_NON_STR_KEYS).decode('utf-8')
+        except TypeError:
+            # orjson is stricter than the stdlib json module for a few
+            # inputs (e.g. integers larger than 64 bits).  Fall back to
+            # the stdlib so we serialize the same values as JSONCodec and
+            # raise the same errors for values that can't be serialized.
+            return super(OrjsonCodec, self).dumps(obj)
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        if self._orjson is None:
+            return super(OrjsonCodec, self).loads(data)
+        return self._orjson.loads(data)
+
+
+_DEFAULT_JSON_CODEC = JSONCodec()
+# Sentinel for lazily computed attributes where ``None`` is a valid value.
+_NOT_LOADED = object()
+
+
 def error_response(
     message: str, error_code: str, http_status_code: int,
     headers: Optional[HeadersType] = None
@@ -65,29 +130,102 @@ def error_response(
     return response
 
 
-def _matches_content_type(content_type: str,
-                          valid_content_types: List[str]) -> bool:
-    # If '*/*' is in the Accept header or the valid types,
-    # then all content_types match. Otherwise see of there are any common types
-    content_type = content_type.lower()
-    valid_content_types = [x.lower() for x in valid_content_types]
-    return '*/*' in content_type or \
-        '*/*' in valid_content_types or \
-        _content_type_header_contains(content_type, valid_content_types)
+class _ContentTypeMatcher(object):
+    # Matches Content-Type and Accept header values against a list of
+    # content types.  The list is lowercased and turned into a set once
+    # when the matcher is created, and the results of matching a header
+    # value are memoized so the header is only parsed the first time a
+    # given value is seen.
+    __slots__ = ('content_types', '_valid_types', '_matches_all')
+
+    # Header values larger than this aren't memoized so a client can't
+    # fill the cache with arbitrarily large values.
+    _MAX_CACHED_LENGTH = 512
+
+    def __init__(self, content_types: List[str]) -> None:
+        # A copy of the original list is kept so callers can check if
+        # the matcher is stale after the list it was created from has
+        # been modified.
+        self.content_types = list(content_types)
+        self._valid_types = frozenset(x.lower() for x in content_types)
+        self._matches_all = '*/*' in self._valid_types
+
+    def matches(self, header_value: str) -> bool:
+        if self._matches_all:
+            return True
+        if len(header_value) > self._MAX_CACHED_LENGTH:
+            return _header_contains_content_type(
+                header_value, self._valid_types)
+        return _cached_header_contains_content_type(
+            header_value, self._valid_types)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, _ContentTypeMatcher) and \
+            self.content_types == other.content_types
 
 
-def _content_type_header_contains(
+def _header_contains_content_type(
         content_type_header: str,
-        valid_content_types: List[str]
+        valid_content_types: FrozenSet[str]
 ) -> bool:
-    content_type_header_parts = [
-        p.strip() for p in
-        re.split('[,;]', content_type_header)
-    ]
-    valid_parts = set(valid_content_types).intersection(
-        content_type_header_parts
-    )
-    return len(valid_parts) > 0
+    content_type_header = content_type_header.lower()
+    if '*/*' in content_type_header:
+        return True
+    for part in _CONTENT_TYPE_DELIMITERS.split(content_type_header):
+        if part.strip() in valid_content_types:
+            return True
+    return False
+
+
+# The cache is keyed on the header value and the set of valid types so
+# a single cache can be shared by every matcher.  Frozensets cache their
+# hash so building the key is cheap.
+_cached_header_contains_content_type = functools.lru_cache(maxsize=1024)(
+    _header_contains_content_type)
+
+
+@functools.lru_cache(maxsize=256)
+def _negotiate_content_encoding(accept_encoding: str,
+                                encodings: Tuple[str, ...]) -> Optional[str]:
+    # Returns the encoding from ``encodings`` with the highest q value
+    # in an Accept-Encoding header.  Ties go to the earliest encoding in
+    # ``encodings``.  Returns None if none of them are acceptable.
+    qualities = {}
+    for part in accept_encoding.lower().split(','):
+        name, _, params = part.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip()] = quality
+    best = None
+    best_quality = 0.0
+    for encoding in encodings:
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def _get_content_type_matcher(
+        matcher: Optional[_ContentTypeMatcher],
+        content_types: List[str]
+) -> _ContentTypeMatcher:
+    # Returns ``matcher`` if it's still valid for ``content_types``,
+    # otherwise a new matcher.  The content type lists are public
+    # attributes that can be replaced or modified in place at any time,
+    # so comparing against a copy of the list (which is fast when the
+    # elements are the same objects) catches every kind of change.
+    if matcher is None or matcher.content_types != content_types:
+        matcher = _ContentTypeMatcher(content_types)
+    return matcher
+
+
+_JSON_CONTENT_TYPE_MATCHER = _ContentTypeMatcher(['application/json'])
 
 
 class ChaliceError(Exception):
@@ -387,19 +525,228 @@ class CORSConfig(object):
         return False
 
 
+class CacheConfig(object):
+    """A response cache configuration to attach to a route."""
+
+    _VARY_ON_PREFIXES = ('query:', 'header:')
+
+    def __init__(self, ttl: float, max_entries: int = 128,
+                 vary_on: Optional[Sequence[str]] = None):
+        if ttl <= 0:
+            raise ValueError("ttl must be greater than 0, got %s" % ttl)
+        if max_entries < 1:
+            raise ValueError(
+                "max_entries must be at least 1, got %s" % max_entries)
+        if vary_on is None:
+            vary_on = []
+        for value in vary_on:
+            if not value.startswith(self._VARY_ON_PREFIXES) or \
+                    not value.partition(':')[2]:
+                raise ValueError(
+                    "Invalid vary_on value '%s', values must be in the "
+                    "form 'query:<name>' or 'header:<name>'." % value)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.vary_on: List[str] = list(vary_on)
+
+    @property
+    def query_params(self) -> List[str]:
+        return [v[len('query:'):] for v in self.vary_on
+                if v.startswith('query:')]
+
+    @property
+    def headers(self) -> List[str]:
+        return [v[len('header:'):].lower() for v in self.vary_on
+                if v.startswith('header:')]
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, self.__class__) and \
+            (self.ttl, self.max_entries, self.vary_on) == \
+            (other.ttl, other.max_entries, other.vary_on)
+
+
+class MetricsConfig(object):
+    """Emit invocation metrics in CloudWatch Embedded Metric Format."""
+
+    def __init__(self, namespace: str = 'Chalice',
+                 dimensions: Optional[Dict[str, str]] = None) -> None:
+        self.namespace = namespace
+        if dimensions is None:
+            dimensions = {}
+        # Added to the Service and Handler dimensions of every metric.
+        self.dimensions: Dict[str, str] = dict(dimensions)
+
+
+class _MetricsEmitter(object):
+    # Shared by all of an app's handlers.  When metrics aren't enabled
+    # ``config`` is None, and checking that is the only cost a handler
+    # has per invocation.
+    def __init__(self, service: str) -> None:
+        self.config: Optional[MetricsConfig] = None
+        self.service = service
+        self._cold_start = True
+
+    def start(self, handler_name: str) -> '_InvocationMetrics':
+        cold_start = self._cold_start
+        self._cold_start = False
+        config = self.config
+        assert config is not None
+        return _InvocationMetrics(config, self.service, handler_name,
+                                  cold_start)
+
+
+class _InvocationMetrics(object):
+    # Buffers the metrics of a single invocation, which are written as
+    # one EMF log line by ``flush()``.
+    __slots__ = ('_config', '_dimensions', '_start', '_units', '_values',
+                 '_properties')
+
+    def __init__(self, config: MetricsConfig, service: str,
+                 handler_name: str, cold_start: bool) -> None:
+        self._config = config
+        self._dimensions = {'Service': service, 'Handler': handler_name}
+        self._start = time.perf_counter()
+        self._units: Dict[str, str] = {}
+        self._values: Dict[str, Any] = {}
+        self._properties: Dict[str, Any] = {}
+        self.add('ColdStart', int(cold_start))
+
+    def add(self, name: str, value: Union[int, float],
+            unit: str = 'Count') -> None:
+        self._units[name] = unit
+        self._values[name] = value
+
+    def add_duration(self, name: str, start: float) -> None:
+        # ``start`` is a ``time.perf_counter()`` value.
+        self.add(name, round((time.perf_counter() - start) * 1000, 3),
+                 'Milliseconds')
+
+    def add_status_code(self, status_code: int) -> None:
+        self._properties['StatusCode'] = status_code
+        status_class = status_code // 100
+        for i in range(2, 6):
+            self.add('Status%sxx' % i, int(i == status_class))
+
+    def set_property(self, name: str, value: Any) -> None:
+        self._properties[name] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        config = self._config
+        dimensions = dict(config.dimensions)
+        dimensions.update(self._dimensions)
+        record = dict(self._properties)
+        record.update(dimensions)
+        record.update(self._values)
+        record['_aws'] = {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': config.namespace,
+                'Dimensions': [list(dimensions)],
+                'Metrics': [{'Name': name, 'Unit': unit}
+                            for name, unit in self._units.items()],
+            }],
+        }
+        return record
+
+    def flush(self) -> None:
+        self.add_duration('Latency', self._start)
+        sys.stdout.write(json.dumps(self.to_dict(), separators=(',', ':'),
+                                    default=str) + '\n')
+
+
+class Instrumentation(object):
+    """Lifecycle hooks to register with ``app.register_instrumentation()``.
+
+    Subclasses override the methods they need.  The same ``info`` dict
+    is passed to both methods of a phase, so state such as a start time
+    can be stored in it.
+
+    """
+
+    def on_phase_start(self, phase: str, info: Dict[str, Any]) -> None:
+        pass
+
+    def on_phase_end(self, phase: str, info: Dict[str, Any],
+                     error: Optional[BaseException]) -> None:
+        pass
+
+
+class _InstrumentationRegistry(object):
+    # Callers check ``hooks`` before building the ``info`` dict of a
+    # phase, so nothing else is done when no hooks are registered.
+    def __init__(self) -> None:
+        self.hooks: List[Instrumentation] = []
+
+    def register(self, hook: Instrumentation) -> None:
+        self.hooks.append(hook)
+
+    def start(self, phase: str, info: Dict[str, Any]) -> None:
+        for hook in self.hooks:
+            hook.on_phase_start(phase, info)
+
+    def end(self, phase: str, info: Dict[str, Any],
+            error: Optional[BaseException] = None) -> None:
+        for hook in reversed(self.hooks):
+            hook.on_phase_end(phase, info, error)
+
+    def call(self, phase: str, info: Dict[str, Any],
+             func: Callable[..., Any], *args: Any) -> Any:
+        self.start(phase, info)
+        try:
+            result = func(*args)
+        except BaseException as e:
+            self.end(phase, info, e)
+            raise
+        self.end(phase, info)
+        return result
+
+    async def call_async(self, phase: str, info: Dict[str, Any],
+                         func: Callable[..., Any], *args: Any) -> Any:
+        self.start(phase, info)
+        try:
+            result = await func(*args)
+        except BaseException as e:
+            self.end(phase, info, e)
+            raise
+        self.end(phase, info)
+        return result
+
+
+def _body_size(body: Any) -> int:
+    if isinstance(body, str):
+        return len(body.encode('utf-8'))
+    if isinstance(body, bytes):
+        return len(body)
+    return 0
+
+
 class Request(object):
     """The current request from API gateway."""
+    # The ``__dict__`` slot is kept so that middleware can continue to
+    # attach arbitrary attributes to a request.  The instance dict is only
+    # allocated if that actually happens.
+    __slots__ = (
+        'uri_params', 'method', 'context', 'stage_vars', 'path',
+        'lambda_context', '_query_params', '_headers', '_is_base64_encoded',
+        '_body', '_json_body', '_raw_body', '_event_dict', '_json_codec',
+        '_cache_hit', '__dict__', '__weakref__',
+    )
     _NON_SERIALIZED_ATTRS: List[str] = ['lambda_context']
+    _SERIALIZED_ATTRS: List[str] = [
+        'query_params', 'headers', 'uri_params', 'method', 'context',
+        'stage_vars', 'path',
+    ]
     body: Any
     base64_body: str
 
     def __init__(self, event_dict: Dict[str, Any],
-                 lambda_context: Optional[Any] = None) -> None:
-        query_params = event_dict['multiValueQueryStringParameters']
-        self.query_params: Optional[MultiDict] = None \
-            if query_params is None else MultiDict(query_params)
-        self.headers: CaseInsensitiveMapping = \
-            CaseInsensitiveMapping(event_dict['headers'])
+                 lambda_context: Optional[Any] = None,
+                 json_codec: Optional[JSONCodec] = None) -> None:
+        # The query params and headers are only converted to a MultiDict
+        # and CaseInsensitiveMapping when they're first accessed.  Many
+        # views never look at either of them.
+        self._query_params: Any = _NOT_LOADED
+        self._headers: Any = _NOT_LOADED
         self.uri_params: Optional[Dict[str, str]] \
             = event_dict['pathParameters']
         self.method: str = event_dict['requestContext']['httpMethod']
@@ -416,6 +763,49 @@ class Request(object):
         self.path: str = event_dict['requestContext']['resourcePath']
         self.lambda_context = lambda_context
         self._event_dict = event_dict
+        if json_codec is None:
+            json_codec = _DEFAULT_JSON_CODEC
+        self._json_codec = json_codec
+        # Set by the REST API handler for routes with a response cache.
+        self._cache_hit: Optional[bool] = None
+
+    @property
+    def query_params(self) -> Optional[MultiDict]:
+        if self._query_params is _NOT_LOADED:
+            query_params = self._event_dict['multiValueQueryStringParameters']
+            self._query_params = None \
+                if query_params is None else MultiDict(query_params)
+        return self._query_params
+
+    @query_params.setter
+    def query_params(self, value: Optional[MultiDict]) -> None:
+        self._query_params = value
+
+    @property
+    def headers(self) -> CaseInsensitiveMapping:
+        if self._headers is _NOT_LOADED:
+            self._headers = CaseInsensitiveMapping(self._event_dict['headers'])
+        return self._headers
+
+    @headers.setter
+    def headers(self, value: CaseInsensitiveMapping) -> None:
+        self._headers = value
+
+    def _get_header(self, name: str, default: Any = None) -> Any:
+        # Looks up a single header by its lowercased ``name`` without
+        # building the full ``headers`` mapping.  This is used internally
+        # for the handful of headers chalice itself needs per request.
+        if self._headers is not _NOT_LOADED:
+            return self._headers.get(name, default)
+        value = default
+        raw_headers = self._event_dict['headers']
+        if raw_headers:
+            # If a header is repeated with different casing, the last
+            # value wins, which matches the CaseInsensitiveMapping.
+            for key, header_value in raw_headers.items():
+                if key.lower() == name:
+                    value = header_value
+        return value
 
     def _base64decode(self, encoded: Union[bytes, str]) -> bytes:
         if not isinstance(encoded, bytes):
@@ -436,21 +826,24 @@ class Request(object):
 
     @property
     def json_body(self) -> Any:
-        if self.headers.get('content-type', '').startswith('application/json'):
+        if self._get_header('content-type', '').startswith(
+                'application/json'):
             if self._json_body is None:
                 try:
-                    self._json_body = json.loads(self.raw_body)
+                    self._json_body = self._json_codec.loads(self.raw_body)
                 except ValueError:
                     raise BadRequestError('Error Parsing JSON')
             return self._json_body
 
     def to_dict(self) -> Dict[Any, Any]:
-        # Don't copy internal attributes.
-        copied = {
+        copied = {k: getattr(self, k) for k in self._SERIALIZED_ATTRS}
+        # Any attributes added to the request (e.g. by middleware) are
+        # included as well.  Don't copy internal attributes.
+        copied.update({
             k: v for k, v in self.__dict__.items()
             if not k.startswith('_') and
             k not in self._NON_SERIALIZED_ATTRS
-        }
+        })
         # We want the output of `to_dict()` to be
         # JSON serializable, so we need to remove the CaseInsensitive dict.
         copied['headers'] = dict(copied['headers'])
@@ -468,6 +861,164 @@ class Request(object):
         return self._event_dict
 
 
+class _NormalizedHeaders(object):
+    # The result of a single pass over a response's headers.  This
+    # splits the headers into the single and multi value headers that
+    # API Gateway expects and finds the content type along the way so
+    # we don't need to make case insensitive copies of the headers.
+    __slots__ = ('single', 'multi', 'content_type')
+
+    def __init__(self, single: Dict[str, Any], multi: Dict[str, List],
+                 content_type: Optional[str]) -> None:
+        self.single = single
+        self.multi = multi
+        self.content_type = content_type
+
+
+def _normalize_headers(
+        headers: HeadersType,
+        default_headers: Optional[Dict[str, str]] = None,
+        validate: bool = False
+) -> _NormalizedHeaders:
+    single: Dict[str, Any] = {}
+    multi: Dict[str, List] = {}
+    content_type = None
+    for name, value in headers.items():
+        if isinstance(value, list):
+            if validate:
+                for item in value:
+                    _validate_header_value(name, item)
+            multi[name] = value
+        else:
+            if validate:
+                _validate_header_value(name, value)
+            single[name] = value
+            if name.lower() == 'content-type':
+                content_type = value
+    if default_headers:
+        for name, value in default_headers.items():
+            if name not in headers:
+                # These are added to the original headers as well so
+                # they're visible to any middleware.
+                headers[name] = value
+                single[name] = value
+    return _NormalizedHeaders(single, multi, content_type)
+
+
+def _validate_header_value(name: str, value: str) -> None:
+    if '\n' in value:
+        raise ChaliceError("Bad value for header '%s': %r" % (name, value))
+
+
+def _copy_headers(headers: HeadersType) -> HeadersType:
+    return {name: list(value) if isinstance(value, list) else value
+            for name, value in headers.items()}
+
+
+def _find_header(headers: Dict[str, Any], name: str) -> Optional[str]:
+    # Returns the key used for the lowercase header ``name``.
+    for key in headers:
+        if key.lower() == name:
+            return key
+    return None
+
+
+def _quote_etag(version: str) -> str:
+    if version.startswith(('"', 'W/"')):
+        return version
+    return '"%s"' % version
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match uses the weak comparison function, so the W/ prefix
+    # is ignored on both sides.
+    if if_none_match.strip() == '*':
+        return True
+    if etag.startswith('W/'):
+        etag = etag[2:]
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def _not_modified_since(if_modified_since: str, last_modified: str) -> bool:
+    from email.utils import parsedate_to_datetime
+    try:
+        return parsedate_to_datetime(last_modified) <= \
+            parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+
+
+def _encode_etag(etag: str, encoding: str) -> str:
+    # A compressed body is a different representation than the
+    # uncompressed one, so it can't have the same strong ETag.  Weak
+    # ETags only promise equivalent content so they're left as is.
+    if etag.startswith('W/') or not etag.endswith('"'):
+        return etag
+    return '%s-%s"' % (etag[:-1], encoding)
+
+
+class _ConditionalGet(object):
+    # The conditional headers of a GET request to a route with an
+    # ``etag``.  This is applied to the response once its body has been
+    # serialized and compressed, so a strong ETag can be computed from
+    # the body and can include its content encoding.
+    __slots__ = ('if_none_match', 'if_modified_since', 'etag')
+
+    def __init__(self, if_none_match: Optional[str],
+                 if_modified_since: Optional[str],
+                 etag: Optional[str] = None) -> None:
+        self.if_none_match = if_none_match
+        self.if_modified_since = if_modified_since
+        self.etag = etag
+
+    def apply(self, response_dict: Dict[str, Any], body: Union[str, bytes],
+              content_encoding: Optional[str] = None) -> None:
+        # ``body`` is the body before it was compressed with
+        # ``content_encoding``, if it was.
+        if response_dict['statusCode'] != 200:
+            return
+        headers = response_dict['headers']
+        etag_key = _find_header(headers, 'etag')
+        if etag_key is not None:
+            etag: str = headers[etag_key]
+        else:
+            etag_key = 'ETag'
+            etag = self.etag or self._compute_etag(body)
+        if content_encoding is not None:
+            etag = _encode_etag(etag, content_encoding)
+        headers[etag_key] = etag
+        if self.if_none_match is not None:
+            # If-Modified-Since is ignored if If-None-Match is sent.
+            not_modified = _etag_matches(self.if_none_match, etag)
+        elif self.if_modified_since is not None:
+            last_modified_key = _find_header(headers, 'last-modified')
+            not_modified = last_modified_key is not None and \
+                _not_modified_since(self.if_modified_since,
+                                    headers[last_modified_key])
+        else:
+            not_modified = False
+        if not_modified:
+            response_dict['statusCode'] = 304
+            response_dict['body'] = ''
+            for name in ('content-length', 'content-type',
+                         'content-encoding'):
+                key = _find_header(headers, name)
+                if key is not None:
+                    del headers[key]
+
+    def _compute_etag(self, body: Union[str, bytes]) -> str:
+        import hashlib
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        return '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
 class Response(object):
 
     def __init__(
@@ -480,49 +1031,115 @@ class Response(object):
             headers = {}
         self.headers: HeadersType = headers
         self.status_code = status_code
+        # Set by the REST API handler once it has processed the headers
+        # so they don't have to be processed again when serialized.
+        self._normalized_headers: Optional[_NormalizedHeaders] = None
+        # Set by the CompressionMiddleware when the client accepts a
+        # compressed response.
+        self._compression: Optional[_ResponseCompression] = None
+        # Set by the REST API handler for routes with an ``etag``.
+        self._conditional_get: Optional[_ConditionalGet] = None
 
     def to_dict(
             self,
-            binary_types: Optional[List[str]] = None
+            binary_types: Optional[List[str]] = None,
+            json_codec: Optional[JSONCodec] = None
     ) -> Dict[str, Any]:
-        body = self.body
-        if not isinstance(body, _ANY_STRING):
-            body = json.dumps(body, separators=(',', ':'),
-                              default=handle_extra_types)
-        single_headers, multi_headers = self._sort_headers(self.headers)
+        return self._to_dict(binary_types, json_codec)
+
+    def _to_dict(
+            self,
+            binary_types: Optional[List[str]] = None,
+            json_codec: Optional[JSONCodec] = None,
+            normalized: Optional[_NormalizedHeaders] = None,
+            binary_types_matcher: Optional[_ContentTypeMatcher] = None
+    ) -> Dict[str, Any]:
+        # ``normalized`` can be provided if the headers have already been
+        # processed and are known not to have changed since.
+        # ``binary_types_matcher`` can be provided instead of
+        # ``binary_types`` to avoid creating a new matcher.
+        if normalized is None:
+            normalized = _normalize_headers(self.headers)
+        if binary_types_matcher is None and binary_types is not None:
+            binary_types_matcher = _ContentTypeMatcher(binary_types)
+        body = self._serialize_body(
+            json_codec, normalized.content_type or '', binary_types_matcher)
         response = {
-            'headers': single_headers,
-            'multiValueHeaders': multi_headers,
+            'headers': normalized.single,
+            'multiValueHeaders': normalized.multi,
             'statusCode': self.status_code,
-            'body': body
+            'body': body,
         }
-        if binary_types is not None:
-            self._b64encode_body_if_needed(response, binary_types)
+        is_compressed = False
+        if binary_types_matcher is not None:
+            is_compressed = self._compress_body_if_needed(
+                response, binary_types_matcher)
+        if self._conditional_get is not None:
+            content_encoding = None
+            if is_compressed:
+                assert self._compression is not None
+                content_encoding = self._compression.encoding
+            self._conditional_get.apply(response, body, content_encoding)
+            if response['statusCode'] == 304:
+                is_compressed = False
+        if binary_types_matcher is not None:
+            self._b64encode_body_if_needed(
+                response, binary_types_matcher, normalized.content_type or '',
+                is_compressed)
         return response
 
-    def _sort_headers(
-            self, all_headers: HeadersType
-    ) -> Tuple[Dict[str, Any], Dict[str, List]]:
-        multi_headers: Dict[str, List] = {}
-        single_headers: Dict[str, Any] = {}
-        for name, value in all_headers.items():
-            if isinstance(value, list):
-                multi_headers[name] = value
-            else:
-                single_headers[name] = value
-        return single_headers, multi_headers
+    def _serialize_body(
+            self,
+            json_codec: Optional[JSONCodec],
+            content_type: str,
+            binary_types_matcher: Optional[_ContentTypeMatcher]
+    ) -> Union[str, bytes]:
+        body = self.body
+        if not isinstance(body, _ANY_STRING):
+            if json_codec is None:
+                json_codec = _DEFAULT_JSON_CODEC
+            body = json_codec.dumps(body)
+        return body
+
+    def _compress_body_if_needed(
+            self,
+            response_dict: Dict[str, Any],
+            binary_types_matcher: _ContentTypeMatcher
+    ) -> bool:
+        compression = self._compression
+        if compression is None:
+            return False
+        headers = response_dict['headers']
+        _add_vary_header(headers, 'Accept-Encoding')
+        # API Gateway only decodes a base64 encoded body if the Accept
+        # header of the request matches one of the binary types, so the
+        # compressed body could only be delivered in that case.
+        if not binary_types_matcher.matches(compression.accept):
+            return False
+        body = response_dict['body']
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        if len(body) < compression.minimum_size or \
+                _find_header(headers, 'content-encoding') is not None:
+            return False
+        compressed = compression.compress(body)
+        if len(compressed) >= len(body):
+            return False
+        headers['Content-Encoding'] = compression.encoding
+        response_dict['body'] = compressed
+        return True
 
     def _b64encode_body_if_needed(
             self,
             response_dict: Dict[str, Any],
-            binary_types: List[str]
+            binary_types_matcher: _ContentTypeMatcher,
+            content_type: str,
+            is_binary: bool = False
     ) -> None:
-        response_headers = CaseInsensitiveMapping(response_dict['headers'])
-        content_type = response_headers.get('content-type', '')
         body = response_dict['body']
 
-        if _matches_content_type(content_type, binary_types):
-            if _matches_content_type(content_type, ['application/json']) or \
+        if is_binary or binary_types_matcher.matches(content_type):
+            if _JSON_CONTENT_TYPE_MATCHER.matches(content_type) or \
                     not content_type:
                 # There's a special case when a user configures
                 # ``application/json`` as a binary type.  The default
@@ -548,6 +1165,64 @@ class Response(object):
         return data.decode('ascii')
 
 
+class StreamingResponse(Response):
+    """A response whose body is an iterable of chunks.
+
+    The chunks can be ``str`` or ``bytes`` and are produced as the
+    response is sent rather than all at once, which keeps large bodies
+    out of memory.  ``chalice local`` and the test client stream the
+    chunks to the client as they're produced.  The Lambda Python runtime
+    returns a single response payload, so when deployed the chunks are
+    joined together before the response is returned.
+    """
+
+    def __init__(
+            self, body: Iterable[Union[str, bytes]],
+            headers: Optional[HeadersType] = None,
+            status_code: int = 200
+    ):
+        super(StreamingResponse, self).__init__(
+            body=body, headers=headers, status_code=status_code)
+
+    def iter_chunks(self) -> Iterator[bytes]:
+        for chunk in self.body:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if chunk:
+                yield chunk
+
+    def _serialize_body(
+            self,
+            json_codec: Optional[JSONCodec],
+            content_type: str,
+            binary_types_matcher: Optional[_ContentTypeMatcher]
+    ) -> Union[str, bytes]:
+        body = b''.join(self.iter_chunks())
+        if binary_types_matcher is not None and \
+                not binary_types_matcher.matches(content_type):
+            try:
+                return body.decode('utf-8')
+            except UnicodeDecodeError:
+                pass
+        return body
+
+    def _to_streaming_dict(
+            self,
+            normalized: Optional[_NormalizedHeaders] = None
+    ) -> Dict[str, Any]:
+        # Used when the caller can send the response incrementally.  The
+        # body is left as an iterator of bytes that produces the chunks
+        # when it's consumed.
+        if normalized is None:
+            normalized = _normalize_headers(self.headers)
+        return {
+            'headers': normalized.single,
+            'multiValueHeaders': normalized.multi,
+            'statusCode': self.status_code,
+            'body': self.iter_chunks(),
+        }
+
+
 class RouteEntry(object):
 
     def __init__(self, view_function: Callable[..., Any], view_name: str,
@@ -555,7 +1230,9 @@ class RouteEntry(object):
                  api_key_required: Optional[bool] = None,
                  content_types: Optional[List[str]] = None,
                  cors: Optional[Union[bool, CORSConfig]] = False,
-                 authorizer: Optional[Authorizer] = None):
+                 authorizer: Optional[Authorizer] = None,
+                 etag: Union[bool, Callable[..., Optional[str]]] = False,
+                 cache: Optional[CacheConfig] = None):
         self.view_function: Callable[..., Any] = view_function
         self.view_name: str = view_name
         self.uri_pattern: str = path
@@ -565,6 +1242,7 @@ class RouteEntry(object):
         #: e.g, '/foo/{bar}/{baz}/qux -> ['bar', 'baz']
         self.view_args: List[str] = self._parse_view_args()
         self.content_types: List[str] = content_types or []
+        self._content_types_matcher = _ContentTypeMatcher(self.content_types)
         # cors is passed as either a boolean or a CORSConfig object. If it is a
         # boolean it needs to be replaced with a real CORSConfig object to
         # pass the typechecker. None in this context will not inject any cors
@@ -576,6 +1254,14 @@ class RouteEntry(object):
             cors = None
         self.cors: CORSConfig = cors  # type: ignore
         self.authorizer: Optional[Authorizer] = authorizer
+        #: Either True to compute a strong ETag from the response body,
+        #: or a function that is called with the view's arguments and
+        #: returns the current version of the resource.
+        self.etag: Union[bool, Callable[..., Optional[str]]] = etag
+        self.cache: Optional[CacheConfig] = cache
+        self._response_cache: Optional[_ResponseCache] = None
+        if cache is not None and method in ('GET', 'HEAD'):
+            self._response_cache = _ResponseCache(cache, self.view_args)
 
     def _parse_view_args(self) -> List[str]:
         if '{' not in self.uri_pattern:
@@ -585,10 +1271,93 @@ class RouteEntry(object):
         results = [r[1:-1] for r in _PARAMS.findall(self.uri_pattern)]
         return results
 
+    def _get_content_types_matcher(self) -> _ContentTypeMatcher:
+        matcher = _get_content_type_matcher(
+            self._content_types_matcher, self.content_types)
+        self._content_types_matcher = matcher
+        return matcher
+
     def __eq__(self, other: object) -> bool:
         return self.__dict__ == other.__dict__
 
 
+class _LRUCache(object):
+    # A bounded LRU whose entries expire ``ttl`` seconds after they're
+    # added.  This can be used from multiple threads in ``chalice local``.
+
+    def __init__(self, ttl: float, max_entries: int) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Any) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Any, value: Any) -> None:
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions,
+                    'entries': len(self._entries)}
+
+
+class _ResponseCache(_LRUCache):
+    # The serialized bodies and headers of a single route's responses.
+    # Entries are keyed by the route's path parameters and the query
+    # parameters and headers the CacheConfig varies on.
+
+    def __init__(self, config: CacheConfig, view_args: List[str]) -> None:
+        super(_ResponseCache, self).__init__(config.ttl, config.max_entries)
+        self.config = config
+        self._view_args = view_args
+        self._query_params = config.query_params
+        self._headers = config.headers
+
+    def create_key(self, request: Request) -> Tuple[Any, ...]:
+        # pylint: disable=protected-access
+        event = request._event_dict
+        key: List[Any] = []
+        if self._view_args:
+            path_params = event.get('pathParameters') or {}
+            key.extend(path_params.get(name) for name in self._view_args)
+        if self._query_params:
+            query_params = event.get('multiValueQueryStringParameters') or {}
+            key.extend(tuple(query_params.get(name) or ())
+                       for name in self._query_params)
+        for name in self._headers:
+            key.append(request._get_header(name))
+        return tuple(key)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, self.__class__) and \
+            self.config == other.config
+
+
 class APIGateway(object):
 
     _DEFAULT_BINARY_TYPES = [
@@ -601,20 +1370,32 @@ class APIGateway(object):
     def __init__(self) -> None:
         self.binary_types: List[str] = self.default_binary_types
         self.cors: Union[bool, CORSConfig] = False
+        self._binary_types_matcher: Optional[_ContentTypeMatcher] = None
 
     @property
     def default_binary_types(self) -> List[str]:
         return list(self._DEFAULT_BINARY_TYPES)
 
+    def _get_binary_types_matcher(self) -> _ContentTypeMatcher:
+        matcher = _get_content_type_matcher(
+            self._binary_types_matcher, self.binary_types)
+        self._binary_types_matcher = matcher
+        return matcher
+
 
 class WebsocketAPI(object):
     _WEBSOCKET_ENDPOINT_TEMPLATE = 'https://{domain_name}/{stage}'
     _REGION_ENV_VARS = ['AWS_REGION', 'AWS_DEFAULT_REGION']
+    BROADCAST_MAX_WORKERS = 20
 
     def __init__(self, env: Optional[MutableMapping] = None) -> None:
         self.session: Optional[Any] = None
         self._endpoint: Optional[str] = None
         self._client = None
+        # The broadcast clients and thread pools, by number of workers.
+        self._broadcast_clients: Dict[int, Any] = {}
+        self._broadcast_executors: Dict[int, Any] = {}
+        self._broadcast_lock = threading.Lock()
         if env is None:
             self._env: MutableMapping = os.environ
         else:
@@ -628,6 +1409,13 @@ class WebsocketAPI(object):
             stage=stage,
         )
 
+    def configure_endpoint_url(self, endpoint_url: str) -> None:
+        # Points the client at a specific management API endpoint, e.g.
+        # chalice.local.LocalWebsocketManagementEndpoint in tests.
+        self._endpoint = endpoint_url
+        self._client = None
+        self._broadcast_clients = {}
+
     def configure_from_api_id(self, api_id: str, stage: str) -> None:
         if self._endpoint is not None:
             return
@@ -669,7 +1457,7 @@ class WebsocketAPI(object):
             "session."
         )
 
-    def _get_client(self) -> Any:
+    def _get_configured_session(self) -> Any:
         if self.session is None:
             raise ValueError(
                 'Assign app.websocket_api.session to a boto3 session before '
@@ -680,8 +1468,12 @@ class WebsocketAPI(object):
                 'WebsocketAPI.configure must be called before using the '
                 'WebsocketAPI'
             )
+        return self.session
+
+    def _get_client(self) -> Any:
+        session = self._get_configured_session()
         if self._client is None:
-            self._client = self.session.client(
+            self._client = session.client(
                 'apigatewaymanagementapi',
                 endpoint_url=self._endpoint,
             )
@@ -697,6 +1489,60 @@ class WebsocketAPI(object):
         except client.exceptions.GoneException:
             raise WebsocketDisconnectedError(connection_id)
 
+    def broadcast(self, connection_ids: Iterable[str], message: str,
+                  max_workers: Optional[int] = None) -> Set[str]:
+        # Returns the connection ids that are no longer connected rather
+        # than raising WebsocketDisconnectedError for them.
+        connection_ids = list(connection_ids)
+        if not connection_ids:
+            return set()
+        if max_workers is None:
+            max_workers = self.BROADCAST_MAX_WORKERS
+        client, executor = self._get_broadcast_client_and_executor(
+            max_workers)
+        gone_exception = client.exceptions.GoneException
+
+        def _post_to_connection(connection_id: str) -> Optional[str]:
+            try:
+                client.post_to_connection(
+                    ConnectionId=connection_id,
+                    Data=message,
+                )
+            except gone_exception:
+                return connection_id
+            return None
+
+        return {
+            connection_id for connection_id in
+            executor.map(_post_to_connection, connection_ids)
+            if connection_id is not None
+        }
+
+    def _get_broadcast_client_and_executor(
+            self, max_workers: int) -> Tuple[Any, Any]:
+        # The broadcast client has an HTTP connection pool as large as the
+        # worker pool so workers don't wait on each other for connections.
+        # Both are reused across invocations.  There's one of each per
+        # size, rather than replacing them when the size changes, since
+        # another thread may still be broadcasting with the old ones.
+        session = self._get_configured_session()
+        with self._broadcast_lock:
+            executor = self._broadcast_executors.get(max_workers)
+            if executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                executor = ThreadPoolExecutor(max_workers=max_workers)
+                self._broadcast_executors[max_workers] = executor
+            client = self._broadcast_clients.get(max_workers)
+            if client is None:
+                from botocore.config import Config as BotocoreConfig
+                client = session.client(
+                    'apigatewaymanagementapi',
+                    endpoint_url=self._endpoint,
+                    config=BotocoreConfig(max_pool_connections=max_workers),
+                )
+                self._broadcast_clients[max_workers] = client
+            return client, executor
+
     def close(self, connection_id: str) -> None:
         client = self._get_client()
         try:
@@ -718,6 +1564,7 @@ class WebsocketAPI(object):
 
 class DecoratorAPI(object):
     websocket_api: Optional[WebsocketAPI] = None
+    json_codec: Optional[JSONCodec] = None
 
     def middleware(
             self,
@@ -733,7 +1580,8 @@ class DecoratorAPI(object):
     def authorizer(self, ttl_seconds: Optional[int] = None,
                    execution_role: Optional[str] = None,
                    name: Optional[str] = None,
-                   header: Optional[str] = 'Authorization'
+                   header: Optional[str] = 'Authorization',
+                   cache_results: bool = False
                    ) -> Callable[..., Any]:
         return self._create_registration_function(
             handler_type='authorizer',
@@ -741,7 +1589,8 @@ class DecoratorAPI(object):
             registration_kwargs={
                 'ttl_seconds': ttl_seconds,
                 'execution_role': execution_role,
-                'header': header
+                'header': header,
+                'cache_results': cache_results,
             }
         )
 
@@ -770,8 +1619,16 @@ class DecoratorAPI(object):
                        queue_arn: Optional[str] = None,
                        maximum_batching_window_in_seconds: int = 0,
                        maximum_concurrency: Optional[int] = None,
+                       report_batch_item_failures: bool = False,
+                       per_record: bool = False,
+                       max_workers: Optional[int] = None,
                        ) -> Callable[..., Any]:
-        return self._create_registration_function(
+        _validate_per_record(per_record, report_batch_item_failures)
+        if max_workers is not None and not per_record:
+            raise ValueError(
+                "`max_workers` can only be used when `per_record` is True."
+            )
+        register = self._create_registration_function(
             handler_type='on_sqs_message',
             name=name,
             registration_kwargs={
@@ -781,8 +1638,14 @@ class DecoratorAPI(object):
                 'maximum_batching_window_in_seconds':
                     maximum_batching_window_in_seconds,
                 'maximum_concurrency': maximum_concurrency,
+                'report_batch_item_failures': report_batch_item_failures,
             }
         )
+        if not per_record:
+            return register
+        return self._create_record_handler_registration(
+            register, functools.partial(SQSRecordBatchHandler,
+                                        max_workers=max_workers))
 
     def on_cw_event(self, event_pattern: Dict[str, Any],
                     name: Optional[str] = None) -> Callable[..., Any]:
@@ -805,9 +1668,15 @@ class DecoratorAPI(object):
     def on_kinesis_record(self, stream: str, batch_size: int = 100,
                           starting_position: str = 'LATEST',
                           name: Optional[str] = None,
-                          maximum_batching_window_in_seconds: int = 0
+                          maximum_batching_window_in_seconds: int = 0,
+                          report_batch_item_failures: bool = False,
+                          bisect_batch_on_function_error: bool = False,
+                          maximum_retry_attempts: Optional[int] = None,
+                          parallelization_factor: Optional[int] = None,
+                          per_record: bool = False,
                           ) -> Callable[..., Any]:
-        return self._create_registration_function(
+        _validate_per_record(per_record, report_batch_item_failures)
+        register = self._create_registration_function(
             handler_type='on_kinesis_record',
             name=name,
             registration_kwargs={
@@ -815,17 +1684,32 @@ class DecoratorAPI(object):
                 'batch_size': batch_size,
                 'starting_position': starting_position,
                 'maximum_batching_window_in_seconds':
-                    maximum_batching_window_in_seconds},
+                    maximum_batching_window_in_seconds,
+                'report_batch_item_failures': report_batch_item_failures,
+                'bisect_batch_on_function_error':
+                    bisect_batch_on_function_error,
+                'maximum_retry_attempts': maximum_retry_attempts,
+                'parallelization_factor': parallelization_factor},
         )
+        if not per_record:
+            return register
+        return self._create_record_handler_registration(
+            register, StreamRecordBatchHandler)
 
     def on_dynamodb_record(
             self, stream_arn: str,
             batch_size: int = 100,
             starting_position: str = 'LATEST',
             name: Optional[str] = None,
-            maximum_batching_window_in_seconds: int = 0
+            maximum_batching_window_in_seconds: int = 0,
+            report_batch_item_failures: bool = False,
+            bisect_batch_on_function_error: bool = False,
+            maximum_retry_attempts: Optional[int] = None,
+            parallelization_factor: Optional[int] = None,
+            per_record: bool = False,
     ) -> Callable[..., Any]:
-        return self._create_registration_function(
+        _validate_per_record(per_record, report_batch_item_failures)
+        register = self._create_registration_function(
             handler_type='on_dynamodb_record',
             name=name,
             registration_kwargs={
@@ -833,8 +1717,17 @@ class DecoratorAPI(object):
                 'batch_size': batch_size,
                 'starting_position': starting_position,
                 'maximum_batching_window_in_seconds':
-                    maximum_batching_window_in_seconds},
+                    maximum_batching_window_in_seconds,
+                'report_batch_item_failures': report_batch_item_failures,
+                'bisect_batch_on_function_error':
+                    bisect_batch_on_function_error,
+                'maximum_retry_attempts': maximum_retry_attempts,
+                'parallelization_factor': parallelization_factor},
         )
+        if not per_record:
+            return register
+        return self._create_record_handler_registration(
+            register, StreamRecordBatchHandler)
 
     def route(self, path: str, **kwargs: Any) -> Callable[..., Any]:
         return self._create_registration_function(
@@ -895,6 +1788,16 @@ class DecoratorAPI(object):
             return wrapped
         return _register_handler
 
+    def _create_record_handler_registration(
+            self, register: Callable[..., Any],
+            batch_handler_factory: Callable[..., Any]) -> Callable[..., Any]:
+        # The user's function handles a single record, so it's wrapped in
+        # a batch handler that's registered as the event handler.
+        def _register_record_handler(
+                user_handler: UserHandlerFuncType) -> Callable[..., Any]:
+            return register(batch_handler_factory(user_handler))
+        return _register_record_handler
+
     def _wrap_handler(self, handler_type: str,
                       handler_name: str,
                       user_handler: UserHandlerFuncType
@@ -912,7 +1815,10 @@ class DecoratorAPI(object):
                 user_handler, _EVENT_CLASSES[handler_type],
                 middleware_handlers=self._get_middleware_handlers(
                     event_type=_MIDDLEWARE_MAPPING[handler_type],
-                )
+                ),
+                name=handler_name,
+                metrics_emitter=self._get_metrics_emitter(),
+                instrumentation=self._get_instrumentation(),
             )
 
         websocket_event_classes = [
@@ -925,17 +1831,29 @@ class DecoratorAPI(object):
                 user_handler, WebsocketEvent,
                 self.websocket_api,
                 middleware_handlers=self._get_middleware_handlers(
-                    event_type='websocket')
+                    event_type='websocket'),
+                json_codec=self.json_codec,
+                name=handler_name,
+                metrics_emitter=self._get_metrics_emitter(),
+                instrumentation=self._get_instrumentation(),
             )
         if handler_type == 'authorizer':
             # Authorizer is special cased and doesn't quite fit the
             # EventSourceHandler pattern.
-            return ChaliceAuthorizer(handler_name, user_handler)
+            return ChaliceAuthorizer(
+                handler_name, user_handler,
+                instrumentation=self._get_instrumentation())
         return user_handler
 
     def _get_middleware_handlers(self, event_type: str) -> List:
         raise NotImplementedError("_get_middleware_handlers")
 
+    def _get_metrics_emitter(self) -> Optional[_MetricsEmitter]:
+        raise NotImplementedError("_get_metrics_emitter")
+
+    def _get_instrumentation(self) -> Optional[_InstrumentationRegistry]:
+        raise NotImplementedError("_get_instrumentation")
+
     def _register_handler(self, handler_type: str, name: str,
                           user_handler: UserHandlerFuncType,
                           wrapped_handler: Callable[..., Any],
@@ -1105,6 +2023,8 @@ class _HandlerRegistration(object):
                 'maximum_batching_window_in_seconds'],
             maximum_concurrency=kwargs[
                 'maximum_concurrency'],
+            report_batch_item_failures=kwargs.get(
+                'report_batch_item_failures', False),
         )
         self.event_sources.append(sqs_config)
 
@@ -1122,6 +2042,12 @@ class _HandlerRegistration(object):
             starting_position=kwargs['starting_position'],
             maximum_batching_window_in_seconds=kwargs[
                 'maximum_batching_window_in_seconds'],
+            report_batch_item_failures=kwargs.get(
+                'report_batch_item_failures', False),
+            bisect_batch_on_function_error=kwargs.get(
+                'bisect_batch_on_function_error', False),
+            maximum_retry_attempts=kwargs.get('maximum_retry_attempts'),
+            parallelization_factor=kwargs.get('parallelization_factor'),
         )
         self.event_sources.append(kinesis_config)
 
@@ -1137,6 +2063,12 @@ class _HandlerRegistration(object):
             starting_position=kwargs['starting_position'],
             maximum_batching_window_in_seconds=kwargs[
                 'maximum_batching_window_in_seconds'],
+            report_batch_item_failures=kwargs.get(
+                'report_batch_item_failures', False),
+            bisect_batch_on_function_error=kwargs.get(
+                'bisect_batch_on_function_error', False),
+            maximum_retry_attempts=kwargs.get('maximum_retry_attempts'),
+            parallelization_factor=kwargs.get('parallelization_factor'),
         )
         self.event_sources.append(ddb_config)
 
@@ -1166,6 +2098,7 @@ class _HandlerRegistration(object):
         ttl_seconds = actual_kwargs.pop('ttl_seconds', None)
         execution_role = actual_kwargs.pop('execution_role', None)
         header = actual_kwargs.pop('header', None)
+        cache_results = actual_kwargs.pop('cache_results', False)
         if actual_kwargs:
             raise TypeError(
                 'TypeError: authorizer() got unexpected keyword '
@@ -1176,8 +2109,15 @@ class _HandlerRegistration(object):
             ttl_seconds=ttl_seconds,
             execution_role=execution_role,
             header=header,
+            cache_results=cache_results,
         )
         wrapped_handler.config = auth_config
+        # pylint: disable=protected-access
+        wrapped_handler._route_table = self.routes
+        if cache_results and auth_config.cache_ttl_seconds > 0:
+            wrapped_handler._result_cache = _LRUCache(
+                auth_config.cache_ttl_seconds,
+                wrapped_handler.RESULT_CACHE_SIZE)
         self.builtin_auth_handlers.append(auth_config)
 
     def _register_route(self, name: str, user_handler: UserHandlerFuncType,
@@ -1195,6 +2135,8 @@ class _HandlerRegistration(object):
             'content_types': actual_kwargs.pop('content_types',
                                                ['application/json']),
             'cors': actual_kwargs.pop('cors', self.api.cors),
+            'etag': actual_kwargs.pop('etag', False),
+            'cache': actual_kwargs.pop('cache', None),
         }
         if route_kwargs['cors'] is None:
             route_kwargs['cors'] = self.api.cors
@@ -1222,6 +2164,23 @@ class _HandlerRegistration(object):
             self.routes[path][method] = entry
 
 
+# chalice local and the test client can send the body of a
+# StreamingResponse as it's produced.  They invoke the app inside
+# _stream_responses() so the body is returned as an iterator of chunks.
+# Lambda can't stream, so everywhere else the chunks are joined.
+_STREAMING_STATE = threading.local()
+
+
+@contextlib.contextmanager
+def _stream_responses() -> Iterator[None]:
+    previous = getattr(_STREAMING_STATE, 'enabled', False)
+    _STREAMING_STATE.enabled = True
+    try:
+        yield
+    finally:
+        _STREAMING_STATE.enabled = previous
+
+
 class Chalice(_HandlerRegistration, DecoratorAPI):
     FORMAT_STRING = '%(name)s - %(levelname)s - %(message)s'
     authorizers: Dict[str, Dict[str, Any]]
@@ -1230,10 +2189,14 @@ class Chalice(_HandlerRegistration, DecoratorAPI):
 
     def __init__(self, app_name: str, debug: bool = False,
                  configure_logs: bool = True,
-                 env: Optional[MutableMapping] = None) -> None:
+                 env: Optional[MutableMapping] = None,
+                 json_codec: Optional[JSONCodec] = None) -> None:
         super(Chalice, self).__init__()
         self.app_name: str = app_name
         self.websocket_api: WebsocketAPI = WebsocketAPI()
+        if json_codec is None:
+            json_codec = _DEFAULT_JSON_CODEC
+        self.json_codec: JSONCodec = json_codec
         self._debug: bool = debug
         self.configure_logs: bool = configure_logs
         self.log: logging.Logger = logging.getLogger(self.app_name)
@@ -1244,6 +2207,14 @@ class Chalice(_HandlerRegistration, DecoratorAPI):
         # This is marked as internal but is intended to be used by
         # any code within Chalice.
         self._features_used: Set[str] = set()
+        # The REST API handler and its middleware chain are built on the
+        # first request and reused across warm invocations.  Anything that
+        # changes how requests are dispatched (routes, middleware, debug)
+        # resets this so it's rebuilt on the next request.
+        self._rest_api_handler: Optional['RestAPIEventHandler'] = None
+        self._metrics_emitter: _MetricsEmitter = _MetricsEmitter(app_name)
+        self._instrumentation: _InstrumentationRegistry = \
+            _InstrumentationRegistry()
 
     def _initialize(self, env: MutableMapping) -> None:
         if self.configure_logs:
@@ -1261,6 +2232,15 @@ class Chalice(_HandlerRegistration, DecoratorAPI):
     def debug(self, value: bool) -> None:
         self._debug = value
         self._configure_log_level()
+        self._rest_api_handler = None
+
+    @property
+    def metrics_config(self) -> Optional[MetricsConfig]:
+        return self._metrics_emitter.config
+
+    @metrics_config.setter
+    def metrics_config(self, value: Optional[MetricsConfig]) -> None:
+        self._metrics_emitter.config = value
 
     def _configure_logging(self) -> None:
         if self._already_configured(self.log):
@@ -1304,6 +2284,17 @@ class Chalice(_HandlerRegistration, DecoratorAPI):
         self._do_register_handler(handler_type, name, user_handler,
                                   wrapped_handler, kwargs, options)
 
+    def register_middleware(self, func: MiddlewareFuncType,
+                            event_type: str = 'all') -> None:
+        super(Chalice, self).register_middleware(func, event_type)
+        self._rest_api_handler = None
+
+    def _register_route(self, name: str, user_handler: UserHandlerFuncType,
+                        kwargs: Any, **unused: Dict[str, Any]) -> None:
+        super(Chalice, self)._register_route(
+            name, user_handler, kwargs, **unused)
+        self._rest_api_handler = None
+
     # These are defined here on the Chalice class because we want all the
     # feature flag tracking to live in Chalice and not the DecoratorAPI.
     def _register_on_ws_connect(self, name: str,
@@ -1339,6 +2330,16 @@ class Chalice(_HandlerRegistration, DecoratorAPI):
         return (func for func, filter_type in self.middleware_handlers if
                 filter_type in [event_type, 'all'])
 
+    def _get_metrics_emitter(self) -> _MetricsEmitter:
+        return self._metrics_emitter
+
+    def _get_instrumentation(self) -> _InstrumentationRegistry:
+        return self._instrumentation
+
+    def register_instrumentation(self, instrumentation: Instrumentation
+                                 ) -> None:
+        self._instrumentation.register(instrumentation)
+
     def __call__(self, event: Any, context: Any) -> Dict[str, Any]:
         # For legacy reasons, we can't move the Rest API handler entry
         # point away from this Chalice.__call__ method . However, we can
@@ -1346,27 +2347,86 @@ class Chalice(_HandlerRegistration, DecoratorAPI):
         # class we can call.  That way it's still structured somewhat similar
         # to the other event handlers which makes it more manageable to
         # implement shared functionality (e.g. middleware).
+        return self._handle_rest_api_event(
+            event, context,
+            stream=getattr(_STREAMING_STATE, 'enabled', False))
+
+    def _handle_rest_api_event(self, event: Any, context: Any,
+                               stream: bool = False) -> Dict[str, Any]:
+        if self._instrumentation.hooks:
+            return self._instrumentation.call(
+                'invocation', {'event': event, 'context': context},
+                self._handle_instrumented_rest_api_event, event, context,
+                stream)
         self.lambda_context: 'LambdaContext' = context
-        handler = RestAPIEventHandler(
-            self.routes, self.api, self.log, self.debug,
-            middleware_handlers=self._get_middleware_handlers('http'),
-        )
-        self.current_request: \
-            Optional[Request] = handler.create_request_object(event, context)
-        return handler(event, context)
+        handler = self._get_rest_api_handler()
+        request = handler.create_request_object(event, context)
+        self.current_request: Optional[Request] = request
+        return handler.dispatch(request, stream=stream)
+
+    def _handle_instrumented_rest_api_event(
+            self, event: Any, context: Any, stream: bool) -> Dict[str, Any]:
+        self.lambda_context = context
+        handler = self._get_rest_api_handler()
+        request = self._instrumentation.call(
+            'request_parse', {'event': event},
+            handler.create_request_object, event, context)
+        self.current_request = request
+        return handler.dispatch(request, stream=stream)
+
+    def invalidate_cache(self, path: Optional[str] = None) -> None:
+        """Remove the cached responses of a route or of all routes."""
+        for route_path, methods in list(self.routes.items()):
+            if path is not None and route_path != path:
+                continue
+            for entry in methods.values():
+                # pylint: disable=protected-access
+                if entry._response_cache is not None:
+                    entry._response_cache.clear()
+
+    def get_cache_stats(self, path: str,
+                        method: str = 'GET') -> Dict[str, int]:
+        route_entry = self.routes.get(path, {}).get(method)
+        # pylint: disable=protected-access
+        if route_entry is None or route_entry._response_cache is None:
+            raise ValueError("No response cache is configured for %s %s"
+                             % (method, path))
+        return route_entry._response_cache.stats()
+
+    def _get_rest_api_handler(self) -> 'RestAPIEventHandler':
+        if self._rest_api_handler is None:
+            self._rest_api_handler = RestAPIEventHandler(
+                self.routes, self.api, self.log, self.debug,
+                middleware_handlers=self._get_middleware_handlers('http'),
+                json_codec=self.json_codec,
+                metrics_emitter=self._metrics_emitter,
+                instrumentation=self._instrumentation,
+            )
+        return self._rest_api_handler
 
 
 class BuiltinAuthConfig(object):
     def __init__(self, name: str, handler_string: str,
                  ttl_seconds: Optional[int] = None,
                  execution_role: Optional[str] = None,
-                 header: str = 'Authorization'):
+                 header: str = 'Authorization',
+                 cache_results: bool = False):
         # We'd also support all the misc config options you can set.
         self.name: str = name
         self.handler_string: str = handler_string
         self.ttl_seconds: Optional[int] = ttl_seconds
         self.execution_role: Optional[str] = execution_role
         self.header: str = header
+        # Whether the authorizer function also caches its results
+        # in-process for ``ttl_seconds``, in addition to API Gateway.
+        self.cache_results: bool = cache_results
+
+    @property
+    def cache_ttl_seconds(self) -> int:
+        if self.ttl_seconds is None:
+            # This is the default TTL of API Gateway's authorizer cache.
+            return 300
+        return self.ttl_seconds
 
 
 # ChaliceAuthorizer is unique in that the runtime component (the thing
@@ -1391,8 +2451,14 @@ class BuiltinAuthConfig(object):
 # we would need more research to know for sure.  For now, this is a
 # special cased runtime class that knows about its config.
 class ChaliceAuthorizer(object):
+    # The maximum number of tokens whose results are cached when the
+    # authorizer is registered with ``cache_results=True``.
+    RESULT_CACHE_SIZE = 1024
+
     def __init__(self, name: str, func: Callable[..., Any],
-                 scopes: Optional[List[str]] = None) -> None:
+                 scopes: Optional[List[str]] = None,
+                 instrumentation: Optional[_InstrumentationRegistry] = None
+                 ) -> None:
         self.name: str = name
         self.func: Callable[
             ['AuthRequest'], Union['AuthResponse', Dict[str, Any]]
@@ -1401,16 +2467,45 @@ class ChaliceAuthorizer(object):
         # This is filled in during the @app.authorizer()
         # processing.
         self.config: BuiltinAuthConfig = None  # type: ignore
+        self.instrumentation: Optional[
+            _InstrumentationRegistry] = instrumentation
+        self._result_cache: Optional[_LRUCache] = None
+        # The app's routes, which are used to compact the policy of an
+        # AuthResponse created with ``compact=True``.
+        self._route_table: Optional[Dict[str, Dict[str, Any]]] = None
 
     def __call__(
             self,
             event: Dict[str, Any],
             context: Dict[str, Any]
     ) -> Dict[str, Any]:
+        instrumentation = self.instrumentation
+        if instrumentation is not None and instrumentation.hooks:
+            return instrumentation.call(
+                'auth', {'event': event, 'context': context,
+                         'handler': self.name},
+                self._authorize, event)
+        return self._authorize(event)
+
+    def _authorize(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        cache = self._result_cache
+        if cache is not None:
+            # The generated policy depends on the API and stage in the
+            # method ARN, but not on the method and path being called,
+            # which is what allows API Gateway to cache it by token.
+            cache_key = (event['authorizationToken'],
+                         tuple(event['methodArn'].split('/', 2)[:2]))
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return _copy_auth_result(cached)
         auth_request = self._transform_event(event)
-        result = self.func(auth_request)
+        result = _resolve_result(self.func, auth_request)
         if isinstance(result, AuthResponse):
-            return result.to_dict(auth_request)
+            result = result.to_dict(auth_request,
+                                    route_table=self._route_table)
+        if cache is not None and isinstance(result, dict):
+            cache.put(cache_key, result)
+            return _copy_auth_result(result)
         return result
 
     def _transform_event(self, event: Dict[str, Any]) -> 'AuthRequest':
@@ -1419,11 +2514,26 @@ class ChaliceAuthorizer(object):
                            event['methodArn'])
 
     def with_scopes(self, scopes: List[str]) -> 'ChaliceAuthorizer':
-        authorizer_with_scopes = copy.deepcopy(self)
+        # The instrumentation registry, result cache and route table are
+        # shared with the copy instead of copying the hooks and routes
+        # registered with the app and the cached results.
+        authorizer_with_scopes = copy.deepcopy(
+            self, {id(self.instrumentation): self.instrumentation,
+                   id(self._result_cache): self._result_cache,
+                   id(self._route_table): self._route_table})
         authorizer_with_scopes.scopes = scopes
         return authorizer_with_scopes
 
 
+def _copy_auth_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    # Callers such as ``chalice local`` add to the context of the result
+    # so a cached result isn't returned directly.
+    copied = dict(result)
+    if isinstance(copied.get('context'), dict):
+        copied['context'] = dict(copied['context'])
+    return copied
+
+
 class AuthRequest(object):
     def __init__(self, auth_type: str, token: str, method_arn: str) -> None:
         self.auth_type: str = auth_type
@@ -1436,7 +2546,8 @@ class AuthResponse(object):
                                    'PATCH', 'POST', 'PUT', 'GET']
 
     def __init__(self, routes: List[Union[str, 'AuthRoute']],
-                 principal_id: str, context: Optional[Dict[str, str]] = None):
+                 principal_id: str, context: Optional[Dict[str, str]] = None,
+                 compact: bool = False):
         self.routes: List[Union[str, 'AuthRoute']] = routes
         self.principal_id: str = principal_id
         # The request is used to generate full qualified ARNs
@@ -1445,16 +2556,25 @@ class AuthResponse(object):
         if context is None:
             context = {}
         self.context: Dict[str, str] = context
+        # Whether to replace the allowed routes with fewer wildcard
+        # resources that allow the same routes.
+        self.compact: bool = compact
 
-    def to_dict(self, request: AuthRequest) -> Dict[str, Any]:
+    def to_dict(self, request: AuthRequest,
+                route_table: Optional[Dict[str, Dict[str, Any]]] = None
+                ) -> Dict[str, Any]:
         return {
             'context': self.context,
             'principalId': self.principal_id,
-            'policyDocument': self._generate_policy(request),
+            'policyDocument': self._generate_policy(request, route_table),
         }
 
-    def _generate_policy(self, request: AuthRequest) -> Dict[str, Any]:
-        allowed_resources = self._generate_allowed_resources(request)
+    def _generate_policy(
+            self, request: AuthRequest,
+            route_table: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
+        allowed_resources = self._generate_allowed_resources(
+            request, route_table)
         return {
             'Version': '2012-10-17',
             'Statement': [
@@ -1466,8 +2586,19 @@ class AuthResponse(object):
             ]
         }
 
-    def _generate_allowed_resources(self, request: AuthRequest) -> List[str]:
-        allowed_resources = []
+    def _generate_allowed_resources(
+            self, request: AuthRequest,
+            route_table: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> List[str]:
+        allowed_routes = self._get_allowed_routes()
+        if self.compact:
+            allowed_routes = _PolicyCompactor(route_table).compact(
+                allowed_routes)
+        return [self._generate_arn(path, request, method)
+                for method, path in allowed_routes]
+
+    def _get_allowed_routes(self) -> List[Tuple[str, str]]:
+        allowed_routes = []
         for route in self.routes:
             if isinstance(route, AuthRoute):
                 methods = route.methods
@@ -1484,9 +2615,8 @@ class AuthResponse(object):
                 methods = ['*']
                 path = route
             for method in methods:
-                allowed_resources.append(
-                    self._generate_arn(path, request, method))
-        return allowed_resources
+                allowed_routes.append((method, path))
+        return allowed_routes
 
     def _generate_arn(
             self,
@@ -1527,6 +2657,264 @@ class AuthRoute(object):
         self.methods: List[str] = methods
 
 
+def _has_wildcard(value: str) -> bool:
+    return '*' in value or '?' in value
+
+
+def _path_segments(path: str) -> List[str]:
+    if path == '/':
+        return []
+    return path.strip('/').split('/')
+
+
+def _resource_suffix(method: str, path: str) -> str:
+    # The part of the ARN that AuthResponse._generate_arn adds after the
+    # API id and stage.
+    if path == '*':
+        return '%s/*' % method
+    return '%s/%s' % (method, path[1:])
+
+
+class _ResourceMatcher(object):
+    # Matches resources the way IAM does, where ``*`` matches any number
+    # of characters, including ``/``, and ``?`` matches one character.
+    def __init__(self, resources: List[str]) -> None:
+        self._literals: Set[str] = set()
+        regexes = []
+        for resource in resources:
+            if _has_wildcard(resource):
+                regexes.append(re.escape(resource).replace(
+                    r'\?', '.').replace(r'\*', '.*'))
+            else:
+                self._literals.add(resource)
+        self._pattern: Optional[Pattern[str]] = None
+        if regexes:
+            self._pattern = re.compile('^(?:%s)$' % '|'.join(regexes))
+
+    def matches(self, resource: str, exact: bool = True) -> bool:
+        # With ``exact=False`` the resource is only matched by wildcards.
+        if exact and resource in self._literals:
+            return True
+        return self._pattern is not None and \
+            self._pattern.match(resource) is not None
+
+
+class _PolicyCompactor(object):
+    # Replaces the (method, path) pairs allowed by an AuthResponse with
+    # fewer pairs that allow the same routes.  Without a route table
+    # this only removes pairs that are covered by a wildcard.  With the
+    # app's route table, the pairs under a path prefix are replaced with
+    # ``prefix/*`` if no route of the app that it matches was denied,
+    # and a path allowed for all of its methods uses the ``*`` method.
+    # The result is checked against the route table and the original
+    # pairs are used if it doesn't allow exactly the same routes.
+
+    def __init__(self,
+                 route_table: Optional[Dict[str, Dict[str, Any]]]) -> None:
+        self._route_table = route_table
+
+    def compact(self, allowed: List[Tuple[str, str]]
+                ) -> List[Tuple[str, str]]:
+        if self._route_table is None:
+            return self._remove_covered(allowed)
+        denied = self._find_denied_routes(allowed)
+        # The ``*`` method also matches ``/`` so a resource such as
+        # ``*/users`` matches ``GET/admin/users``.  Wildcard methods are
+        # checked against all of the denied resources as a single string.
+        denied_resources = '\n%s\n' % '\n'.join(
+            _resource_suffix(method, path) for method, path in denied)
+        blocked = self._find_blocked_prefixes(denied)
+        # Merging the methods of a path can stop it from being compacted
+        # with the other paths of one of those methods, so both are tried.
+        compacted = min(
+            [self._compact_prefixes(self._merge_methods(
+                allowed, denied_resources), blocked, denied_resources),
+             self._compact_prefixes(allowed, blocked, denied_resources)],
+            key=len)
+        if not self._is_equivalent(allowed, compacted, denied):
+            return allowed
+        return compacted
+
+    def _compact_prefixes(
+            self, allowed: List[Tuple[str, str]],
+            blocked: Dict[str, List[Tuple[Optional[str], ...]]],
+            denied_resources: str) -> List[Tuple[str, str]]:
+        compacted: List[Tuple[str, str]] = []
+        # Wildcard methods are compacted first since their prefixes can
+        # also cover the pairs of a single method.
+        methods = sorted({method for method, _ in allowed},
+                         key=lambda m: (m != '*', m))
+        for method in methods:
+            compacted.extend(self._compact_method(
+                method, [path for m, path in allowed if m == method],
+                blocked, denied_resources))
+        return self._remove_covered(compacted)
+
+    def _find_denied_routes(self, allowed: List[Tuple[str, str]]
+                            ) -> List[Tuple[str, str]]:
+        # A route's path, including its ``{param}`` placeholders, is used
+        # as the resource to check.  Routes with path parameters are only
+        # allowed by a wildcard that matches every value of them.
+        assert self._route_table is not None
+        matcher = _ResourceMatcher(
+            [_resource_suffix(method, path) for method, path in allowed])
+        return [(method, path)
+                for path, route_methods in self._route_table.items()
+                for method in route_methods
+                if not matcher.matches(_resource_suffix(method, path),
+                                       exact='{' not in path)]
+
+    def _merge_methods(self, allowed: List[Tuple[str, str]],
+                       denied_resources: str) -> List[Tuple[str, str]]:
+        # If a path is allowed for every method the app defines for it,
+        # a single ``*`` method is used unless that matches the path of
+        # a denied route as well.
+        assert self._route_table is not None
+        methods_by_path: Dict[str, Set[str]] = OrderedDict()
+        for method, path in allowed:
+            methods_by_path.setdefault(path, set()).add(method)
+        merged = []
+        for path, methods in methods_by_path.items():
+            route_methods = None
+            if not _has_wildcard(path):
+                route_methods = self._route_table.get(path)
+            if '*' in methods or (
+                    route_methods and methods >= set(route_methods) and
+                    '%s\n' % path not in denied_resources):
+                merged.append(('*', path))
+            else:
+                merged.extend((method, path) for method in sorted(methods))
+        return merged
+
+    def _find_blocked_prefixes(
+            self, denied: List[Tuple[str, str]]
+    ) -> Dict[str, List[Tuple[Optional[str], ...]]]:
+        # A ``prefix/*`` wildcard can't be used for any prefix of a denied
+        # route.  These are returned for each method as tuples of
+        # segments where ``None`` is a path parameter.
+        blocked: Dict[str, List[Tuple[Optional[str], ...]]] = {'*': []}
+        for method, path in denied:
+            segments = tuple(
+                None if segment.startswith('{') else segment
+                for segment in _path_segments(path))
+            # The root wildcard also matches ``/``, so every route
+            # blocks it.
+            prefixes = [segments[:length]
+                        for length in range(max(len(segments), 1))]
+            blocked.setdefault(method, []).extend(prefixes)
+            blocked['*'].extend(prefixes)
+        return blocked
+
+    def _compact_method(
+            self, method: str, paths: List[str],
+            blocked: Dict[str, List[Tuple[Optional[str], ...]]],
+            denied_resources: str) -> List[Tuple[str, str]]:
+        blocked_literals = set()
+        blocked_patterns = []
+        for prefix in blocked.get(method, []):
+            if None in prefix:
+                blocked_patterns.append(prefix)
+            else:
+                blocked_literals.add(prefix)
+        paths_by_prefix = self._group_by_prefix(paths)
+        compacted = []
+        replaced = [False] * len(paths)
+        # Shorter prefixes are tried first so the fewest wildcards are
+        # used.
+        for prefix in sorted(paths_by_prefix, key=lambda p: (len(p), p)):
+            indexes = [i for i in paths_by_prefix[prefix] if not replaced[i]]
+            if len(indexes) < 2 or prefix in blocked_literals or \
+                    self._matches_blocked_pattern(prefix, blocked_patterns):
+                continue
+            if method == '*' and prefix and \
+                    '/%s/' % '/'.join(prefix) in denied_resources:
+                continue
+            for i in indexes:
+                replaced[i] = True
+            if prefix:
+                compacted.append((method, '/%s/*' % '/'.join(prefix)))
+            else:
+                compacted.append((method, '*'))
+        compacted.extend((method, path) for path, is_replaced
+                         in zip(paths, replaced) if not is_replaced)
+        return compacted
+
+    def _group_by_prefix(self, paths: List[str]
+                         ) -> Dict[Tuple[str, ...], List[int]]:
+        # Maps each literal prefix to the indexes of the paths under it.
+        paths_by_prefix: Dict[Tuple[str, ...], List[int]] = {}
+        for i, path in enumerate(paths):
+            if path == '*':
+                continue
+            segments = _path_segments(path)
+            literal_count = 0
+            for segment in segments:
+                if _has_wildcard(segment):
+                    break
+                literal_count += 1
+            # A path is only under the prefixes that are shorter than it.
+            max_length = max(min(literal_count, len(segments) - 1), 0)
+            for length in range(max_length + 1):
+                paths_by_prefix.setdefault(
+                    tuple(segments[:length]), []).append(i)
+        return paths_by_prefix
+
+    def _matches_blocked_pattern(
+            self, prefix: Tuple[str, ...],
+            blocked_patterns: List[Tuple[Optional[str], ...]]) -> bool:
+        return any(len(pattern) == len(prefix) and
+                   all(p is None or p == segment
+                       for p, segment in zip(pattern, prefix))
+                   for pattern in blocked_patterns)
+
+    def _remove_covered(self, allowed: List[Tuple[str, str]]
+                        ) -> List[Tuple[str, str]]:
+        wildcards = [(method, path[:-1]) for method, path in allowed
+                     if path.endswith('*') and not _has_wildcard(path[:-1])]
+        wildcard_set = set(wildcards)
+        prefix_patterns = {}
+        for method in {m for m, _ in wildcards}:
+            prefix_patterns[method] = re.compile('|'.join(
+                re.escape(prefix) for m, prefix in wildcards if m == method))
+        remaining = []
+        seen = set()
+        for method, path in allowed:
+            if (method, path) in seen:
+                continue
+            seen.add((method, path))
+            if (method, path[:-1]) in wildcard_set:
+                # A wildcard doesn't cover itself, so it's only covered by
+                # a shorter prefix or by the same prefix for every method.
+                covered = (method != '*' and ('*', path[:-1]) in
+                           wildcard_set) or any(
+                    (m, path[:i]) in wildcard_set
+                    for m in (method, '*') for i in range(len(path) - 1))
+            else:
+                covered = any(
+                    prefix_patterns[m].match(path) is not None
+                    for m in (method, '*') if m in prefix_patterns)
+            if not covered:
+                remaining.append((method, path))
+        return remaining
+
+    def _is_equivalent(self, allowed: List[Tuple[str, str]],
+                       compacted: List[Tuple[str, str]],
+                       denied: List[Tuple[str, str]]) -> bool:
+        # ``denied`` are the routes that ``allowed`` doesn't allow.
+        assert self._route_table is not None
+        after = _ResourceMatcher(
+            [_resource_suffix(method, path) for method, path in compacted])
+        denied_routes = set(denied)
+        for path, route_methods in self._route_table.items():
+            for method in route_methods:
+                is_allowed = after.matches(_resource_suffix(method, path),
+                                           exact='{' not in path)
+                if is_allowed == ((method, path) in denied_routes):
+                    return False
+        return all(after.matches(_resource_suffix(method, path))
+                   for method, path in allowed)
+
+
 class LambdaFunction(object):
     def __init__(self, func: Callable[..., Any], name: str,
                  handler_string: str):
@@ -1630,7 +3018,8 @@ class SQSEventConfig(BaseEventSourceConfig):
     def __init__(self, name: str, handler_string: str, queue: Optional[str],
                  queue_arn: Optional[str], batch_size: int,
                  maximum_batching_window_in_seconds: int,
-                 maximum_concurrency: Optional[int]):
+                 maximum_concurrency: Optional[int],
+                 report_batch_item_failures: bool = False):
         super(SQSEventConfig, self).__init__(name, handler_string)
         self.queue: Optional[str] = queue
         self.queue_arn: Optional[str] = queue_arn
@@ -1638,30 +3027,49 @@ class SQSEventConfig(BaseEventSourceConfig):
         self.maximum_batching_window_in_seconds: int = \
             maximum_batching_window_in_seconds
         self.maximum_concurrency: Optional[int] = maximum_concurrency
+        self.report_batch_item_failures: bool = report_batch_item_failures
 
 
 class KinesisEventConfig(BaseEventSourceConfig):
     def __init__(self, name: str, handler_string: str, stream: str,
                  batch_size: int, starting_position: str,
-                 maximum_batching_window_in_seconds: int) -> None:
+                 maximum_batching_window_in_seconds: int,
+                 report_batch_item_failures: bool = False,
+                 bisect_batch_on_function_error: bool = False,
+                 maximum_retry_attempts: Optional[int] = None,
+                 parallelization_factor: Optional[int] = None) -> None:
         super(KinesisEventConfig, self).__init__(name, handler_string)
         self.stream: str = stream
         self.batch_size: int = batch_size
         self.starting_position: str = starting_position
         self.maximum_batching_window_in_seconds: int = \
             maximum_batching_window_in_seconds
+        self.report_batch_item_failures: bool = report_batch_item_failures
+        self.bisect_batch_on_function_error: bool = \
+            bisect_batch_on_function_error
+        self.maximum_retry_attempts: Optional[int] = maximum_retry_attempts
+        self.parallelization_factor: Optional[int] = parallelization_factor
 
 
 class DynamoDBEventConfig(BaseEventSourceConfig):
     def __init__(self, name: str, handler_string: str, stream_arn: str,
                  batch_size: int, starting_position: str,
-                 maximum_batching_window_in_seconds: int) -> None:
+                 maximum_batching_window_in_seconds: int,
+                 report_batch_item_failures: bool = False,
+                 bisect_batch_on_function_error: bool = False,
+                 maximum_retry_attempts: Optional[int] = None,
+                 parallelization_factor: Optional[int] = None) -> None:
         super(DynamoDBEventConfig, self).__init__(name, handler_string)
         self.stream_arn: str = stream_arn
         self.batch_size: int = batch_size
         self.starting_position: str = starting_position
         self.maximum_batching_window_in_seconds: int = \
             maximum_batching_window_in_seconds
+        self.report_batch_item_failures: bool = report_batch_item_failures
+        self.bisect_batch_on_function_error: bool = \
+            bisect_batch_on_function_error
+        self.maximum_retry_attempts: Optional[int] = maximum_retry_attempts
+        self.parallelization_factor: Optional[int] = parallelization_factor
 
 
 class WebsocketConnectConfig(BaseEventSourceConfig):
@@ -1708,26 +3116,320 @@ class PureLambdaWrapper(object):
         return self._original_func(event.to_dict(), event.context)
 
 
+def _validate_per_record(per_record: bool,
+                         report_batch_item_failures: bool) -> None:
+    if per_record and not report_batch_item_failures:
+        raise ValueError(
+            "`per_record` can only be used when "
+            "`report_batch_item_failures` is True."
+        )
+
+
+class RecordBatchHandler(object):
+    """Call a handler for each record in a batch.
+
+    A handler that raises an exception marks its record as failed, and
+    the failed records are returned in the ``batchItemFailures`` format
+    that Lambda uses to only retry the records that weren't processed.
+
+    """
+
+    def __init__(self, func: Callable[..., Any]) -> None:
+        self.func: Callable[..., Any] = func
+        functools.update_wrapper(self, func)
+
+    def __call__(self, event: Iterable[Any]) -> Dict[str, Any]:
+        failed = self._process_records(list(event))
+        return {
+            'batchItemFailures': [
+                {'itemIdentifier': self._get_item_identifier(record)}
+                for record in failed
+            ]
+        }
+
+    def _process_records(self, records: List[Any]) -> List[Any]:
+        # Processes records in order until one fails.  The failed record
+        # and every record after it are returned so they're retried in
+        # their original order.
+        for i, record in enumerate(records):
+            if not self._process_record(record):
+                return records[i:]
+        return []
+
+    def _process_record(self, record: Any) -> bool:
+        try:
+            _resolve_result(self.func, record)
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.error("Failed to process record %s",
+                          self._get_item_identifier(record), exc_info=True)
+            return False
+        return True
+
+    def _get_item_identifier(self, record: Any) -> Optional[str]:
+        raise NotImplementedError("_get_item_identifier")
+
+
+class SQSRecordBatchHandler(RecordBatchHandler):
+    """Call a handler for each record in an SQS batch.
+
+    Records are processed in order, or concurrently in a thread pool of
+    ``max_workers`` threads.  Records from FIFO queues are always
+    processed in order.
+
+    """
+
+    def __init__(self, func: Callable[..., Any],
+                 max_workers: Optional[int] = None) -> None:
+        super(SQSRecordBatchHandler, self).__init__(func)
+        self.max_workers: Optional[int] = max_workers
+        self._executor: Any = None
+        self._lock = threading.Lock()
+
+    def _process_records(self, records: List[Any]) -> List[Any]:
+        if self._is_fifo(records):
+            return super(SQSRecordBatchHandler, self)._process_records(
+                records)
+        if self.max_workers is None or self.max_workers <= 1 \
+                or len(records) <= 1:
+            return [record for record in records
+                    if not self._process_record(record)]
+        # The thread pool is created on first use and reused for every
+        # invocation handled by this Lambda container.
+        results = self._get_executor().map(self._process_record, records)
+        return [record for record, succeeded in zip(records, results)
+                if not succeeded]
+
+    def _is_fifo(self, records: List['SQSRecord']) -> bool:
+        if not records:
+            return False
+        arn = records[0].to_dict().get('eventSourceARN', '')
+        return arn.endswith('.fifo')
+
+    def _get_item_identifier(self, record: 'SQSRecord') -> Optional[str]:
+        return record.message_id
+
+    def _get_executor(self) -> Any:
+        with self._lock:
+            if self._executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers)
+            return self._executor
+
+
+class StreamRecordBatchHandler(RecordBatchHandler):
+    """Call a handler for each record in a Kinesis or DynamoDB batch.
+
+    Records are processed in order.  Processing stops at the first record
+    that fails and its sequence number is reported so Lambda checkpoints
+    the shard after the last successful record and retries from there.
+
+    """
+
+    def _process_records(self, records: List[Any]) -> List[Any]:
+        failed = super(StreamRecordBatchHandler, self)._process_records(
+            records)
+        return failed[:1]
+
+    def _get_item_identifier(self, record: Any) -> Optional[str]:
+        return record.sequence_number
+
+
+# Async support.  asyncio is only imported once a coroutine needs to be
+# run so apps that don't use async functions don't pay for importing it.
+# Each thread gets its own event loop which is created the first time
+# it's needed and reused for every invocation after that.  In Lambda
+# there's a single thread, so this is one event loop per container.
+_ASYNC_STATE = threading.local()
+# This is inspect.CO_COROUTINE, which avoids importing inspect.
+_CO_COROUTINE = 0x80
+
+
+def _is_awaitable(value: Any) -> bool:
+    return hasattr(value, '__await__')
+
+
+def _is_async_callable(func: Any) -> bool:
+    while isinstance(func, functools.partial):
+        func = func.func
+    code = getattr(func, '__code__', None)
+    if code is None:
+        code = getattr(getattr(func, '__call__', None), '__code__', None)
+    return code is not None and bool(code.co_flags & _CO_COROUTINE)
+
+
+def _get_event_loop() -> Any:
+    loop = getattr(_ASYNC_STATE, 'loop', None)
+    if loop is None or loop.is_closed():
+        import asyncio
+        loop = asyncio.new_event_loop()
+        _ASYNC_STATE.loop = loop
+    return loop
+
+
+def _run_coroutine(awaitable: Any) -> Any:
+    parent_loop = getattr(_ASYNC_STATE, 'parent_loop', None)
+    if parent_loop is not None:
+        # We're in a worker thread running sync middleware on behalf of
+        # an async middleware chain.  The chain's event loop is waiting
+        # on this thread, so the rest of the chain is run there.
+        import asyncio
+        return asyncio.run_coroutine_threadsafe(
+            _await(awaitable), parent_loop).result()
+    return _get_event_loop().run_until_complete(awaitable)
+
+
+async def _await(awaitable: Any) -> Any:
+    return await awaitable
+
+
+async def _run_in_worker_thread(func: Callable[..., Any],
+                                *args: Any) -> Any:
+    # Runs sync code that may need to run coroutines itself (e.g. sync
+    # middleware whose downstream handlers are async) without blocking
+    # the event loop that those coroutines need to run on.
+    import asyncio
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, _call_in_worker_thread, loop, func, *args)
+
+
+def _call_in_worker_thread(parent_loop: Any, func: Callable[..., Any],
+                           *args: Any) -> Any:
+    _ASYNC_STATE.parent_loop = parent_loop
+    try:
+        return func(*args)
+    finally:
+        _ASYNC_STATE.parent_loop = None
+
+
+def _resolve_result(func: Callable[..., Any], event: Any) -> Any:
+    # Calls a handler that may be an async function from sync code.
+    result = func(event)
+    if _is_awaitable(result):
+        result = _run_coroutine(result)
+    return result
+
+
+async def _await_result(func: Callable[..., Any], event: Any) -> Any:
+    # Calls a handler that may be a sync function from async code.
+    result = func(event)
+    if _is_awaitable(result):
+        result = await result
+    return result
+
+
+def _call_view_function(view_function: Callable[..., Any],
+                        function_args: Dict[str, Any]) -> Any:
+    result = view_function(**function_args)
+    if _is_awaitable(result):
+        result = _run_coroutine(result)
+    return result
+
+
+async def _await_view_function(view_function: Callable[..., Any],
+                               function_args: Dict[str, Any]) -> Any:
+    result = view_function(**function_args)
+    if _is_awaitable(result):
+        result = await result
+    return result
+
+
 class MiddlewareHandler(object):
     def __init__(self, handler: Callable[..., Any],
-                 next_handler: Callable[..., Any]) -> None:
+                 next_handler: Callable[..., Any],
+                 instrumentation: Optional[_InstrumentationRegistry] = None
+                 ) -> None:
         self.handler: Callable[..., Any] = handler
         self.next_handler: Callable[..., Any] = next_handler
+        self.instrumentation: Optional[
+            _InstrumentationRegistry] = instrumentation
 
     def __call__(self, request: Any) -> Any:
+        instrumentation = self.instrumentation
+        if instrumentation is not None and instrumentation.hooks:
+            return instrumentation.call(
+                'middleware', {'middleware': self.handler, 'event': request},
+                self.handler, request, self.next_handler)
         return self.handler(request, self.next_handler)
 
 
+class AsyncMiddlewareHandler(object):
+    # A link in a middleware chain that's run as a coroutine.  The
+    # ``next_handler`` is always an async callable, so async middleware
+    # can ``await get_response(event)``.  Sync middleware is run in a
+    # worker thread with a sync ``get_response`` so it doesn't block the
+    # event loop that's needed to run the rest of the chain.
+    def __init__(self, handler: Callable[..., Any],
+                 next_handler: Callable[..., Any],
+                 instrumentation: Optional[_InstrumentationRegistry] = None
+                 ) -> None:
+        self.handler: Callable[..., Any] = handler
+        self.next_handler: Callable[..., Any] = next_handler
+        self.instrumentation: Optional[
+            _InstrumentationRegistry] = instrumentation
+        self._is_async = _is_async_callable(handler)
+
+    async def __call__(self, request: Any) -> Any:
+        instrumentation = self.instrumentation
+        if instrumentation is not None and instrumentation.hooks:
+            return await instrumentation.call_async(
+                'middleware', {'middleware': self.handler, 'event': request},
+                self._call_handler, request)
+        return await self._call_handler(request)
+
+    async def _call_handler(self, request: Any) -> Any:
+        if self._is_async:
+            return await self.handler(request, self.next_handler)
+        return await _run_in_worker_thread(
+            self.handler, request, self._get_response)
+
+    def _get_response(self, request: Any) -> Any:
+        return _run_coroutine(self.next_handler(request))
+
+
+class _AsyncMiddlewareChain(object):
+    # Runs a chain of AsyncMiddlewareHandlers from sync code.
+    def __init__(self, handler: Callable[..., Any]) -> None:
+        self.handler: Callable[..., Any] = handler
+
+    def __call__(self, request: Any) -> Any:
+        return _run_coroutine(self.handler(request))
+
+
 class BaseLambdaHandler(object):
     def __call__(self, event: Any, context: Any) -> Any:
         pass
 
-    def _build_middleware_handlers(self, handlers: List[Callable[..., Any]],
-                                   original_handler: Callable[..., Any]
-                                   ) -> Callable[..., Any]:
+    def _build_middleware_handlers(
+            self, handlers: List[Callable[..., Any]],
+            original_handler: Callable[..., Any],
+            async_original_handler: Optional[Callable[..., Any]] = None,
+            instrumentation: Optional[_InstrumentationRegistry] = None
+    ) -> Callable[..., Any]:
+        # If any of the middleware is async, the whole chain is run as
+        # a coroutine on the event loop.  ``async_original_handler`` is
+        # the async version of ``original_handler`` to use in that case,
+        # otherwise ``original_handler`` is run in a worker thread.
+        handlers = list(handlers)
+        middleware_class: Any = MiddlewareHandler
         current = original_handler
-        for handler in reversed(list(handlers)):
-            current = MiddlewareHandler(handler=handler, next_handler=current)
+        is_async = any(_is_async_callable(handler) for handler in handlers)
+        if is_async:
+            middleware_class = AsyncMiddlewareHandler
+            if async_original_handler is None:
+                async_original_handler = functools.partial(
+                    _run_in_worker_thread, original_handler)
+            current = async_original_handler
+        for handler in reversed(handlers):
+            # Middleware that's a method of this handler, such as the
+            # global error handler, isn't instrumented as middleware.
+            is_internal = getattr(handler, '__self__', None) is self
+            current = middleware_class(
+                handler=handler, next_handler=current,
+                instrumentation=None if is_internal else instrumentation)
+        if is_async:
+            return _AsyncMiddlewareChain(current)
         return current
 
 
@@ -1735,7 +3437,10 @@ class EventSourceHandler(BaseLambdaHandler):
 
     def __init__(
             self, func: Callable[..., Any], event_class: Any,
-            middleware_handlers: Optional[List[Callable[..., Any]]] = None
+            middleware_handlers: Optional[List[Callable[..., Any]]] = None,
+            name: Optional[str] = None,
+            metrics_emitter: Optional[_MetricsEmitter] = None,
+            instrumentation: Optional[_InstrumentationRegistry] = None
     ) -> None:
         self.func: Callable[..., Any] = func
         self.event_class: Any = event_class
@@ -1744,6 +3449,12 @@ class EventSourceHandler(BaseLambdaHandler):
         self._middleware_handlers: \
             List[Callable[..., Any]] = middleware_handlers
         self.handler: Optional[Callable[..., Any]] = None
+        if name is None:
+            name = getattr(func, '__name__', type(func).__name__)
+        self.name: str = name
+        self.metrics_emitter: Optional[_MetricsEmitter] = metrics_emitter
+        self.instrumentation: Optional[
+            _InstrumentationRegistry] = instrumentation
 
     @property
     def middleware_handlers(self) -> List[Callable[..., Any]]:
@@ -1754,36 +3465,128 @@ class EventSourceHandler(BaseLambdaHandler):
         self._middleware_handlers = value
 
     def __call__(self, event: Any, context: Any) -> Any:
-        event_obj = self.event_class(event, context)
+        instrumentation = self.instrumentation
+        if instrumentation is not None and instrumentation.hooks:
+            return instrumentation.call(
+                'invocation',
+                {'event': event, 'context': context, 'handler': self.name},
+                self._invoke, event, context)
+        return self._invoke(event, context)
+
+    def _invoke(self, event: Any, context: Any) -> Any:
+        emitter = self.metrics_emitter
+        if emitter is None or emitter.config is None:
+            return self._handle(event, context)
+        metrics = emitter.start(self.name)
+        metrics.set_property('RequestId',
+                             getattr(context, 'aws_request_id', None))
+        self._add_event_metrics(metrics, event)
+        try:
+            result = self._handle(event, context)
+        except Exception:
+            metrics.add('Errors', 1)
+            metrics.flush()
+            raise
+        metrics.add('Errors', 0)
+        self._add_result_metrics(metrics, result)
+        metrics.flush()
+        return result
+
+    def _add_event_metrics(self, metrics: _InvocationMetrics,
+                           event: Any) -> None:
+        if isinstance(event, dict) and 'Records' in event:
+            metrics.add('RecordCount', len(event['Records']))
+
+    def _add_result_metrics(self, metrics: _InvocationMetrics,
+                            result: Any) -> None:
+        if isinstance(result, dict) and 'batchItemFailures' in result:
+            metrics.add('BatchItemFailures',
+                        len(result['batchItemFailures']))
+
+    def _handle(self, event: Any, context: Any) -> Any:
+        event_obj = self._create_event_object(event, context)
         if self.handler is None:
             # Defer creating handlers so we have all middleware configured.
+            # The handler function can be an async function, in which case
+            # it's run on the event loop.
             self.handler = self._build_middleware_handlers(
-                self._middleware_handlers, original_handler=self.func)
+                self._middleware_handlers,
+                original_handler=self._call_function,
+                async_original_handler=self._call_function_async,
+                instrumentation=self.instrumentation,
+            )
         return self.handler(event_obj)
 
+    def _call_function(self, event_obj: Any) -> Any:
+        instrumentation = self.instrumentation
+        if instrumentation is not None and instrumentation.hooks:
+            return instrumentation.call(
+                'view', {'event': event_obj, 'handler': self.name},
+                _resolve_result, self.func, event_obj)
+        return _resolve_result(self.func, event_obj)
+
+    async def _call_function_async(self, event_obj: Any) -> Any:
+        instrumentation = self.instrumentation
+        if instrumentation is not None and instrumentation.hooks:
+            return await instrumentation.call_async(
+                'view', {'event': event_obj, 'handler': self.name},
+                _await_result, self.func, event_obj)
+        return await _await_result(self.func, event_obj)
+
+    def _create_event_object(self, event: Any, context: Any) -> Any:
+        return self.event_class(event, context)
+
 
 class WebsocketEventSourceHandler(EventSourceHandler):
     WEBSOCKET_API_RESPONSE = {'statusCode': 200}
 
     def __init__(self, func: Callable[..., Any],
                  event_class: Any, websocket_api: WebsocketAPI,
-                 middleware_handlers: Optional[List[Callable[..., Any]]] = None
+                 middleware_handlers: Optional[
+                     List[Callable[..., Any]]] = None,
+                 json_codec: Optional[JSONCodec] = None,
+                 name: Optional[str] = None,
+                 metrics_emitter: Optional[_MetricsEmitter] = None,
+                 instrumentation: Optional[_InstrumentationRegistry] = None
                  ) -> None:
-        super(WebsocketEventSourceHandler, self).__init__(func, event_class,
-                                                          middleware_handlers)
+        super(WebsocketEventSourceHandler, self).__init__(
+            func, event_class, middleware_handlers, name=name,
+            metrics_emitter=metrics_emitter,
+            instrumentation=instrumentation)
         self.websocket_api: WebsocketAPI = websocket_api
+        if json_codec is None:
+            json_codec = _DEFAULT_JSON_CODEC
+        self.json_codec: JSONCodec = json_codec
 
-    def __call__(self, event: Dict[str, Any],
-                 context: Dict[str, Any]) -> Dict[str, Any]:
+    def _create_event_object(self, event: Any, context: Any) -> Any:
+        return self.event_class(event, context, json_codec=self.json_codec)
+
+    def _add_event_metrics(self, metrics: _InvocationMetrics,
+                           event: Any) -> None:
+        metrics.add('MessageSize', _body_size(event.get('body')), 'Bytes')
+
+    def _add_result_metrics(self, metrics: _InvocationMetrics,
+                            result: Any) -> None:
+        metrics.add_status_code(result['statusCode'])
+
+    def _handle(self, event: Dict[str, Any],
+                context: Dict[str, Any]) -> Dict[str, Any]:
         self.websocket_api.configure_from_api_id(
             event['requestContext']['apiId'],
             event['requestContext']['stage'],
         )
         response = super(
-            WebsocketEventSourceHandler, self).__call__(event, context)
+            WebsocketEventSourceHandler, self)._handle(event, context)
         data = None
         if isinstance(response, Response):
-            data = response.to_dict()
+            instrumentation = self.instrumentation
+            if instrumentation is not None and instrumentation.hooks:
+                data = instrumentation.call(
+                    'serialization', {'response': response},
+                    functools.partial(response.to_dict,
+                                      json_codec=self.json_codec))
+            else:
+                data = response.to_dict(json_codec=self.json_codec)
         elif isinstance(response, dict):
             data = response
             if "statusCode" not in data:
@@ -1794,25 +3597,55 @@ class WebsocketEventSourceHandler(EventSourceHandler):
 class RestAPIEventHandler(BaseLambdaHandler):
     def __init__(self, route_table: Dict[str, Dict[str, RouteEntry]],
                  api: APIGateway, log: logging.Logger, debug: bool,
-                 middleware_handlers: Optional[List[Callable[..., Any]]] = None
+                 middleware_handlers: Optional[
+                     List[Callable[..., Any]]] = None,
+                 json_codec: Optional[JSONCodec] = None,
+                 metrics_emitter: Optional[_MetricsEmitter] = None,
+                 instrumentation: Optional[_InstrumentationRegistry] = None
                  ) -> None:
         self.routes: Dict[str, Dict[str, RouteEntry]] = route_table
         self.api: APIGateway = api
         self.log: logging.Logger = log
         self.debug: bool = debug
-        self.current_request: Optional[Request] = None
+        # The handler is shared across invocations, and across threads in
+        # ``chalice local``, so the current request is kept per thread.
+        self._local = threading.local()
         self.lambda_context: Optional['LambdaContext'] = None
         if middleware_handlers is None:
             middleware_handlers = []
         self._middleware_handlers: \
             List[Callable[..., Any]] = middleware_handlers
+        self._handler: Optional[Callable[..., Any]] = None
+        self._has_middleware = False
+        if json_codec is None:
+            json_codec = _DEFAULT_JSON_CODEC
+        self.json_codec: JSONCodec = json_codec
+        self.metrics_emitter: Optional[_MetricsEmitter] = metrics_emitter
+        if instrumentation is None:
+            instrumentation = _InstrumentationRegistry()
+        self.instrumentation: _InstrumentationRegistry = instrumentation
+
+    @property
+    def current_request(self) -> Optional[Request]:
+        return getattr(self._local, 'current_request', None)
+
+    @current_request.setter
+    def current_request(self, value: Optional[Request]) -> None:
+        self._local.current_request = value
 
     def _global_error_handler(self, event: Any,
                               get_response: Callable[..., Any]) -> Response:
         try:
             return get_response(event)
         except Exception:
-            return self._unhandled_exception_to_response()
+            return self._unhandled_exception_to_response(event)
+
+    async def _global_error_handler_async(
+            self, event: Any, get_response: Callable[..., Any]) -> Response:
+        try:
+            return await get_response(event)
+        except Exception:
+            return self._unhandled_exception_to_response(event)
 
     def create_request_object(self, event: Any,
                               context: Any) -> Optional[Request]:
@@ -1823,28 +3656,268 @@ class RestAPIEventHandler(BaseLambdaHandler):
         # now to minimize the potential for breaking changes.
         resource_path = event.get('requestContext', {}).get('resourcePath')
         if resource_path is not None:
-            self.current_request = Request(event, context)
+            self.current_request = Request(event, context,
+                                           json_codec=self.json_codec)
             return self.current_request
         return None
 
     def __call__(self, event: Any, context: Any) -> Any:
-        def wrapped_event(request: Request) -> Response:
-            return self._main_rest_api_handler(event, context)
+        return self.dispatch(self.current_request)
+
+    def dispatch(self, request: Optional[Request],
+                 stream: bool = False) -> Dict[str, Any]:
+        emitter = self.metrics_emitter
+        if emitter is None or emitter.config is None:
+            return self._dispatch(request, stream, None)
+        if request is None:
+            metrics = emitter.start('UnknownRoute')
+        else:
+            metrics = emitter.start('%s %s' % (request.method, request.path))
+            metrics.set_property(
+                'RequestId',
+                getattr(request.lambda_context, 'aws_request_id', None))
+            # pylint: disable=protected-access
+            metrics.add('RequestSize', _body_size(request._body), 'Bytes')
+        response_dict = self._dispatch(request, stream, metrics)
+        metrics.add_status_code(response_dict['statusCode'])
+        # A streamed body is an iterator so its size isn't known yet.
+        body = response_dict.get('body')
+        if isinstance(body, (str, bytes)):
+            metrics.add('ResponseSize', _body_size(body), 'Bytes')
+        metrics.flush()
+        return response_dict
+
+    def _dispatch(self, request: Optional[Request], stream: bool,
+                  metrics: Optional[_InvocationMetrics]
+                  ) -> Dict[str, Any]:
+        # All per-request state is carried by the ``request`` object
+        # so a single handler instance (and its middleware chain) can
+        # be reused across invocations, including concurrent invocations
+        # from threads in ``chalice local``.
+        # If ``stream`` is True, the body of a ``StreamingResponse`` is
+        # returned as an iterator of bytes instead of being buffered.
+        response = self._get_handler()(request)
+        # pylint: disable=protected-access
+        if metrics is not None and request is not None and \
+                request._cache_hit is not None:
+            metrics.set_property('CacheHit', request._cache_hit)
+        normalized = None
+        if not self._has_middleware:
+            # Without middleware nothing can modify the response between
+            # the view function and here, so we can reuse the headers
+            # that were processed when the response was validated.
+            normalized = getattr(response, '_normalized_headers', None)
+        if stream and isinstance(response, StreamingResponse):
+            return response._to_streaming_dict(normalized)
+        if metrics is not None:
+            start = time.perf_counter()
+        response_dict = self._serialize_response(response, normalized)
+        if metrics is not None:
+            metrics.add_duration('SerializationLatency', start)
+        return response_dict
+
+    def _serialize_response(
+            self, response: Response,
+            normalized: Optional[_NormalizedHeaders]) -> Dict[str, Any]:
+        # pylint: disable=protected-access
+        if self.instrumentation.hooks:
+            return self.instrumentation.call(
+                'serialization', {'response': response},
+                functools.partial(
+                    response._to_dict, json_codec=self.json_codec,
+                    normalized=normalized,
+                    binary_types_matcher=self.api._get_binary_types_matcher()))
+        return response._to_dict(
+            json_codec=self.json_codec, normalized=normalized,
+            binary_types_matcher=self.api._get_binary_types_matcher())
+
+    def _get_handler(self) -> Callable[..., Any]:
+        if self._handler is None:
+            # Defer creating handlers so we have all middleware configured.
+            middleware_handlers = list(self._middleware_handlers)
+            self._has_middleware = bool(middleware_handlers)
+            global_error_handler: Callable[..., Any] = \
+                self._global_error_handler
+            if any(_is_async_callable(h) for h in middleware_handlers):
+                # Keep the whole chain on the event loop.
+                global_error_handler = self._global_error_handler_async
+            self._handler = self._build_middleware_handlers(
+                [global_error_handler] + middleware_handlers,
+                original_handler=self._main_rest_api_handler,
+                async_original_handler=self._main_rest_api_handler_async,
+                instrumentation=self.instrumentation,
+            )
+        return self._handler
+
+    def _main_rest_api_handler(self, request: Optional[Request]) -> Response:
+        route_match = self._match_route_entry(request)
+        if isinstance(route_match, Response):
+            return route_match
+        route_entry, function_args, cors_headers = route_match
+        conditional_get = None
+        if route_entry.etag:
+            conditional_get = self._get_conditional_get(
+                route_entry, function_args, request)
+            if conditional_get is not None and \
+                    conditional_get.etag is not None:
+                not_modified = self._get_not_modified_response(
+                    conditional_get, cors_headers)
+                if not_modified is not None:
+                    return not_modified
+        cache_key, cached_response = self._get_cached_response(
+            route_entry, request)
+        if cached_response is not None:
+            response = cached_response
+        else:
+            response = self._get_view_function_response(
+                route_entry.view_function, function_args, request,
+                cors_headers)
+        if self.instrumentation.hooks:
+            response = self.instrumentation.call(
+                'response_validation',
+                {'request': request, 'response': response},
+                self._validate_view_response, request, response,
+                cors_headers)
+        else:
+            response = self._validate_view_response(
+                request, response, cors_headers)
+        if cache_key is not None:
+            self._cache_response(route_entry, cache_key, response)
+        # pylint: disable=protected-access
+        response._conditional_get = conditional_get
+        return response
 
-        final_handler = self._build_middleware_handlers(
-            [self._global_error_handler] + list(self._middleware_handlers),
-            original_handler=wrapped_event,
-        )
-        response = final_handler(self.current_request)
-        return response.to_dict(self.api.binary_types)
+    async def _main_rest_api_handler_async(
+            self, request: Optional[Request]) -> Response:
+        # Used instead of _main_rest_api_handler when there's async
+        # middleware, so an async view can be awaited on the event loop
+        # that's already running the middleware.
+        route_match = self._match_route_entry(request)
+        if isinstance(route_match, Response):
+            return route_match
+        route_entry, function_args, cors_headers = route_match
+        conditional_get = None
+        if route_entry.etag:
+            conditional_get = self._get_conditional_get(
+                route_entry, function_args, request)
+            if conditional_get is not None and \
+                    conditional_get.etag is not None:
+                not_modified = self._get_not_modified_response(
+                    conditional_get, cors_headers)
+                if not_modified is not None:
+                    return not_modified
+        cache_key, cached_response = self._get_cached_response(
+            route_entry, request)
+        if cached_response is not None:
+            response = cached_response
+        else:
+            response = await self._get_view_function_response_async(
+                route_entry.view_function, function_args, request,
+                cors_headers)
+        if self.instrumentation.hooks:
+            response = self.instrumentation.call(
+                'response_validation',
+                {'request': request, 'response': response},
+                self._validate_view_response, request, response,
+                cors_headers)
+        else:
+            response = self._validate_view_response(
+                request, response, cors_headers)
+        if cache_key is not None:
+            self._cache_response(route_entry, cache_key, response)
+        # pylint: disable=protected-access
+        response._conditional_get = conditional_get
+        return response
 
-    def _main_rest_api_handler(self, event: Any, context: Any) -> Response:
-        resource_path = event.get('requestContext', {}).get('resourcePath')
-        if resource_path is None:
+    def _get_cached_response(
+            self, route_entry: RouteEntry, request: Optional[Request]
+    ) -> Tuple[Optional[Tuple[Any, ...]], Optional[Response]]:
+        # Returns the cached response of a route with a response cache.
+        # On a miss, the key to cache the view's response under is
+        # returned instead.  The lookup happens here, around the view
+        # function, so every middleware still runs for a cached response
+        # and the response is compressed or base64 encoded for this
+        # request.
+        # pylint: disable=protected-access
+        response_cache = route_entry._response_cache
+        if response_cache is None or request is None:
+            return None, None
+        cache_key = response_cache.create_key(request)
+        cached = response_cache.get(cache_key)
+        request._cache_hit = cached is not None
+        if cached is None:
+            return cache_key, None
+        body, headers = cached
+        response = Response(body=body, headers=_copy_headers(headers))
+        response._normalized_headers = _normalize_headers(response.headers)
+        return None, response
+
+    def _cache_response(self, route_entry: RouteEntry,
+                        cache_key: Tuple[Any, ...],
+                        response: Response) -> None:
+        # pylint: disable=protected-access
+        response_cache = route_entry._response_cache
+        if response_cache is None or response.status_code != 200 or \
+                isinstance(response, StreamingResponse):
+            return
+        # The body is serialized once and the serialized body is what
+        # middleware sees for both this response and every cache hit.
+        # Copies are stored so changes made by middleware aren't cached.
+        response.body = response._serialize_body(self.json_codec, '', None)
+        response_cache.put(cache_key,
+                           (response.body, _copy_headers(response.headers)))
+
+    def _get_conditional_get(
+            self, route_entry: RouteEntry, function_args: Dict[str, Any],
+            request: Optional[Request]) -> Optional[_ConditionalGet]:
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return None
+        etag = None
+        if callable(route_entry.etag):
+            # The version function is cheap compared to the view, so
+            # when it returns a version we can skip calling the view.
+            version = route_entry.etag(**function_args)
+            if version is not None:
+                etag = _quote_etag(version)
+        # pylint: disable=protected-access
+        return _ConditionalGet(request._get_header('if-none-match'),
+                               request._get_header('if-modified-since'),
+                               etag)
+
+    def _get_not_modified_response(
+            self, conditional_get: _ConditionalGet,
+            cors_headers: Optional[Dict[str, Any]]) -> Optional[Response]:
+        if conditional_get.if_none_match is None or \
+                conditional_get.etag is None:
+            return None
+        # Whether the body would be compressed isn't known until the view
+        # is called.  The version is current for every encoding of the
+        # body, so the ETag the client has for any of them is matched.
+        for etag in [conditional_get.etag] + [
+                _encode_etag(conditional_get.etag, encoding)
+                for encoding in CompressionMiddleware.SUPPORTED_ENCODINGS]:
+            if _etag_matches(conditional_get.if_none_match, etag):
+                break
+        else:
+            return None
+        headers = dict(cors_headers or {})
+        headers['ETag'] = etag
+        return Response(body='', headers=headers, status_code=304)
+
+    def _match_route_entry(
+            self, request: Optional[Request]
+    ) -> Union[Response,
+               Tuple[RouteEntry, Dict[str, Any], Optional[Dict[str, Any]]]]:
+        # Returns the route entry to call along with the view function's
+        # arguments and CORS headers, or an error response if the request
+        # can't be routed to a view function.
+        if request is None:
             return error_response(error_code='InternalServerError',
                                   message='Unknown request.',
                                   http_status_code=500)
-        http_method = event['requestContext']['httpMethod']
+        event = request.to_original_event()
+        resource_path = request.path
+        http_method = request.method
         if http_method not in self.routes[resource_path]:
             allowed_methods = ', '.join(self.routes[resource_path].keys())
             return error_response(
@@ -1853,10 +3926,8 @@ class RestAPIEventHandler(BaseLambdaHandler):
                 http_status_code=405,
                 headers={'Allow': allowed_methods})
         route_entry = self.routes[resource_path][http_method]
-        view_function = route_entry.view_function
         function_args = {name: event['pathParameters'][name]
                          for name in route_entry.view_args}
-        self.lambda_context = context
         # We're getting the CORS headers before validation to be able to
         # output desired headers with
         cors_headers = None
@@ -1865,26 +3936,31 @@ class RestAPIEventHandler(BaseLambdaHandler):
         # We're doing the header validation after creating the request
         # so can leverage the case insensitive dict that the Request class
         # uses for headers.
-        if self.current_request and route_entry.content_types:
-            content_type = self.current_request.headers.get(
+        if route_entry.content_types:
+            # pylint: disable=protected-access
+            content_type = request._get_header(
                 'content-type', 'application/json')
-            if not _matches_content_type(content_type,
-                                         route_entry.content_types):
+            # pylint: disable=protected-access
+            matcher = route_entry._get_content_types_matcher()
+            if not matcher.matches(content_type):
                 return error_response(
                     error_code='UnsupportedMediaType',
                     message='Unsupported media type: %s' % content_type,
                     http_status_code=415,
                     headers=cors_headers
                 )
-        response = self._get_view_function_response(view_function,
-                                                    function_args)
-        if cors_headers is not None:
-            self._add_cors_headers(response, cors_headers)
-
-        response_headers = CaseInsensitiveMapping(response.headers)
-        if self.current_request and not self._validate_binary_response(
-                self.current_request.headers, response_headers):
-            content_type = response_headers.get('content-type', '')
+        return route_entry, function_args, cors_headers
+
+    def _validate_view_response(
+            self, request: Optional[Request], response: Response,
+            cors_headers: Optional[Dict[str, Any]]) -> Response:
+        # pylint: disable=protected-access
+        normalized = response._normalized_headers
+        response_content_type = (
+            normalized.content_type if normalized is not None else None)
+        if request is not None and not self._validate_binary_response(
+                request, response_content_type):
+            content_type = response_content_type or ''
             return error_response(
                 error_code='BadRequest',
                 message=('Request did not specify an Accept header with %s, '
@@ -1898,49 +3974,107 @@ class RestAPIEventHandler(BaseLambdaHandler):
         return response
 
     def _validate_binary_response(self,
-                                  request_headers: CaseInsensitiveMapping,
-                                  response_headers: CaseInsensitiveMapping
+                                  request: Request,
+                                  response_content_type: Optional[str]
                                   ) -> bool:
         # Validates that a response is valid given the request. If the response
         # content-type specifies a binary type, there must be an accept header
         # that is a binary type as well.
-        request_accept_header = request_headers.get('accept')
-        response_content_type = response_headers.get(
-            'content-type', 'application/json')
-        response_is_binary = _matches_content_type(response_content_type,
-                                                   self.api.binary_types)
+        # pylint: disable=protected-access
+        request_accept_header = request._get_header('accept')
+        if response_content_type is None:
+            response_content_type = 'application/json'
+        binary_types_matcher = self.api._get_binary_types_matcher()
+        response_is_binary = binary_types_matcher.matches(
+            response_content_type)
         expects_binary_response = False
         if request_accept_header is not None:
-            expects_binary_response = _matches_content_type(
-                request_accept_header, self.api.binary_types)
+            expects_binary_response = binary_types_matcher.matches(
+                request_accept_header)
         if response_is_binary and not expects_binary_response:
             return False
         return True
 
-    def _get_view_function_response(self, view_function: Callable[..., Any],
-                                    function_args: Dict[str, Any]) -> Response:
+    def _get_view_function_response(
+            self, view_function: Callable[..., Any],
+            function_args: Dict[str, Any],
+            request: Optional[Request] = None,
+            cors_headers: Optional[Dict[str, Any]] = None
+    ) -> Response:
         try:
-            response = view_function(**function_args)
-            if not isinstance(response, Response):
-                response = Response(body=response)
-            self._validate_response(response)
+            if self.instrumentation.hooks:
+                result = self.instrumentation.call(
+                    'view', {'request': request,
+                             'view_function': view_function},
+                    _call_view_function, view_function, function_args)
+            else:
+                result = view_function(**function_args)
+                if _is_awaitable(result):
+                    result = _run_coroutine(result)
+            return self._view_result_to_response(result, cors_headers)
         except ChaliceUnhandledError:
             # Reraise this exception so that middleware has a chance
             # to handle the exception.
             raise
-        except ChaliceViewError as e:
+        except Exception as e:
+            return self._view_error_to_response(e, request, cors_headers)
+
+    async def _get_view_function_response_async(
+            self, view_function: Callable[..., Any],
+            function_args: Dict[str, Any],
+            request: Optional[Request] = None,
+            cors_headers: Optional[Dict[str, Any]] = None
+    ) -> Response:
+        try:
+            if self.instrumentation.hooks:
+                result = await self.instrumentation.call_async(
+                    'view', {'request': request,
+                             'view_function': view_function},
+                    _await_view_function, view_function, function_args)
+            else:
+                result = await _await_view_function(
+                    view_function, function_args)
+            return self._view_result_to_response(result, cors_headers)
+        except ChaliceUnhandledError:
+            raise
+        except Exception as e:
+            return self._view_error_to_response(e, request, cors_headers)
+
+    def _view_result_to_response(
+            self, result: Any,
+            cors_headers: Optional[Dict[str, Any]]) -> Response:
+        response = result
+        if not isinstance(response, Response):
+            response = Response(body=response)
+        # This validates the headers, merges in any CORS headers, and
+        # sorts them into single/multi value headers in one pass.
+        # pylint: disable=protected-access
+        response._normalized_headers = _normalize_headers(
+            response.headers, cors_headers, validate=True)
+        return response
+
+    def _view_error_to_response(
+            self, error: Exception, request: Optional[Request],
+            cors_headers: Optional[Dict[str, Any]]) -> Response:
+        # This must be called while handling ``error`` so the traceback
+        # is available for logging.
+        if isinstance(error, ChaliceViewError):
             # Any chalice view error should propagate.  These
             # get mapped to various HTTP status codes in API Gateway.
-            response = Response(body={'Code': e.__class__.__name__,
-                                      'Message': str(e)},
-                                status_code=e.STATUS_CODE)
-        except Exception:
-            response = self._unhandled_exception_to_response()
+            response = Response(body={'Code': error.__class__.__name__,
+                                      'Message': str(error)},
+                                status_code=error.STATUS_CODE)
+        else:
+            response = self._unhandled_exception_to_response(request)
+        # pylint: disable=protected-access
+        response._normalized_headers = _normalize_headers(
+            response.headers, cors_headers)
         return response
 
-    def _unhandled_exception_to_response(self) -> Response:
+    def _unhandled_exception_to_response(
+            self, request: Optional[Request] = None) -> Response:
         headers: HeadersType = {}
-        path = getattr(self.current_request, 'path', 'unknown')
+        path = getattr(request, 'path', 'unknown')
         self.log.error("Caught exception for path %s", path, exc_info=True)
         if self.debug:
             # If the user has turned on debug mode,
@@ -1955,24 +4089,12 @@ class RestAPIEventHandler(BaseLambdaHandler):
         response = Response(body=body, headers=headers, status_code=500)
         return response
 
-    def _validate_response(self, response: Response) -> None:
-        for header, value in response.headers.items():
-            if '\n' in value:
-                raise ChaliceError("Bad value for header '%s': %r" %
-                                   (header, value))
-
     def _cors_enabled_for_route(self, route_entry: RouteEntry) -> bool:
         return route_entry.cors is not None
 
     def _get_cors_headers(self, cors: CORSConfig) -> Dict[str, Any]:
         return cors.get_access_control_headers()
 
-    def _add_cors_headers(self, response: Response,
-                          cors_headers: Dict[str, str]) -> None:
-        for name, value in cors_headers.items():
-            if name not in response.headers:
-                response.headers[name] = value
-
 
 # These classes contain all the event types that are passed
 # in as arguments in the lambda event handlers.  These are
@@ -1992,6 +4114,31 @@ class BaseLambdaEvent(object):
         return self._event_dict
 
 
+_T = TypeVar('_T')
+
+
+class _LazyAttribute(Generic[_T]):
+    """An event attribute that's computed the first time it's read.
+
+    The value is stored in the instance ``__dict__``, which takes
+    precedence over this descriptor, so it's only computed once and the
+    attribute can still be assigned to like a regular attribute.
+
+    """
+
+    def __init__(self, func: Callable[[Any], _T]) -> None:
+        self._func = func
+        self._name: str = func.__name__
+        self.__doc__ = func.__doc__
+
+    def __get__(self, instance: Any, owner: Optional[type] = None) -> _T:
+        if instance is None:
+            return self  # type: ignore
+        value = self._func(instance)
+        instance.__dict__[self._name] = value
+        return value
+
+
 # This class is only used for middleware handlers because
 # we can't change the existing interface for @app.lambda_function().
 # This could be a Chalice 2.0 thing where we make all the decorators
@@ -2022,9 +4169,13 @@ class CloudWatchEvent(BaseLambdaEvent):
 
 
 class WebsocketEvent(BaseLambdaEvent):
-    def __init__(self, event_dict: Dict[str, Any], context: Any):
+    def __init__(self, event_dict: Dict[str, Any], context: Any,
+                 json_codec: Optional[JSONCodec] = None):
         super(WebsocketEvent, self).__init__(event_dict, context)
         self._json_body: Optional[Dict[str, Any]] = None
+        if json_codec is None:
+            json_codec = _DEFAULT_JSON_CODEC
+        self._json_codec: JSONCodec = json_codec
 
     def _extract_attributes(self, event_dict: Dict[str, Any]) -> None:
         request_context = event_dict['requestContext']
@@ -2037,7 +4188,7 @@ class WebsocketEvent(BaseLambdaEvent):
     def json_body(self) -> Dict[str, Any]:
         if self._json_body is None:
             try:
-                self._json_body = json.loads(self.body)
+                self._json_body = self._json_codec.loads(self.body)
             except ValueError:
                 raise BadRequestError('Error Parsing JSON')
         return self._json_body
@@ -2072,10 +4223,27 @@ class SQSEvent(BaseLambdaEvent):
 
 
 class SQSRecord(BaseLambdaEvent):
-
+    # Attributes are read from the record dict when they're accessed.
     def _extract_attributes(self, event_dict: Dict[str, Any]) -> None:
-        self.body: str = event_dict['body']
-        self.receipt_handle: str = event_dict['receiptHandle']
+        pass
+
+    @_LazyAttribute
+    def body(self) -> str:
+        return self._event_dict['body']
+
+    @_LazyAttribute
+    def receipt_handle(self) -> str:
+        return self._event_dict['receiptHandle']
+
+    @_LazyAttribute
+    def message_id(self) -> Optional[str]:
+        return self._event_dict.get('messageId')
+
+
+def _decode_kinesis_data(kinesis: Dict[str, Any]) -> bytes:
+    # binascii accepts the base64 str directly, which avoids the extra
+    # copy base64.b64decode makes when encoding it to bytes first.
+    return binascii.a2b_base64(kinesis['data'])
 
 
 class KinesisEvent(BaseLambdaEvent):
@@ -2086,17 +4254,155 @@ class KinesisEvent(BaseLambdaEvent):
         for record in self._event_dict['Records']:
             yield KinesisRecord(record, self.context)
 
+    def iter_data(self) -> Iterator[bytes]:
+        # Yields the decoded payload of each record without creating a
+        # KinesisRecord for it.
+        for record in self._event_dict['Records']:
+            yield _decode_kinesis_data(record['kinesis'])
+
 
 class KinesisRecord(BaseLambdaEvent):
+    # The payload is only base64 decoded, and the timestamp converted,
+    # the first time they're accessed, so records that a handler skips
+    # don't pay for either.
     def _extract_attributes(self, event_dict: Dict[str, Any]) -> None:
-        kinesis = event_dict['kinesis']
-        encoded_payload = kinesis['data']
-        self.data: bytes = base64.b64decode(encoded_payload)
-        self.sequence_number: str = kinesis['sequenceNumber']
-        self.partition_key: str = kinesis['partitionKey']
-        self.schema_version: str = kinesis['kinesisSchemaVersion']
-        self.timestamp: datetime.datetime = datetime.datetime.utcfromtimestamp(
-            kinesis['approximateArrivalTimestamp'])
+        self._kinesis: Dict[str, Any] = event_dict['kinesis']
+
+    @_LazyAttribute
+    def data(self) -> bytes:
+        return _decode_kinesis_data(self._kinesis)
+
+    @property
+    def data_view(self) -> memoryview:
+        # Slicing a memoryview doesn't copy the underlying payload.
+        return memoryview(self.data)
+
+    @_LazyAttribute
+    def sequence_number(self) -> str:
+        return self._kinesis['sequenceNumber']
+
+    @_LazyAttribute
+    def partition_key(self) -> str:
+        return self._kinesis['partitionKey']
+
+    @_LazyAttribute
+    def schema_version(self) -> str:
+        return self._kinesis['kinesisSchemaVersion']
+
+    @_LazyAttribute
+    def timestamp(self) -> datetime.datetime:
+        return datetime.datetime.utcfromtimestamp(
+            self._kinesis['approximateArrivalTimestamp'])
+
+
+def _deserialize_dynamodb_number(value: str) -> Union[int, decimal.Decimal]:
+    if '.' in value or 'e' in value or 'E' in value:
+        return decimal.Decimal(value)
+    return int(value)
+
+
+def _deserialize_dynamodb_binary(value: str) -> bytes:
+    # Binary values are base64 encoded in stream records.
+    return binascii.a2b_base64(value)
+
+
+_DYNAMODB_SCALAR_DESERIALIZERS: Dict[str, Callable[[Any], Any]] = {
+    'S': str,
+    'N': _deserialize_dynamodb_number,
+    'B': _deserialize_dynamodb_binary,
+    'BOOL': bool,
+    'NULL': lambda value: None,
+    'SS': set,
+    'NS': lambda values: {_deserialize_dynamodb_number(v) for v in values},
+    'BS': lambda values: {_deserialize_dynamodb_binary(v) for v in values},
+}
+# Map the image names used for DynamoDBRecord attributes to their keys in
+# the stream record.
+_DYNAMODB_IMAGE_KEYS: Dict[str, str] = {
+    'keys': 'Keys',
+    'new_image': 'NewImage',
+    'old_image': 'OldImage',
+}
+
+
+def _deserialize_dynamodb_map(image: Dict[str, Any]) -> Dict[str, Any]:
+    # Converts a map of typed attribute values such as {"N": "1"} into
+    # their native python types.  Nested maps and lists are converted
+    # with an explicit stack of containers instead of recursion, so
+    # deeply nested values can't hit the recursion limit and there's no
+    # function call per value.  Strings, the most common type, are
+    # checked first.
+    result: Dict[str, Any] = {}
+    stack: List[Tuple[Any, Iterable[Tuple[Any, Dict[str, Any]]]]] = [
+        (result, image.items())]
+    scalar_deserializers = _DYNAMODB_SCALAR_DESERIALIZERS
+    while stack:
+        container, items = stack.pop()
+        for key, typed_value in items:
+            for type_name, raw_value in typed_value.items():
+                if type_name == 'S':
+                    container[key] = raw_value
+                elif type_name == 'M':
+                    native: Any = {}
+                    container[key] = native
+                    stack.append((native, raw_value.items()))
+                elif type_name == 'L':
+                    native = [None] * len(raw_value)
+                    container[key] = native
+                    stack.append((native, enumerate(raw_value)))
+                else:
+                    try:
+                        deserializer = scalar_deserializers[type_name]
+                    except KeyError:
+                        raise ValueError(
+                            "Unsupported DynamoDB type: %s" % type_name)
+                    container[key] = deserializer(raw_value)
+    return result
+
+
+def _deserialize_dynamodb_value(value: Dict[str, Any]) -> Any:
+    return _deserialize_dynamodb_map({'value': value})['value']
+
+
+def _deserialize_dynamodb_image(
+        image: Optional[Dict[str, Any]],
+        lazy: bool = False) -> Optional[Mapping]:
+    if image is None:
+        return None
+    if lazy:
+        return LazyDynamoDBImage(image)
+    return _deserialize_dynamodb_map(image)
+
+
+class LazyDynamoDBImage(Mapping):
+    """A DynamoDB image that converts each attribute when it's accessed.
+
+    Converted values are cached, so accessing an attribute again doesn't
+    convert it again.  This is useful when a handler only needs a few
+    attributes from large items.
+
+    """
+
+    def __init__(self, image: Dict[str, Any]) -> None:
+        self._image: Dict[str, Any] = image
+        self._values: Dict[str, Any] = {}
+
+    def __getitem__(self, name: str) -> Any:
+        try:
+            return self._values[name]
+        except KeyError:
+            value = _deserialize_dynamodb_value(self._image[name])
+            self._values[name] = value
+            return value
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._image)
+
+    def __len__(self) -> int:
+        return len(self._image)
+
+    def __repr__(self) -> str:
+        return 'LazyDynamoDBImage(%r)' % list(self._image)
 
 
 class DynamoDBEvent(BaseLambdaEvent):
@@ -2107,24 +4413,80 @@ class DynamoDBEvent(BaseLambdaEvent):
         for record in self._event_dict['Records']:
             yield DynamoDBRecord(record, self.context)
 
+    def iter_images(self, image: str = 'new_image',
+                    lazy: bool = False) -> Iterator[Optional[Mapping]]:
+        # Yields the converted image of each record without creating a
+        # DynamoDBRecord for it.
+        try:
+            key = _DYNAMODB_IMAGE_KEYS[image]
+        except KeyError:
+            raise ValueError(
+                "Unknown image %r, must be one of: %s" % (
+                    image, ', '.join(_DYNAMODB_IMAGE_KEYS)))
+        for record in self._event_dict['Records']:
+            yield _deserialize_dynamodb_image(
+                record['dynamodb'].get(key), lazy=lazy)
 
-class DynamoDBRecord(BaseLambdaEvent):
 
+class DynamoDBRecord(BaseLambdaEvent):
+    # Attributes are read from the record dict when they're accessed.
     def _extract_attributes(self, event_dict: Dict[str, Any]) -> None:
-        dynamodb = event_dict['dynamodb']
-        self.timestamp: datetime.datetime = datetime.datetime.utcfromtimestamp(
-            dynamodb['ApproximateCreationDateTime'])
-        self.keys: Any = dynamodb.get('Keys')
-        self.new_image: Any = dynamodb.get('NewImage')
-        self.old_image: Any = dynamodb.get('OldImage')
-        self.sequence_number: str = dynamodb['SequenceNumber']
-        self.size_bytes: int = dynamodb['SizeBytes']
-        self.stream_view_type: str = dynamodb['StreamViewType']
-        # These are from the top level keys in a record.
-        self.aws_region: str = event_dict['awsRegion']
-        self.event_id: str = event_dict['eventID']
-        self.event_name: str = event_dict['eventName']
-        self.event_source_arn: str = event_dict['eventSourceARN']
+        self._dynamodb: Dict[str, Any] = event_dict['dynamodb']
+
+    @_LazyAttribute
+    def timestamp(self) -> datetime.datetime:
+        return datetime.datetime.utcfromtimestamp(
+            self._dynamodb['ApproximateCreationDateTime'])
+
+    @_LazyAttribute
+    def keys(self) -> Any:
+        return self._dynamodb.get('Keys')
+
+    @_LazyAttribute
+    def new_image(self) -> Any:
+        return self._dynamodb.get('NewImage')
+
+    @_LazyAttribute
+    def old_image(self) -> Any:
+        return self._dynamodb.get('OldImage')
+
+    def deserialize_keys(self, lazy: bool = False) -> Optional[Mapping]:
+        return _deserialize_dynamodb_image(self.keys, lazy=lazy)
+
+    def deserialize_new_image(self, lazy: bool = False) -> Optional[Mapping]:
+        return _deserialize_dynamodb_image(self.new_image, lazy=lazy)
+
+    def deserialize_old_image(self, lazy: bool = False) -> Optional[Mapping]:
+        return _deserialize_dynamodb_image(self.old_image, lazy=lazy)
+
+    @_LazyAttribute
+    def sequence_number(self) -> str:
+        return self._dynamodb['SequenceNumber']
+
+    @_LazyAttribute
+    def size_bytes(self) -> int:
+        return self._dynamodb['SizeBytes']
+
+    @_LazyAttribute
+    def stream_view_type(self) -> str:
+        return self._dynamodb['StreamViewType']
+
+    # These are from the top level keys in a record.
+    @_LazyAttribute
+    def aws_region(self) -> str:
+        return self._event_dict['awsRegion']
+
+    @_LazyAttribute
+    def event_id(self) -> str:
+        return self._event_dict['eventID']
+
+    @_LazyAttribute
+    def event_name(self) -> str:
+        return self._event_dict['eventName']
+
+    @_LazyAttribute
+    def event_source_arn(self) -> str:
+        return self._event_dict['eventSourceARN']
 
     @property
     def table_name(self) -> str:
@@ -2230,6 +4592,13 @@ class Blueprint(DecoratorAPI):
                 wrapped_handler.middleware_handlers = \
                     app._get_middleware_handlers(
                         _MIDDLEWARE_MAPPING[handler_type])
+            if isinstance(wrapped_handler, EventSourceHandler):
+                # pylint: disable=protected-access
+                wrapped_handler.metrics_emitter = app._get_metrics_emitter()
+            if isinstance(wrapped_handler,
+                          (EventSourceHandler, ChaliceAuthorizer)):
+                # pylint: disable=protected-access
+                wrapped_handler.instrumentation = app._get_instrumentation()
             # pylint: disable=protected-access
             app._register_handler(
                 handler_type, name, user_handler, wrapped_handler,
@@ -2241,6 +4610,13 @@ class Blueprint(DecoratorAPI):
         # This will get filled in later during the registration process.
         return []
 
+    def _get_metrics_emitter(self) -> Optional[_MetricsEmitter]:
+        # Like middleware, this is set when the blueprint is registered.
+        return None
+
+    def _get_instrumentation(self) -> Optional[_InstrumentationRegistry]:
+        return None
+
 
 # This class is used to convert any existing/3rd party decorators
 # that work directly on lambda functions with the original signature
@@ -2276,6 +4652,79 @@ class ConvertToMiddleware(object):
         return event.to_dict(), event.context
 
 
+def _add_vary_header(headers: Dict[str, Any], value: str) -> None:
+    name = _find_header(headers, 'vary')
+    if name is None:
+        headers['Vary'] = value
+    elif value.lower() not in headers[name].lower():
+        headers[name] = '%s, %s' % (headers[name], value)
+
+
+class _ResponseCompression(object):
+    __slots__ = ('encoding', 'minimum_size', 'compression_level', 'accept')
+
+    def __init__(self, encoding: str, minimum_size: int,
+                 compression_level: int, accept: str) -> None:
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.compression_level = compression_level
+        self.accept = accept
+
+    def compress(self, body: bytes) -> bytes:
+        if self.encoding == 'gzip':
+            import gzip
+            # A fixed mtime keeps the output the same for the same body.
+            return gzip.compress(body, self.compression_level, mtime=0)
+        import zlib
+        return zlib.compress(body, self.compression_level)
+
+
+class CompressionMiddleware(object):
+    SUPPORTED_ENCODINGS = ('gzip', 'deflate')
+
+    def __init__(self, minimum_size: int = 1024,
+                 compression_level: int = 6,
+                 encodings: Optional[Sequence[str]] = None) -> None:
+        if encodings is None:
+            encodings = self.SUPPORTED_ENCODINGS
+        unsupported = [e for e in encodings
+                       if e not in self.SUPPORTED_ENCODINGS]
+        if unsupported:
+            raise ValueError(
+                "Unsupported encodings: %s, supported encodings are: %s"
+                % (', '.join(unsupported),
+                   ', '.join(self.SUPPORTED_ENCODINGS)))
+        if not 0 <= compression_level <= 9:
+            raise ValueError(
+                "compression_level must be between 0 and 9, got %s"
+                % compression_level)
+        self.minimum_size = minimum_size
+        self.compression_level = compression_level
+        self.encodings = tuple(encodings)
+
+    def __call__(self, event: Any, get_response: Callable[..., Any]) -> Any:
+        response = get_response(event)
+        # The body is compressed when the response is serialized, after
+        # it's known whether it can be returned as a binary response,
+        # so it's compressed before it's base64 encoded.
+        if not isinstance(event, Request) or \
+                not isinstance(response, Response) or \
+                isinstance(response, StreamingResponse) or \
+                response.status_code in (204, 304):
+            return response
+        # pylint: disable=protected-access
+        accept_encoding = event._get_header('accept-encoding')
+        accept = event._get_header('accept')
+        encoding = None
+        if accept_encoding and accept:
+            encoding = _negotiate_content_encoding(
+                accept_encoding, self.encodings)
+        if encoding is not None:
+            response._compression = _ResponseCompression(
+                encoding, self.minimum_size, self.compression_level, accept)
+        return response
+
+
 _EVENT_CLASSES = {
     'on_s3_event': S3Event,
     'on_sns_message': SNSEvent,
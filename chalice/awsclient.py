@@ -1823,10 +1823,14 @@ class TypedAWSClient(object):
         starting_position: Optional[str] = None,
         maximum_batching_window_in_seconds: Optional[int] = 0,
         maximum_concurrency: Optional[int] = None,
+        report_batch_item_failures: bool = False,
+        bisect_batch_on_function_error: bool = False,
+        maximum_retry_attempts: Optional[int] = None,
+        parallelization_factor: Optional[int] = None,
     ) -> None:
         lambda_client = self._client('lambda')
         batch_window = maximum_batching_window_in_seconds
-        kwargs = {
+        kwargs: Dict[str, Any] = {
             'EventSourceArn': event_source_arn,
             'FunctionName': function_name,
             'BatchSize': batch_size,
@@ -1836,6 +1840,14 @@ class TypedAWSClient(object):
             kwargs['ScalingConfig'] = {
                 'MaximumConcurrency': maximum_concurrency
             }
+        if report_batch_item_failures:
+            kwargs['FunctionResponseTypes'] = ['ReportBatchItemFailures']
+        if bisect_batch_on_function_error:
+            kwargs['BisectBatchOnFunctionError'] = True
+        if maximum_retry_attempts is not None:
+            kwargs['MaximumRetryAttempts'] = maximum_retry_attempts
+        if parallelization_factor is not None:
+            kwargs['ParallelizationFactor'] = parallelization_factor
         if starting_position is not None:
             kwargs['StartingPosition'] = starting_position
         return self._call_client_method_with_retries(
@@ -1850,10 +1862,14 @@ class TypedAWSClient(object):
         batch_size: int,
         maximum_batching_window_in_seconds: Optional[int] = 0,
         maximum_concurrency: Optional[int] = None,
+        report_batch_item_failures: Optional[bool] = None,
+        bisect_batch_on_function_error: Optional[bool] = None,
+        maximum_retry_attempts: Optional[int] = None,
+        parallelization_factor: Optional[int] = None,
     ) -> None:
         lambda_client = self._client('lambda')
         batch_window = maximum_batching_window_in_seconds
-        kwargs = {
+        kwargs: Dict[str, Any] = {
             'UUID': event_uuid,
             'BatchSize': batch_size,
             'MaximumBatchingWindowInSeconds': batch_window,
@@ -1862,6 +1878,20 @@ class TypedAWSClient(object):
             kwargs['ScalingConfig'] = {
                 'MaximumConcurrency': maximum_concurrency
             }
+        if report_batch_item_failures is not None:
+            # An empty list is sent to turn off batch item failure
+            # reporting for a mapping that previously had it enabled.
+            kwargs['FunctionResponseTypes'] = (
+                ['ReportBatchItemFailures'] if report_batch_item_failures
+                else []
+            )
+        if bisect_batch_on_function_error is not None:
+            kwargs['BisectBatchOnFunctionError'] = \
+                bisect_batch_on_function_error
+        if maximum_retry_attempts is not None:
+            kwargs['MaximumRetryAttempts'] = maximum_retry_attempts
+        if parallelization_factor is not None:
+            kwargs['ParallelizationFactor'] = parallelization_factor
         self._call_client_method_with_retries(
             lambda_client.update_event_source_mapping,
             kwargs,
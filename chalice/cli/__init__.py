@@ -10,13 +10,14 @@ import platform
 import sys
 import tempfile
 import shutil
+import socket  # noqa
 import traceback
 import functools
 import json
 
 import botocore.exceptions
 import click
-from typing import Dict, Any, Optional, cast  # noqa
+from typing import Dict, Any, Callable, Optional, cast  # noqa
 
 from chalice import __version__ as chalice_version
 from chalice.app import Chalice  # noqa
@@ -38,6 +39,7 @@ from chalice.deploy.swagger import TemplatedSwaggerGenerator
 from chalice.deploy.planner import PlanEncoder
 from chalice.deploy.appgraph import ApplicationGraphBuilder, GraphPrettyPrint
 from chalice.cli import newproj
+from chalice.coldstart import ColdStartProfileError, display_report
 
 
 def _configure_logging(level, format_string=None):
@@ -107,16 +109,48 @@ def _configure_cli_env_vars():
 @click.option('--autoreload/--no-autoreload',
               default=True,
               help='Automatically restart server when code changes.')
+@click.option('--workers', default=1, type=click.IntRange(min=1),
+              help=('Number of processes that serve requests.  Each '
+                    'process imports the app and accepts connections on '
+                    'the same port.'))
+@click.option('--emulate-concurrency/--no-emulate-concurrency',
+              default=False,
+              help=('Run each request in a separate process that imports '
+                    'the app on first use, like a Lambda execution '
+                    'environment.  Requests are throttled once the '
+                    'reserved_concurrency of the function is reached, '
+                    'an invocation that runs longer than lambda_timeout '
+                    'is killed, and the duration and init duration of '
+                    'each invocation is logged.'))
+@click.option('--event-sources/--no-event-sources',
+              default=False,
+              help=('Run in-memory SQS queues and Kinesis and DynamoDB '
+                    'streams that send records to the app\'s handlers in '
+                    'batches.  Records are put by POSTing a JSON list of '
+                    'records to /sqs/<queue>, /kinesis/<stream> or '
+                    '/dynamodb/<table> on the --event-sources-port.'))
+@click.option('--event-sources-port', default=8001, type=click.INT,
+              help='Port of the HTTP endpoint for --event-sources.')
 @click.pass_context
-def local(ctx, host='127.0.0.1', port=8000, stage=DEFAULT_STAGE_NAME,
-          autoreload=True):
-    # type: (click.Context, str, int, str, bool) -> None
+def local(ctx,  # type: click.Context
+          host='127.0.0.1',  # type: str
+          port=8000,  # type: int
+          stage=DEFAULT_STAGE_NAME,  # type: str
+          autoreload=True,  # type: bool
+          workers=1,  # type: int
+          emulate_concurrency=False,  # type: bool
+          event_sources=False,  # type: bool
+          event_sources_port=8001,  # type: int
+          ):
+    # type: (...) -> None
     factory = ctx.obj['factory']  # type: CLIFactory
     from chalice.cli import reloader
+    from chalice.cli import workerpool
     # We don't create the server here because that will bind the
     # socket and we only want to do this in the worker process.
-    server_factory = functools.partial(
-        create_local_server, factory, host, port, stage)
+    server_factory = _create_server_factory(
+        factory, host, port, stage, workers, emulate_concurrency,
+        event_sources_port if event_sources else None)
     # When running `chalice local`, a stdout logger is configured
     # so you'll see the same stdout logging as you would when
     # running in lambda.  This is configuring the root logger.
@@ -124,20 +158,63 @@ def local(ctx, host='127.0.0.1', port=8000, stage=DEFAULT_STAGE_NAME,
     # to work.
     logging.basicConfig(
         stream=sys.stdout, level=logging.INFO, format='%(message)s')
+    socket_fd = os.environ.get(workerpool.SOCKET_FD_ENV_VAR)
+    if socket_fd is not None:
+        # This is one of the processes started by ``--workers``.  The
+        # process that started it restarts it when files change.
+        workerpool.run_worker(server_factory, int(socket_fd))
+        return
+    if workers > 1:
+        if sys.platform == 'win32':
+            raise click.UsageError(
+                "The --workers option is not supported on Windows.")
+        server_factory = functools.partial(
+            workerpool.WorkerPool, host, port, workers, os.environ)
     if autoreload:
-        project_dir = factory.create_config_obj(
-            chalice_stage_name=stage).project_dir
         rc = reloader.run_with_reloader(
-            server_factory, os.environ, project_dir)
+            server_factory, os.environ,
+            factory.create_config_obj(chalice_stage_name=stage).project_dir)
         # Click doesn't sys.exit() with the RC this function.  The
         # recommended way to do this is to use sys.exit() directly,
         # see: https://github.com/pallets/click/issues/747
         sys.exit(rc)
-    run_local_server(factory, host, port, stage)
+    server_factory().serve_forever()
+
+
+def _create_server_factory(factory,  # type: CLIFactory
+                           host,  # type: str
+                           port,  # type: int
+                           stage,  # type: str
+                           workers,  # type: int
+                           emulate_concurrency,  # type: bool
+                           event_sources_port,  # type: Optional[int]
+                           ):
+    # type: (...) -> Callable[..., Any]
+    # Each worker would have its own containers and event sources, so the
+    # reserved concurrency couldn't be enforced across the workers, and
+    # the event sources would all use the same port.
+    for option, enabled in (
+            ('--emulate-concurrency', emulate_concurrency),
+            ('--event-sources', event_sources_port is not None)):
+        if enabled and workers > 1:
+            raise click.UsageError(
+                "The %s option can't be used with --workers." % option)
+    return functools.partial(
+        create_local_server, factory, host, port, stage,
+        emulate_concurrency=emulate_concurrency,
+        event_sources_port=event_sources_port,
+    )
 
 
-def create_local_server(factory, host, port, stage):
-    # type: (CLIFactory, str, int, str) -> LocalDevServer
+def create_local_server(factory,  # type: CLIFactory
+                        host,  # type: str
+                        port,  # type: int
+                        stage,  # type: str
+                        sock=None,  # type: Optional[socket.socket]
+                        emulate_concurrency=False,  # type: bool
+                        event_sources_port=None,  # type: Optional[int]
+                        ):
+    # type: (...) -> LocalDevServer
     config = factory.create_config_obj(
         chalice_stage_name=stage
     )
@@ -146,7 +223,15 @@ def create_local_server(factory, host, port, stage):
     # there is no point in testing locally.
     routes = config.chalice_app.routes
     validate_routes(routes)
-    server = factory.create_local_server(app_obj, config, host, port)
+    container_pool = None
+    if emulate_concurrency:
+        container_pool = factory.create_container_pool(config)
+    event_source_server = None
+    if event_sources_port is not None:
+        event_source_server = factory.create_event_source_server(
+            app_obj, config, host, event_sources_port)
+    server = factory.create_local_server(app_obj, config, host, port, sock,
+                                         container_pool, event_source_server)
     return server
 
 
@@ -495,6 +580,58 @@ def generate_models(ctx, stage):
     ui.write('\n')
 
 
+@cli.command('cold-start-report')
+@click.option('--stage', default=DEFAULT_STAGE_NAME,
+              help='Chalice Stage to profile.')
+@click.option('--deployment-package',
+              type=click.Path(exists=True, dir_okay=False),
+              help=('Profile an existing deployment package zip file '
+                    'instead of building one.'))
+@click.option('--max-depth', default=3, type=click.INT,
+              help='Maximum depth of the import tree to display.')
+@click.option('--min-ms', default=1.0, type=click.FLOAT,
+              help=('Hide imports in the import tree that take less than '
+                    'this many milliseconds.'))
+@click.option('--heavy-ms', default=20.0, type=click.FLOAT,
+              help=('Report packages that take at least this many '
+                    'milliseconds to import and are not referenced by '
+                    'any handler.'))
+@click.option('--site-packages/--no-site-packages', default=False,
+              help=('Allow importing packages installed in the current '
+                    'python environment that are not in the deployment '
+                    'package, such as boto3 which is provided by the '
+                    'Lambda runtime.'))
+@click.pass_context
+def cold_start_report(ctx, stage, deployment_package, max_depth, min_ms,
+                      heavy_ms, site_packages):
+    # type: (click.Context, str, str, int, float, float, bool) -> None
+    """Report how long importing your app takes on a cold start.
+
+    The deployment package is extracted and app.py is imported in a new
+    python interpreter with "-X importtime".  This doesn't make any
+    AWS calls.
+    """
+    factory = ctx.obj['factory']  # type: CLIFactory
+    config = factory.create_config_obj(stage)
+    if deployment_package is None:
+        packager = factory.create_deployment_packager()
+        deployment_package = packager.create_deployment_package(
+            config.project_dir, config.lambda_python_version)
+    profiler = factory.create_cold_start_profiler()
+    try:
+        report = profiler.profile(
+            deployment_package,
+            environment_variables=config.environment_variables,
+            heavy_threshold_ms=heavy_ms,
+            use_site_packages=site_packages,
+        )
+    except ColdStartProfileError as e:
+        click.echo(str(e), err=True)
+        raise click.Abort()
+    display_report(report, click.get_text_stream('stdout'),
+                   max_depth=max_depth, min_ms=min_ms)
+
+
 @cli.command('package')
 @click.option('--pkg-format', default='cloudformation',
               help=('Specify the provisioning engine to use for '
@@ -4,6 +4,7 @@ import os
 import json
 import importlib
 import logging
+import socket
 import functools
 
 import click
@@ -26,13 +27,22 @@ from chalice.logs import LogRetriever, LogEventGenerator
 from chalice.logs import FollowLogEventGenerator
 from chalice.logs import BaseLogEventGenerator
 from chalice import local
+from chalice.containerpool import ContainerPool
+from chalice.localevents import EventSourcePump
+from chalice.localevents import EventSourceServer
 from chalice.utils import UI  # noqa
+from chalice.utils import OSUtils
 from chalice.utils import PipeReader  # noqa
 from chalice.deploy import deployer  # noqa
 from chalice.deploy import validate
 from chalice.invoke import LambdaInvokeHandler
 from chalice.invoke import LambdaInvoker
 from chalice.invoke import LambdaResponseFormatter
+from chalice.coldstart import ColdStartProfiler
+from chalice.deploy.packager import DependencyBuilder
+from chalice.deploy.packager import LambdaDeploymentPackager
+from chalice.deploy.packager import PipRunner
+from chalice.deploy.packager import SubprocessPip
 
 
 OptStr = Optional[str]
@@ -335,10 +345,36 @@ class CLIFactory(object):
         with open(config_file) as f:
             return json.loads(f.read())
 
+    def create_deployment_packager(self) -> LambdaDeploymentPackager:
+        osutils = OSUtils()
+        pip_runner = PipRunner(pip=SubprocessPip(osutils=osutils),
+                               osutils=osutils)
+        return LambdaDeploymentPackager(
+            osutils=osutils,
+            dependency_builder=DependencyBuilder(
+                osutils=osutils, pip_runner=pip_runner),
+            ui=UI(),
+        )
+
+    def create_cold_start_profiler(self) -> ColdStartProfiler:
+        return ColdStartProfiler(OSUtils())
+
     def create_local_server(
-        self, app_obj: Chalice, config: Config, host: str, port: int
+        self, app_obj: Chalice, config: Config, host: str, port: int,
+        sock: Optional[socket.socket] = None,
+        container_pool: Optional[ContainerPool] = None,
+        event_source_server: Optional[EventSourceServer] = None
     ) -> local.LocalDevServer:
-        return local.create_local_server(app_obj, config, host, port)
+        return local.create_local_server(app_obj, config, host, port, sock,
+                                         container_pool, event_source_server)
+
+    def create_container_pool(self, config: Config) -> ContainerPool:
+        return ContainerPool.from_config(config)
+
+    def create_event_source_server(
+        self, app_obj: Chalice, config: Config, host: str, port: int
+    ) -> EventSourceServer:
+        return EventSourceServer(EventSourcePump(app_obj, config), host, port)
 
     def create_package_options(self) -> PackageOptions:
         """Create the package options that are required to target regions."""
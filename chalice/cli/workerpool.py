@@ -0,0 +1,147 @@
+"""Run chalice local in multiple worker processes.
+
+How It Works
+============
+
+A single ``chalice local`` process handles every request with one
+``ThreadedHTTPServer``, so views that are CPU bound are limited to a single
+core by the GIL.  With ``chalice local --workers N``, the process that would
+otherwise run the dev server binds the listening socket itself and starts N
+worker processes with the same command line.  The file descriptor of the
+socket is inherited by each worker and passed to it in the
+``CHALICE_LOCAL_SOCKET_FD`` env var.  Each worker imports the app once and
+accepts connections on the shared socket, which lets the kernel spread
+connections across the workers.
+
+The ``WorkerPool`` has the same ``serve_forever()`` and ``shutdown()``
+methods as ``LocalDevServer``, so the reloader runs it in place of a
+single server.  When a file changes, the reloader shuts down the pool,
+which terminates every worker, and then starts a new pool.
+
+"""
+import copy
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from typing import (  # noqa
+    Callable, List, MutableMapping, Optional, Type
+)
+
+from chalice.local import LocalDevServer  # noqa
+
+
+SOCKET_FD_ENV_VAR = 'CHALICE_LOCAL_SOCKET_FD'
+
+
+def create_listening_socket(host, port):
+    # type: (str, int) -> socket.socket
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    try:
+        sock.bind((host, port))
+        sock.listen(socket.SOMAXCONN)
+    except Exception:
+        sock.close()
+        raise
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(server_factory, socket_fd):
+    # type: (Callable[[socket.socket], LocalDevServer], int) -> None
+    # The socket was bound and is listening in the process that started
+    # this worker, so the server only needs to accept connections on it.
+    sock = socket.socket(fileno=socket_fd)
+    # Every worker is woken up when a connection arrives but only one of
+    # them accepts it.  With a timeout, the others go back to waiting
+    # for requests, and for a shutdown, instead of blocking in accept().
+    sock.settimeout(WorkerPool.POLL_INTERVAL)
+    server = server_factory(sock)
+    monitor = threading.Thread(target=shutdown_when_orphaned,
+                               args=(server, os.getppid()))
+    monitor.daemon = True
+    monitor.start()
+    server.serve_forever()
+
+
+def shutdown_when_orphaned(server, parent_pid, poll_interval=0.5):
+    # type: (LocalDevServer, int, float) -> None
+    # If the process that started this worker is killed before it can
+    # stop its workers, this worker is reparented and stops on its own.
+    while os.getppid() == parent_pid:
+        time.sleep(poll_interval)
+    server.shutdown()
+
+
+class WorkerPool(object):
+    """Runs the dev server in multiple processes sharing one socket."""
+
+    # How often, in seconds, to check if a worker has exited.
+    POLL_INTERVAL = 0.5
+
+    def __init__(self,
+                 host,  # type: str
+                 port,  # type: int
+                 num_workers,  # type: int
+                 env,  # type: MutableMapping
+                 popen=subprocess.Popen,  # type: Type[subprocess.Popen]
+                 ):
+        # type: (...) -> None
+        self.host = host
+        self.port = port
+        self._num_workers = num_workers
+        self._env = copy.copy(env)
+        self._popen = popen
+        self._socket = None  # type: Optional[socket.socket]
+        self._processes = []  # type: List[subprocess.Popen]
+        self._shutdown_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def serve_forever(self):
+        # type: () -> None
+        self._socket = create_listening_socket(self.host, self.port)
+        socket_fd = self._socket.fileno()
+        self._env[SOCKET_FD_ENV_VAR] = str(socket_fd)
+        print("Starting %s workers on http://%s:%s" % (
+            self._num_workers, self.host, self._socket.getsockname()[1]))
+        try:
+            with self._lock:
+                if self._shutdown_event.is_set():
+                    return
+                for _ in range(self._num_workers):
+                    self._processes.append(self._popen(
+                        sys.argv, env=self._env, pass_fds=(socket_fd,)))
+            # If a worker exits on its own, for example because the app
+            # can't be imported, the remaining workers are stopped so the
+            # failure isn't hidden behind the workers that are left.
+            while not self._shutdown_event.wait(self.POLL_INTERVAL):
+                if any(p.poll() is not None for p in self._processes):
+                    print("A worker exited, stopping all workers.")
+                    break
+        finally:
+            self._stop_workers()
+
+    def shutdown(self):
+        # type: () -> None
+        # Unlike LocalDevServer, the workers are stopped before this
+        # returns so they don't outlive a process that exits right after
+        # calling shutdown(), which is what the reloader does.
+        self._shutdown_event.set()
+        self._stop_workers()
+
+    def _stop_workers(self):
+        # type: () -> None
+        with self._lock:
+            processes, self._processes = self._processes, []
+            for process in processes:
+                if process.poll() is None:
+                    process.terminate()
+            for process in processes:
+                process.wait()
+            if self._socket is not None:
+                self._socket.close()
+                self._socket = None
@@ -0,0 +1,350 @@
+"""Profile the imports done when a deployment package is loaded.
+
+This module extracts a deployment package created by the
+``LambdaDeploymentPackager``, imports ``app`` in a fresh interpreter
+with ``-X importtime`` and summarizes where the time went.  No AWS
+calls are made.
+
+"""
+from __future__ import annotations
+import json
+import subprocess
+import sys
+from dataclasses import dataclass, field
+
+from typing import Any, Dict, IO, Iterator, List, Optional, Set  # noqa
+
+from chalice.utils import OSUtils
+
+
+# This runs in the interpreter being profiled.  Only the deployment
+# package is importable, so this can't use anything from chalice other
+# than what's in the package.  It prints the modules that are reachable
+# from the registered handlers as JSON.
+_REFERENCE_SCRIPT = '''\
+import sys
+sys.path.insert(0, sys.argv[1])
+import app
+import inspect
+import json
+import types
+
+
+def _is_local(module_name):
+    return module_name == 'app' or module_name.startswith('chalicelib')
+
+
+def _iter_handlers(chalice_app):
+    for methods in chalice_app.routes.values():
+        for entry in methods.values():
+            yield entry.view_function
+    configs = (chalice_app.event_sources +
+               chalice_app.builtin_auth_handlers +
+               chalice_app.pure_lambda_functions +
+               list(chalice_app.websocket_handlers.values()))
+    for config in configs:
+        module_name, _, name = config.handler_string.rpartition('.')
+        yield getattr(sys.modules.get(module_name), name, None)
+    for func, _ in chalice_app.middleware_handlers:
+        yield func
+
+
+def _module_of(value):
+    if isinstance(value, types.ModuleType):
+        return value.__name__
+    module_name = getattr(value, '__module__', None)
+    if not isinstance(module_name, str):
+        module_name = getattr(type(value), '__module__', None)
+    return module_name
+
+
+def _referenced_modules(handlers):
+    modules = set()
+    seen = set()
+    pending = list(handlers)
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, type):
+            modules.add(obj.__module__)
+            pending.extend(vars(obj).values())
+            continue
+        obj = inspect.unwrap(getattr(obj, '__func__', obj))
+        code = getattr(obj, '__code__', None)
+        if code is None:
+            continue
+        modules.add(obj.__module__)
+        namespace = obj.__globals__
+        codes = [code]
+        while codes:
+            code = codes.pop()
+            codes.extend(const for const in code.co_consts
+                         if isinstance(const, types.CodeType))
+            for name in code.co_names:
+                if name in sys.modules:
+                    # Catches imports done inside of the handler.
+                    modules.add(name)
+                if name not in namespace:
+                    continue
+                value = namespace[name]
+                module_name = _module_of(value)
+                if not module_name:
+                    continue
+                modules.add(module_name)
+                if not _is_local(module_name):
+                    continue
+                if isinstance(value, types.ModuleType):
+                    pending.extend(
+                        v for v in vars(value).values()
+                        if _module_of(v) == module_name and
+                        isinstance(v, (type, types.FunctionType)))
+                else:
+                    pending.append(value)
+    return modules
+
+
+def _required_modules(modules):
+    # Expand to everything the referenced modules import at module
+    # level so a package imported by app.py on behalf of a dependency
+    # that is used isn't reported as unused.
+    required = set()
+    pending = [name for name in modules if name in sys.modules]
+    while pending:
+        name = pending.pop()
+        if name in required or _is_local(name):
+            continue
+        required.add(name)
+        module = sys.modules.get(name)
+        for value in list(vars(module).values()) if module else []:
+            if isinstance(value, (types.ModuleType, type,
+                                  types.FunctionType)):
+                module_name = _module_of(value)
+                if module_name in sys.modules:
+                    pending.append(module_name)
+    return required | modules
+
+
+_referenced = _referenced_modules(
+    h for h in _iter_handlers(app.app) if h is not None)
+# The app object itself is always used to dispatch to the handlers.
+_referenced.add(type(app.app).__module__)
+print(json.dumps(sorted(_required_modules(_referenced))))
+'''
+
+_METADATA_SUFFIXES = ('.dist-info', '.egg-info')
+_METADATA_PACKAGE = '(metadata)'
+
+
+class ColdStartProfileError(Exception):
+    pass
+
+
+@dataclass
+class ImportRecord(object):
+    name: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+    children: List[ImportRecord] = field(default_factory=list)
+
+    @property
+    def top_level_package(self) -> str:
+        return self.name.split('.', 1)[0]
+
+    def walk(self) -> Iterator[ImportRecord]:
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+
+@dataclass
+class PackageStats(object):
+    name: str
+    import_us: int = 0
+    module_count: int = 0
+    size: int = 0
+
+
+@dataclass
+class ColdStartReport(object):
+    root: ImportRecord
+    packages: List[PackageStats]
+    unused: List[PackageStats]
+
+    @property
+    def total_us(self) -> int:
+        return self.root.cumulative_us
+
+    @property
+    def module_count(self) -> int:
+        return sum(1 for _ in self.root.walk())
+
+
+def parse_import_times(output: str) -> List[ImportRecord]:
+    """Parse the output of ``python -X importtime``.
+
+    Returns the top level imports, each of which has the imports it
+    triggered as its children.
+
+    """
+    pending: List[ImportRecord] = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|', 2)
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            # This is the header line.
+            continue
+        name = parts[2][1:]
+        stripped = name.lstrip(' ')
+        record = ImportRecord(
+            name=stripped,
+            self_us=int(parts[0]),
+            cumulative_us=int(parts[1]),
+            depth=(len(name) - len(stripped)) // 2,
+        )
+        # Imports are printed after everything they import, so the
+        # children of this record are the deeper records seen last.
+        start = len(pending)
+        while start > 0 and pending[start - 1].depth > record.depth:
+            start -= 1
+        record.children = pending[start:]
+        del pending[start:]
+        pending.append(record)
+    return pending
+
+
+class ColdStartProfiler(object):
+    def __init__(self, osutils: OSUtils,
+                 python_executable: Optional[str] = None) -> None:
+        self._osutils = osutils
+        if python_executable is None:
+            python_executable = sys.executable
+        self._python_executable = python_executable
+
+    def profile(self, deployment_package: str,
+                environment_variables: Optional[Dict[str, str]] = None,
+                heavy_threshold_ms: float = 20.0,
+                use_site_packages: bool = False) -> ColdStartReport:
+        with self._osutils.tempdir() as package_dir:
+            self._osutils.extract_zipfile(deployment_package, package_dir)
+            sizes = self._package_sizes(package_dir)
+            stdout, stderr = self._import_app(
+                package_dir, environment_variables, use_site_packages)
+        root = self._find_app_import(parse_import_times(stderr))
+        required = set(json.loads(stdout.strip().splitlines()[-1]))
+        return self._create_report(root, sizes, required,
+                                   int(heavy_threshold_ms * 1000))
+
+    def _import_app(self, package_dir: str,
+                    environment_variables: Optional[Dict[str, str]],
+                    use_site_packages: bool) -> Any:
+        command = [self._python_executable, '-I', '-X', 'importtime']
+        if not use_site_packages:
+            command.append('-S')
+        command.extend(['-c', _REFERENCE_SCRIPT, package_dir])
+        env = dict(self._osutils.environ())
+        env.update(environment_variables or {})
+        p = self._osutils.popen(command, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, env=env)
+        stdout, stderr = p.communicate()
+        stdout = stdout.decode('utf-8')
+        stderr = stderr.decode('utf-8')
+        if p.returncode != 0:
+            errors = '\n'.join(
+                line for line in stderr.splitlines()
+                if not line.startswith('import time:'))
+            raise ColdStartProfileError(
+                'Unable to import app from the deployment package:\n%s'
+                % errors)
+        return stdout, stderr
+
+    def _find_app_import(self, records: List[ImportRecord]) -> ImportRecord:
+        for record in records:
+            if record.name == 'app':
+                return record
+        raise ColdStartProfileError(
+            'No import time was recorded for app.py.')
+
+    def _package_sizes(self, package_dir: str) -> Dict[str, int]:
+        sizes: Dict[str, int] = {}
+        prefix_len = len(package_dir) + 1
+        for root, _, filenames in self._osutils.walk(package_dir):
+            for filename in filenames:
+                full_path = self._osutils.joinpath(root, filename)
+                top_level = full_path[prefix_len:].replace(
+                    '\\', '/').split('/', 1)[0]
+                if top_level.endswith(_METADATA_SUFFIXES):
+                    name = _METADATA_PACKAGE
+                else:
+                    name = top_level.split('.', 1)[0]
+                sizes[name] = (sizes.get(name, 0) +
+                               self._osutils.stat(full_path).st_size)
+        return sizes
+
+    def _create_report(self, root: ImportRecord, sizes: Dict[str, int],
+                       required: Set[str],
+                       heavy_threshold_us: int) -> ColdStartReport:
+        packages = {name: PackageStats(name=name, size=size)
+                    for name, size in sizes.items()}
+        for record in root.walk():
+            name = record.top_level_package
+            stats = packages.setdefault(name, PackageStats(name=name))
+            stats.import_us += record.self_us
+            stats.module_count += 1
+        required_packages = {name.split('.', 1)[0] for name in required}
+        unused = [
+            stats for stats in packages.values()
+            if stats.module_count and
+            stats.import_us >= heavy_threshold_us and
+            stats.name not in required_packages and
+            stats.name not in ('app', 'chalicelib') and
+            # Private modules such as _decimal are imported by the
+            # public module wrapping them.
+            not stats.name.startswith('_')
+        ]
+        return ColdStartReport(
+            root=root,
+            packages=sorted(packages.values(),
+                            key=lambda s: (-s.import_us, -s.size, s.name)),
+            unused=sorted(unused, key=lambda s: -s.import_us),
+        )
+
+
+def display_report(report: ColdStartReport, stream: IO[str],
+                   max_depth: int = 3, min_ms: float = 1.0) -> None:
+    stream.write('Total import time: %.1f ms (%s modules)\n\n'
+                 % (report.total_us / 1000.0, report.module_count))
+    stream.write('Import tree (cumulative ms, at least %.1f ms):\n' % min_ms)
+    _display_tree(report.root, stream, 0, max_depth, int(min_ms * 1000))
+    stream.write('\nPackages in the deployment package or taking at least '
+                 '%.1f ms to import:\n' % min_ms)
+    stream.write('%-32s %10s %8s %12s\n'
+                 % ('Package', 'Import ms', 'Modules', 'Size (KiB)'))
+    min_us = int(min_ms * 1000)
+    for stats in report.packages:
+        if stats.import_us < min_us and not stats.size:
+            continue
+        stream.write('%-32s %10.1f %8s %12.1f\n' % (
+            stats.name, stats.import_us / 1000.0, stats.module_count,
+            stats.size / 1024.0))
+    if report.unused:
+        stream.write('\nHeavy packages not referenced by any handler:\n')
+        for stats in report.unused:
+            stream.write('  %s (%.1f ms)\n'
+                         % (stats.name, stats.import_us / 1000.0))
+        stream.write('Consider removing these imports or importing them '
+                     'inside the functions that need them.\n')
+
+
+def _display_tree(record: ImportRecord, stream: IO[str], level: int,
+                  max_depth: int, min_us: int) -> None:
+    stream.write('%10.1f  %s%s\n' % (record.cumulative_us / 1000.0,
+                                     '  ' * level, record.name))
+    if level >= max_depth:
+        return
+    for child in sorted(record.children, key=lambda r: -r.cumulative_us):
+        if child.cumulative_us >= min_us:
+            _display_tree(child, stream, level + 1, max_depth, min_us)
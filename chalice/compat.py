@@ -3,7 +3,7 @@ import six
 import os
 
 from typing import Dict, Any  # noqa
-from urllib.parse import urlparse, parse_qs
+from urllib.parse import urlparse, parse_qs, unquote
 
 from six import StringIO
 
@@ -0,0 +1,274 @@
+"""Emulate Lambda's concurrency and cold starts in ``chalice local``.
+
+By default ``chalice local`` handles every request with the app object it
+imported, with no limit on how many requests run at the same time.  A
+``ContainerPool`` instead sends each request to a separate process, called a
+container, that imports ``app.py`` the first time it's used, the same way a
+Lambda execution environment does.  Each container handles one request at a
+time and idle containers are reused, so the first request handled by a
+container is a cold start and later ones are warm.  When all of the
+containers are busy and the pool has as many containers as the function's
+``reserved_concurrency``, the request is throttled.
+
+For every invocation a line in the format of the ``REPORT`` line Lambda
+writes to CloudWatch Logs is logged with the duration of the invocation,
+the init duration for cold starts, and the latency seen by the gateway.
+
+"""
+from __future__ import annotations
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass
+
+from typing import Any, Callable, Dict, List, Optional, Tuple  # noqa
+
+from chalice.config import Config  # noqa
+from chalice.constants import DEFAULT_LAMBDA_TIMEOUT
+
+
+LOGGER = logging.getLogger(__name__)
+# The init duration of a container includes importing chalice, which is
+# part of importing the app in Lambda, so the clock starts before the
+# container code is imported.
+CONTAINER_SCRIPT = (
+    'import time; start = time.perf_counter(); '
+    'from chalice.containerruntime import main; main(start)'
+)
+
+
+class ContainerError(Exception):
+    """The container exited or raised an error handling an invocation."""
+
+
+class ThrottledError(Exception):
+    """Every container is busy and the pool can't start a new one."""
+
+
+class ContainerTimeoutError(ContainerError):
+    """The invocation didn't finish within the function's timeout."""
+
+
+@dataclass
+class InvocationReport(object):
+    request_id: str
+    cold_start: bool
+    # The time, in milliseconds, from when the gateway sent the request
+    # to the container until it received the response.  For a cold start
+    # this includes starting the process and importing the app.
+    latency_ms: float
+    duration_ms: float
+    init_duration_ms: Optional[float] = None
+
+    def format(self) -> str:
+        line = 'REPORT RequestId: %s\tDuration: %.2f ms' % (
+            self.request_id, self.duration_ms)
+        if self.init_duration_ms is not None:
+            line += '\tInit Duration: %.2f ms' % self.init_duration_ms
+        line += '\tLatency: %.2f ms\t%s' % (
+            self.latency_ms, 'Cold Start' if self.cold_start else 'Warm')
+        return line
+
+
+class LambdaContainer(object):
+    """A process that imports the app and handles one request at a time."""
+
+    def __init__(self, project_dir: str, config: Config,
+                 popen: Callable[..., Any] = subprocess.Popen,
+                 timer_factory: Callable[..., Any] = threading.Timer
+                 ) -> None:
+        self._project_dir = project_dir
+        self._config = config
+        self._popen = popen
+        self._timer_factory = timer_factory
+        self._process: Any = None
+        # Guards the kill done by the timer against the invocation
+        # finishing at the same time.
+        self._kill_lock = threading.Lock()
+        self._finished = False
+        self._timed_out = False
+
+    @property
+    def is_started(self) -> bool:
+        return self._process is not None
+
+    def invoke(self, event: Dict[str, Any],
+               request_id: str) -> Dict[str, Any]:
+        if self._process is None:
+            self._process = self._start()
+        timeout = self._get_timeout()
+        message = {
+            'event': event,
+            'request_id': request_id,
+            'function_name': self._config.function_name,
+            'memory_size': self._config.lambda_memory_size,
+            'timeout_ms': timeout * 1000,
+        }
+        line = self._send(message, timeout)
+        if not line:
+            raise ContainerError('Container exited with code %s'
+                                 % self._process.wait())
+        result = json.loads(line.decode('utf-8'))
+        if 'error' in result:
+            raise ContainerError(result['error'])
+        return result
+
+    def stop(self) -> None:
+        if self._process is not None:
+            self._process.stdin.close()
+            self._process.wait()
+            self._process = None
+
+    def _send(self, message: Dict[str, Any], timeout: int) -> bytes:
+        # Like Lambda, an invocation that runs past the function's timeout
+        # is stopped by killing the container, and the next invocation is
+        # a cold start.
+        with self._kill_lock:
+            self._finished = False
+            self._timed_out = False
+        line = b''
+        timer = self._timer_factory(timeout, self._kill)
+        timer.start()
+        try:
+            self._process.stdin.write(
+                json.dumps(message).encode('utf-8') + b'\n')
+            self._process.stdin.flush()
+            line = self._process.stdout.readline()
+        except (IOError, OSError) as e:
+            if not self._timed_out:
+                raise ContainerError('Unable to invoke container: %s' % e)
+        finally:
+            with self._kill_lock:
+                self._finished = True
+            timer.cancel()
+        if self._timed_out:
+            # The timer can fire after the response was read but before
+            # the invocation was marked as finished.  The response is
+            # still returned, but the process was killed so the next
+            # invocation starts a new one.
+            self._process.wait()
+            self._process = None
+            if not line.endswith(b'\n'):
+                raise ContainerTimeoutError(
+                    'Task timed out after %.2f seconds' % timeout)
+        return line
+
+    def _kill(self) -> None:
+        with self._kill_lock:
+            if self._finished:
+                return
+            self._timed_out = True
+            self._process.kill()
+
+    def _get_timeout(self) -> int:
+        timeout = self._config.lambda_timeout
+        if timeout is None:
+            timeout = DEFAULT_LAMBDA_TIMEOUT
+        return timeout
+
+    def _start(self) -> Any:
+        env = dict(os.environ)
+        env.update(self._config.environment_variables)
+        return self._popen(
+            [sys.executable, '-c', CONTAINER_SCRIPT, self._project_dir],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env)
+
+
+class ContainerPool(object):
+    """Runs requests in containers, capped at the reserved concurrency."""
+
+    def __init__(self,
+                 container_factory: Callable[[], LambdaContainer],
+                 max_containers: Optional[int] = None,
+                 clock: Callable[[], float] = time.perf_counter) -> None:
+        self._container_factory = container_factory
+        self.max_containers = max_containers
+        self._clock = clock
+        self._idle: List[LambdaContainer] = []
+        self._containers: List[LambdaContainer] = []
+        self._lock = threading.Lock()
+        self._stats = {'invocations': 0, 'cold_starts': 0, 'throttles': 0,
+                       'errors': 0, 'timeouts': 0}
+
+    @classmethod
+    def from_config(cls, config: Config) -> ContainerPool:
+        return cls(
+            container_factory=lambda: LambdaContainer(
+                config.project_dir, config),
+            max_containers=config.reserved_concurrency,
+        )
+
+    def invoke(self, event: Dict[str, Any],
+               request_id: str) -> Tuple[Dict[str, Any], InvocationReport]:
+        container = self._acquire()
+        cold_start = not container.is_started
+        start = self._clock()
+        try:
+            result = container.invoke(event, request_id)
+        except ContainerTimeoutError as e:
+            LOGGER.error('RequestId: %s Error: %s', request_id, e)
+            self._discard(container, 'timeouts')
+            raise
+        except ContainerError:
+            self._discard(container, 'errors')
+            raise
+        latency_ms = (self._clock() - start) * 1000
+        self._release(container)
+        report = InvocationReport(
+            request_id=request_id,
+            cold_start=cold_start,
+            latency_ms=latency_ms,
+            duration_ms=result['duration_ms'],
+            init_duration_ms=result.get('init_duration_ms'),
+        )
+        with self._lock:
+            self._stats['invocations'] += 1
+            self._stats['cold_starts'] += int(cold_start)
+        LOGGER.info(report.format())
+        return result['response'], report
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['containers'] = len(self._containers)
+            stats['idle'] = len(self._idle)
+        return stats
+
+    def shutdown(self) -> None:
+        with self._lock:
+            containers, self._containers = self._containers, []
+            self._idle = []
+        for container in containers:
+            container.stop()
+
+    def _acquire(self) -> LambdaContainer:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+            if self.max_containers is not None and \
+                    len(self._containers) >= self.max_containers:
+                self._stats['throttles'] += 1
+                raise ThrottledError()
+            container = self._container_factory()
+            self._containers.append(container)
+            return container
+
+    def _release(self, container: LambdaContainer) -> None:
+        with self._lock:
+            if container in self._containers:
+                self._idle.append(container)
+
+    def _discard(self, container: LambdaContainer, stat: str) -> None:
+        # Like Lambda, a container that fails is replaced by a new one,
+        # which is a cold start, the next time one is needed.  ``stat``
+        # is the stat the failure is counted in, ``errors`` or
+        # ``timeouts``.
+        with self._lock:
+            self._stats[stat] += 1
+            if container in self._containers:
+                self._containers.remove(container)
+        container.stop()
@@ -0,0 +1,78 @@
+"""The process side of the containers used by ``chalice local``.
+
+A ``LambdaContainer`` from ``chalice.containerpool`` starts this in a new
+Python process and sends it one invocation per line of stdin.  The app is
+imported when the first invocation is received, and the result of each
+invocation, with its duration, is written back as a line of JSON.
+
+"""
+from __future__ import annotations
+import importlib
+import json
+import os
+import sys
+import time
+import traceback
+
+from typing import Any, Dict, IO, Optional  # noqa
+
+from chalice.local import LambdaContext
+
+
+def _import_app(project_dir: str) -> Any:
+    sys.path.insert(0, project_dir)
+    # The vendor directory is on the path the same way it is for
+    # ``chalice local``.
+    vendor_dir = os.path.join(project_dir, 'vendor')
+    if os.path.isdir(vendor_dir):
+        sys.path.append(vendor_dir)
+    return getattr(importlib.import_module('app'), 'app')
+
+
+def run_container(project_dir: str, stdin: IO[bytes], stdout: IO[bytes],
+                  init_start: Optional[float] = None) -> None:
+    app = None
+    for line in stdin:
+        message = json.loads(line.decode('utf-8'))
+        result: Dict[str, Any] = {}
+        failed = False
+        try:
+            if app is None:
+                start = time.perf_counter()
+                app = _import_app(project_dir)
+                if init_start is not None:
+                    start = init_start
+                result['init_duration_ms'] = (
+                    time.perf_counter() - start) * 1000
+            context = LambdaContext(message['function_name'],
+                                    message['memory_size'],
+                                    message['timeout_ms'])
+            context.aws_request_id = message['request_id']
+            start = time.perf_counter()
+            result['response'] = app(message['event'], context)
+            result['duration_ms'] = (time.perf_counter() - start) * 1000
+            # A response that can't be serialized, such as one with a
+            # bytes body, is an error for the invocation, the same as in
+            # Lambda, and not for the container.
+            output = json.dumps(result)
+        except Exception as e:
+            # This is logged the same way Lambda logs an unhandled error.
+            traceback.print_exc()
+            failed = True
+            output = json.dumps(
+                {'error': '%s: %s' % (e.__class__.__name__, e)})
+        stdout.write(output.encode('utf-8') + b'\n')
+        stdout.flush()
+        if failed and app is None:
+            # The app couldn't be imported, so this container can't be
+            # used again.
+            return
+
+
+def main(init_start: Optional[float] = None) -> None:
+    # Anything the app prints goes to stderr, which is shown by
+    # ``chalice local``, so only the results are written to the pipe
+    # the gateway reads.
+    results = os.fdopen(os.dup(sys.stdout.fileno()), 'wb')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    run_container(sys.argv[1], sys.stdin.buffer, results, init_start)
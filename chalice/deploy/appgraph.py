@@ -664,7 +664,8 @@ class ApplicationGraphBuilder(object):
             batch_size=sqs_config.batch_size,
             lambda_function=lambda_function,
             maximum_batching_window_in_seconds=batch_window,
-            maximum_concurrency=sqs_config.maximum_concurrency
+            maximum_concurrency=sqs_config.maximum_concurrency,
+            report_batch_item_failures=sqs_config.report_batch_item_failures,
         )
         return sqs_event_source
 
@@ -691,6 +692,12 @@ class ApplicationGraphBuilder(object):
             maximum_batching_window_in_seconds=batch_window,
             starting_position=kinesis_config.starting_position,
             lambda_function=lambda_function,
+            report_batch_item_failures=(
+                kinesis_config.report_batch_item_failures),
+            bisect_batch_on_function_error=(
+                kinesis_config.bisect_batch_on_function_error),
+            maximum_retry_attempts=kinesis_config.maximum_retry_attempts,
+            parallelization_factor=kinesis_config.parallelization_factor,
         )
         return kinesis_event_source
 
@@ -717,6 +724,11 @@ class ApplicationGraphBuilder(object):
             maximum_batching_window_in_seconds=batch_window,
             starting_position=ddb_config.starting_position,
             lambda_function=lambda_function,
+            report_batch_item_failures=ddb_config.report_batch_item_failures,
+            bisect_batch_on_function_error=(
+                ddb_config.bisect_batch_on_function_error),
+            maximum_retry_attempts=ddb_config.maximum_retry_attempts,
+            parallelization_factor=ddb_config.parallelization_factor,
         )
         return ddb_event_source
 
@@ -349,6 +349,7 @@ class SQSEventSource(FunctionEventSubscriber):
     batch_size: int
     maximum_batching_window_in_seconds: int
     maximum_concurrency: Opt[int] = None
+    report_batch_item_failures: bool = False
 
 
 @dataclass
@@ -358,6 +359,10 @@ class KinesisEventSource(FunctionEventSubscriber):
     batch_size: int
     starting_position: str
     maximum_batching_window_in_seconds: int
+    report_batch_item_failures: bool = False
+    bisect_batch_on_function_error: bool = False
+    maximum_retry_attempts: Opt[int] = None
+    parallelization_factor: Opt[int] = None
 
 
 @dataclass
@@ -367,3 +372,10 @@ class DynamoDBEventSource(FunctionEventSubscriber):
     batch_size: int
     starting_position: str
     maximum_batching_window_in_seconds: int
+    report_batch_item_failures: bool = False
+    bisect_batch_on_function_error: bool = False
+    maximum_retry_attempts: Opt[int] = None
+    parallelization_factor: Opt[int] = None
+
+
+StreamEventSource = Union[KinesisEventSource, DynamoDBEventSource]
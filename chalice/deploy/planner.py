@@ -736,7 +736,9 @@ class PlanStage(object):
                         'batch_size': resource.batch_size,
                         'maximum_batching_window_in_seconds':
                             resource.maximum_batching_window_in_seconds,
-                        'maximum_concurrency': resource.maximum_concurrency
+                        'maximum_concurrency': resource.maximum_concurrency,
+                        'report_batch_item_failures':
+                            resource.report_batch_item_failures,
                     }
                 )
             ] + self._batch_record_resource(
@@ -755,6 +757,8 @@ class PlanStage(object):
                         'maximum_batching_window_in_seconds':
                             resource.maximum_batching_window_in_seconds,
                         'maximum_concurrency': resource.maximum_concurrency,
+                        'report_batch_item_failures':
+                            resource.report_batch_item_failures,
                         'function_name': function_arn},
                 output_var=uuid_varname,
             ), 'Subscribing %s to SQS queue %s\n'
@@ -796,7 +800,9 @@ class PlanStage(object):
                     params={'event_uuid': uuid,
                             'batch_size': resource.batch_size,
                             'maximum_batching_window_in_seconds':
-                                resource.maximum_batching_window_in_seconds}
+                                resource.maximum_batching_window_in_seconds,
+                            **self._stream_event_source_params(
+                                resource, is_update=True)}
                 )
             ] + self._batch_record_resource(
                 'kinesis_event', resource.resource_name, {
@@ -814,7 +820,9 @@ class PlanStage(object):
                         'function_name': function_arn,
                         'starting_position': resource.starting_position,
                         'maximum_batching_window_in_seconds':
-                            resource.maximum_batching_window_in_seconds},
+                            resource.maximum_batching_window_in_seconds,
+                        **self._stream_event_source_params(
+                            resource, is_update=False)},
                 output_var=uuid_varname,
             ), 'Subscribing %s to Kinesis stream %s\n'
                 % (resource.lambda_function.function_name, resource.stream)
@@ -879,7 +887,9 @@ class PlanStage(object):
                     params={'event_uuid': uuid,
                             'batch_size': resource.batch_size,
                             'maximum_batching_window_in_seconds':
-                                resource.maximum_batching_window_in_seconds}
+                                resource.maximum_batching_window_in_seconds,
+                            **self._stream_event_source_params(
+                                resource, is_update=True)}
                 )
             ] + self._batch_record_resource(
                 'dynamodb_event', resource.resource_name, {
@@ -896,7 +906,9 @@ class PlanStage(object):
                         'function_name': function_arn,
                         'starting_position': resource.starting_position,
                         'maximum_batching_window_in_seconds':
-                            resource.maximum_batching_window_in_seconds},
+                            resource.maximum_batching_window_in_seconds,
+                        **self._stream_event_source_params(
+                            resource, is_update=False)},
                 output_var=uuid_varname,
             ), 'Subscribing %s to DynamoDB stream %s\n'
                 % (resource.lambda_function.function_name,
@@ -909,6 +921,26 @@ class PlanStage(object):
             }
         )
 
+    def _stream_event_source_params(self, resource, is_update):
+        # type: (models.StreamEventSource, bool) -> Dict[str, Any]
+        maximum_retry_attempts = resource.maximum_retry_attempts
+        parallelization_factor = resource.parallelization_factor
+        if is_update:
+            # Options that aren't set are updated to their default values
+            # so removing them from the app resets the event source.
+            if maximum_retry_attempts is None:
+                maximum_retry_attempts = -1
+            if parallelization_factor is None:
+                parallelization_factor = 1
+        return {
+            'report_batch_item_failures':
+                resource.report_batch_item_failures,
+            'bisect_batch_on_function_error':
+                resource.bisect_batch_on_function_error,
+            'maximum_retry_attempts': maximum_retry_attempts,
+            'parallelization_factor': parallelization_factor,
+        }
+
     def _arn_parse_instructions(self, function_arn):
         # type: (Variable) -> List[InstructionMsg]
         instruction_for_stream_arn = [
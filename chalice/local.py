@@ -1,3 +1,4 @@
+# pylint: disable=too-many-lines
 """Dev server used for running a chalice app locally.
 
 This is intended only for local development purposes.
@@ -6,6 +7,8 @@ This is intended only for local development purposes.
 from __future__ import print_function
 from __future__ import annotations
 import re
+import json
+import socket
 import threading
 import time
 import uuid
@@ -13,7 +16,6 @@ import base64
 import functools
 import warnings
 from collections import namedtuple
-import json
 
 from six.moves.BaseHTTPServer import HTTPServer
 from six.moves.BaseHTTPServer import BaseHTTPRequestHandler
@@ -26,6 +28,9 @@ from typing import (
     Callable,
     Optional,
     Union,
+    Iterator,
+    Pattern,
+    TYPE_CHECKING,
 )  # noqa
 
 from chalice.app import Chalice  # noqa
@@ -36,9 +41,16 @@ from chalice.app import RouteEntry  # noqa
 from chalice.app import Request  # noqa
 from chalice.app import AuthResponse  # noqa
 from chalice.app import BuiltinAuthConfig  # noqa
+from chalice.app import _stream_responses  # noqa
 from chalice.config import Config  # noqa
+from chalice.containerpool import ContainerError  # noqa
+from chalice.containerpool import ContainerPool  # noqa
+from chalice.containerpool import ThrottledError  # noqa
 
-from chalice.compat import urlparse, parse_qs
+from chalice.compat import urlparse, parse_qs, unquote
+
+if TYPE_CHECKING:
+    from chalice.localevents import EventSourceServer
 
 
 MatchResult = namedtuple('MatchResult', ['route', 'captured', 'query_params'])
@@ -57,10 +69,17 @@ class Clock(object):
 
 def create_local_server(app_obj: Chalice,
                         config: Config,
-                        host: str, port: int) -> LocalDevServer:
+                        host: str, port: int,
+                        sock: Optional[socket.socket] = None,
+                        container_pool: Optional[ContainerPool] = None,
+                        event_source_server: Optional[
+                            EventSourceServer] = None
+                        ) -> LocalDevServer:
     CustomLocalChalice.__bases__ = (LocalChalice, app_obj.__class__)
     app_obj.__class__ = CustomLocalChalice
-    return LocalDevServer(app_obj, config, host, port)
+    return LocalDevServer(app_obj, config, host, port, sock=sock,
+                          container_pool=container_pool,
+                          event_source_server=event_source_server)
 
 
 class LocalARNBuilder(object):
@@ -89,35 +108,65 @@ class LocalARNBuilder(object):
         )
 
 
+@functools.lru_cache(maxsize=256)
+def _compile_resource_patterns(resources: Tuple[str, ...]) -> Pattern[str]:
+    # Arn matching supports two special case characetrs that are not
+    # escapable. * represents a glob which translates to a non-greedy
+    # match of any number of characters. ? which is any single character.
+    # These are easy to translate to a regex using .*? and . respectivly.
+    # The resources of a policy are combined into a single regex, which
+    # is cached since the same policy is usually checked for every request
+    # with the same token.
+    resource_regexes = [
+        re.escape(resource).replace(r'\?', '.').replace(r'\*', '.*?')
+        for resource in resources
+    ]
+    return re.compile('^(?:%s)$' % '|'.join(resource_regexes))
+
+
 class ARNMatcher(object):
     def __init__(self, target_arn: str) -> None:
         self._arn = target_arn
 
-    def _resource_match(self, resource: str) -> bool:
-        # Arn matching supports two special case characetrs that are not
-        # escapable. * represents a glob which translates to a non-greedy
-        # match of any number of characters. ? which is any single character.
-        # These are easy to translate to a regex using .*? and . respectivly.
-        escaped_resource = re.escape(resource)
-        resource_regex = escaped_resource.replace(r'\?', '.').replace(
-            r'\*', '.*?')
-        resource_regex = '^%s$' % resource_regex
-        return re.match(resource_regex, self._arn) is not None
-
     def does_any_resource_match(self, resources: List[str]) -> bool:
-        for resource in resources:
-            if self._resource_match(resource):
-                return True
-        return False
+        if not resources:
+            return False
+        pattern = _compile_resource_patterns(tuple(resources))
+        return pattern.match(self._arn) is not None
+
+
+class _RouteNode(object):
+    def __init__(self) -> None:
+        self.static: Dict[str, _RouteNode] = {}
+        # Maps the name of a ``{capture}`` segment to its node.
+        self.captures: Dict[str, _RouteNode] = {}
+        self.route: Optional[str] = None
 
 
 class RouteMatcher(object):
     def __init__(self, route_urls: List[str]) -> None:
-        # Sorting the route_urls ensures we always check
-        # the concrete routes for a prefix before the
-        # variable/capture parts of the route, e.g
-        # '/foo/bar' before '/foo/{capture}'
+        # Sorting the route_urls ensures the captures of a node are
+        # checked in the same order for every request.
         self.route_urls = sorted(route_urls)
+        # The routes are split into a trie of their segments once so a
+        # request only needs to look at the routes that share its
+        # prefix.
+        self._root = _RouteNode()
+        for route_url in self.route_urls:
+            self._add_route(route_url)
+
+    def _add_route(self, route_url: str) -> None:
+        node = self._root
+        for part in route_url.split('/'):
+            if part.startswith('{') and part.endswith('}'):
+                children = node.captures
+                part = part[1:-1]
+            else:
+                children = node.static
+            if part not in children:
+                children[part] = _RouteNode()
+            node = children[part]
+        node.route = route_url
 
     def match_route(self, url: str) -> MatchResult:
         """Match the url against known routes.
@@ -129,8 +178,11 @@ class RouteMatcher(object):
 
             match_route('/foo/bar') -> '/foo/{name}'
 
+        Like API Gateway, a static segment takes precedence over a
+        ``{capture}`` segment, e.g. '/foo/bar' is matched by '/foo/bar'
+        before '/foo/{name}'.
+
         """
-        # Otherwise we need to check for param substitution
         parsed_url = urlparse(url)
         query_params = parse_qs(parsed_url.query, keep_blank_values=True)
         path = parsed_url.path
@@ -138,20 +190,28 @@ class RouteMatcher(object):
         # path. We do the same here so our route matching works the same way.
         if path != '/' and path.endswith('/'):
             path = path[:-1]
-        parts = path.split('/')
-        captured = {}
-        for route_url in self.route_urls:
-            url_parts = route_url.split('/')
-            if len(parts) == len(url_parts):
-                for i, j in zip(parts, url_parts):
-                    if j.startswith('{') and j.endswith('}'):
-                        captured[j[1:-1]] = i
-                        continue
-                    if i != j:
-                        break
-                else:
-                    return MatchResult(route_url, captured, query_params)
-        raise ValueError("No matching route found for: %s" % url)
+        captured: Dict[str, str] = {}
+        route_url = self._find_route(self._root, path.split('/'), 0, captured)
+        if route_url is None:
+            raise ValueError("No matching route found for: %s" % url)
+        return MatchResult(route_url, captured, query_params)
+
+    def _find_route(self, node: _RouteNode, parts: List[str], index: int,
+                    captured: Dict[str, str]) -> Optional[str]:
+        if index == len(parts):
+            return node.route
+        part = parts[index]
+        child = node.static.get(part)
+        if child is not None:
+            route_url = self._find_route(child, parts, index + 1, captured)
+            if route_url is not None:
+                return route_url
+        for name, child in node.captures.items():
+            route_url = self._find_route(child, parts, index + 1, captured)
+            if route_url is not None:
+                captured[name] = part
+                return route_url
+        return None
 
 
 class LambdaEventConverter(object):
@@ -224,6 +284,14 @@ class NotAuthorizedError(LocalGatewayException):
     CODE = 401
 
 
+class TooManyRequestsError(LocalGatewayException):
+    CODE = 429
+
+
+class BadGatewayError(LocalGatewayException):
+    CODE = 502
+
+
 class LambdaContext(object):
     def __init__(self, function_name: str, memory_size: int,
                  max_runtime_ms: int = 3000,
@@ -435,7 +503,7 @@ class LocalGatewayAuthorizer(object):
     def _decode_jwt_payload(self, jwt: str) -> Dict:
         payload_segment = jwt.split(".", 2)[1]
         payload = base64.urlsafe_b64decode(self._base64_pad(payload_segment))
-        return json.loads(payload)
+        return self._app_object.json_codec.loads(payload)
 
     def _base64_pad(self, value: str) -> str:
         rem = len(value) % 4
@@ -449,9 +517,11 @@ class LocalGateway(object):
 
     MAX_LAMBDA_EXECUTION_TIME = 900
 
-    def __init__(self, app_object: Chalice, config: Config) -> None:
+    def __init__(self, app_object: Chalice, config: Config,
+                 container_pool: Optional[ContainerPool] = None) -> None:
         self._app_object = app_object
         self._config = config
+        self._container_pool = container_pool
         self.event_converter = LambdaEventConverter(
             RouteMatcher(list(app_object.routes)),
             self._app_object.api.binary_types
@@ -543,7 +613,31 @@ class LocalGateway(object):
         # 401 will be sent back over the wire.
         lambda_event, lambda_context = self._authorizer.authorize(
             path, lambda_event, lambda_context)
-        response = self._app_object(lambda_event, lambda_context)
+        if self._container_pool is not None:
+            return self._invoke_container(lambda_event, lambda_context)
+        # The body of a StreamingResponse is returned as an iterator of
+        # bytes so it can be sent to the client as it's produced.
+        with _stream_responses():
+            response = self._app_object(lambda_event, lambda_context)
+        return response
+
+    def _invoke_container(self, lambda_event: EventType,
+                          lambda_context: LambdaContext) -> ResponseType:
+        assert self._container_pool is not None
+        request_id = lambda_context.aws_request_id
+        error_headers = {'x-amzn-RequestId': request_id}
+        try:
+            response, _ = self._container_pool.invoke(
+                lambda_event, request_id)
+        except ThrottledError:
+            # This is what API Gateway returns when the function's
+            # reserved concurrency is used up.
+            error_headers['x-amzn-ErrorType'] = 'TooManyRequestsException'
+            raise TooManyRequestsError(
+                error_headers, b'{"message": "Too Many Requests"}')
+        except ContainerError:
+            raise BadGatewayError(
+                error_headers, b'{"message": "Internal server error"}')
         return response
 
     def _autogen_options_headers(self, lambda_event: EventType) -> HeaderType:
@@ -587,8 +681,11 @@ class ChaliceRequestHandler(BaseHTTPRequestHandler):
                  client_address: Tuple[str, int],
                  server: HTTPServer,
                  app_object: Chalice,
-                 config: Config) -> None:
-        self.local_gateway = LocalGateway(app_object, config)
+                 config: Config,
+                 local_gateway: Optional[LocalGateway] = None) -> None:
+        if local_gateway is None:
+            local_gateway = LocalGateway(app_object, config)
+        self.local_gateway = local_gateway
         BaseHTTPRequestHandler.__init__(
             self, request, client_address, server)  # type: ignore
 
@@ -633,11 +730,14 @@ class ChaliceRequestHandler(BaseHTTPRequestHandler):
     def _send_http_response(self,
                             code: int,
                             headers: HeaderType,
-                            body: Optional[Union[str, bytes]]) -> None:
+                            body: Optional[Union[str, bytes, Iterator[bytes]]]
+                            ) -> None:
         if body is None:
             self._send_http_response_no_body(code, headers)
-        else:
+        elif isinstance(body, (str, bytes)):
             self._send_http_response_with_body(code, headers, body)
+        else:
+            self._send_http_response_chunked(code, headers, body)
 
     def _send_http_response_with_body(self,
                                       code: int,
@@ -653,6 +753,35 @@ class ChaliceRequestHandler(BaseHTTPRequestHandler):
         self._send_headers(headers)
         self.wfile.write(body)
 
+    def _send_http_response_chunked(self,
+                                    code: int,
+                                    headers: HeaderType,
+                                    chunks: Iterator[bytes]) -> None:
+        self.send_response(code)
+        self.send_header('Transfer-Encoding', 'chunked')
+        content_type = headers.pop(
+            'Content-Type', 'application/json')
+        self.send_header('Content-Type', content_type)
+        self._send_headers(headers)
+        try:
+            for chunk in chunks:
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+        except Exception as e:
+            # The status code and headers have already been sent so
+            # the only way to signal an error is to end the response
+            # without the terminating chunk and close the connection.
+            self.log_error('Error while streaming response: %r', e)
+            # pylint: disable=attribute-defined-outside-init
+            self.close_connection = True
+            return
+        finally:
+            # Ensure the view's generator is cleaned up if the
+            # client disconnects before the response is finished.
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+        self.wfile.write(b'0\r\n\r\n')
+
     do_GET = do_PUT = do_POST = do_HEAD = do_DELETE = \
         do_PATCH = do_OPTIONS = _generic_handle
 
@@ -691,18 +820,45 @@ class LocalDevServer(object):
                  app_object: Chalice,
                  config: Config, host: str, port: int,
                  handler_cls: HandlerCls = ChaliceRequestHandler,
-                 server_cls: ServerCls = ThreadedHTTPServer) -> None:
+                 server_cls: ServerCls = ThreadedHTTPServer,
+                 sock: Optional[socket.socket] = None,
+                 container_pool: Optional[ContainerPool] = None,
+                 event_source_server: Optional[EventSourceServer] = None
+                 ) -> None:
         self.app_object = app_object
         self.host = host
         self.port = port
+        self.container_pool = container_pool
+        self.event_source_server = event_source_server
+        # A LocalGateway doesn't keep any per request state, so one
+        # gateway is created when the app is loaded and shared by every
+        # connection instead of rebuilding its routes for each of them.
+        self.local_gateway = LocalGateway(app_object, config,
+                                          container_pool=container_pool)
         self._wrapped_handler = functools.partial(
-            handler_cls, app_object=app_object, config=config)
-        self.server = server_cls((host, port), self._wrapped_handler)
+            handler_cls, app_object=app_object, config=config,
+            local_gateway=self.local_gateway)
+        if sock is None:
+            self.server = server_cls((host, port), self._wrapped_handler)
+        else:
+            # The socket is already bound and listening, e.g. when it's
+            # shared by the workers of ``chalice local --workers``.
+            self.server = server_cls((host, port), self._wrapped_handler,
+                                     bind_and_activate=False)
+            self.server.socket.close()
+            self.server.socket = sock
+            self.server.server_address = sock.getsockname()
 
     def handle_single_request(self) -> None:
         self.server.handle_request()
 
     def serve_forever(self) -> None:
+        if self.event_source_server is not None:
+            self.event_source_server.start()
+            url = self.event_source_server.endpoint_url
+            print("Event sources on %s" % url)
+            for source_type, name in self.event_source_server.pump.sources:
+                print("  POST %s/%s/%s" % (url, source_type, name))
         print("Serving on http://%s:%s" % (self.host, self.port))
         self.server.serve_forever()
 
@@ -710,6 +866,10 @@ class LocalDevServer(object):
         # This must be called from another thread of else it
         # will deadlock.
         self.server.shutdown()
+        if self.container_pool is not None:
+            self.container_pool.shutdown()
+        if self.event_source_server is not None:
+            self.event_source_server.shutdown()
 
 
 class HTTPServerThread(threading.Thread):
@@ -735,6 +895,169 @@ class HTTPServerThread(threading.Thread):
             self._server.shutdown()
 
 
+class WebsocketManagementRequestHandler(BaseHTTPRequestHandler):
+    """Serves the API Gateway management API for a local endpoint."""
+    protocol_version = 'HTTP/1.1'
+    _CONNECTIONS_PATH = '/@connections/'
+
+    def __init__(self,
+                 request: bytes,
+                 client_address: Tuple[str, int],
+                 server: HTTPServer,
+                 endpoint: LocalWebsocketManagementEndpoint) -> None:
+        self.endpoint = endpoint
+        BaseHTTPRequestHandler.__init__(
+            self, request, client_address, server)  # type: ignore
+
+    def do_POST(self) -> None:
+        content_length = int(self.headers.get('content-length', '0'))
+        data = self.rfile.read(content_length)
+        connection_id = self._get_connection_id()
+        if connection_id is None or not self.endpoint.post_to_connection(
+                connection_id, data):
+            self._send_gone_response(connection_id)
+            return
+        self._send_response(200, b'')
+
+    def do_GET(self) -> None:
+        connection_id = self._get_connection_id()
+        info = None
+        if connection_id is not None:
+            info = self.endpoint.get_connection(connection_id)
+        if info is None:
+            self._send_gone_response(connection_id)
+            return
+        self._send_response(200, json.dumps(info).encode('utf-8'))
+
+    def do_DELETE(self) -> None:
+        connection_id = self._get_connection_id()
+        if connection_id is None or not self.endpoint.delete_connection(
+                connection_id):
+            self._send_gone_response(connection_id)
+            return
+        self._send_response(204, b'')
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+    def _get_connection_id(self) -> Optional[str]:
+        path = urlparse(self.path).path
+        _, found, connection_id = path.partition(self._CONNECTIONS_PATH)
+        if not found or not connection_id:
+            return None
+        return unquote(connection_id)
+
+    def _send_gone_response(self, connection_id: Optional[str]) -> None:
+        body = json.dumps(
+            {'message': 'Connection %s is gone' % connection_id})
+        self._send_response(410, body.encode('utf-8'),
+                            {'x-amzn-ErrorType': 'GoneException'})
+
+    def _send_response(self, status_code: int, body: bytes,
+                       headers: Optional[HeaderType] = None) -> None:
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for header_name, header_value in (headers or {}).items():
+            self.send_header(header_name, header_value)
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+
+class LocalWebsocketManagementEndpoint(object):
+    """An in-memory stand-in for the API Gateway management API.
+
+    This serves ``post_to_connection``, ``get_connection`` and
+    ``delete_connection`` over HTTP so the ``WebsocketAPI`` can be used
+    in tests without a deployed websocket API.  Connections have to be
+    added with ``add_connection()``, posting to any other connection
+    fails with a ``GoneException``.  Messages that are posted are
+    recorded per connection.
+
+    """
+    def __init__(self, host: str = '127.0.0.1', port: int = 0,
+                 stage: str = 'api') -> None:
+        self.stage = stage
+        self._host = host
+        self._connections: Dict[str, List[bytes]] = {}
+        self._connected_at: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        handler = functools.partial(
+            WebsocketManagementRequestHandler, endpoint=self)
+        self.server = ThreadedHTTPServer((host, port), handler)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def endpoint_url(self) -> str:
+        port = self.server.server_address[1]
+        return 'http://%s:%s/%s' % (self._host, port, self.stage)
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self.server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def shutdown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> LocalWebsocketManagementEndpoint:
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.shutdown()
+
+    def add_connection(self, connection_id: str) -> None:
+        with self._lock:
+            self._connections[connection_id] = []
+            self._connected_at[connection_id] = time.strftime(
+                '%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+
+    def remove_connection(self, connection_id: str) -> None:
+        with self._lock:
+            self._connections.pop(connection_id, None)
+            self._connected_at.pop(connection_id, None)
+
+    @property
+    def connection_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._connections)
+
+    def messages(self, connection_id: str) -> List[bytes]:
+        with self._lock:
+            return list(self._connections.get(connection_id, []))
+
+    def post_to_connection(self, connection_id: str, data: bytes) -> bool:
+        with self._lock:
+            if connection_id not in self._connections:
+                return False
+            self._connections[connection_id].append(data)
+            return True
+
+    def get_connection(self, connection_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if connection_id not in self._connections:
+                return None
+            connected_at = self._connected_at[connection_id]
+        return {
+            'connectedAt': connected_at,
+            'lastActiveAt': connected_at,
+            'identity': {'sourceIp': '127.0.0.1', 'userAgent': ''},
+        }
+
+    def delete_connection(self, connection_id: str) -> bool:
+        with self._lock:
+            if connection_id not in self._connections:
+                return False
+            del self._connections[connection_id]
+            del self._connected_at[connection_id]
+        return True
+
+
 class LocalChalice(Chalice):
 
     _THREAD_LOCAL = threading.local()
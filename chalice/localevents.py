@@ -0,0 +1,619 @@
+"""In-memory SQS queues and Kinesis and DynamoDB streams for local mode.
+
+``chalice.test.TestEventsClient`` can generate a single event for a handler
+registered with ``on_sqs_message``, ``on_kinesis_record`` or
+``on_dynamodb_record``, which is enough to test what a handler does with a
+batch of records but not how many records it can keep up with.  The
+``EventSourcePump`` stands in for the queues and streams these handlers are
+subscribed to.  Records are put in an in-memory buffer for each handler
+and a thread for each handler reads them in batches, the way the Lambda
+event source mapping does:
+
+* A batch has at most ``batch_size`` records.
+* With a ``maximum_batching_window_in_seconds`` of 0, a batch is sent as
+  soon as there are records, otherwise records are buffered until the
+  batch is full or the oldest record has waited for the batching window.
+* Batches for a handler are sent one at a time.  Every handler subscribed
+  to a stream gets every record, but the handlers of a queue share its
+  records.
+
+Records can be put with the Python API, e.g. ``send_sqs_messages()``, or
+over HTTP by ``POST``\\ ing a JSON list of records to
+``/sqs/<queue>``, ``/kinesis/<stream>`` or ``/dynamodb/<table>``.  For each
+handler the pump keeps the number of records per second it handled, how
+full its batches were, and the percentiles of how long it took to handle a
+batch.  These are returned by ``get_stats()`` and ``GET /stats``.
+
+Records are not retried.  If a handler raises an error, or reports batch
+item failures, the records are counted as failed and dropped.
+
+"""
+from __future__ import annotations
+import base64
+import collections
+import functools
+import hashlib
+import json
+import logging
+import math
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, \
+    Union  # noqa
+
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler
+from six.moves.BaseHTTPServer import HTTPServer  # noqa
+
+from chalice.app import Chalice  # noqa
+from chalice.app import BaseEventSourceConfig  # noqa
+from chalice.app import DynamoDBEventConfig
+from chalice.app import KinesisEventConfig
+from chalice.app import SQSEventConfig
+from chalice.compat import unquote, urlparse
+from chalice.config import Config
+from chalice.local import LambdaContext
+from chalice.local import LocalARNBuilder
+from chalice.local import ThreadedHTTPServer
+
+
+LOGGER = logging.getLogger(__name__)
+SQS = 'sqs'
+KINESIS = 'kinesis'
+DYNAMODB = 'dynamodb'
+
+
+class UnknownEventSourceError(Exception):
+    """No handler is subscribed to the queue or stream."""
+
+
+class InvalidRecordError(Exception):
+    """A record isn't of the type its queue or stream expects."""
+
+
+@dataclass
+class EventSourceStats(object):
+    source_type: str
+    name: str
+    handler_name: str
+    batch_size: int
+    records: int = 0
+    failed_records: int = 0
+    batches: int = 0
+    # The time, in seconds, from when the first record was put until the
+    # last batch was handled.
+    elapsed: float = 0.0
+    # How long, in milliseconds, the handler took for each batch.
+    latencies_ms: List[float] = field(default_factory=list)
+
+    @property
+    def records_per_second(self) -> float:
+        if not self.elapsed:
+            return 0.0
+        return self.records / self.elapsed
+
+    @property
+    def fill_ratio(self) -> float:
+        # The average fraction of batch_size that each batch used.
+        if not self.batches:
+            return 0.0
+        return self.records / float(self.batches * self.batch_size)
+
+    def percentile(self, percent: float) -> float:
+        if not self.latencies_ms:
+            return 0.0
+        latencies = sorted(self.latencies_ms)
+        rank = int(math.ceil(percent / 100.0 * len(latencies)))
+        return latencies[max(rank, 1) - 1]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'source_type': self.source_type,
+            'name': self.name,
+            'handler_name': self.handler_name,
+            'batch_size': self.batch_size,
+            'records': self.records,
+            'failed_records': self.failed_records,
+            'batches': self.batches,
+            'records_per_second': self.records_per_second,
+            'fill_ratio': self.fill_ratio,
+            'latency_ms': {
+                'p50': self.percentile(50),
+                'p90': self.percentile(90),
+                'p99': self.percentile(99),
+                'max': self.percentile(100),
+            },
+        }
+
+    def format(self) -> str:
+        return (
+            '%s %s (%s): %s records (%s failed) in %s batches, '
+            '%.1f records/s, fill ratio %.2f, latency p50 %.2f ms, '
+            'p90 %.2f ms, p99 %.2f ms' % (
+                self.source_type, self.name, self.handler_name, self.records,
+                self.failed_records, self.batches, self.records_per_second,
+                self.fill_ratio, self.percentile(50), self.percentile(90),
+                self.percentile(99))
+        )
+
+
+class _RecordBuffer(object):
+    """Records waiting to be handled, with the time each one arrived."""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic) -> None:
+        self._records: Deque[Tuple[float, Dict[str, Any]]] = \
+            collections.deque()
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def put(self, records: List[Dict[str, Any]]) -> None:
+        now = self._clock()
+        with self._cond:
+            self._records.extend((now, record) for record in records)
+            self._cond.notify_all()
+
+    def close(self) -> None:
+        # Records that are already buffered are still returned, without
+        # waiting for the batching window, so they can be drained.
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def get_batch(self, batch_size: int,
+                  batching_window: float) -> List[Dict[str, Any]]:
+        # Returns an empty list once the buffer is closed and empty.
+        with self._cond:
+            while True:
+                if self._records:
+                    waited = self._clock() - self._records[0][0]
+                    if len(self._records) >= batch_size or \
+                            waited >= batching_window or self._closed:
+                        break
+                    self._cond.wait(batching_window - waited)
+                elif self._closed:
+                    return []
+                else:
+                    self._cond.wait()
+            count = min(batch_size, len(self._records))
+            return [self._records.popleft()[1] for _ in range(count)]
+
+
+class _Subscription(object):
+    """A handler subscribed to a queue or stream."""
+
+    def __init__(self, source_type: str, name: str, event_source_arn: str,
+                 event_source: Any, buffer: _RecordBuffer) -> None:
+        self.source_type = source_type
+        self.name = name
+        self.event_source_arn = event_source_arn
+        self.event_source = event_source
+        self.buffer = buffer
+        self.stats = EventSourceStats(
+            source_type=source_type, name=name,
+            handler_name=event_source.name,
+            batch_size=event_source.batch_size)
+        self.thread: Optional[threading.Thread] = None
+        self.first_put: Optional[float] = None
+
+
+class EventSourcePump(object):
+    """Feeds records to the SQS, Kinesis and DynamoDB handlers of an app."""
+
+    def __init__(self, app: Chalice, config: Optional[Config] = None,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        if config is None:
+            config = Config.create()
+        self._app = app
+        self._config = config
+        self._clock = clock
+        self._subscriptions: Dict[Tuple[str, str], List[_Subscription]] = {}
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = 0
+        self._sequence_number = 0
+        self._started = False
+        for event_source in app.event_sources:
+            self._subscribe(event_source)
+
+    @property
+    def sources(self) -> List[Tuple[str, str]]:
+        return sorted(self._subscriptions)
+
+    def start(self) -> None:
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for subscription in self._all_subscriptions():
+            thread = threading.Thread(target=self._poll,
+                                      args=(subscription,))
+            thread.daemon = True
+            thread.start()
+            subscription.thread = thread
+
+    def shutdown(self) -> None:
+        # Records that were already put are handled before this returns.
+        for subscription in self._all_subscriptions():
+            subscription.buffer.close()
+        for subscription in self._all_subscriptions():
+            if subscription.thread is not None:
+                subscription.thread.join()
+
+    def __enter__(self) -> EventSourcePump:
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.shutdown()
+
+    def send_sqs_messages(self, queue: str, bodies: List[str]) -> None:
+        subscriptions = self._get_subscriptions(SQS, queue)
+        arn = subscriptions[0].event_source_arn
+        records = [self._create_sqs_record(arn, body) for body in bodies]
+        self._put(subscriptions, records)
+
+    def put_kinesis_records(self, stream: str, data: List[bytes],
+                            partition_key: str = '1') -> None:
+        subscriptions = self._get_subscriptions(KINESIS, stream)
+        arn = subscriptions[0].event_source_arn
+        records = [self._create_kinesis_record(arn, record, partition_key)
+                   for record in data]
+        self._put(subscriptions, records)
+
+    def put_dynamodb_records(self, table: str,
+                             records: List[Dict[str, Any]]) -> None:
+        # Each record has the ``Keys``, and optionally the ``NewImage``
+        # and ``OldImage``, in the DynamoDB JSON format, and an
+        # ``eventName`` that defaults to INSERT.
+        subscriptions = self._get_subscriptions(DYNAMODB, table)
+        arn = subscriptions[0].event_source_arn
+        stream_records = [self._create_dynamodb_record(arn, record)
+                          for record in records]
+        self._put(subscriptions, stream_records)
+
+    def put_records(self, source_type: str, name: str,
+                    records: List[Any]) -> None:
+        # The records are checked before any of them are put, so a list
+        # with an invalid record doesn't get partially delivered.
+        if source_type == SQS:
+            _check_record_types(
+                records, str, 'SQS messages must be strings')
+            self.send_sqs_messages(name, records)
+        elif source_type == KINESIS:
+            _check_record_types(
+                records, (str, bytes), 'Kinesis records must be strings')
+            self.put_kinesis_records(
+                name, [r.encode('utf-8') if isinstance(r, str) else r
+                       for r in records])
+        elif source_type == DYNAMODB:
+            _check_record_types(
+                records, dict, 'DynamoDB records must be JSON objects')
+            self.put_dynamodb_records(name, records)
+        else:
+            raise UnknownEventSourceError(source_type)
+
+    def wait_until_idle(self, timeout: Optional[float] = None) -> bool:
+        # Waits until every record that was put has been handled.
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def get_stats(self) -> List[EventSourceStats]:
+        with self._lock:
+            return [
+                EventSourceStats(**dict(
+                    vars(s.stats), latencies_ms=list(s.stats.latencies_ms)))
+                for s in self._all_subscriptions()
+            ]
+
+    def format_report(self) -> str:
+        return '\n'.join(stats.format() for stats in self.get_stats())
+
+    def _subscribe(self, event_source: BaseEventSourceConfig) -> None:
+        if isinstance(event_source, SQSEventConfig):
+            if event_source.queue_arn is not None:
+                arn = event_source.queue_arn
+                name = arn.rsplit(':', 1)[-1]
+            else:
+                name = str(event_source.queue)
+                arn = self._build_arn('sqs', name)
+            source_type = SQS
+        elif isinstance(event_source, KinesisEventConfig):
+            source_type, name = KINESIS, event_source.stream
+            arn = self._build_arn('kinesis', 'stream/%s' % name)
+        elif isinstance(event_source, DynamoDBEventConfig):
+            source_type, arn = DYNAMODB, event_source.stream_arn
+            name = self._get_table_name(arn)
+        else:
+            return
+        subscriptions = self._subscriptions.setdefault(
+            (source_type, name), [])
+        if source_type == SQS and subscriptions:
+            # The handlers of a queue compete for its messages.
+            buffer = subscriptions[0].buffer
+        else:
+            buffer = _RecordBuffer(self._clock)
+        subscriptions.append(
+            _Subscription(source_type, name, arn, event_source, buffer))
+
+    def _build_arn(self, service: str, resource: str) -> str:
+        return 'arn:aws:%s:%s:%s:%s' % (
+            service, LocalARNBuilder.LOCAL_REGION,
+            LocalARNBuilder.LOCAL_ACCOUNT_ID, resource)
+
+    def _get_table_name(self, stream_arn: str) -> str:
+        # Converts:
+        # "arn:aws:dynamodb:us-west-2:12345:table/MyTable/stream/2020-..."
+        # into "MyTable".
+        resource = stream_arn.split(':', 5)[-1]
+        parts = resource.split('/')
+        if len(parts) >= 2 and parts[0] == 'table':
+            return parts[1]
+        return stream_arn
+
+    def _get_subscriptions(self, source_type: str,
+                           name: str) -> List[_Subscription]:
+        key = (source_type, name)
+        if key not in self._subscriptions and source_type == DYNAMODB:
+            key = (source_type, self._get_table_name(name))
+        try:
+            return self._subscriptions[key]
+        except KeyError:
+            raise UnknownEventSourceError(
+                'No handler is subscribed to %s %s' % (source_type, name))
+
+    def _all_subscriptions(self) -> List[_Subscription]:
+        return [subscription for key in self.sources
+                for subscription in self._subscriptions[key]]
+
+    def _put(self, subscriptions: List[_Subscription],
+             records: List[Dict[str, Any]]) -> None:
+        # The handlers of a stream each have a buffer, but the handlers of
+        # a queue share one, so each message is only handled once.
+        buffers = {id(s.buffer): s.buffer for s in subscriptions}
+        now = self._clock()
+        with self._lock:
+            for subscription in subscriptions:
+                if subscription.first_put is None:
+                    subscription.first_put = now
+            self._pending += len(records) * len(buffers)
+        for buffer in buffers.values():
+            buffer.put(records)
+
+    def _next_sequence_number(self) -> str:
+        with self._lock:
+            self._sequence_number += 1
+            return '%021d' % self._sequence_number
+
+    def _create_sqs_record(self, arn: str, body: str) -> Dict[str, Any]:
+        timestamp = str(int(time.time() * 1000))
+        return {
+            'attributes': {
+                'ApproximateFirstReceiveTimestamp': timestamp,
+                'ApproximateReceiveCount': '1',
+                'SenderId': 'sender-id',
+                'SentTimestamp': timestamp,
+            },
+            'awsRegion': LocalARNBuilder.LOCAL_REGION,
+            'body': body,
+            'eventSource': 'aws:sqs',
+            'eventSourceARN': arn,
+            'md5OfBody': hashlib.md5(body.encode('utf-8')).hexdigest(),
+            'messageAttributes': {},
+            'messageId': str(uuid.uuid4()),
+            'receiptHandle': str(uuid.uuid4()),
+        }
+
+    def _create_kinesis_record(self, arn: str, data: bytes,
+                               partition_key: str) -> Dict[str, Any]:
+        sequence_number = self._next_sequence_number()
+        return {
+            'kinesis': {
+                'kinesisSchemaVersion': '1.0',
+                'partitionKey': partition_key,
+                'sequenceNumber': sequence_number,
+                'data': base64.b64encode(data).decode('ascii'),
+                'approximateArrivalTimestamp': time.time(),
+            },
+            'eventSource': 'aws:kinesis',
+            'eventVersion': '1.0',
+            'eventID': 'shardId-000000000000:%s' % sequence_number,
+            'eventName': 'aws:kinesis:record',
+            'invokeIdentityArn': 'arn:aws:iam::%s:role/lambda-role' % (
+                LocalARNBuilder.LOCAL_ACCOUNT_ID),
+            'awsRegion': LocalARNBuilder.LOCAL_REGION,
+            'eventSourceARN': arn,
+        }
+
+    def _create_dynamodb_record(self, arn: str,
+                                record: Dict[str, Any]) -> Dict[str, Any]:
+        dynamodb = {
+            'ApproximateCreationDateTime': int(time.time()),
+            'Keys': record.get('Keys', {}),
+            'SequenceNumber': self._next_sequence_number(),
+            'SizeBytes': len(json.dumps(record)),
+            'StreamViewType': 'NEW_AND_OLD_IMAGES',
+        }
+        for image in ('NewImage', 'OldImage'):
+            if image in record:
+                dynamodb[image] = record[image]
+        return {
+            'eventID': uuid.uuid4().hex,
+            'eventName': record.get('eventName', 'INSERT'),
+            'eventVersion': '1.1',
+            'eventSource': 'aws:dynamodb',
+            'awsRegion': LocalARNBuilder.LOCAL_REGION,
+            'dynamodb': dynamodb,
+            'eventSourceARN': arn,
+        }
+
+    def _poll(self, subscription: _Subscription) -> None:
+        event_source = subscription.event_source
+        while True:
+            records = subscription.buffer.get_batch(
+                event_source.batch_size,
+                event_source.maximum_batching_window_in_seconds)
+            if not records:
+                return
+            self._invoke(subscription, records)
+
+    def _invoke(self, subscription: _Subscription,
+                records: List[Dict[str, Any]]) -> None:
+        name = subscription.event_source.name
+        scoped = self._config.scope(self._config.chalice_stage, name)
+        context = LambdaContext(name, scoped.lambda_memory_size)
+        start = self._clock()
+        try:
+            response = self._app.handler_map[name](
+                {'Records': records}, context)
+            failed = len(self._get_batch_item_failures(response))
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.error("Handler %s failed to process a batch of %s "
+                         "records", name, len(records), exc_info=True)
+            failed = len(records)
+        end = self._clock()
+        with self._lock:
+            stats = subscription.stats
+            stats.records += len(records)
+            stats.failed_records += failed
+            stats.batches += 1
+            stats.latencies_ms.append((end - start) * 1000)
+            assert subscription.first_put is not None
+            stats.elapsed = end - subscription.first_put
+            self._pending -= len(records)
+            self._idle.notify_all()
+
+    def _get_batch_item_failures(self, response: Any) -> List[Any]:
+        if isinstance(response, dict):
+            return response.get('batchItemFailures', [])
+        return []
+
+
+def _check_record_types(records: List[Any],
+                        record_type: Union[type, Tuple[type, ...]],
+                        message: str) -> None:
+    for index, record in enumerate(records):
+        if not isinstance(record, record_type):
+            raise InvalidRecordError(
+                '%s, record %s is %s' % (
+                    message, index, type(record).__name__))
+
+
+class EventSourceRequestHandler(BaseHTTPRequestHandler):
+    """Puts records in the queues and streams of an EventSourcePump."""
+    protocol_version = 'HTTP/1.1'
+
+    def __init__(self,
+                 request: bytes,
+                 client_address: Tuple[str, int],
+                 server: HTTPServer,
+                 pump: EventSourcePump) -> None:
+        self.pump = pump
+        BaseHTTPRequestHandler.__init__(
+            self, request, client_address, server)  # type: ignore
+
+    def do_POST(self) -> None:
+        content_length = int(self.headers.get('content-length', '0'))
+        body = self.rfile.read(content_length)
+        source_type, _, name = urlparse(
+            self.path).path.lstrip('/').partition('/')
+        try:
+            records = json.loads(body)
+        except ValueError:
+            self._send_response(
+                400, {'message': 'The body must be a JSON list of records'})
+            return
+        if not isinstance(records, list):
+            self._send_response(
+                400, {'message': 'The body must be a JSON list of records'})
+            return
+        try:
+            self.pump.put_records(source_type, unquote(name), records)
+        except UnknownEventSourceError as e:
+            self._send_response(404, {'message': str(e)})
+            return
+        except InvalidRecordError as e:
+            self._send_response(400, {'message': str(e)})
+            return
+        self._send_response(200, {'records': len(records)})
+
+    def do_GET(self) -> None:
+        if urlparse(self.path).path != '/stats':
+            self._send_response(404, {'message': 'Not found'})
+            return
+        self._send_response(200, {
+            'sources': [stats.to_dict() for stats in self.pump.get_stats()]
+        })
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+    def _send_response(self, status_code: int, body: Any) -> None:
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class EventSourceServer(object):
+    """Serves the HTTP API of an EventSourcePump and runs the pump.
+
+    The stats of the pump are logged every ``report_interval`` seconds
+    when records were handled since they were last logged, and when the
+    server is shut down.
+
+    """
+
+    def __init__(self, pump: EventSourcePump, host: str = '127.0.0.1',
+                 port: int = 0, report_interval: float = 10.0) -> None:
+        self.pump = pump
+        self._host = host
+        self._report_interval = report_interval
+        handler = functools.partial(EventSourceRequestHandler, pump=pump)
+        self.server = ThreadedHTTPServer((host, port), handler)
+        self._threads: List[threading.Thread] = []
+        self._stopped = threading.Event()
+        self._last_report = ''
+
+    @property
+    def endpoint_url(self) -> str:
+        return 'http://%s:%s' % (self._host, self.server.server_address[1])
+
+    def start(self) -> None:
+        self.pump.start()
+        for target in (self.server.serve_forever, self._report_periodically):
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def shutdown(self) -> None:
+        self._stopped.set()
+        self.server.shutdown()
+        self.server.server_close()
+        for thread in self._threads:
+            thread.join()
+        self.pump.shutdown()
+        self._report()
+
+    def __enter__(self) -> EventSourceServer:
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.shutdown()
+
+    def _report_periodically(self) -> None:
+        while not self._stopped.wait(self._report_interval):
+            self._report()
+
+    def _report(self) -> None:
+        report = self.pump.format_report()
+        if any(stats.batches for stats in self.pump.get_stats()) and \
+                report != self._last_report:
+            LOGGER.info(report)
+            self._last_report = report
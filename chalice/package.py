@@ -664,11 +664,13 @@ class SAMTemplateGenerator(TemplateGenerator):
             'BatchSize': resource.batch_size,
             'MaximumBatchingWindowInSeconds':
                 resource.maximum_batching_window_in_seconds
-        }
+        }  # type: Dict[str, Any]
         if resource.maximum_concurrency:
             properties["ScalingConfig"] = {
                 "MaximumConcurrency": resource.maximum_concurrency
             }
+        if resource.report_batch_item_failures:
+            properties["FunctionResponseTypes"] = ["ReportBatchItemFailures"]
         function_cfn['Properties']['Events'] = {
             sqs_cfn_name: {
                 'Type': 'SQS',
@@ -676,6 +678,19 @@ class SAMTemplateGenerator(TemplateGenerator):
             }
         }
 
+    def _add_stream_event_source_properties(self, resource, properties):
+        # type: (models.StreamEventSource, Dict[str, Any]) -> None
+        if resource.report_batch_item_failures:
+            properties['FunctionResponseTypes'] = ['ReportBatchItemFailures']
+        if resource.bisect_batch_on_function_error:
+            properties['BisectBatchOnFunctionError'] = True
+        if resource.maximum_retry_attempts is not None:
+            properties['MaximumRetryAttempts'] = \
+                resource.maximum_retry_attempts
+        if resource.parallelization_factor is not None:
+            properties['ParallelizationFactor'] = \
+                resource.parallelization_factor
+
     def _generate_kinesiseventsource(self, resource, template):
         # type: (models.KinesisEventSource, Dict[str, Any]) -> None
         function_cfn_name = to_cfn_resource_name(
@@ -696,6 +711,7 @@ class SAMTemplateGenerator(TemplateGenerator):
             'MaximumBatchingWindowInSeconds':
                 resource.maximum_batching_window_in_seconds,
         }
+        self._add_stream_event_source_properties(resource, properties)
         function_cfn['Properties']['Events'] = {
             kinesis_cfn_name: {
                 'Type': 'Kinesis',
@@ -717,6 +733,7 @@ class SAMTemplateGenerator(TemplateGenerator):
             'MaximumBatchingWindowInSeconds':
                 resource.maximum_batching_window_in_seconds,
         }
+        self._add_stream_event_source_properties(resource, properties)
         function_cfn['Properties']['Events'] = {
             ddb_cfn_name: {
                 'Type': 'DynamoDB',
@@ -1140,13 +1157,15 @@ class TerraformGenerator(TemplateGenerator):
             aws_lambda_event_source_mapping["scaling_config"] = {
                 "maximum_concurrency": resource.maximum_concurrency
             }
+        if resource.report_batch_item_failures:
+            aws_lambda_event_source_mapping["function_response_types"] = [
+                "ReportBatchItemFailures"]
         template['resource'].setdefault('aws_lambda_event_source_mapping', {})[
             resource.resource_name] = aws_lambda_event_source_mapping
 
     def _generate_kinesiseventsource(self, resource, template):
         # type: (models.KinesisEventSource, Dict[str, Any]) -> None
-        template['resource'].setdefault('aws_lambda_event_source_mapping', {})[
-            resource.resource_name] = {
+        aws_lambda_event_source_mapping = {
             'event_source_arn': self._arnref(
                 "arn:%(partition)s:kinesis:%(region)s"
                 ":%(account_id)s:stream/%(stream)s",
@@ -1156,19 +1175,39 @@ class TerraformGenerator(TemplateGenerator):
             'maximum_batching_window_in_seconds':
                 resource.maximum_batching_window_in_seconds,
             'function_name': self._fref(resource.lambda_function)
-        }
+        }  # type: Dict[str, Any]
+        self._add_stream_event_source_mapping_options(
+            resource, aws_lambda_event_source_mapping)
+        template['resource'].setdefault('aws_lambda_event_source_mapping', {})[
+            resource.resource_name] = aws_lambda_event_source_mapping
 
     def _generate_dynamodbeventsource(self, resource, template):
         # type: (models.DynamoDBEventSource, Dict[str, Any]) -> None
-        template['resource'].setdefault('aws_lambda_event_source_mapping', {})[
-            resource.resource_name] = {
+        aws_lambda_event_source_mapping = {
             'event_source_arn': resource.stream_arn,
             'batch_size': resource.batch_size,
             'starting_position': resource.starting_position,
             'maximum_batching_window_in_seconds':
                 resource.maximum_batching_window_in_seconds,
             'function_name': self._fref(resource.lambda_function),
-        }
+        }  # type: Dict[str, Any]
+        self._add_stream_event_source_mapping_options(
+            resource, aws_lambda_event_source_mapping)
+        template['resource'].setdefault('aws_lambda_event_source_mapping', {})[
+            resource.resource_name] = aws_lambda_event_source_mapping
+
+    def _add_stream_event_source_mapping_options(self, resource, mapping):
+        # type: (models.StreamEventSource, Dict[str, Any]) -> None
+        if resource.report_batch_item_failures:
+            mapping['function_response_types'] = ['ReportBatchItemFailures']
+        if resource.bisect_batch_on_function_error:
+            mapping['bisect_batch_on_function_error'] = True
+        if resource.maximum_retry_attempts is not None:
+            mapping['maximum_retry_attempts'] = \
+                resource.maximum_retry_attempts
+        if resource.parallelization_factor is not None:
+            mapping['parallelization_factor'] = \
+                resource.parallelization_factor
 
     def _generate_snslambdasubscription(self, resource, template):
         # type: (models.SNSLambdaSubscription, Dict[str, Any]) -> None
@@ -1,13 +1,14 @@
 from __future__ import annotations
 import os
-import json
 import base64
 import contextlib
 from types import TracebackType
 
-from typing import Optional, Type, Generator, Dict, Any, List  # noqa
+from typing import Optional, Type, Generator, Dict, Any, List, \
+    Iterator, Union, Literal, overload  # noqa
 
 from chalice import Chalice  # noqa
+from chalice.app import JSONCodec  # noqa
 from chalice.config import Config
 from chalice.local import LocalGateway, LambdaContext, LocalGatewayException
 from chalice.cli.factory import CLIFactory
@@ -102,11 +103,42 @@ class TestHTTPClient(BaseClient):
         self._config = config
         self._local_gateway = LocalGateway(app, self._config)
 
+    # Only ``stream=True`` can return a StreamingHTTPResponse, so the
+    # overloads let a call without it be typed as an HTTPResponse.
+    @overload
     def request(self,
                 method: str,
                 path: str,
                 headers: Optional[Dict[str, str]] = None,
-                body: bytes = b'') -> HTTPResponse:
+                body: bytes = b'',
+                stream: Literal[False] = False) -> HTTPResponse:
+        ...
+
+    @overload
+    def request(self,
+                method: str,
+                path: str,
+                headers: Optional[Dict[str, str]] = None,
+                body: bytes = b'',
+                *,
+                stream: Literal[True]) -> StreamingHTTPResponse:
+        ...
+
+    @overload
+    def request(self,
+                method: str,
+                path: str,
+                headers: Optional[Dict[str, str]] = None,
+                body: bytes = b'',
+                stream: bool = False) -> AnyHTTPResponse:
+        ...
+
+    def request(self,
+                method: str,
+                path: str,
+                headers: Optional[Dict[str, str]] = None,
+                body: bytes = b'',
+                stream: bool = False) -> AnyHTTPResponse:
         if headers is None:
             headers = {}
         scoped = self._config.scope(self._config.chalice_stage, 'api_handler')
@@ -117,35 +149,144 @@ class TestHTTPClient(BaseClient):
                     headers=headers, body=body
                 )
             except LocalGatewayException as e:
-                return self._error_response(e)
-        return HTTPResponse.create_from_dict(response)
+                return self._maybe_streaming(self._error_response(e), stream)
+            if not isinstance(response['body'], (str, bytes)):
+                # The body of a StreamingResponse.  Either hand the
+                # chunks to the caller as they're read, or read them
+                # all now while the environment variables are patched.
+                if stream:
+                    response['body'] = self._iter_with_env_vars(
+                        response['body'], scoped.environment_variables)
+                    return StreamingHTTPResponse.create_from_dict(
+                        response, json_codec=self._app.json_codec)
+                response['body'] = b''.join(response['body'])
+        return self._maybe_streaming(HTTPResponse.create_from_dict(
+            response, json_codec=self._app.json_codec), stream)
+
+    def _maybe_streaming(self, response: HTTPResponse,
+                         stream: bool) -> AnyHTTPResponse:
+        # With ``stream=True`` a response whose body was produced all at
+        # once is still returned as a StreamingHTTPResponse, with the
+        # body as its only chunk.
+        if not stream:
+            return response
+        return StreamingHTTPResponse(
+            chunks=iter([response.body]),
+            headers=response.headers,
+            status_code=response.status_code,
+            json_codec=self._app.json_codec,
+        )
+
+    def _iter_with_env_vars(self, chunks: Iterator[bytes],
+                            environment_variables: Dict[str, str]
+                            ) -> Iterator[bytes]:
+        # The view function's code runs each time a chunk is read, so
+        # the environment variables are patched while it's running the
+        # same way they are for a regular request.
+        while True:
+            with self._patched_env_vars(environment_variables):
+                chunk = next(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
 
     def _error_response(self, e: LocalGatewayException) -> HTTPResponse:
         return HTTPResponse(
             headers=e.headers,
             body=e.body if e.body else b'',
-            status_code=e.CODE
+            status_code=e.CODE,
+            json_codec=self._app.json_codec,
         )
 
-    def get(self, path: str, **kwargs: Any) -> HTTPResponse:
+    @overload
+    def get(self, path: str, *, stream: Literal[True],
+            **kwargs: Any) -> StreamingHTTPResponse:
+        ...
+
+    @overload
+    def get(self, path: str, *, stream: Literal[False] = False,
+            **kwargs: Any) -> HTTPResponse:
+        ...
+
+    def get(self, path: str, **kwargs: Any) -> AnyHTTPResponse:
         return self.request('GET', path, **kwargs)
 
-    def post(self, path: str, **kwargs: Any) -> HTTPResponse:
+    @overload
+    def post(self, path: str, *, stream: Literal[True],
+             **kwargs: Any) -> StreamingHTTPResponse:
+        ...
+
+    @overload
+    def post(self, path: str, *, stream: Literal[False] = False,
+             **kwargs: Any) -> HTTPResponse:
+        ...
+
+    def post(self, path: str, **kwargs: Any) -> AnyHTTPResponse:
         return self.request('POST', path, **kwargs)
 
-    def put(self, path: str, **kwargs: Any) -> HTTPResponse:
+    @overload
+    def put(self, path: str, *, stream: Literal[True],
+            **kwargs: Any) -> StreamingHTTPResponse:
+        ...
+
+    @overload
+    def put(self, path: str, *, stream: Literal[False] = False,
+            **kwargs: Any) -> HTTPResponse:
+        ...
+
+    def put(self, path: str, **kwargs: Any) -> AnyHTTPResponse:
         return self.request('PUT', path, **kwargs)
 
-    def patch(self, path: str, **kwargs: Any) -> HTTPResponse:
+    @overload
+    def patch(self, path: str, *, stream: Literal[True],
+              **kwargs: Any) -> StreamingHTTPResponse:
+        ...
+
+    @overload
+    def patch(self, path: str, *, stream: Literal[False] = False,
+              **kwargs: Any) -> HTTPResponse:
+        ...
+
+    def patch(self, path: str, **kwargs: Any) -> AnyHTTPResponse:
         return self.request('PATCH', path, **kwargs)
 
-    def options(self, path: str, **kwargs: Any) -> HTTPResponse:
+    @overload
+    def options(self, path: str, *, stream: Literal[True],
+                **kwargs: Any) -> StreamingHTTPResponse:
+        ...
+
+    @overload
+    def options(self, path: str, *, stream: Literal[False] = False,
+                **kwargs: Any) -> HTTPResponse:
+        ...
+
+    def options(self, path: str, **kwargs: Any) -> AnyHTTPResponse:
         return self.request('OPTIONS', path, **kwargs)
 
-    def delete(self, path: str, **kwargs: Any) -> HTTPResponse:
+    @overload
+    def delete(self, path: str, *, stream: Literal[True],
+               **kwargs: Any) -> StreamingHTTPResponse:
+        ...
+
+    @overload
+    def delete(self, path: str, *, stream: Literal[False] = False,
+               **kwargs: Any) -> HTTPResponse:
+        ...
+
+    def delete(self, path: str, **kwargs: Any) -> AnyHTTPResponse:
         return self.request('DELETE', path, **kwargs)
 
-    def head(self, path: str, **kwargs: Any) -> HTTPResponse:
+    @overload
+    def head(self, path: str, *, stream: Literal[True],
+             **kwargs: Any) -> StreamingHTTPResponse:
+        ...
+
+    @overload
+    def head(self, path: str, *, stream: Literal[False] = False,
+             **kwargs: Any) -> HTTPResponse:
+        ...
+
+    def head(self, path: str, **kwargs: Any) -> AnyHTTPResponse:
         return self.request('HEAD', path, **kwargs)
 
 
@@ -153,35 +294,102 @@ class HTTPResponse(object):
     def __init__(self,
                  body: bytes,
                  headers: Dict[str, str],
-                 status_code: int) -> None:
+                 status_code: int,
+                 json_codec: Optional[JSONCodec] = None) -> None:
         self.body = body
         self.headers = headers
         self.status_code = status_code
+        if json_codec is None:
+            json_codec = JSONCodec()
+        self._json_codec = json_codec
 
     @property
     def json_body(self) -> Any:
         try:
-            return json.loads(self.body)
+            return self._json_codec.loads(self.body)
         except ValueError:
             return None
 
     @classmethod
-    def create_from_dict(cls, response_dict: Dict[str, Any]) -> HTTPResponse:
+    def create_from_dict(cls, response_dict: Dict[str, Any],
+                         json_codec: Optional[JSONCodec] = None
+                         ) -> HTTPResponse:
         # Takes the response dict we have to send back to lambda
         # and exposes it as a python object.
+        body = response_dict['body']
         if response_dict.get('isBase64Encoded', False):
-            body = base64.b64decode(response_dict['body'])
-        else:
-            body = response_dict['body'].encode('utf-8')
+            body = base64.b64decode(body)
+        elif not isinstance(body, bytes):
+            body = body.encode('utf-8')
         combined_headers = response_dict['headers']
         combined_headers.update(response_dict['multiValueHeaders'])
         return cls(
             body=body,
             status_code=response_dict['statusCode'],
             headers=combined_headers,
+            json_codec=json_codec,
         )
 
 
+class StreamingHTTPResponse(object):
+    """An HTTP response whose body is read incrementally.
+
+    This is returned by the test client for a ``StreamingResponse`` when
+    ``stream=True`` is specified.  The chunks aren't produced by the view
+    function until they're read with ``iter_chunks()``, and chunks read
+    that way aren't kept in memory.  Accessing ``body`` reads the
+    remaining chunks and keeps them.
+    """
+
+    def __init__(self,
+                 chunks: Iterator[bytes],
+                 headers: Dict[str, str],
+                 status_code: int,
+                 json_codec: Optional[JSONCodec] = None) -> None:
+        self.headers = headers
+        self.status_code = status_code
+        if json_codec is None:
+            json_codec = JSONCodec()
+        self._json_codec = json_codec
+        self._chunks = chunks
+        self._body: Optional[bytes] = None
+
+    @property
+    def body(self) -> bytes:
+        if self._body is None:
+            self._body = b''.join(self._chunks)
+        return self._body
+
+    @property
+    def json_body(self) -> Any:
+        try:
+            return self._json_codec.loads(self.body)
+        except ValueError:
+            return None
+
+    def iter_chunks(self) -> Iterator[bytes]:
+        if self._body is not None:
+            return iter([self._body])
+        return self._chunks
+
+    @classmethod
+    def create_from_dict(cls, response_dict: Dict[str, Any],
+                         json_codec: Optional[JSONCodec] = None
+                         ) -> StreamingHTTPResponse:
+        # The body of the response dict is an iterator of bytes.
+        combined_headers = response_dict['headers']
+        combined_headers.update(response_dict['multiValueHeaders'])
+        return cls(
+            chunks=response_dict['body'],
+            status_code=response_dict['statusCode'],
+            headers=combined_headers,
+            json_codec=json_codec,
+        )
+
+
+AnyHTTPResponse = Union[HTTPResponse, StreamingHTTPResponse]
+
+
 class TestEventsClient(BaseClient):
     def __init__(self, app: Chalice) -> None:
         self._app = app
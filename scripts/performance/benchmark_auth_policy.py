@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""Measure the size of an authorizer policy with and without compaction.
+
+This creates an app with ``--routes`` routes spread over a number of
+resources, and an authorizer that allows every route except those under
+the ``/admin-*`` resources, which is the common case of a role that can
+call most of an API.  The policy is generated once with the allowed
+routes listed individually and once with ``AuthResponse(...,
+compact=True)``, and the number of resources, the size of the serialized
+policy and the time to generate it are printed.  API Gateway limits the
+size of a policy returned by an authorizer, which is what compaction
+helps with.
+
+Usage::
+
+    python scripts/performance/benchmark_auth_policy.py
+    python scripts/performance/benchmark_auth_policy.py --routes 1000
+
+"""
+import argparse
+import json
+import time
+
+from chalice import Chalice, AuthResponse, AuthRoute
+from chalice.app import AuthRequest
+
+
+ROUTES_PER_RESOURCE = 10
+METHOD_ARN = (
+    'arn:aws:execute-api:us-west-2:123456789012:abcdef1234/api/GET/')
+
+
+def create_app(num_routes):
+    app = Chalice(app_name='benchmark', configure_logs=False)
+    for i in range(num_routes):
+        resource = i // ROUTES_PER_RESOURCE
+        name = 'admin-%s' % resource if resource % 5 == 0 else \
+            'resource-%s' % resource
+        if i % ROUTES_PER_RESOURCE == 0:
+            path = '/%s/{id}' % name
+        else:
+            path = '/%s/action-%s' % (name, i % ROUTES_PER_RESOURCE)
+        app.route(path, methods=['GET', 'POST'])(lambda: {})
+    return app
+
+
+def allowed_routes(app):
+    # A route with path parameters is allowed for every value of them.
+    return [AuthRoute(path.replace('{id}', '*'), list(methods))
+            for path, methods in app.routes.items()
+            if not path.startswith('/admin-')]
+
+
+def measure(app, compact, iterations):
+    request = AuthRequest('TOKEN', 'token', METHOD_ARN)
+    response = AuthResponse(allowed_routes(app), 'principal',
+                            compact=compact)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        policy = response.to_dict(request, route_table=app.routes)
+    elapsed = (time.perf_counter() - start) / iterations
+    resources = policy['policyDocument']['Statement'][0]['Resource']
+    return len(resources), len(json.dumps(policy)), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--routes', type=int, default=500)
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+    app = create_app(args.routes)
+    print('%-12s %10s %12s %12s' % (
+        'policy', 'resources', 'size (KiB)', 'time (ms)'))
+    for compact in (False, True):
+        count, size, elapsed = measure(app, compact, args.iterations)
+        print('%-12s %10s %12.1f %12.2f' % (
+            'compact' if compact else 'full', count, size / 1024.0,
+            elapsed * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+"""Compare DynamoDB stream image conversion strategies.
+
+This converts the ``NewImage`` of every record in a batch to native
+python values with a recursive converter (similar to what handlers
+typically write themselves), boto3's ``TypeDeserializer`` if boto3 is
+installed, ``DynamoDBEvent.iter_images()``, and the lazy mode, where a
+handler only reads a couple of attributes from each image.
+
+Usage::
+
+    python scripts/performance/benchmark_dynamodb_images.py
+
+"""
+import argparse
+import decimal
+import timeit
+
+from chalice.app import DynamoDBEvent
+
+try:
+    from boto3.dynamodb.types import TypeDeserializer
+except ImportError:
+    TypeDeserializer = None
+
+
+def create_image(num_attributes):
+    image = {
+        'PK': {'S': 'customer#1234'},
+        'SK': {'S': 'order#5678'},
+        'Total': {'N': '123.45'},
+        'Quantity': {'N': '3'},
+        'Tags': {'SS': ['new', 'priority']},
+        'Address': {'M': {
+            'Street': {'S': '123 Main St'},
+            'City': {'S': 'Seattle'},
+            'Zip': {'N': '98101'},
+        }},
+        'Items': {'L': [
+            {'M': {'Sku': {'S': 'sku-%s' % i}, 'Price': {'N': '9.99'}}}
+            for i in range(5)
+        ]},
+    }
+    for i in range(num_attributes):
+        image['Attribute%s' % i] = {'S': 'value-%s' % i}
+    return image
+
+
+def create_event(num_records, num_attributes):
+    image = create_image(num_attributes)
+    return {'Records': [{
+        'dynamodb': {
+            'ApproximateCreationDateTime': 1601317140.0,
+            'Keys': {'PK': image['PK'], 'SK': image['SK']},
+            'NewImage': image,
+            'SequenceNumber': str(i),
+            'SizeBytes': 512,
+            'StreamViewType': 'NEW_IMAGE',
+        },
+        'eventName': 'INSERT',
+    } for i in range(num_records)]}
+
+
+def recursive_convert(value):
+    (type_name, raw), = value.items()
+    if type_name == 'M':
+        return {k: recursive_convert(v) for k, v in raw.items()}
+    if type_name == 'L':
+        return [recursive_convert(v) for v in raw]
+    if type_name == 'N':
+        return decimal.Decimal(raw)
+    if type_name in ('SS', 'NS', 'BS'):
+        return set(raw)
+    return raw
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=1000)
+    parser.add_argument('--attributes', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    event = DynamoDBEvent(create_event(args.records, args.attributes), None)
+    records = event.to_dict()['Records']
+
+    def recursive():
+        return [{k: recursive_convert(v)
+                 for k, v in r['dynamodb']['NewImage'].items()}
+                for r in records]
+
+    def iter_images():
+        return list(event.iter_images())
+
+    def lazy_partial_access():
+        return [(image['PK'], image['Total'])
+                for image in event.iter_images(lazy=True)]
+
+    scenarios = [('recursive', recursive)]
+    if TypeDeserializer is not None:
+        deserializer = TypeDeserializer()
+
+        def boto3_deserializer():
+            return [{k: deserializer.deserialize(v)
+                     for k, v in r['dynamodb']['NewImage'].items()}
+                    for r in records]
+        scenarios.append(('boto3 TypeDeserializer', boto3_deserializer))
+    scenarios.extend([('iter_images()', iter_images),
+                      ('iter_images(lazy=True), 2 attrs',
+                       lazy_partial_access)])
+    print('%-34s %14s' % ('scenario', 'us/record'))
+    for name, func in scenarios:
+        elapsed = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        print('%-34s %14.2f' % (name, elapsed / args.records * 1e6))
+
+
+if __name__ == '__main__':
+    main()
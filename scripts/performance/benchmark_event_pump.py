@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""Measure the throughput of an SQS handler with the local event pump.
+
+This registers an ``on_sqs_message`` handler for each batch size in
+``--batch-sizes`` that spends ``--per-batch-ms`` on every batch, the fixed
+cost of an invocation, and ``--per-record-ms`` on every record.  Then it
+sends ``--messages`` messages to each handler's queue with the
+``EventSourcePump`` used by ``chalice local --event-sources`` and waits
+until they've been handled.
+
+The output is a line per batch size with the records per second, the
+fill ratio of the batches and the percentiles of the handler latency.
+
+Usage::
+
+    python scripts/performance/benchmark_event_pump.py
+    python scripts/performance/benchmark_event_pump.py --batch-sizes 1 100
+
+"""
+import argparse
+import time
+
+from chalice import Chalice
+from chalice.localevents import EventSourcePump
+
+
+def create_app(batch_sizes, per_batch_ms, per_record_ms):
+    app = Chalice(app_name='benchmark', configure_logs=False)
+    for batch_size in batch_sizes:
+        def handler(event):
+            time.sleep(per_batch_ms / 1000.0)
+            for _ in event:
+                time.sleep(per_record_ms / 1000.0)
+        handler.__name__ = 'handler_%s' % batch_size
+        app.on_sqs_message(queue='queue-%s' % batch_size,
+                           batch_size=batch_size)(handler)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+',
+                        default=[1, 10, 100])
+    parser.add_argument('--per-batch-ms', type=float, default=1.0)
+    parser.add_argument('--per-record-ms', type=float, default=0.0)
+    args = parser.parse_args()
+    app = create_app(args.batch_sizes, args.per_batch_ms,
+                     args.per_record_ms)
+    print('%-10s %12s %8s %10s %10s' % (
+        'batch size', 'records/s', 'fill', 'p50 (ms)', 'p99 (ms)'))
+    with EventSourcePump(app) as pump:
+        for batch_size in args.batch_sizes:
+            pump.send_sqs_messages(
+                'queue-%s' % batch_size,
+                ['message-%s' % i for i in range(args.messages)])
+            pump.wait_until_idle()
+        for stats in sorted(pump.get_stats(), key=lambda s: s.batch_size):
+            print('%-10s %12.1f %8.2f %10.2f %10.2f' % (
+                stats.batch_size, stats.records_per_second,
+                stats.fill_ratio, stats.percentile(50),
+                stats.percentile(99)))
+
+
+if __name__ == '__main__':
+    main()
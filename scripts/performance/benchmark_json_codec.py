@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""Compare JSON codecs on realistic request/response payload sizes.
+
+This measures ``Response.to_dict()`` (serialization) and
+``Request.json_body`` (parsing) for each available codec.  The
+``OrjsonCodec`` results are only meaningful if ``orjson`` is installed,
+otherwise it falls back to the stdlib json module.
+
+Usage::
+
+    python scripts/performance/benchmark_json_codec.py
+
+"""
+import argparse
+import decimal
+import json
+import timeit
+
+from chalice.app import JSONCodec, OrjsonCodec, Request, Response
+
+
+PAYLOAD_SIZES = {
+    'small': 1,
+    'medium': 100,
+    'large': 5000,
+}
+
+
+def create_payload(num_items):
+    return {
+        'items': [
+            {
+                'id': 'item-%s' % i,
+                'name': 'Item number %s' % i,
+                'price': decimal.Decimal('%s.99' % i),
+                'quantity': i,
+                'tags': ['alpha', 'beta', 'gamma'],
+                'in_stock': i % 2 == 0,
+                'attributes': {'color': 'blue', 'size': 'M', 'weight': 1.5},
+            } for i in range(num_items)
+        ],
+        'next_token': 'abcdefghijklmnopqrstuvwxyz',
+    }
+
+
+def create_request(body, codec):
+    event = {
+        'requestContext': {'httpMethod': 'POST', 'resourcePath': '/'},
+        'headers': {'content-type': 'application/json'},
+        'pathParameters': {},
+        'multiValueQueryStringParameters': None,
+        'body': body,
+        'stageVariables': {},
+    }
+    return Request(event, json_codec=codec)
+
+
+def time_per_call(func, number, repeat):
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    codecs = [('stdlib', JSONCodec()), ('orjson', OrjsonCodec())]
+    # pylint: disable=protected-access
+    if codecs[1][1]._orjson is None:
+        print('orjson is not installed, OrjsonCodec uses the stdlib '
+              'json module.')
+    print('%-8s %-8s %12s %12s %10s' % (
+        'payload', 'codec', 'dumps (us)', 'loads (us)', 'bytes'))
+    for size_name, num_items in PAYLOAD_SIZES.items():
+        payload = create_payload(num_items)
+        body = json.dumps(payload, default=float)
+        number = max(1, 20000 // num_items)
+        for codec_name, codec in codecs:
+            response = Response(body=payload)
+            dumps = time_per_call(
+                lambda: response.to_dict(json_codec=codec),
+                number, args.repeat)
+
+            def parse():
+                return create_request(body, codec).json_body
+            loads = time_per_call(parse, number, args.repeat)
+            print('%-8s %-8s %12.2f %12.2f %10d' % (
+                size_name, codec_name, dumps * 1e6, loads * 1e6, len(body)))
+
+
+if __name__ == '__main__':
+    main()
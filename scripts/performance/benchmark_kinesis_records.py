@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""Measure time and peak memory for iterating over a Kinesis batch.
+
+``KinesisRecord`` only base64 decodes its payload when ``.data`` is
+accessed.  This compares a handler that filters records by partition key
+without reading their payload, one that reads every payload through
+``KinesisRecord.data``, and one that uses ``KinesisEvent.iter_data()``,
+which doesn't create a record object for each payload.  The eager
+baseline decodes every payload up front, which is what creating a
+``KinesisRecord`` used to do.
+
+Usage::
+
+    python scripts/performance/benchmark_kinesis_records.py
+    python scripts/performance/benchmark_kinesis_records.py \\
+        --records 10000 --record-size 1048576
+
+"""
+import argparse
+import base64
+import gc
+import time
+import tracemalloc
+
+from chalice.app import KinesisEvent
+
+
+def create_event(num_records, record_size):
+    payload = base64.b64encode(b'x' * record_size).decode('ascii')
+    return {
+        'Records': [{
+            'kinesis': {
+                'kinesisSchemaVersion': '1.0',
+                'partitionKey': str(i % 10),
+                'sequenceNumber': str(i),
+                'data': payload,
+                'approximateArrivalTimestamp': 1545084650.987,
+            },
+            'eventSource': 'aws:kinesis',
+        } for i in range(num_records)]
+    }
+
+
+def eager_decode(event):
+    payloads = [base64.b64decode(record['kinesis']['data'])
+                for record in event.to_dict()['Records']]
+    return sum(len(payload) for payload in payloads)
+
+
+def filter_by_partition_key(event):
+    return sum(1 for record in event if record.partition_key == '0')
+
+
+def read_records(event):
+    return sum(len(record.data) for record in event)
+
+
+def read_iter_data(event):
+    return sum(len(data) for data in event.iter_data())
+
+
+def measure(func, event):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(event)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=10000)
+    parser.add_argument('--record-size', type=int, default=1024)
+    args = parser.parse_args()
+    event = KinesisEvent(create_event(args.records, args.record_size), None)
+    print('%-28s %12s %14s' % ('scenario', 'time (ms)', 'peak (KiB)'))
+    for name, func in [('eager decode (baseline)', eager_decode),
+                       ('filter by partition key', filter_by_partition_key),
+                       ('KinesisRecord.data', read_records),
+                       ('KinesisEvent.iter_data()', read_iter_data)]:
+        elapsed, peak = measure(func, event)
+        print('%-28s %12.2f %14.1f' % (name, elapsed * 1000, peak / 1024.0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""Measure the request throughput of ``chalice local``.
+
+This starts a ``LocalDevServer`` for an app with ``--routes`` routes on an
+ephemeral port and sends ``--requests`` GET requests to it from
+``--concurrency`` client threads.  Each request uses a new connection, as
+clients that don't use keep-alive do, which creates a new request
+handler on the server.  The server is measured once with the
+``LocalGateway`` that the ``LocalDevServer`` shares across connections,
+and once with a new ``LocalGateway`` created for every connection, which
+is what ``chalice local`` used to do.
+
+The output is a single line per mode, so the requests per second can be
+tracked in CI.
+
+Usage::
+
+    python scripts/performance/benchmark_local_throughput.py
+    python scripts/performance/benchmark_local_throughput.py --routes 400
+
+"""
+import argparse
+import threading
+import time
+from http.client import HTTPConnection
+
+from chalice import Chalice
+from chalice.config import Config
+from chalice.local import ChaliceRequestHandler, LocalDevServer
+
+
+class PerConnectionGatewayHandler(ChaliceRequestHandler):
+    def __init__(self, request, client_address, server, app_object, config,
+                 local_gateway=None):
+        super(PerConnectionGatewayHandler, self).__init__(
+            request, client_address, server, app_object, config)
+
+    def log_message(self, *args):
+        pass
+
+
+class QuietHandler(ChaliceRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def create_app(num_routes):
+    app = Chalice(app_name='benchmark', configure_logs=False)
+    for i in range(num_routes):
+        app.route('/resource-%s/{name}' % i)(lambda name: {'name': name})
+    return app
+
+
+def send_requests(port, paths, errors):
+    for path in paths:
+        connection = HTTPConnection('127.0.0.1', port)
+        try:
+            connection.request('GET', path, headers={'Connection': 'close'})
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+        finally:
+            connection.close()
+
+
+def measure(app, handler_cls, num_routes, num_requests, concurrency):
+    server = LocalDevServer(app, Config(), '127.0.0.1', 0,
+                            handler_cls=handler_cls)
+    port = server.server.server_address[1]
+    thread = threading.Thread(target=server.server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    paths = ['/resource-%s/name' % (i % num_routes)
+             for i in range(num_requests)]
+    errors = []
+    clients = [
+        threading.Thread(target=send_requests,
+                         args=(port, paths[i::concurrency], errors))
+        for i in range(concurrency)
+    ]
+    start = time.perf_counter()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+    server.server.server_close()
+    return num_requests / elapsed, len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--routes', type=int, default=400)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=4)
+    args = parser.parse_args()
+    app = create_app(args.routes)
+    print('%-16s %12s %8s' % ('gateway', 'requests/s', 'errors'))
+    for name, handler_cls in (('per-connection', PerConnectionGatewayHandler),
+                              ('shared', QuietHandler)):
+        throughput, errors = measure(app, handler_cls, args.routes,
+                                     args.requests, args.concurrency)
+        print('%-16s %12.1f %8s' % (name, throughput, errors))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""Measure memory allocated per ``Request`` with tracemalloc.
+
+The ``Request`` object only builds its ``headers`` and ``query_params``
+views when they're accessed.  This compares the memory allocated per
+request for a view that ignores them against one that reads both (which
+is what every request used to pay for), as well as the full dispatch
+path through ``Chalice.__call__``.
+
+Usage::
+
+    python scripts/performance/benchmark_request_allocations.py
+
+"""
+import argparse
+import gc
+import tracemalloc
+
+from chalice import Chalice
+from chalice.app import Request
+
+
+def create_event(num_headers, num_query_params):
+    headers = {'X-Custom-Header-%s' % i: 'value-%s' % i
+               for i in range(num_headers)}
+    headers['Content-Type'] = 'application/json'
+    return {
+        'requestContext': {
+            'httpMethod': 'GET',
+            'resourcePath': '/resource/{name}',
+        },
+        'headers': headers,
+        'pathParameters': {'name': 'foo'},
+        'multiValueQueryStringParameters': {
+            'param%s' % i: ['value'] for i in range(num_query_params)
+        },
+        'body': None,
+        'stageVariables': {},
+    }
+
+
+def measure(func, count):
+    # Returns the (bytes, number of blocks) still allocated per call
+    # after ``count`` calls, keeping every result alive so nothing is
+    # freed before the snapshot is taken.
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    results = [func() for _ in range(count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, 'filename')
+    size = sum(stat.size_diff for stat in stats)
+    blocks = sum(stat.count_diff for stat in stats)
+    del results
+    return size / count, blocks / count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--headers', type=int, default=20)
+    parser.add_argument('--query-params', type=int, default=5)
+    parser.add_argument('--count', type=int, default=10000)
+    args = parser.parse_args()
+    event = create_event(args.headers, args.query_params)
+
+    def lazy_request():
+        return Request(event)
+
+    def eager_request():
+        request = Request(event)
+        request.headers
+        request.query_params
+        return request
+
+    app = Chalice('benchmark', configure_logs=False)
+
+    @app.route('/resource/{name}')
+    def resource(name):
+        return {'name': name}
+
+    def dispatch():
+        app(event, None)
+        return app.current_request
+
+    print('%-28s %12s %12s' % ('scenario', 'bytes/req', 'blocks/req'))
+    for name, func in [('Request (lazy)', lazy_request),
+                       ('Request (headers + query)', eager_request),
+                       ('Chalice.__call__', dispatch)]:
+        size, blocks = measure(func, args.count)
+        print('%-28s %12.1f %12.1f' % (name, size, blocks))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"""Measure the latency of a REST API request with and without a cache.
+
+This dispatches the same GET request to a route that builds a list of
+items, once without a response cache and once with
+``cache=CacheConfig(...)``, where every request after the first is served
+from the cache without calling the view function or serializing its
+return value.
+
+Usage::
+
+    python scripts/performance/benchmark_response_cache.py
+    python scripts/performance/benchmark_response_cache.py --items 1000
+
+"""
+import argparse
+import time
+
+from chalice import Chalice, CacheConfig
+
+
+def create_app(num_items):
+    app = Chalice(app_name='benchmark', configure_logs=False)
+    items = [{'id': i, 'name': 'item-%s' % i, 'tags': ['a', 'b']}
+             for i in range(num_items)]
+
+    @app.route('/uncached/{group}')
+    def uncached(group):
+        return {'group': group, 'items': items}
+
+    @app.route('/cached/{group}', cache=CacheConfig(ttl=60))
+    def cached(group):
+        return {'group': group, 'items': items}
+
+    return app
+
+
+def create_event(path):
+    return {
+        'requestContext': {'httpMethod': 'GET', 'resourcePath': path},
+        'headers': {'accept': 'application/json'},
+        'pathParameters': {'group': 'a'},
+        'multiValueQueryStringParameters': None,
+        'body': None,
+        'stageVariables': {},
+    }
+
+
+def measure(app, event, requests):
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        app(event, None)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[
+        int(len(latencies) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+    app = create_app(args.items)
+    print('%-12s %12s %12s' % ('route', 'p50 (us)', 'p99 (us)'))
+    for name in ('uncached', 'cached'):
+        p50, p99 = measure(app, create_event('/%s/{group}' % name),
+                           args.requests)
+        print('%-12s %12.1f %12.1f' % (name, p50 * 1e6, p99 * 1e6))
+
+
+if __name__ == '__main__':
+    main()
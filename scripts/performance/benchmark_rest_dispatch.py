@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""Measure the per-invocation overhead of REST API dispatch.
+
+This compares the cost of building a new ``RestAPIEventHandler`` and
+middleware chain on every invocation (the previous behavior of
+``Chalice.__call__``) against reusing the handler that the app builds
+once and keeps across warm invocations.
+
+Usage::
+
+    python scripts/performance/benchmark_rest_dispatch.py --middleware 5
+
+"""
+import argparse
+import timeit
+
+from chalice import Chalice
+from chalice.app import RestAPIEventHandler
+
+
+def create_app(num_middleware):
+    app = Chalice('benchmark', configure_logs=False)
+
+    for _ in range(num_middleware):
+        def middleware(event, get_response):
+            return get_response(event)
+        app.register_middleware(middleware, 'http')
+
+    @app.route('/resource/{name}')
+    def resource(name):
+        return {'name': name}
+
+    return app
+
+
+def create_event():
+    return {
+        'requestContext': {
+            'httpMethod': 'GET',
+            'resourcePath': '/resource/{name}',
+        },
+        'headers': {'Content-Type': 'application/json'},
+        'pathParameters': {'name': 'foo'},
+        'multiValueQueryStringParameters': None,
+        'body': None,
+        'stageVariables': {},
+    }
+
+
+def per_invocation_handler(app, event):
+    # This mirrors what Chalice.__call__ used to do on every request.
+    handler = RestAPIEventHandler(
+        app.routes, app.api, app.log, app.debug,
+        middleware_handlers=app._get_middleware_handlers('http'),
+    )
+    request = handler.create_request_object(event, None)
+    app.current_request = request
+    return handler.dispatch(request)
+
+
+def reused_handler(app, event):
+    return app(event, None)
+
+
+def run_benchmark(name, func, app, event, number, repeat):
+    timings = timeit.repeat(lambda: func(app, event),
+                            number=number, repeat=repeat)
+    best = min(timings) / number * 1e6
+    print('%-24s %8.2f us/invocation' % (name, best))
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--middleware', type=int, default=5,
+                        help='Number of http middleware to register.')
+    parser.add_argument('--number', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    app = create_app(args.middleware)
+    event = create_event()
+    before = run_benchmark('per-invocation handler', per_invocation_handler,
+                           app, event, args.number, args.repeat)
+    after = run_benchmark('reused handler', reused_handler,
+                          app, event, args.number, args.repeat)
+    print('Overhead saved: %.2f us/invocation (%.1f%%)' % (
+        before - after, (before - after) / before * 100))
+
+
+if __name__ == '__main__':
+    main()
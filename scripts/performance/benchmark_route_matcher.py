@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""Measure the latency of matching a URL to a route in ``chalice local``.
+
+This creates ``--routes`` synthetic routes spread over resources with
+static and ``{capture}`` segments and matches URLs for the first, middle
+and last routes with the ``RouteMatcher`` used by ``chalice local`` and
+``chalice.test.Client``.  For comparison, the same URLs are matched by
+scanning every route, which is how routes were matched before the
+``RouteMatcher`` used a trie of route segments.
+
+Usage::
+
+    python scripts/performance/benchmark_route_matcher.py
+    python scripts/performance/benchmark_route_matcher.py --routes 5000
+
+"""
+import argparse
+import time
+
+from chalice.local import RouteMatcher
+
+
+ROUTES_PER_RESOURCE = 10
+
+
+class LinearRouteMatcher(object):
+    def __init__(self, route_urls):
+        self.route_urls = sorted(route_urls)
+
+    def match_route(self, url):
+        parts = url.split('/')
+        captured = {}
+        for route_url in self.route_urls:
+            url_parts = route_url.split('/')
+            if len(parts) == len(url_parts):
+                for i, j in zip(parts, url_parts):
+                    if j.startswith('{') and j.endswith('}'):
+                        captured[j[1:-1]] = i
+                        continue
+                    if i != j:
+                        break
+                else:
+                    return route_url
+        raise ValueError(url)
+
+
+def create_routes(num_routes):
+    routes = []
+    for i in range(num_routes):
+        resource = 'resource-%s' % (i // ROUTES_PER_RESOURCE)
+        if i % ROUTES_PER_RESOURCE == 0:
+            routes.append('/%s/{id}' % resource)
+        else:
+            routes.append('/%s/{id}/action-%s' % (
+                resource, i % ROUTES_PER_RESOURCE))
+    return routes
+
+
+def create_urls(routes):
+    sorted_routes = sorted(routes)
+    selected = [sorted_routes[0], sorted_routes[len(routes) // 2],
+                sorted_routes[-1]]
+    return [route.replace('{id}', '1234') for route in selected]
+
+
+def measure(matcher, urls, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for url in urls:
+            matcher.match_route(url)
+    return (time.perf_counter() - start) / (iterations * len(urls))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--routes', type=int, default=2000)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+    routes = create_routes(args.routes)
+    urls = create_urls(routes)
+    print('%-10s %14s' % ('matcher', 'match (us)'))
+    for name, matcher_cls in (('linear', LinearRouteMatcher),
+                              ('trie', RouteMatcher)):
+        elapsed = measure(matcher_cls(routes), urls, args.iterations)
+        print('%-10s %14.1f' % (name, elapsed * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -285,6 +285,43 @@ def test_can_package_with_single_file(runner):
                 'deployment.zip', 'sam.json']
 
 
+def test_can_generate_cold_start_report(runner):
+    with runner.isolated_filesystem():
+        newproj.create_new_project_skeleton('testproject')
+        os.chdir('testproject')
+        with open('app.py', 'w') as f:
+            f.write(
+                'import xml.dom.minidom\n'
+                'from chalice import Chalice\n'
+                'app = Chalice(app_name="testproject")\n'
+                '@app.route("/")\n'
+                'def index():\n'
+                '    return {"hello": "world"}\n'
+            )
+        result = _run_cli_command(
+            runner, cli.cold_start_report, ['--heavy-ms', '0'])
+        assert result.exit_code == 0, result.output
+        assert 'Total import time' in result.output
+        unused = result.output.split(
+            'Heavy packages not referenced by any handler:')[1]
+        assert 'xml' in unused
+        assert 'chalice' not in unused
+
+
+def test_cold_start_report_shows_import_errors(runner):
+    with runner.isolated_filesystem():
+        newproj.create_new_project_skeleton('testproject')
+        os.chdir('testproject')
+        with zipfile.ZipFile('deployment.zip', 'w') as f:
+            f.writestr('app.py', 'import doesnotexist\n')
+        result = _run_cli_command(
+            runner, cli.cold_start_report,
+            ['--deployment-package', 'deployment.zip'])
+        assert result.exit_code == 1
+        assert 'Unable to import app' in result.output
+        assert 'doesnotexist' in result.output
+
+
 def test_package_terraform_err_with_single_file_or_merge(runner):
     with runner.isolated_filesystem():
         newproj.create_new_project_skeleton('testproject')
@@ -11,6 +11,8 @@ from chalice.deploy.deployer import Deployer, DeploymentReporter
 from chalice.config import Config
 from chalice.config import DeployedResources
 from chalice import local
+from chalice.containerpool import ContainerPool
+from chalice.localevents import EventSourceServer
 from chalice.package import PackageOptions
 from chalice.utils import UI
 from chalice import Chalice
@@ -221,6 +223,25 @@ def test_can_create_local_server(clifactory):
     assert server.port == 8000
 
 
+def test_can_create_container_pool(clifactory):
+    config = clifactory.create_config_obj()
+    pool = clifactory.create_container_pool(config)
+    assert isinstance(pool, ContainerPool)
+    assert pool.max_containers is None
+
+
+def test_can_create_event_source_server(clifactory):
+    app = clifactory.load_chalice_app()
+    config = clifactory.create_config_obj()
+    server = clifactory.create_event_source_server(app, config,
+                                                   '127.0.0.1', 0)
+    try:
+        assert isinstance(server, EventSourceServer)
+        assert server.pump.sources == []
+    finally:
+        server.server.server_close()
+
+
 def test_can_create_deployment_reporter(clifactory):
     ui = UI()
     reporter = clifactory.create_deployment_reporter(ui=ui)
@@ -3604,6 +3604,58 @@ def test_can_create_kinesis_event_source(stubbed_session):
     stubbed_session.verify_stubs()
 
 
+def test_can_create_stream_event_source_with_options(stubbed_session):
+    kinesis_arn = 'arn:aws:kinesis:us-west-2:...:stream/MyStream'
+    lambda_stub = stubbed_session.stub('lambda')
+    lambda_stub.create_event_source_mapping(
+        EventSourceArn=kinesis_arn,
+        FunctionName='myfunction',
+        BatchSize=100,
+        StartingPosition='LATEST',
+        MaximumBatchingWindowInSeconds=0,
+        FunctionResponseTypes=['ReportBatchItemFailures'],
+        BisectBatchOnFunctionError=True,
+        MaximumRetryAttempts=3,
+        ParallelizationFactor=10,
+    ).returns({'UUID': 'my-uuid'})
+
+    stubbed_session.activate_stubs()
+    client = TypedAWSClient(stubbed_session)
+    result = client.create_lambda_event_source(
+        kinesis_arn, 'myfunction', 100, 'LATEST',
+        report_batch_item_failures=True,
+        bisect_batch_on_function_error=True,
+        maximum_retry_attempts=3,
+        parallelization_factor=10,
+    )
+    assert result == 'my-uuid'
+    stubbed_session.verify_stubs()
+
+
+def test_can_update_stream_event_source_options(stubbed_session):
+    lambda_stub = stubbed_session.stub('lambda')
+    lambda_stub.update_event_source_mapping(
+        UUID='my-uuid',
+        BatchSize=5,
+        MaximumBatchingWindowInSeconds=0,
+        FunctionResponseTypes=[],
+        BisectBatchOnFunctionError=False,
+        MaximumRetryAttempts=-1,
+        ParallelizationFactor=1,
+    ).returns({})
+
+    stubbed_session.activate_stubs()
+    client = TypedAWSClient(stubbed_session)
+    client.update_lambda_event_source(
+        event_uuid='my-uuid', batch_size=5,
+        report_batch_item_failures=False,
+        bisect_batch_on_function_error=False,
+        maximum_retry_attempts=-1,
+        parallelization_factor=1,
+    )
+    stubbed_session.verify_stubs()
+
+
 def test_can_create_kinesis_event_source_batching_window(stubbed_session):
     kinesis_arn = 'arn:aws:kinesis:us-west-2:...:stream/MyStream'
     function_name = 'myfunction'
@@ -3655,6 +3707,50 @@ def test_can_create_sqs_event_source(stubbed_session):
     stubbed_session.verify_stubs()
 
 
+def test_can_create_event_source_with_batch_item_failures(stubbed_session):
+    lambda_stub = stubbed_session.stub('lambda')
+    lambda_stub.create_event_source_mapping(
+        EventSourceArn='arn:sqs:queue-name',
+        FunctionName='myfunction',
+        BatchSize=10,
+        MaximumBatchingWindowInSeconds=0,
+        FunctionResponseTypes=['ReportBatchItemFailures'],
+    ).returns({'UUID': 'my-uuid'})
+
+    stubbed_session.activate_stubs()
+    client = TypedAWSClient(stubbed_session)
+    result = client.create_lambda_event_source(
+        'arn:sqs:queue-name', 'myfunction', 10,
+        report_batch_item_failures=True,
+    )
+    assert result == 'my-uuid'
+    stubbed_session.verify_stubs()
+
+
+@pytest.mark.parametrize('enabled,response_types', [
+    (True, ['ReportBatchItemFailures']),
+    (False, []),
+])
+def test_can_update_event_source_batch_item_failures(stubbed_session,
+                                                     enabled,
+                                                     response_types):
+    lambda_stub = stubbed_session.stub('lambda')
+    lambda_stub.update_event_source_mapping(
+        UUID='my-uuid',
+        BatchSize=5,
+        MaximumBatchingWindowInSeconds=0,
+        FunctionResponseTypes=response_types,
+    ).returns({})
+
+    stubbed_session.activate_stubs()
+    client = TypedAWSClient(stubbed_session)
+    client.update_lambda_event_source(
+        event_uuid='my-uuid', batch_size=5,
+        report_batch_item_failures=enabled,
+    )
+    stubbed_session.verify_stubs()
+
+
 def test_can_retry_create_sqs_event_source(stubbed_session):
     queue_arn = 'arn:sqs:queue-name'
     function_name = 'myfunction'
@@ -9,6 +9,7 @@ import json
 import subprocess
 from contextlib import contextmanager
 
+import boto3
 import pytest
 import requests
 from urllib3.util.retry import Retry
@@ -16,6 +17,10 @@ from requests.adapters import HTTPAdapter
 
 from chalice import app
 from chalice.local import create_local_server
+from chalice.local import LocalWebsocketManagementEndpoint
+from chalice.local import LambdaEventConverter
+from chalice.local import RouteMatcher
+from chalice.containerpool import ContainerPool
 from chalice.config import Config
 from chalice.utils import OSUtils
 
@@ -223,6 +228,90 @@ def test_can_get_unicode_string_content_length(
     assert response.headers['Content-Length'] == '3'
 
 
+def test_can_stream_response(config, local_server_factory):
+    demo = app.Chalice('app-name')
+    second_chunk_requested = Event()
+
+    @demo.route('/')
+    def index_view():
+        def generate():
+            yield '{"first": true}\n'
+            second_chunk_requested.set()
+            yield '{"second": true}\n'
+        return app.StreamingResponse(
+            generate(), headers={'Content-Type': 'application/x-ndjson'})
+
+    local_server, port = local_server_factory(demo, config)
+    local_server.wait_for_server_ready()
+    response = requests.get(
+        'http://localhost:%s/' % port, stream=True, timeout=2)
+    assert response.headers['Transfer-Encoding'] == 'chunked'
+    lines = response.iter_lines()
+    assert json.loads(next(lines)) == {'first': True}
+    assert json.loads(next(lines)) == {'second': True}
+    assert second_chunk_requested.is_set()
+    assert list(lines) == []
+
+
+def test_can_compress_response(config, local_server_factory):
+    demo = app.Chalice('app-name')
+    demo.api.binary_types.append('*/*')
+    demo.register_middleware(app.CompressionMiddleware(), 'http')
+
+    @demo.route('/')
+    def index_view():
+        return {'data': 'a' * 2000}
+
+    local_server, port = local_server_factory(demo, config)
+    response = local_server.make_call(requests.get, '/', port)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert int(response.headers['Content-Length']) < 2000
+    # requests decompresses the body.
+    assert response.json() == {'data': 'a' * 2000}
+
+
+def test_can_make_conditional_get_request(config, local_server_factory):
+    demo = app.Chalice('app-name')
+
+    @demo.route('/', etag=True)
+    def index_view():
+        return {'hello': 'world'}
+
+    local_server, port = local_server_factory(demo, config)
+    response = local_server.make_call(requests.get, '/', port)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    response = requests.get('http://localhost:%s/' % port,
+                            headers={'If-None-Match': etag}, timeout=0.5)
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    assert response.content == b''
+
+
+def test_can_broadcast_to_local_websocket_endpoint():
+    websocket_api = app.WebsocketAPI()
+    websocket_api.session = boto3.Session(
+        aws_access_key_id='foo', aws_secret_access_key='bar',
+        region_name='us-west-2')
+    with LocalWebsocketManagementEndpoint() as endpoint:
+        websocket_api.configure_endpoint_url(endpoint.endpoint_url)
+        connected = ['connection-%s=' % i for i in range(20)]
+        for connection_id in connected:
+            endpoint.add_connection(connection_id)
+
+        gone = websocket_api.broadcast(connected + ['gone'], 'hello')
+
+        assert gone == {'gone'}
+        assert all(endpoint.messages(connection_id) == [b'hello']
+                   for connection_id in connected)
+        info = websocket_api.info(connected[0])
+        assert info['Identity']['SourceIp'] == '127.0.0.1'
+        websocket_api.close(connected[0])
+        assert connected[0] not in endpoint.connection_ids
+        with pytest.raises(app.WebsocketDisconnectedError):
+            websocket_api.send(connected[0], 'hello')
+
+
 def test_can_accept_options_request(config, sample_app, local_server_factory):
     local_server, port = local_server_factory(sample_app, config)
     response = local_server.make_call(requests.options, '/test-cors', port)
@@ -301,6 +390,25 @@ def _assert_env_var_loaded(port_number, http_session):
     assert response == {'hello': 'bar'}
 
 
+def test_can_invoke_app_in_container():
+    config = Config.create(project_dir=ENV_APP_DIR,
+                           environment_variables={'FOO': 'bar'})
+    pool = ContainerPool.from_config(config)
+    event = LambdaEventConverter(RouteMatcher(['/'])).create_lambda_event(
+        'GET', '/', {}, None)
+    try:
+        response, report = pool.invoke(event, 'request-1')
+        assert json.loads(response['body']) == {'hello': 'bar'}
+        assert report.cold_start
+        assert report.init_duration_ms > 0
+        response, report = pool.invoke(event, 'request-2')
+        assert json.loads(response['body']) == {'hello': 'bar'}
+        assert not report.cold_start
+        assert pool.get_stats()['containers'] == 1
+    finally:
+        pool.shutdown()
+
+
 def test_can_reload_server(unused_tcp_port, basic_app, http_session):
     with cd(basic_app):
         p = subprocess.Popen(['chalice', 'local', '--port',
@@ -21,6 +21,32 @@ def test_cannot_run_local_mode_with_trailing_slash_route():
     assert str(e.value) == 'Route cannot end with a trailing slash: foobar/'
 
 
+def test_can_create_local_server_with_container_pool():
+    factory = mock.Mock(spec=CLIFactory)
+    config = factory.create_config_obj.return_value
+    config.chalice_app.routes = {}
+    server = cli.create_local_server(factory, 'localhost', 8000, 'dev',
+                                     emulate_concurrency=True)
+    factory.create_container_pool.assert_called_with(config)
+    factory.create_local_server.assert_called_with(
+        config.chalice_app, config, 'localhost', 8000, None,
+        factory.create_container_pool.return_value, None)
+    assert server is factory.create_local_server.return_value
+
+
+def test_can_create_local_server_with_event_sources():
+    factory = mock.Mock(spec=CLIFactory)
+    config = factory.create_config_obj.return_value
+    config.chalice_app.routes = {}
+    cli.create_local_server(factory, 'localhost', 8000, 'dev',
+                            event_sources_port=8001)
+    factory.create_event_source_server.assert_called_with(
+        config.chalice_app, config, 'localhost', 8001)
+    factory.create_local_server.assert_called_with(
+        config.chalice_app, config, 'localhost', 8000, None, None,
+        factory.create_event_source_server.return_value)
+
+
 def test_get_system_info():
     system_info = cli.get_system_info()
     assert re.match(r'python\s*([\d.]+),?\s*(.*) (.*)', system_info)
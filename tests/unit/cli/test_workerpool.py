@@ -0,0 +1,132 @@
+import os
+import socket
+import threading
+from unittest import mock
+
+from chalice.cli import workerpool
+from chalice.local import LocalDevServer
+
+
+class FakeProcess(object):
+    def __init__(self, returncode=None):
+        self.returncode = returncode
+        self.terminated = False
+
+    def poll(self):
+        return self.returncode
+
+    def terminate(self):
+        self.terminated = True
+        self.returncode = -15
+
+    def wait(self):
+        return self.returncode
+
+
+class RecordingPopen(object):
+    def __init__(self, returncodes=None):
+        self.recorded_args = []
+        self.processes = []
+        self._returncodes = returncodes or []
+
+    def __call__(self, *args, **kwargs):
+        self.recorded_args.append((args, kwargs))
+        returncode = None
+        if self._returncodes:
+            returncode = self._returncodes.pop(0)
+        process = FakeProcess(returncode)
+        self.processes.append(process)
+        return process
+
+
+def start_pool(pool):
+    thread = threading.Thread(target=pool.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def wait_for_workers(popen, num_workers):
+    for _ in range(100):
+        if len(popen.recorded_args) == num_workers:
+            return
+        threading.Event().wait(0.01)
+
+
+def test_listening_socket_can_be_inherited():
+    sock = workerpool.create_listening_socket('127.0.0.1', 0)
+    try:
+        assert sock.getsockname()[1] != 0
+        assert sock.get_inheritable()
+    finally:
+        sock.close()
+
+
+def test_pool_starts_workers_with_shared_socket():
+    popen = RecordingPopen()
+    pool = workerpool.WorkerPool('127.0.0.1', 0, 3, {'foo': 'bar'},
+                                 popen=popen)
+    thread = start_pool(pool)
+    wait_for_workers(popen, 3)
+
+    pool.shutdown()
+    thread.join(5)
+
+    assert not thread.is_alive()
+    assert len(popen.recorded_args) == 3
+    for _, kwargs in popen.recorded_args:
+        socket_fd = kwargs['env'][workerpool.SOCKET_FD_ENV_VAR]
+        assert kwargs['env']['foo'] == 'bar'
+        assert kwargs['pass_fds'] == (int(socket_fd),)
+    assert all(p.terminated for p in popen.processes)
+
+
+def test_pool_stops_all_workers_if_one_exits():
+    popen = RecordingPopen(returncodes=[None, 1])
+    pool = workerpool.WorkerPool('127.0.0.1', 0, 2, {}, popen=popen)
+    pool.POLL_INTERVAL = 0.01
+
+    pool.serve_forever()
+
+    assert popen.processes[0].terminated
+    assert not popen.processes[1].terminated
+
+
+def test_no_workers_started_after_shutdown():
+    popen = RecordingPopen()
+    pool = workerpool.WorkerPool('127.0.0.1', 0, 2, {}, popen=popen)
+
+    pool.shutdown()
+    pool.serve_forever()
+
+    assert popen.recorded_args == []
+
+
+def test_worker_shuts_down_when_orphaned():
+    server = mock.Mock(spec=LocalDevServer)
+    # A parent pid that doesn't match the real parent means the worker
+    # was reparented.
+    workerpool.shutdown_when_orphaned(server, os.getppid() + 1, 0.01)
+    server.shutdown.assert_called_with()
+
+
+def test_run_worker_serves_on_inherited_socket():
+    sock = workerpool.create_listening_socket('127.0.0.1', 0)
+    server = mock.Mock(spec=LocalDevServer)
+    servers = []
+
+    def server_factory(worker_sock):
+        servers.append(worker_sock)
+        return server
+
+    try:
+        workerpool.run_worker(server_factory, os.dup(sock.fileno()))
+        worker_sock = servers[0]
+        assert worker_sock.getsockname() == sock.getsockname()
+        assert worker_sock.gettimeout() == workerpool.WorkerPool.POLL_INTERVAL
+        assert worker_sock.type == socket.SOCK_STREAM
+        server.serve_forever.assert_called_with()
+    finally:
+        sock.close()
+        for worker_sock in servers:
+            worker_sock.close()
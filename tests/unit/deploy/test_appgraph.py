@@ -583,6 +583,23 @@ class TestApplicationGraphBuilder(object):
         assert lambda_function.resource_name == 'new_handler'
         assert lambda_function.handler == 'app.new_handler'
 
+    def test_can_create_sqs_handler_with_batch_item_failures(
+            self, sample_sqs_event_app):
+        @sample_sqs_event_app.on_sqs_message(
+            queue='myqueue', report_batch_item_failures=True)
+        def record_handler(record):
+            pass
+
+        config = self.create_config(sample_sqs_event_app,
+                                    app_name='sqs-event-app',
+                                    autogen_policy=True)
+        builder = ApplicationGraphBuilder()
+        application = builder.build(config, stage_name='dev')
+        assert not application.resources[0].report_batch_item_failures
+        sqs_event = application.resources[1]
+        assert sqs_event.report_batch_item_failures
+        assert sqs_event.lambda_function.handler == 'app.record_handler'
+
     def test_can_create_kinesis_event_handler(self, sample_kinesis_event_app):
         config = self.create_config(sample_kinesis_event_app,
                                     app_name='kinesis-event-app',
@@ -598,6 +615,26 @@ class TestApplicationGraphBuilder(object):
         assert lambda_function.resource_name == 'handler'
         assert lambda_function.handler == 'app.handler'
 
+    def test_can_create_kinesis_handler_with_stream_options(
+            self, sample_kinesis_event_app):
+        @sample_kinesis_event_app.on_kinesis_record(
+            stream='mystream', report_batch_item_failures=True,
+            bisect_batch_on_function_error=True, maximum_retry_attempts=3,
+            parallelization_factor=10)
+        def record_handler(record):
+            pass
+
+        config = self.create_config(sample_kinesis_event_app,
+                                    app_name='kinesis-event-app',
+                                    autogen_policy=True)
+        builder = ApplicationGraphBuilder()
+        application = builder.build(config, stage_name='dev')
+        kinesis_event = application.resources[1]
+        assert kinesis_event.report_batch_item_failures
+        assert kinesis_event.bisect_batch_on_function_error
+        assert kinesis_event.maximum_retry_attempts == 3
+        assert kinesis_event.parallelization_factor == 10
+
     def test_can_create_ddb_event_handler(self, sample_ddb_event_app):
         config = self.create_config(sample_ddb_event_app,
                                     app_name='ddb-event-app',
@@ -1782,7 +1782,8 @@ class TestPlanSQSSubscription(BasePlannerTests):
                 'batch_size': 10,
                 'maximum_batching_window_in_seconds': 60,
                 'function_name': Variable("function_name_lambda_arn"),
-                'maximum_concurrency': None
+                'maximum_concurrency': None,
+                'report_batch_item_failures': False,
             },
             output_var='function_name-sqs-event-source_uuid'
         )
@@ -1822,6 +1823,7 @@ class TestPlanSQSSubscription(BasePlannerTests):
                 'maximum_batching_window_in_seconds': 0,
                 'function_name': Variable("function_name_lambda_arn"),
                 'maximum_concurrency': None,
+                'report_batch_item_failures': False,
             },
             output_var='function_name-sqs-event-source_uuid'
         )
@@ -1866,6 +1868,7 @@ class TestPlanSQSSubscription(BasePlannerTests):
                 'batch_size': 10,
                 'maximum_batching_window_in_seconds': 0,
                 'maximum_concurrency': None,
+                'report_batch_item_failures': False,
             },
         )
         self.assert_recorded_values(
@@ -1929,6 +1932,7 @@ class TestPlanSQSSubscription(BasePlannerTests):
                 'batch_size': 10,
                 'maximum_batching_window_in_seconds': 0,
                 'maximum_concurrency': None,
+                'report_batch_item_failures': False,
             },
         )
         self.assert_recorded_values(
@@ -1961,6 +1965,7 @@ class TestPlanSQSSubscription(BasePlannerTests):
                 'maximum_batching_window_in_seconds': 0,
                 'function_name': Variable("function_name_lambda_arn"),
                 'maximum_concurrency': 2,
+                'report_batch_item_failures': False,
             },
             output_var='function_name-sqs-event-source_uuid'
         )
@@ -2002,6 +2007,7 @@ class TestPlanSQSSubscription(BasePlannerTests):
                 'batch_size': 10,
                 'maximum_batching_window_in_seconds': 0,
                 'maximum_concurrency': 2,
+                'report_batch_item_failures': False,
             },
         )
         self.assert_recorded_values(
@@ -2013,6 +2019,41 @@ class TestPlanSQSSubscription(BasePlannerTests):
             }
         )
 
+    def test_sqs_event_supports_report_batch_item_failures(self):
+        function = create_function_resource('function_name')
+        sqs_event_source = models.SQSEventSource(
+            resource_name='function_name-sqs-event-source',
+            queue=models.QueueARN(arn='arn:us-west-2:myqueue'),
+            batch_size=10,
+            lambda_function=function,
+            maximum_batching_window_in_seconds=0,
+            report_batch_item_failures=True,
+        )
+        plan = self.determine_plan(sqs_event_source)
+        assert plan[1].params['report_batch_item_failures'] is True
+
+    def test_sqs_event_source_exists_updates_report_batch_item_failures(self):
+        function = create_function_resource('function_name')
+        sqs_event_source = models.SQSEventSource(
+            resource_name='function_name-sqs-event-source',
+            queue='myqueue',
+            batch_size=10,
+            lambda_function=function,
+            maximum_batching_window_in_seconds=0,
+            report_batch_item_failures=True,
+        )
+        self.remote_state.declare_resource_exists(
+            sqs_event_source,
+            queue='myqueue',
+            queue_arn='arn:sqs:myqueue',
+            resource_type='sqs_event',
+            lambda_arn='arn:lambda',
+            event_uuid='my-uuid',
+        )
+        plan = self.determine_plan(sqs_event_source)
+        assert plan[5].method_name == 'update_lambda_event_source'
+        assert plan[5].params['report_batch_item_failures'] is True
+
     @pytest.mark.parametrize('functions,integration_injected', [
         (
             (create_function_resource('connect'), None, None),
@@ -2101,7 +2142,11 @@ class TestPlanKinesisSubscription(BasePlannerTests):
                 'batch_size': 10,
                 'starting_position': 'LATEST',
                 'maximum_batching_window_in_seconds': 0,
-                'function_name': Variable("function_name_lambda_arn")
+                'function_name': Variable("function_name_lambda_arn"),
+                'report_batch_item_failures': False,
+                'bisect_batch_on_function_error': False,
+                'maximum_retry_attempts': None,
+                'parallelization_factor': None,
             },
             output_var='function_name-kinesis-event-source_uuid'
         )
@@ -2142,9 +2187,34 @@ class TestPlanKinesisSubscription(BasePlannerTests):
                 'event_uuid': 'my-uuid',
                 'batch_size': 10,
                 'maximum_batching_window_in_seconds': 60,
+                'report_batch_item_failures': False,
+                'bisect_batch_on_function_error': False,
+                'maximum_retry_attempts': -1,
+                'parallelization_factor': 1,
             }
         )
 
+    def test_can_plan_kinesis_stream_options(self):
+        function = create_function_resource('function_name')
+        kinesis_event_source = models.KinesisEventSource(
+            resource_name='function_name-kinesis-event-source',
+            stream='mystream',
+            batch_size=10,
+            starting_position='LATEST',
+            maximum_batching_window_in_seconds=0,
+            lambda_function=function,
+            report_batch_item_failures=True,
+            bisect_batch_on_function_error=True,
+            maximum_retry_attempts=3,
+            parallelization_factor=10,
+        )
+        plan = self.determine_plan(kinesis_event_source)
+        params = plan[5].params
+        assert params['report_batch_item_failures'] is True
+        assert params['bisect_batch_on_function_error'] is True
+        assert params['maximum_retry_attempts'] == 3
+        assert params['parallelization_factor'] == 10
+
 
 class TestPlanDynamoDBSubscription(BasePlannerTests):
     def test_can_plan_dynamodb_event_source(self):
@@ -2163,6 +2233,10 @@ class TestPlanDynamoDBSubscription(BasePlannerTests):
                 'function_name': Variable('function_name_lambda_arn'),
                 'starting_position': 'LATEST',
                 'maximum_batching_window_in_seconds': 0,
+                'report_batch_item_failures': False,
+                'bisect_batch_on_function_error': False,
+                'maximum_retry_attempts': None,
+                'parallelization_factor': None,
             },
             output_var='handler-dynamodb-event-source_uuid',
         )
@@ -2187,10 +2261,37 @@ class TestPlanDynamoDBSubscription(BasePlannerTests):
             params={
                 'event_uuid': 'my-uuid',
                 'batch_size': 100,
-                'maximum_batching_window_in_seconds': 60
+                'maximum_batching_window_in_seconds': 60,
+                'report_batch_item_failures': False,
+                'bisect_batch_on_function_error': False,
+                'maximum_retry_attempts': -1,
+                'parallelization_factor': 1,
             },
         )
 
+    def test_can_update_dynamodb_stream_options(self):
+        function = create_function_resource('function_name')
+        event_source = models.DynamoDBEventSource(
+            resource_name='handler-dynamodb-event-source',
+            stream_arn='arn:stream', batch_size=100,
+            maximum_batching_window_in_seconds=60,
+            starting_position='LATEST', lambda_function=function,
+            report_batch_item_failures=True,
+            maximum_retry_attempts=0,
+            parallelization_factor=5)
+        self.remote_state.declare_resource_exists(
+            event_source,
+            stream_arn='arn:stream',
+            resource_type='dynamodb_event',
+            lambda_arn='arn:lambda',
+            event_uuid='my-uuid',
+        )
+        plan = self.determine_plan(event_source)
+        params = plan[0].params
+        assert params['report_batch_item_failures'] is True
+        assert params['maximum_retry_attempts'] == 0
+        assert params['parallelization_factor'] == 5
+
 
 class TestRemoteState(object):
     def setup_method(self):
@@ -1,10 +1,15 @@
 import sys
+import asyncio
 import base64
+import binascii
 import logging
 import json
 import gzip
 import inspect
+import decimal
 import collections
+import threading
+import zlib
 from copy import deepcopy
 from datetime import datetime
 
@@ -143,11 +148,13 @@ class FakeClient(object):
 class FakeSession(object):
     def __init__(self, client=None, region_name='us-west-2'):
         self.calls = []
+        self.configs = []
         self._client = client
         self.region_name = region_name
 
-    def client(self, name, endpoint_url=None):
+    def client(self, name, endpoint_url=None, config=None):
         self.calls.append((name, endpoint_url))
+        self.configs.append(config)
         return self._client
 
 
@@ -419,6 +426,41 @@ def test_can_encode_binary_json(sample_app):
     assert encoded_response['body'] == 'eyJmb28iOiJiYXIifQ=='
 
 
+def test_streaming_response_is_buffered_in_to_dict(sample_app):
+    response = app.StreamingResponse(
+        iter(['foo,bar\n', b'1,2\n']),
+        headers={'Content-Type': 'text/csv'})
+    serialized = response.to_dict(sample_app.api.binary_types)
+    assert serialized['body'] == 'foo,bar\n1,2\n'
+    assert 'isBase64Encoded' not in serialized
+
+
+def test_streaming_response_with_binary_content_type(sample_app):
+    response = app.StreamingResponse(
+        iter([b'\xff\xfe', b'\x00']),
+        headers={'Content-Type': 'application/octet-stream'})
+    serialized = response.to_dict(sample_app.api.binary_types)
+    assert base64.b64decode(serialized['body']) == b'\xff\xfe\x00'
+    assert serialized['isBase64Encoded']
+
+
+def test_can_stream_response_body(sample_app, create_event):
+    @sample_app.route('/stream')
+    def stream():
+        return app.StreamingResponse(
+            (str(i) for i in range(3)),
+            headers={'Content-Type': 'text/plain'})
+
+    event = create_event('/stream', 'GET', {})
+    # The Lambda entry point always buffers the response.
+    assert sample_app(event, context=None)['body'] == '012'
+    # pylint: disable=protected-access
+    response = sample_app._handle_rest_api_event(event, None, stream=True)
+    assert response['statusCode'] == 200
+    assert response['headers'] == {'Content-Type': 'text/plain'}
+    assert list(response['body']) == [b'0', b'1', b'2']
+
+
 def test_wildcard_accepts_with_native_python_types_serializes_json(
         sample_app, create_event):
     sample_app.api.binary_types = ['*/*']
@@ -558,6 +600,53 @@ def test_request_to_dict_does_not_contain_internal_attrs(sample_app,
     assert not internal_attrs
 
 
+def test_request_headers_and_query_params_are_lazy(create_event):
+    event = create_event('/', 'GET', {})
+    event['multiValueQueryStringParameters'] = {'key': ['val1', 'val2']}
+    request = Request(event)
+    # pylint: disable=protected-access
+    assert request._headers is app._NOT_LOADED
+    assert request._query_params is app._NOT_LOADED
+    assert request.headers['content-type'] == 'application/json'
+    assert request.query_params.getlist('key') == ['val1', 'val2']
+    assert request.headers is request.headers
+    assert request.query_params is request.query_params
+
+
+def test_request_header_lookup_matches_headers_mapping(create_event):
+    event = create_event('/', 'GET', {})
+    event['headers'] = {'Accept': 'text/plain', 'ACCEPT': 'image/png'}
+    request = Request(event)
+    # pylint: disable=protected-access
+    assert request._get_header('accept') == 'image/png'
+    assert request._get_header('missing', 'default') == 'default'
+    assert request.headers['accept'] == request._get_header('accept')
+    event['headers'] = None
+    assert Request(event)._get_header('accept') is None
+
+
+def test_can_set_request_headers_and_query_params(create_event):
+    request = Request(create_event('/', 'GET', {}))
+    request.headers = app.CaseInsensitiveMapping({'Foo': 'bar'})
+    request.query_params = MultiDict({'a': ['b']})
+    assert request.headers['foo'] == 'bar'
+    assert request.query_params['a'] == 'b'
+    assert request.to_dict()['headers'] == {'foo': 'bar'}
+
+
+def test_request_to_dict_includes_added_attributes(create_event):
+    request = Request(create_event('/', 'GET', {}), FakeLambdaContext())
+    request.user = 'james'
+    request._internal = 'internal'
+    serialized = request.to_dict()
+    assert serialized['user'] == 'james'
+    assert '_internal' not in serialized
+    assert 'lambda_context' not in serialized
+    assert sorted(serialized) == [
+        'context', 'headers', 'method', 'path', 'query_params',
+        'stage_vars', 'uri_params', 'user']
+
+
 def test_will_pass_captured_params_to_view(sample_app, create_event):
     event = create_event('/name/{name}', 'GET', {'name': 'james'})
     response = sample_app(event, context=None)
@@ -724,6 +813,62 @@ def test_json_body_none_with_malformed_json(create_event):
     assert json_response_body(result)['Code'] == 'BadRequestError'
 
 
+class UpperCaseKeysCodec(app.JSONCodec):
+    def __init__(self):
+        self.calls = []
+
+    def dumps(self, obj):
+        self.calls.append('dumps')
+        return super(UpperCaseKeysCodec, self).dumps(obj)
+
+    def loads(self, data):
+        self.calls.append('loads')
+        loaded = super(UpperCaseKeysCodec, self).loads(data)
+        return {k.upper(): v for k, v in loaded.items()}
+
+
+def test_can_provide_custom_json_codec(create_event):
+    codec = UpperCaseKeysCodec()
+    demo = app.Chalice('demo-app', json_codec=codec)
+
+    @demo.route('/', methods=['POST'])
+    def index():
+        return demo.current_request.json_body
+
+    event = create_event('/', 'POST', {})
+    event['body'] = json.dumps({'foo': 'bar'})
+
+    result = demo(event, context=None)
+    assert json_response_body(result) == {'FOO': 'bar'}
+    assert codec.calls == ['loads', 'dumps']
+
+
+@pytest.mark.parametrize('codec', [app.JSONCodec(), app.OrjsonCodec()])
+def test_json_codecs_serialize_extra_types(codec):
+    body = {'decimal': decimal.Decimal('1.5'),
+            'multidict': app.MultiDict({'a': ['b', 'c']}),
+            1: 'int-key'}
+    assert json.loads(codec.dumps(body)) == {
+        'decimal': 1.5, 'multidict': {'a': 'c'}, '1': 'int-key'}
+    assert codec.loads(b'{"foo": [1, 2]}') == {'foo': [1, 2]}
+    with pytest.raises(TypeError):
+        codec.dumps({'foo': object()})
+    with pytest.raises(ValueError):
+        codec.loads('{"foo": ')
+
+
+def test_orjson_codec_falls_back_to_stdlib_json(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'orjson', None)
+    codec = app.OrjsonCodec()
+    assert codec.dumps({'foo': decimal.Decimal('2')}) == '{"foo":2.0}'
+    assert codec.loads('{"foo": "bar"}') == {'foo': 'bar'}
+
+
+def test_orjson_codec_handles_large_ints():
+    codec = app.OrjsonCodec()
+    assert json.loads(codec.dumps({'big': 2 ** 70})) == {'big': 2 ** 70}
+
+
 def test_cant_access_json_body_with_wrong_content_type(create_event):
     demo = app.Chalice('demo-app')
 
@@ -877,6 +1022,41 @@ def test_empty_headers_have_basic_validation(create_empty_header_event):
     assert response['statusCode'] == 200
 
 
+def test_multi_value_headers_have_basic_validation(create_event):
+    demo = app.Chalice('app-name')
+
+    @demo.route('/index')
+    def index_view():
+        return app.Response(
+            status_code=200, body='{}',
+            headers={'Set-Cookie': ['key=value', 'foo\nbar']})
+
+    event = create_event('/index', 'GET', {})
+    response = demo(event, context=None)
+    assert response['statusCode'] == 500
+    assert 'Set-Cookie' not in response.get('multiValueHeaders', {})
+
+
+def test_cors_headers_do_not_override_view_headers(create_event):
+    demo = app.Chalice('app-name')
+
+    @demo.route('/index', cors=True)
+    def index_view():
+        return app.Response(
+            status_code=200, body='{}',
+            headers={'Access-Control-Allow-Origin': 'https://example.com',
+                     'Set-Cookie': ['a=b', 'c=d']})
+
+    event = create_event('/index', 'GET', {})
+    response = demo(event, context=None)
+    assert response['statusCode'] == 200
+    headers = response['headers']
+    assert headers['Access-Control-Allow-Origin'] == 'https://example.com'
+    assert 'Access-Control-Allow-Headers' in headers
+    assert 'Set-Cookie' not in headers
+    assert response['multiValueHeaders'] == {'Set-Cookie': ['a=b', 'c=d']}
+
+
 def test_no_content_type_is_still_allowed(create_event):
     # When the content type validation happens in API gateway, it appears
     # to assume a default of application/json, so the chalice handler needs
@@ -1389,6 +1569,106 @@ def test_auth_response_with_colon_chars():
     assert actual == response
 
 
+class TestAuthorizerResultCache(object):
+    def create_event(self, token='authtoken', path='GET/a'):
+        return {
+            'type': 'TOKEN',
+            'authorizationToken': token,
+            'methodArn': 'arn:aws:execute-api:us-west-2:1:id/dev/' + path,
+        }
+
+    @fixture
+    def cached_auth(self):
+        auth_app = app.Chalice('builtin-auth')
+        calls = []
+
+        @auth_app.authorizer(ttl_seconds=60, cache_results=True)
+        def builtin_auth(auth_request):
+            calls.append(auth_request.token)
+            return app.AuthResponse(['/a', '/b'], 'principal',
+                                    context={'token': auth_request.token})
+
+        builtin_auth.calls = calls
+        return builtin_auth
+
+    def test_results_are_not_cached_by_default(self):
+        auth_app = app.Chalice('builtin-auth')
+        calls = []
+
+        @auth_app.authorizer(ttl_seconds=60)
+        def builtin_auth(auth_request):
+            calls.append(auth_request.token)
+            return app.AuthResponse(['/a'], 'principal')
+
+        builtin_auth(self.create_event(), None)
+        builtin_auth(self.create_event(), None)
+        assert calls == ['authtoken', 'authtoken']
+
+    def test_auth_function_called_once_per_token(self, cached_auth):
+        first = cached_auth(self.create_event(path='GET/a'), None)
+        second = cached_auth(self.create_event(path='POST/b'), None)
+        other = cached_auth(self.create_event(token='other'), None)
+        assert cached_auth.calls == ['authtoken', 'other']
+        assert first == second
+        assert other['context'] == {'token': 'other'}
+
+    def test_cache_is_keyed_on_api_and_stage(self, cached_auth):
+        event = self.create_event()
+        cached_auth(event, None)
+        event['methodArn'] = event['methodArn'].replace('/dev/', '/prod/')
+        result = cached_auth(event, None)
+        assert cached_auth.calls == ['authtoken', 'authtoken']
+        resources = result['policyDocument']['Statement'][0]['Resource']
+        assert all('/prod/' in resource for resource in resources)
+
+    def test_cached_results_expire_after_ttl(self, cached_auth,
+                                             monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(app.time, 'monotonic', lambda: now[0])
+        cached_auth(self.create_event(), None)
+        now[0] += 59
+        cached_auth(self.create_event(), None)
+        now[0] += 2
+        cached_auth(self.create_event(), None)
+        assert cached_auth.calls == ['authtoken', 'authtoken']
+
+    def test_cached_result_is_copied(self, cached_auth):
+        cached_auth(self.create_event(), None)['context']['extra'] = 'x'
+        result = cached_auth(self.create_event(), None)
+        assert result['context'] == {'token': 'authtoken'}
+
+    def test_cache_is_shared_with_scoped_copies(self, cached_auth):
+        scoped = cached_auth.with_scopes(['read'])
+        cached_auth(self.create_event(), None)
+        scoped(self.create_event(), None)
+        assert cached_auth.calls == ['authtoken']
+        assert scoped.scopes == ['read']
+
+    def test_zero_ttl_disables_cache(self):
+        auth_app = app.Chalice('builtin-auth')
+        calls = []
+
+        @auth_app.authorizer(ttl_seconds=0, cache_results=True)
+        def builtin_auth(auth_request):
+            calls.append(auth_request.token)
+            return app.AuthResponse(['/a'], 'principal')
+
+        builtin_auth(self.create_event(), None)
+        builtin_auth(self.create_event(), None)
+        assert len(calls) == 2
+
+    def test_default_ttl_matches_api_gateway(self):
+        auth_app = app.Chalice('builtin-auth')
+
+        @auth_app.authorizer(cache_results=True)
+        def builtin_auth(auth_request):
+            pass
+
+        config = auth_app.builtin_auth_handlers[0]
+        assert config.cache_results
+        assert config.cache_ttl_seconds == 300
+
+
 def test_auth_response_serialization():
     method_arn = (
         "arn:aws:execute-api:us-west-2:123:rest-api-id/dev/GET/needs/auth")
@@ -1507,6 +1787,157 @@ def test_root_resource(auth_request):
     }
 
 
+class TestAuthPolicyCompaction(object):
+    ARN_PREFIX = 'arn:aws:execute-api:us-west-2:123:rest-api-id/dev/'
+
+    @pytest.fixture
+    def route_table(self):
+        demo = app.Chalice('app-name')
+        paths = ['/', '/users', '/users/me', '/users/{id}',
+                 '/users/{id}/posts', '/admin', '/admin/users',
+                 '/reports/daily', '/reports/weekly']
+        for path in paths:
+            demo.route(path, methods=['GET', 'POST'])(lambda: {})
+        return demo.routes
+
+    def resources(self, response, auth_request, route_table=None):
+        serialized = response.to_dict(auth_request, route_table)
+        resources = serialized['policyDocument']['Statement'][0]['Resource']
+        return sorted(r[len(self.ARN_PREFIX):] for r in resources)
+
+    def test_not_compacted_by_default(self, auth_request, route_table):
+        response = app.AuthResponse(
+            [app.AuthRoute('/reports/daily', ['GET']),
+             app.AuthRoute('/reports/weekly', ['GET'])], 'principal')
+        assert self.resources(response, auth_request, route_table) == [
+            'GET/reports/daily', 'GET/reports/weekly']
+
+    def test_can_compact_to_prefix_wildcard(self, auth_request,
+                                            route_table):
+        response = app.AuthResponse(
+            [app.AuthRoute('/reports/daily', ['GET']),
+             app.AuthRoute('/reports/weekly', ['GET'])], 'principal',
+            compact=True)
+        assert self.resources(response, auth_request, route_table) == [
+            'GET/reports/*']
+
+    def test_merges_methods_defined_by_app(self, auth_request,
+                                           route_table):
+        response = app.AuthResponse(
+            [app.AuthRoute('/reports/daily', ['GET', 'POST']),
+             app.AuthRoute('/reports/weekly', ['GET', 'POST'])],
+            'principal', compact=True)
+        assert self.resources(response, auth_request, route_table) == [
+            '*/reports/*']
+
+    def test_prefix_not_used_if_route_under_it_denied(self, auth_request,
+                                                      route_table):
+        response = app.AuthResponse(
+            [app.AuthRoute('/users/me', ['GET']),
+             app.AuthRoute('/users/{id}/posts', ['GET'])],
+            'principal', compact=True)
+        # GET /users/{id} isn't allowed so /users/* can't be used.
+        assert self.resources(response, auth_request, route_table) == [
+            'GET/users/me', 'GET/users/{id}/posts']
+
+    def test_literal_param_path_does_not_allow_route(self, auth_request,
+                                                     route_table):
+        response = app.AuthResponse(
+            [app.AuthRoute('/users/me', ['GET']),
+             app.AuthRoute('/users/{id}', ['GET']),
+             app.AuthRoute('/users/{id}/posts', ['GET'])],
+            'principal', compact=True)
+        assert self.resources(response, auth_request, route_table) == [
+            'GET/users/me', 'GET/users/{id}', 'GET/users/{id}/posts']
+
+    def test_wildcard_method_not_used_if_it_matches_other_paths(
+            self, auth_request, route_table):
+        response = app.AuthResponse(
+            [app.AuthRoute('/users', ['GET', 'POST'])],
+            'principal', compact=True)
+        # */users would also match GET/admin/users.
+        assert self.resources(response, auth_request, route_table) == [
+            'GET/users', 'POST/users']
+
+    def test_can_compact_to_root_wildcard(self, auth_request, route_table):
+        routes = [app.AuthRoute(path.replace('{id}', '*'), ['GET', 'POST'])
+                  for path in route_table]
+        response = app.AuthResponse(routes, 'principal', compact=True)
+        assert self.resources(response, auth_request, route_table) == [
+            '*/*']
+
+    def test_existing_wildcards_are_used(self, auth_request, route_table):
+        response = app.AuthResponse(
+            [app.AuthRoute('/users/*', ['GET']),
+             app.AuthRoute('/users/me', ['GET']),
+             app.AuthRoute('/users/me', ['GET'])],
+            'principal', compact=True)
+        assert self.resources(response, auth_request, route_table) == [
+            'GET/users/*']
+
+    def test_only_removes_covered_routes_without_route_table(
+            self, auth_request):
+        response = app.AuthResponse(
+            [app.AuthRoute('/reports/daily', ['GET']),
+             app.AuthRoute('/reports/weekly', ['GET']),
+             app.AuthRoute('/users/*', ['GET']),
+             app.AuthRoute('/users/me', ['GET', 'POST'])],
+            'principal', compact=True)
+        assert self.resources(response, auth_request) == [
+            'GET/reports/daily', 'GET/reports/weekly', 'GET/users/*',
+            'POST/users/me']
+
+    def test_compacted_policy_allows_same_routes(self, auth_request,
+                                                 route_table):
+        compactor = app._PolicyCompactor(route_table)
+        allowed = [(method, path)
+                   for path in ['/users/me', '/users/{id}', '/admin',
+                                '/reports/daily', '/reports/weekly']
+                   for method in ['GET', 'POST']]
+        compacted = compactor.compact(allowed)
+        assert len(compacted) < len(allowed)
+        denied = compactor._find_denied_routes(allowed)
+        assert ('GET', '/users/{id}/posts') in denied
+        assert compactor._is_equivalent(allowed, compacted, denied)
+        assert not compactor._is_equivalent(allowed, [('*', '*')], denied)
+
+    def test_authorizer_compacts_with_app_routes(self):
+        demo = app.Chalice('app-name')
+
+        @demo.authorizer()
+        def auth(auth_request):
+            return app.AuthResponse(
+                [app.AuthRoute('/reports/daily', ['GET']),
+                 app.AuthRoute('/reports/weekly', ['GET'])],
+                'principal', compact=True)
+
+        @demo.route('/reports/daily', authorizer=auth)
+        def daily():
+            return {}
+
+        @demo.route('/reports/weekly', authorizer=auth)
+        def weekly():
+            return {}
+
+        @demo.route('/reports/admin', methods=['POST'], authorizer=auth)
+        def admin():
+            return {}
+
+        event = {
+            'type': 'TOKEN',
+            'authorizationToken': 'token',
+            'methodArn': self.ARN_PREFIX + 'GET/reports/daily',
+        }
+        response = auth(event, context=None)
+        # Every GET route is allowed and POST /reports/admin isn't.
+        assert response['policyDocument']['Statement'][0]['Resource'] == [
+            self.ARN_PREFIX + 'GET/*']
+        scoped = auth.with_scopes(['read'])
+        response = scoped(event, context=None)
+        assert response['policyDocument']['Statement'][0]['Resource'] == [
+            self.ARN_PREFIX + 'GET/*']
+
+
 def test_can_register_scheduled_event_with_str(sample_app):
     @sample_app.schedule('rate(1 minute)')
     def foo(event):
@@ -2044,6 +2475,119 @@ def test_can_map_sqs_event(sample_app):
     assert actual_event.context == lambda_context
 
 
+def _create_sqs_event(message_ids, queue_name='queue-name'):
+    return {'Records': [{
+        'attributes': {},
+        'awsRegion': 'us-west-2',
+        'body': message_id,
+        'eventSource': 'aws:sqs',
+        'eventSourceARN': 'arn:aws:sqs:us-west-2:12345:%s' % queue_name,
+        'messageAttributes': {},
+        'messageId': message_id,
+        'receiptHandle': 'receipt-handle',
+    } for message_id in message_ids]}
+
+
+def test_sqs_batch_item_failures_keep_event_contract(sample_app):
+    @sample_app.on_sqs_message(queue='queue-name',
+                               report_batch_item_failures=True)
+    def handler(event):
+        assert isinstance(event, app.SQSEvent)
+        return {'batchItemFailures': [
+            {'itemIdentifier': record.message_id} for record in event
+            if record.body.startswith('bad')]}
+
+    assert sample_app.event_sources[0].report_batch_item_failures
+    response = handler(_create_sqs_event(['a', 'bad-b']), context=None)
+    assert response == {'batchItemFailures': [{'itemIdentifier': 'bad-b'}]}
+
+
+def test_can_report_sqs_batch_item_failures_per_record(sample_app):
+    processed = []
+
+    @sample_app.on_sqs_message(queue='queue-name',
+                               report_batch_item_failures=True,
+                               per_record=True)
+    def handler(record):
+        processed.append(record.message_id)
+        if record.body.startswith('bad'):
+            raise ValueError(record.body)
+
+    assert sample_app.event_sources[0].report_batch_item_failures
+    assert sample_app.event_sources[0].handler_string == 'app.handler'
+    response = handler(
+        _create_sqs_event(['a', 'bad-b', 'c', 'bad-d']), context=None)
+    assert processed == ['a', 'bad-b', 'c', 'bad-d']
+    assert response == {'batchItemFailures': [
+        {'itemIdentifier': 'bad-b'}, {'itemIdentifier': 'bad-d'}]}
+    assert handler(_create_sqs_event(['a']), context=None) == {
+        'batchItemFailures': []}
+
+
+def test_can_process_sqs_records_concurrently(sample_app):
+    num_records = 4
+    barrier = threading.Barrier(num_records, timeout=5)
+
+    @sample_app.on_sqs_message(queue='queue-name',
+                               report_batch_item_failures=True,
+                               per_record=True, max_workers=num_records)
+    def handler(record):
+        # Every record has to be in flight at the same time for the
+        # barrier to be released.
+        barrier.wait()
+        if record.body == 'bad':
+            raise ValueError(record.body)
+
+    response = handler(
+        _create_sqs_event(['a', 'bad', 'c', 'd']), context=None)
+    assert response == {'batchItemFailures': [{'itemIdentifier': 'bad'}]}
+
+
+def test_sqs_fifo_records_fail_remaining_batch(sample_app):
+    processed = []
+
+    @sample_app.on_sqs_message(queue='queue-name.fifo',
+                               report_batch_item_failures=True,
+                               per_record=True, max_workers=4)
+    def handler(record):
+        processed.append(record.message_id)
+        if record.body == 'bad':
+            raise ValueError(record.body)
+
+    response = handler(
+        _create_sqs_event(['a', 'bad', 'c'], queue_name='queue-name.fifo'),
+        context=None)
+    assert processed == ['a', 'bad']
+    assert response == {'batchItemFailures': [
+        {'itemIdentifier': 'bad'}, {'itemIdentifier': 'c'}]}
+
+
+def test_can_report_sqs_batch_item_failures_async(sample_app):
+    @sample_app.on_sqs_message(queue='queue-name',
+                               report_batch_item_failures=True,
+                               per_record=True, max_workers=2)
+    async def handler(record):
+        if record.body == 'bad':
+            raise ValueError(record.body)
+
+    response = handler(_create_sqs_event(['a', 'bad']), context=None)
+    assert response == {'batchItemFailures': [{'itemIdentifier': 'bad'}]}
+
+
+def test_sqs_max_workers_requires_per_record(sample_app):
+    with pytest.raises(ValueError):
+        sample_app.on_sqs_message(queue='queue-name', max_workers=2)
+    with pytest.raises(ValueError):
+        sample_app.on_sqs_message(queue='queue-name',
+                                  report_batch_item_failures=True,
+                                  max_workers=2)
+
+
+def test_sqs_per_record_requires_batch_item_failures(sample_app):
+    with pytest.raises(ValueError):
+        sample_app.on_sqs_message(queue='queue-name', per_record=True)
+
+
 def test_can_create_kinesis_handler(sample_app):
     @sample_app.on_kinesis_record(stream='MyStream',
                                   batch_size=1,
@@ -2129,6 +2673,132 @@ def test_can_map_kinesis_event(sample_app):
     assert records[1].data == b'This is only a test.'
 
 
+def test_can_set_kinesis_stream_options(sample_app):
+    @sample_app.on_kinesis_record(stream='MyStream',
+                                  bisect_batch_on_function_error=True,
+                                  maximum_retry_attempts=3,
+                                  parallelization_factor=10)
+    def handler(event):
+        pass
+
+    config = sample_app.event_sources[0]
+    assert not config.report_batch_item_failures
+    assert config.bisect_batch_on_function_error
+    assert config.maximum_retry_attempts == 3
+    assert config.parallelization_factor == 10
+
+
+def _create_kinesis_event(payloads):
+    return {'Records': [{
+        'kinesis': {
+            'kinesisSchemaVersion': '1.0',
+            'partitionKey': '1',
+            'sequenceNumber': str(i),
+            'data': base64.b64encode(payload).decode('ascii'),
+            'approximateArrivalTimestamp': 1545084650.987,
+        },
+        'eventSource': 'aws:kinesis',
+        'eventSourceARN': 'arn:aws:kinesis:us-east-2:123:stream/stream',
+    } for i, payload in enumerate(payloads)]}
+
+
+def test_kinesis_batch_item_failures_keep_event_contract(sample_app):
+    @sample_app.on_kinesis_record(stream='MyStream',
+                                  report_batch_item_failures=True)
+    def handler(event):
+        assert isinstance(event, app.KinesisEvent)
+        return {'batchItemFailures': [
+            {'itemIdentifier': record.sequence_number} for record in event
+            if record.data == b'bad'][:1]}
+
+    response = handler(_create_kinesis_event([b'a', b'bad']), context=None)
+    assert response == {'batchItemFailures': [{'itemIdentifier': '1'}]}
+
+
+def test_stream_per_record_requires_batch_item_failures(sample_app):
+    with pytest.raises(ValueError):
+        sample_app.on_kinesis_record(stream='MyStream', per_record=True)
+    with pytest.raises(ValueError):
+        sample_app.on_dynamodb_record(stream_arn='arn:aws:...:stream',
+                                      per_record=True)
+
+
+def test_kinesis_reports_first_failed_sequence_number(sample_app):
+    processed = []
+
+    @sample_app.on_kinesis_record(stream='MyStream',
+                                  report_batch_item_failures=True,
+                                  per_record=True)
+    def handler(record):
+        processed.append(record.sequence_number)
+        if record.data == b'bad':
+            raise ValueError(record.data)
+
+    assert sample_app.event_sources[0].report_batch_item_failures
+    assert sample_app.event_sources[0].handler_string == 'app.handler'
+    response = handler(_create_kinesis_event([b'a', b'bad', b'c', b'bad']),
+                       context=None)
+    # Processing stops at the first failure so Lambda can checkpoint
+    # the shard and retry from that record.
+    assert processed == ['0', '1']
+    assert response == {'batchItemFailures': [{'itemIdentifier': '1'}]}
+    assert handler(_create_kinesis_event([b'a']), context=None) == {
+        'batchItemFailures': []}
+
+
+def test_kinesis_record_decodes_data_lazily():
+    event = _create_kinesis_event([b'hello'])
+    # This isn't valid base64, which is only noticed once it's decoded.
+    event['Records'][0]['kinesis']['data'] = 'a'
+    record = next(iter(app.KinesisEvent(event, None)))
+    assert record.sequence_number == '0'
+    assert record.partition_key == '1'
+    with pytest.raises(binascii.Error):
+        record.data
+
+
+def test_kinesis_record_attributes_can_be_set():
+    record = next(iter(app.KinesisEvent(_create_kinesis_event([b'a']), None)))
+    assert record.data == b'a'
+    record.data = b'b'
+    record.sequence_number = '10'
+    record.foo = 'bar'
+    assert record.data == b'b'
+    assert record.sequence_number == '10'
+    assert record.foo == 'bar'
+
+
+def test_kinesis_record_data_view():
+    record = next(iter(
+        app.KinesisEvent(_create_kinesis_event([b'hello world']), None)))
+    view = record.data_view
+    assert isinstance(view, memoryview)
+    assert view[:5] == b'hello'
+    # The decoded payload is cached so the view doesn't copy it again.
+    assert view.obj is record.data
+
+
+def test_kinesis_event_iter_data():
+    event = app.KinesisEvent(_create_kinesis_event([b'a', b'bc', b'']), None)
+    assert list(event.iter_data()) == [b'a', b'bc', b'']
+    assert list(event.iter_data()) == [r.data for r in event]
+
+
+def test_sqs_and_ddb_record_attributes_can_be_set():
+    sqs_record = next(iter(app.SQSEvent(_create_sqs_event(['a']), None)))
+    assert sqs_record.body == 'a'
+    sqs_record.body = 'b'
+    sqs_record.foo = 'bar'
+    assert sqs_record.body == 'b'
+    assert sqs_record.foo == 'bar'
+    ddb_record = app.DynamoDBRecord({'dynamodb': {}}, None)
+    assert ddb_record.new_image is None
+    ddb_record.new_image = {'id': {'S': 'a'}}
+    ddb_record.foo = 'bar'
+    assert ddb_record.deserialize_new_image() == {'id': 'a'}
+    assert ddb_record.foo == 'bar'
+
+
 def test_can_create_ddb_handler(sample_app):
     @sample_app.on_dynamodb_record(
         stream_arn='arn:aws:dynamodb:...:stream', batch_size=10,
@@ -2157,6 +2827,143 @@ def test_can_set_ddb_handler_maximum_batching_window_in_seconds(sample_app):
     assert config.maximum_batching_window_in_seconds == 60
 
 
+def test_ddb_reports_first_failed_sequence_number(sample_app):
+    @sample_app.on_dynamodb_record(stream_arn='arn:aws:...:stream',
+                                   report_batch_item_failures=True,
+                                   maximum_retry_attempts=2,
+                                   per_record=True)
+    def handler(record):
+        if record.event_name == 'REMOVE':
+            raise ValueError(record.event_name)
+
+    config = sample_app.event_sources[0]
+    assert config.report_batch_item_failures
+    assert config.maximum_retry_attempts == 2
+    ddb_event = {'Records': [{
+        'awsRegion': 'us-west-2',
+        'dynamodb': {'ApproximateCreationDateTime': 1601317140.0,
+                     'SequenceNumber': sequence_number,
+                     'SizeBytes': 20,
+                     'StreamViewType': 'KEYS_ONLY'},
+        'eventID': sequence_number,
+        'eventName': event_name,
+        'eventSourceARN': 'arn:aws:dynamodb:us-west-2:12345:table/MyTable',
+    } for sequence_number, event_name in [('100', 'INSERT'),
+                                          ('200', 'REMOVE'),
+                                          ('300', 'REMOVE')]]}
+    assert handler(ddb_event, context=None) == {
+        'batchItemFailures': [{'itemIdentifier': '200'}]}
+
+
+DDB_TYPED_IMAGE = {
+    'PK': {'S': 'foo'},
+    'Count': {'N': '10'},
+    'Price': {'N': '1.50'},
+    'Data': {'B': 'aGVsbG8='},
+    'Active': {'BOOL': True},
+    'Missing': {'NULL': True},
+    'Tags': {'SS': ['a', 'b']},
+    'Scores': {'NS': ['1', '2.5']},
+    'Blobs': {'BS': ['aGVsbG8=']},
+    'Nested': {'M': {
+        'List': {'L': [{'N': '1'}, {'S': 'two'},
+                       {'M': {'Deep': {'L': [{'BOOL': False}]}}}]},
+        'Empty': {'M': {}},
+    }},
+}
+DDB_NATIVE_IMAGE = {
+    'PK': 'foo',
+    'Count': 10,
+    'Price': decimal.Decimal('1.50'),
+    'Data': b'hello',
+    'Active': True,
+    'Missing': None,
+    'Tags': {'a', 'b'},
+    'Scores': {1, decimal.Decimal('2.5')},
+    'Blobs': {b'hello'},
+    'Nested': {
+        'List': [1, 'two', {'Deep': [False]}],
+        'Empty': {},
+    },
+}
+
+
+def _create_ddb_record(new_image=None, keys=None):
+    dynamodb = {'SequenceNumber': '1', 'SizeBytes': 1,
+                'StreamViewType': 'NEW_AND_OLD_IMAGES',
+                'ApproximateCreationDateTime': 1601317140.0}
+    if new_image is not None:
+        dynamodb['NewImage'] = new_image
+    if keys is not None:
+        dynamodb['Keys'] = keys
+    return {'dynamodb': dynamodb, 'eventName': 'INSERT'}
+
+
+def test_can_deserialize_ddb_images():
+    record = app.DynamoDBRecord(
+        _create_ddb_record(DDB_TYPED_IMAGE, keys={'PK': {'S': 'foo'}}), None)
+    image = record.deserialize_new_image()
+    assert image == DDB_NATIVE_IMAGE
+    assert isinstance(image['Count'], int)
+    assert record.deserialize_keys() == {'PK': 'foo'}
+    assert record.deserialize_old_image() is None
+    # The raw typed image is still available.
+    assert record.new_image == DDB_TYPED_IMAGE
+
+
+def test_can_deserialize_deeply_nested_ddb_values():
+    value = {'S': 'leaf'}
+    for _ in range(sys.getrecursionlimit() * 2):
+        value = {'L': [value]}
+    record = app.DynamoDBRecord(
+        _create_ddb_record({'Deep': value}), None)
+    result = record.deserialize_new_image()['Deep']
+    while isinstance(result, list):
+        result = result[0]
+    assert result == 'leaf'
+
+
+def test_deserialize_unknown_ddb_type_raises_error():
+    record = app.DynamoDBRecord(
+        _create_ddb_record({'PK': {'UNKNOWN': 'foo'}}), None)
+    with pytest.raises(ValueError):
+        record.deserialize_new_image()
+
+
+def test_can_lazily_deserialize_ddb_image():
+    record = app.DynamoDBRecord(_create_ddb_record({
+        'PK': {'S': 'foo'},
+        'Bad': {'UNKNOWN': 'foo'},
+    }), None)
+    image = record.deserialize_new_image(lazy=True)
+    assert isinstance(image, app.LazyDynamoDBImage)
+    assert len(image) == 2
+    assert list(image) == ['PK', 'Bad']
+    # Only the attributes that are accessed are converted.
+    assert image['PK'] == 'foo'
+    assert image.get('Other') is None
+    with pytest.raises(ValueError):
+        image['Bad']
+    full_image = app.DynamoDBRecord(
+        _create_ddb_record(DDB_TYPED_IMAGE), None).deserialize_new_image(
+            lazy=True)
+    assert full_image['Nested'] is full_image['Nested']
+    assert dict(full_image) == DDB_NATIVE_IMAGE
+
+
+def test_can_deserialize_ddb_event_images():
+    event = app.DynamoDBEvent({'Records': [
+        _create_ddb_record(DDB_TYPED_IMAGE, keys={'PK': {'S': 'foo'}}),
+        _create_ddb_record(keys={'PK': {'S': 'bar'}}),
+    ]}, None)
+    assert list(event.iter_images()) == [DDB_NATIVE_IMAGE, None]
+    assert list(event.iter_images('keys')) == [{'PK': 'foo'}, {'PK': 'bar'}]
+    lazy_images = list(event.iter_images('keys', lazy=True))
+    assert [image['PK'] for image in lazy_images] == ['foo', 'bar']
+    with pytest.raises(ValueError):
+        list(event.iter_images('unknown'))
+
+
 def test_can_map_ddb_event(sample_app):
     @sample_app.on_dynamodb_record(stream_arn='arn:aws:...:stream')
     def handler(event):
@@ -2220,6 +3027,59 @@ def test_bytes_when_binary_type_is_application_json():
     return demo
 
 
+def test_binary_types_modified_after_first_request_are_used(create_event):
+    demo = app.Chalice('demo-app')
+
+    @demo.route('/index')
+    def index():
+        return Response(body=b'hello', status_code=200,
+                        headers={'Content-Type': 'application/pdf'})
+
+    event = create_event('/index', 'GET', {})
+    event['headers']['Accept'] = 'application/pdf'
+    assert 'isBase64Encoded' not in demo(event, context=None)
+
+    demo.api.binary_types.append('application/pdf')
+    response = demo(event, context=None)
+    assert response['statusCode'] == 200
+    assert response['isBase64Encoded']
+    assert base64.b64decode(response['body']) == b'hello'
+
+    demo.api.binary_types = ['image/png']
+    assert 'isBase64Encoded' not in demo(event, context=None)
+
+
+def test_route_content_types_modified_after_first_request(create_event):
+    demo = app.Chalice('demo-app')
+
+    @demo.route('/index', methods=['POST'], content_types=['text/plain'])
+    def index():
+        return {}
+
+    event = create_event('/index', 'POST', {}, 'application/xml')
+    assert demo(event, context=None)['statusCode'] == 415
+    demo.routes['/index']['POST'].content_types.append('application/xml')
+    assert demo(event, context=None)['statusCode'] == 200
+
+
+@pytest.mark.parametrize('header_value,content_types,expected', [
+    ('application/json', ['application/json'], True),
+    ('Application/JSON; charset=utf-8', ['application/json'], True),
+    ('text/html, application/xml;q=0.9', ['Application/XML'], True),
+    ('text/html, application/xml;q=0.9', ['image/png'], False),
+    ('*/*', ['image/png'], True),
+    ('text/plain', ['*/*'], True),
+    ('', ['image/png'], False),
+    ('text/plain', [], False),
+    ('x' * 1024 + ', image/png', ['image/png'], True),
+])
+def test_content_type_matcher(header_value, content_types, expected):
+    matcher = app._ContentTypeMatcher(content_types)
+    assert matcher.matches(header_value) == expected
+    # The result is memoized so check that a second lookup agrees.
+    assert matcher.matches(header_value) == expected
+
+
 def test_can_register_blueprint_on_app():
     myapp = app.Chalice('myapp')
     foo = app.Blueprint('foo')
@@ -3030,6 +3890,95 @@ def test_info_does_fail_if_already_disconnected(create_websocket_event):
     assert connection_id == 'connection_id'
 
 
+class FakeBroadcastClient(FakeClient):
+    def __init__(self, gone_connection_ids):
+        super(FakeBroadcastClient, self).__init__()
+        self._gone_connection_ids = gone_connection_ids
+        self._lock = threading.Lock()
+
+    def post_to_connection(self, ConnectionId, Data):
+        with self._lock:
+            self.calls['post_to_connection'].append((ConnectionId, Data))
+        if ConnectionId in self._gone_connection_ids:
+            raise FakeGoneException()
+
+
+def test_can_broadcast_to_websocket_connections():
+    websocket_api = app.WebsocketAPI()
+    client = FakeBroadcastClient(gone_connection_ids={'b', 'd'})
+    websocket_api.session = FakeSession(client)
+    websocket_api.configure('example.com', 'api')
+    connection_ids = ['a', 'b', 'c', 'd']
+
+    gone = websocket_api.broadcast(connection_ids, 'hello', max_workers=2)
+
+    assert gone == {'b', 'd'}
+    assert sorted(client.calls['post_to_connection']) == [
+        (connection_id, 'hello') for connection_id in connection_ids]
+    config = websocket_api.session.configs[0]
+    assert config.max_pool_connections == 2
+
+
+def test_broadcast_reuses_client_for_same_pool_size():
+    websocket_api = app.WebsocketAPI()
+    websocket_api.session = FakeSession(FakeBroadcastClient(set()))
+    websocket_api.configure('example.com', 'api')
+    assert websocket_api.broadcast([], 'hello') == set()
+    websocket_api.broadcast(['a'], 'hello')
+    websocket_api.broadcast(['a'], 'hello')
+    assert len(websocket_api.session.calls) == 1
+    websocket_api.broadcast(['a'], 'hello', max_workers=5)
+    assert len(websocket_api.session.calls) == 2
+    assert websocket_api.session.configs[-1].max_pool_connections == 5
+    websocket_api.broadcast(['a'], 'hello')
+    assert len(websocket_api.session.calls) == 2
+
+
+def test_broadcast_with_other_pool_size_while_broadcasting():
+    # A broadcast with a different max_workers doesn't shut down the
+    # thread pool another broadcast has already been given.
+    websocket_api = app.WebsocketAPI()
+    client = FakeBroadcastClient(set())
+    websocket_api.session = FakeSession(client)
+    websocket_api.configure('example.com', 'api')
+    got_executor = threading.Event()
+    other_broadcast_done = threading.Event()
+    exceptions = client.exceptions
+
+    class BlockingExceptions(object):
+        # The exceptions are looked up after the executor is returned and
+        # before it's used, so the first broadcast waits there for the
+        # second one.
+        @property
+        def GoneException(self):
+            if threading.current_thread() is thread:
+                got_executor.set()
+                other_broadcast_done.wait(5)
+            return exceptions.GoneException
+
+    client.exceptions = BlockingExceptions()
+    results = []
+    thread = threading.Thread(target=lambda: results.append(
+        websocket_api.broadcast(['a', 'b'], 'hello', max_workers=1)))
+    thread.start()
+    assert got_executor.wait(5)
+    websocket_api.broadcast(['c'], 'hello', max_workers=2)
+    other_broadcast_done.set()
+    thread.join(5)
+    assert results == [set()]
+    assert sorted(client.calls['post_to_connection']) == [
+        (connection_id, 'hello') for connection_id in ['a', 'b', 'c']]
+
+
+def test_broadcast_propagates_other_errors():
+    websocket_api = app.WebsocketAPI()
+    client = FakeClient(errors=[ValueError('error')])
+    websocket_api.session = FakeSession(client)
+    websocket_api.configure('example.com', 'api')
+    with pytest.raises(ValueError):
+        websocket_api.broadcast(['a'], 'hello')
+
+
 def test_can__about_websocket_connection(create_websocket_event):
     demo = app.Chalice('app-name')
     client = FakeClient(infos=[{'foo': 'bar'}])
@@ -3213,6 +4162,22 @@ def test_can_access_websocket_json_body_twice(create_websocket_event):
     demo(event, context=None)
 
 
+def test_websocket_json_body_uses_app_json_codec(create_websocket_event):
+    codec = UpperCaseKeysCodec()
+    demo = app.Chalice('app-name', json_codec=codec)
+    client = FakeClient()
+    demo.websocket_api.session = FakeSession(client)
+    called = []
+
+    @demo.on_ws_message()
+    def message(event):
+        called.append(event.json_body)
+
+    event = create_websocket_event('$default', body='{"foo": "bar"}')
+    demo.handler_map['message'](event, context=None)
+    assert called == [{'FOO': 'bar'}]
+
+
 def test_does_raise_on_invalid_json_wbsocket_body(create_websocket_event):
     demo = app.Chalice('app-name')
     client = FakeClient()
@@ -3745,3 +4710,1156 @@ class TestMiddleware:
             {'name': 'wrapped', 'event': {'input-event': True}},
             {'name': 'myfunction', 'event': {'input-event': True}},
         ]
+
+    def test_rest_api_middleware_chain_reused_across_requests(self):
+        demo = app.Chalice('app-name')
+        called = []
+
+        @demo.middleware('http')
+        def mymiddleware(event, get_response):
+            called.append(event.path)
+            return get_response(event)
+
+        @demo.route('/')
+        def index():
+            return {'index': True}
+
+        with Client(demo) as c:
+            c.http.get('/')
+            # pylint: disable=protected-access
+            handler = demo._rest_api_handler
+            c.http.get('/')
+            assert demo._rest_api_handler is handler
+        assert called == ['/', '/']
+
+    def test_middleware_added_after_first_request_is_used(self):
+        demo = app.Chalice('app-name')
+        called = []
+
+        @demo.route('/')
+        def index():
+            return {'index': True}
+
+        with Client(demo) as c:
+            assert c.http.get('/').json_body == {'index': True}
+
+            @demo.middleware('http')
+            def mymiddleware(event, get_response):
+                called.append(event.path)
+                return get_response(event)
+
+            assert c.http.get('/').json_body == {'index': True}
+        assert called == ['/']
+
+    def test_route_added_after_first_request_is_used(self, create_event):
+        demo = app.Chalice('app-name')
+
+        @demo.route('/')
+        def index():
+            return {'index': True}
+
+        demo(create_event('/', 'GET', {}), context=None)
+
+        @demo.route('/later')
+        def later():
+            return {'later': True}
+
+        response = demo(create_event('/later', 'GET', {}), context=None)
+        assert json.loads(response['body']) == {'later': True}
+
+    def test_middleware_sees_cors_headers(self):
+        demo = app.Chalice('app-name')
+        seen = []
+
+        @demo.middleware('http')
+        def mymiddleware(event, get_response):
+            response = get_response(event)
+            seen.append(response.headers.get('Access-Control-Allow-Origin'))
+            return response
+
+        @demo.route('/', cors=True)
+        def index():
+            return {'index': True}
+
+        with Client(demo) as c:
+            response = c.http.get('/')
+        assert seen == ['*']
+        assert response.headers['Access-Control-Allow-Origin'] == '*'
+
+    def test_middleware_can_modify_response_headers(self):
+        demo = app.Chalice('app-name')
+
+        @demo.middleware('http')
+        def mymiddleware(event, get_response):
+            response = get_response(event)
+            response.headers['Content-Type'] = 'text/plain'
+            response.headers['Set-Cookie'] = ['a=b', 'c=d']
+            return response
+
+        @demo.route('/')
+        def index():
+            return 'hello'
+
+        with Client(demo) as c:
+            response = c.http.get('/')
+        assert response.headers['Content-Type'] == 'text/plain'
+        assert response.body == b'hello'
+
+
+def test_current_request_is_per_invocation(sample_app, create_event):
+    @sample_app.route('/greet/{name}')
+    def name(name):
+        return {'name': sample_app.current_request.uri_params['name']}
+
+    first = sample_app(create_event('/greet/{name}', 'GET', {'name': 'a'}),
+                       context=None)
+    second = sample_app(create_event('/greet/{name}', 'GET', {'name': 'b'}),
+                        context=None)
+    assert json.loads(first['body']) == {'name': 'a'}
+    assert json.loads(second['body']) == {'name': 'b'}
+
+
+def test_handler_current_request_is_per_thread(sample_app, create_event):
+    @sample_app.route('/greet/{name}')
+    def name(name):
+        return {'name': name}
+
+    # pylint: disable=protected-access
+    handler = sample_app._get_rest_api_handler()
+    barrier = threading.Barrier(2, timeout=5)
+    results = {}
+
+    def invoke(value):
+        event = create_event('/greet/{name}', 'GET', {'name': value})
+        handler.create_request_object(event, None)
+        # Both threads have created their request before either
+        # dispatches it.
+        barrier.wait()
+        results[value] = json.loads(handler(event, None)['body'])
+
+    threads = [threading.Thread(target=invoke, args=(value,))
+               for value in ('a', 'b')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {'a': {'name': 'a'}, 'b': {'name': 'b'}}
+    assert handler.current_request is None
+
+
+def test_changing_debug_rebuilds_rest_api_handler(sample_app, create_event):
+    @sample_app.route('/error')
+    def error():
+        raise ValueError("error")
+
+    event = create_event('/error', 'GET', {})
+    response = sample_app(event, context=None)
+    assert json.loads(response['body'])['Code'] == 'InternalServerError'
+    sample_app.debug = True
+    response = sample_app(event, context=None)
+    assert 'ValueError' in response['body']
+
+
+class TestAsyncHandlers(object):
+    def test_can_use_async_view(self, create_event):
+        demo = app.Chalice('app-name')
+
+        @demo.route('/')
+        async def index():
+            await asyncio.sleep(0)
+            return {'async': True}
+
+        response = demo(create_event('/', 'GET', {}), context=None)
+        assert response['statusCode'] == 200
+        assert json.loads(response['body']) == {'async': True}
+
+    def test_event_loop_is_reused_across_invocations(self, create_event):
+        demo = app.Chalice('app-name')
+        loops = []
+
+        @demo.route('/')
+        async def index():
+            loops.append(asyncio.get_running_loop())
+            return {}
+
+        demo(create_event('/', 'GET', {}), context=None)
+        demo(create_event('/', 'GET', {}), context=None)
+        assert len(loops) == 2
+        assert loops[0] is loops[1]
+
+    def test_async_view_errors_are_converted_to_responses(
+            self, create_event):
+        demo = app.Chalice('app-name')
+
+        @demo.route('/notfound')
+        async def notfound():
+            raise NotFoundError('not found')
+
+        @demo.route('/error')
+        async def error():
+            raise ValueError('error')
+
+        response = demo(create_event('/notfound', 'GET', {}), context=None)
+        assert response['statusCode'] == 404
+        assert json.loads(response['body'])['Code'] == 'NotFoundError'
+        response = demo(create_event('/error', 'GET', {}), context=None)
+        assert response['statusCode'] == 500
+        assert json.loads(response['body'])['Code'] == 'InternalServerError'
+
+    @pytest.mark.parametrize('async_view', [True, False])
+    def test_can_use_async_middleware(self, create_event, async_view):
+        demo = app.Chalice('app-name')
+        called = []
+
+        @demo.middleware('http')
+        async def mymiddleware(event, get_response):
+            called.append('before')
+            response = await get_response(event)
+            called.append('after')
+            response.headers['X-Async'] = 'true'
+            return response
+
+        if async_view:
+            @demo.route('/')
+            async def index():
+                called.append('view')
+                return {'hello': 'world'}
+        else:
+            @demo.route('/')
+            def index():
+                called.append('view')
+                return {'hello': 'world'}
+
+        response = demo(create_event('/', 'GET', {}), context=None)
+        assert json.loads(response['body']) == {'hello': 'world'}
+        assert response['headers']['X-Async'] == 'true'
+        assert called == ['before', 'view', 'after']
+
+    def test_can_mix_sync_and_async_middleware(self, create_event):
+        demo = app.Chalice('app-name')
+        called = []
+
+        @demo.middleware('http')
+        async def outer(event, get_response):
+            called.append('outer')
+            return await get_response(event)
+
+        @demo.middleware('http')
+        def inner(event, get_response):
+            called.append('inner')
+            response = get_response(event)
+            # Sync middleware always sees the actual response.
+            assert isinstance(response, Response)
+            return response
+
+        @demo.route('/')
+        async def index():
+            called.append('view')
+            return {'hello': 'world'}
+
+        response = demo(create_event('/', 'GET', {}), context=None)
+        assert json.loads(response['body']) == {'hello': 'world'}
+        assert called == ['outer', 'inner', 'view']
+
+    def test_async_middleware_error_handling(self, create_event):
+        demo = app.Chalice('app-name')
+
+        @demo.middleware('http')
+        async def mymiddleware(event, get_response):
+            raise ValueError('middleware error')
+
+        @demo.route('/')
+        def index():
+            return {}
+
+        response = demo(create_event('/', 'GET', {}), context=None)
+        assert response['statusCode'] == 500
+
+    def test_can_use_async_event_handler(self):
+        demo = app.Chalice('app-name')
+        called = []
+
+        @demo.middleware('all')
+        async def mymiddleware(event, get_response):
+            called.append(event.__class__.__name__)
+            return await get_response(event)
+
+        @demo.on_sns_message(topic='mytopic')
+        async def handler(event):
+            await asyncio.sleep(0)
+            return {'message': event.message}
+
+        with Client(demo) as c:
+            event = c.events.generate_sns_event(message='hello')
+            response = c.lambda_.invoke('handler', event)
+        assert response.payload == {'message': 'hello'}
+        assert called == ['SNSEvent']
+
+    def test_can_use_async_lambda_function(self):
+        demo = app.Chalice('app-name')
+
+        @demo.lambda_function()
+        async def handler(event, context):
+            return {'event': event}
+
+        assert handler({'foo': 'bar'}, None) == {'event': {'foo': 'bar'}}
+
+    def test_can_use_async_view_with_test_client(self):
+        demo = app.Chalice('app-name')
+
+        @demo.route('/{name}')
+        async def index(name):
+            return {'name': name}
+
+        with Client(demo) as c:
+            assert c.http.get('/foo').json_body == {'name': 'foo'}
+
+
+class TestCompressionMiddleware(object):
+    @fixture
+    def compressed_app(self):
+        demo = app.Chalice('app-name')
+        demo.api.binary_types.append('application/json')
+        demo.register_middleware(
+            app.CompressionMiddleware(minimum_size=100), 'http')
+
+        @demo.route('/')
+        def index():
+            return {'data': 'a' * 1000}
+
+        @demo.route('/small')
+        def small():
+            return {'data': 'a'}
+
+        @demo.route('/encoded')
+        def encoded():
+            return app.Response(body=b'a' * 1000,
+                                headers={'Content-Encoding': 'br',
+                                         'Vary': 'Origin'})
+
+        return demo
+
+    def test_can_compress_response(self, compressed_app):
+        with Client(compressed_app) as c:
+            response = c.http.get('/', headers={
+                'Accept': 'application/json',
+                'Accept-Encoding': 'gzip, deflate'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert response.headers['Vary'] == 'Accept-Encoding'
+        assert json.loads(gzip.decompress(response.body)) == {
+            'data': 'a' * 1000}
+
+    def test_compressed_body_is_base64_encoded(self, compressed_app,
+                                               create_event):
+        event = create_event('/', 'GET', {})
+        event['headers'].update({'Accept': 'application/json',
+                                 'Accept-Encoding': 'deflate'})
+        response = compressed_app(event, context=None)
+        assert response['isBase64Encoded']
+        assert response['headers']['Content-Encoding'] == 'deflate'
+        body = zlib.decompress(base64.b64decode(response['body']))
+        assert json.loads(body) == {'data': 'a' * 1000}
+
+    def test_can_compress_non_binary_content_type(self, create_event):
+        demo = app.Chalice('app-name')
+        demo.api.binary_types.append('*/*')
+        demo.register_middleware(app.CompressionMiddleware(), 'http')
+
+        @demo.route('/')
+        def index():
+            return app.Response(body='a' * 2000,
+                                headers={'Content-Type': 'text/plain'})
+
+        event = create_event('/', 'GET', {})
+        event['headers'].update({'Accept': 'text/plain',
+                                 'Accept-Encoding': 'gzip'})
+        response = demo(event, context=None)
+        assert response['isBase64Encoded']
+        assert gzip.decompress(base64.b64decode(response['body'])) == \
+            b'a' * 2000
+
+    @pytest.mark.parametrize('accept_encoding,expected', [
+        ('gzip', 'gzip'),
+        ('deflate', 'deflate'),
+        ('deflate, gzip', 'gzip'),
+        ('gzip;q=0.5, deflate', 'deflate'),
+        ('*', 'gzip'),
+        ('br, *;q=0.1', 'gzip'),
+        ('gzip;q=0, deflate;q=0', None),
+        ('gzip;q=0, *', 'deflate'),
+        ('identity', None),
+        ('br', None),
+    ])
+    def test_negotiates_encoding(self, compressed_app, accept_encoding,
+                                 expected):
+        with Client(compressed_app) as c:
+            response = c.http.get('/', headers={
+                'Accept': 'application/json',
+                'Accept-Encoding': accept_encoding})
+        assert response.headers.get('Content-Encoding') == expected
+
+    def test_does_not_compress_small_responses(self, compressed_app):
+        with Client(compressed_app) as c:
+            response = c.http.get('/small', headers={
+                'Accept': 'application/json', 'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in response.headers
+        assert response.headers['Vary'] == 'Accept-Encoding'
+        assert response.json_body == {'data': 'a'}
+
+    def test_does_not_compress_already_encoded_response(
+            self, compressed_app):
+        with Client(compressed_app) as c:
+            response = c.http.get('/encoded', headers={
+                'Accept': 'application/json', 'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'br'
+        assert response.headers['Vary'] == 'Origin, Accept-Encoding'
+        assert response.body == b'a' * 1000
+
+    def test_does_not_compress_if_accept_is_not_binary(self):
+        demo = app.Chalice('app-name')
+        demo.register_middleware(app.CompressionMiddleware(), 'http')
+
+        @demo.route('/')
+        def index():
+            return {'data': 'a' * 2000}
+
+        # API Gateway wouldn't decode the base64 encoded body.
+        with Client(demo) as c:
+            response = c.http.get('/', headers={
+                'Accept': 'application/json', 'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in response.headers
+        assert response.json_body == {'data': 'a' * 2000}
+
+    def test_middleware_can_be_registered_for_all_events(self):
+        demo = app.Chalice('app-name')
+        demo.register_middleware(app.CompressionMiddleware(), 'all')
+
+        @demo.on_sns_message(topic='mytopic')
+        def handler(event):
+            return {'message': event.message}
+
+        with Client(demo) as c:
+            event = c.events.generate_sns_event(message='hello')
+            response = c.lambda_.invoke('handler', event)
+        assert response.payload == {'message': 'hello'}
+
+    def test_validates_arguments(self):
+        with pytest.raises(ValueError):
+            app.CompressionMiddleware(encodings=['br'])
+        with pytest.raises(ValueError):
+            app.CompressionMiddleware(compression_level=10)
+
+
+class TestConditionalGet(object):
+    @fixture
+    def etag_app(self):
+        demo = app.Chalice('app-name')
+        demo.calls = []
+
+        @demo.route('/', etag=True, cors=True)
+        def index():
+            demo.calls.append('index')
+            return {'hello': 'world'}
+
+        @demo.route('/items/{name}', etag=lambda name: 'v1-%s' % name)
+        def item(name):
+            demo.calls.append(name)
+            return {'name': name}
+
+        @demo.route('/modified', etag=True)
+        def modified():
+            return app.Response(body={'hello': 'world'}, headers={
+                'Last-Modified': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+
+        @demo.route('/custom', etag=True)
+        def custom():
+            return app.Response(body={'hello': 'world'},
+                                headers={'ETag': 'W/"custom"'})
+
+        @demo.route('/error', etag=True)
+        def error():
+            raise app.NotFoundError('not found')
+
+        @demo.route('/post', methods=['POST'], etag=True)
+        def post():
+            return {'hello': 'world'}
+
+        return demo
+
+    def test_adds_strong_etag(self, etag_app):
+        with Client(etag_app) as c:
+            first = c.http.get('/')
+            second = c.http.get('/')
+        assert first.status_code == 200
+        assert first.headers['ETag'].startswith('"')
+        assert first.headers['ETag'] == second.headers['ETag']
+        assert first.json_body == {'hello': 'world'}
+
+    def test_returns_304_when_etag_matches(self, etag_app):
+        with Client(etag_app) as c:
+            etag = c.http.get('/').headers['ETag']
+            response = c.http.get('/', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.body == b''
+        assert response.headers['ETag'] == etag
+        assert response.headers['Access-Control-Allow-Origin'] == '*'
+        assert 'Content-Type' not in response.headers
+
+    @pytest.mark.parametrize('if_none_match', [
+        '"other", %s', 'W/%s', '*',
+    ])
+    def test_if_none_match_formats(self, etag_app, if_none_match):
+        with Client(etag_app) as c:
+            etag = c.http.get('/').headers['ETag']
+            response = c.http.get('/', headers={
+                'If-None-Match': if_none_match.replace('%s', etag)})
+        assert response.status_code == 304
+
+    def test_returns_200_when_etag_does_not_match(self, etag_app):
+        with Client(etag_app) as c:
+            response = c.http.get('/', headers={'If-None-Match': '"stale"'})
+        assert response.status_code == 200
+        assert response.json_body == {'hello': 'world'}
+
+    def test_version_function_skips_view(self, etag_app):
+        with Client(etag_app) as c:
+            response = c.http.get('/items/foo',
+                                  headers={'If-None-Match': '"v1-foo"'})
+            assert response.status_code == 304
+            assert response.headers['ETag'] == '"v1-foo"'
+            assert etag_app.calls == []
+            response = c.http.get('/items/bar',
+                                  headers={'If-None-Match': '"v1-foo"'})
+        assert response.status_code == 200
+        assert response.headers['ETag'] == '"v1-bar"'
+        assert etag_app.calls == ['bar']
+
+    def test_can_use_last_modified(self, etag_app):
+        with Client(etag_app) as c:
+            not_modified = c.http.get('/modified', headers={
+                'If-Modified-Since': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+            modified = c.http.get('/modified', headers={
+                'If-Modified-Since': 'Tue, 20 Oct 2015 07:28:00 GMT'})
+            invalid = c.http.get('/modified', headers={
+                'If-Modified-Since': 'not a date'})
+        assert not_modified.status_code == 304
+        assert modified.status_code == 200
+        assert invalid.status_code == 200
+
+    def test_if_none_match_takes_precedence(self, etag_app):
+        with Client(etag_app) as c:
+            response = c.http.get('/modified', headers={
+                'If-None-Match': '"stale"',
+                'If-Modified-Since': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+        assert response.status_code == 200
+
+    def test_uses_etag_set_by_view(self, etag_app):
+        with Client(etag_app) as c:
+            response = c.http.get('/custom',
+                                  headers={'If-None-Match': '"custom"'})
+        assert response.status_code == 304
+        assert response.headers['ETag'] == 'W/"custom"'
+
+    def test_only_applies_to_successful_get_requests(self, etag_app):
+        with Client(etag_app) as c:
+            error = c.http.get('/error', headers={'If-None-Match': '*'})
+            post = c.http.post('/post', headers={'If-None-Match': '*'})
+        assert error.status_code == 404
+        assert 'ETag' not in error.headers
+        assert post.status_code == 200
+        assert 'ETag' not in post.headers
+
+    def test_no_etag_without_option(self, sample_app):
+        with Client(sample_app) as c:
+            response = c.http.get('/')
+        assert 'ETag' not in response.headers
+
+    def test_etag_with_middleware(self, etag_app):
+        seen = []
+
+        @etag_app.middleware('http')
+        def mymiddleware(event, get_response):
+            response = get_response(event)
+            seen.append(response.status_code)
+            return response
+
+        with Client(etag_app) as c:
+            response = c.http.get('/items/foo',
+                                  headers={'If-None-Match': '"v1-foo"'})
+        assert response.status_code == 304
+        assert seen == [304]
+
+    def test_etag_with_async_middleware(self, etag_app):
+        @etag_app.middleware('http')
+        async def mymiddleware(event, get_response):
+            return await get_response(event)
+
+        with Client(etag_app) as c:
+            etag = c.http.get('/').headers['ETag']
+            response = c.http.get('/', headers={'If-None-Match': etag})
+            skipped = c.http.get('/items/foo',
+                                 headers={'If-None-Match': '"v1-foo"'})
+        assert response.status_code == 304
+        assert skipped.status_code == 304
+        assert etag_app.calls == ['index', 'index']
+
+    def test_compressed_response_has_its_own_etag(self):
+        demo = app.Chalice('app-name')
+        demo.api.binary_types.append('application/json')
+        demo.register_middleware(
+            app.CompressionMiddleware(minimum_size=100), 'http')
+
+        @demo.route('/', etag=True)
+        def index():
+            return {'data': 'a' * 1000}
+
+        @demo.route('/items/{name}', etag=lambda name: 'v1-%s' % name)
+        def item(name):
+            return {'data': name * 1000}
+
+        gzip_headers = {'Accept': 'application/json',
+                        'Accept-Encoding': 'gzip'}
+        plain_headers = {'Accept': 'application/json'}
+        with Client(demo) as c:
+            compressed = c.http.get('/', headers=gzip_headers)
+            plain = c.http.get('/', headers=plain_headers)
+            assert compressed.headers['Content-Encoding'] == 'gzip'
+            assert 'Content-Encoding' not in plain.headers
+            etag = plain.headers['ETag']
+            assert compressed.headers['ETag'] == etag[:-1] + '-gzip"'
+            # Each ETag only matches its own representation.
+            not_modified = c.http.get('/', headers=dict(
+                gzip_headers, **{'If-None-Match': compressed.headers['ETag']}))
+            assert not_modified.status_code == 304
+            assert not_modified.body == b''
+            assert not_modified.headers['ETag'] == \
+                compressed.headers['ETag']
+            assert 'Content-Encoding' not in not_modified.headers
+            assert c.http.get('/', headers=dict(
+                gzip_headers, **{'If-None-Match': etag})).status_code == 200
+            assert c.http.get('/', headers=dict(
+                plain_headers, **{'If-None-Match': compressed.headers[
+                    'ETag']})).status_code == 200
+            assert c.http.get('/', headers=dict(
+                plain_headers, **{'If-None-Match': etag})).status_code == 304
+            # An ETag from a version function is checked before the view
+            # is called, so the ETag of any encoding of the version is
+            # matched and sent back.
+            compressed = c.http.get('/items/foo', headers=gzip_headers)
+            assert compressed.headers['ETag'] == '"v1-foo-gzip"'
+            not_modified = c.http.get('/items/foo', headers=dict(
+                gzip_headers, **{'If-None-Match': '"v1-foo-gzip"'}))
+            assert not_modified.status_code == 304
+            assert not_modified.headers['ETag'] == '"v1-foo-gzip"'
+            assert c.http.get('/items/foo', headers=dict(
+                gzip_headers, **{'If-None-Match': '"v2-foo-gzip"'}
+            )).status_code == 200
+
+    def test_weak_etag_is_shared_by_compressed_response(self):
+        demo = app.Chalice('app-name')
+        demo.api.binary_types.append('application/json')
+        demo.register_middleware(
+            app.CompressionMiddleware(minimum_size=100), 'http')
+
+        @demo.route('/', etag=True)
+        def index():
+            return app.Response(body={'data': 'a' * 1000},
+                                headers={'ETag': 'W/"custom"'})
+
+        with Client(demo) as c:
+            response = c.http.get('/', headers={
+                'Accept': 'application/json', 'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert response.headers['ETag'] == 'W/"custom"'
+
+
+class TestResponseCache(object):
+    @fixture
+    def cached_app(self):
+        demo = app.Chalice('app-name')
+        demo.calls = []
+
+        @demo.route('/items/{name}', cache=app.CacheConfig(
+            ttl=60, max_entries=2,
+            vary_on=['query:page', 'header:Accept-Language']))
+        def item(name):
+            demo.calls.append(name)
+            return {'name': name, 'calls': len(demo.calls)}
+
+        @demo.route('/error', cache=app.CacheConfig(ttl=60))
+        def error():
+            demo.calls.append('error')
+            raise app.NotFoundError('not found')
+
+        @demo.route('/etag', etag=True, cache=app.CacheConfig(ttl=60))
+        def etag():
+            demo.calls.append('etag')
+            return {'hello': 'world'}
+
+        return demo
+
+    def test_cache_hit_skips_view(self, cached_app):
+        with Client(cached_app) as c:
+            first = c.http.get('/items/foo')
+            second = c.http.get('/items/foo')
+        assert first.json_body == second.json_body == {
+            'name': 'foo', 'calls': 1}
+        assert cached_app.calls == ['foo']
+        assert cached_app.get_cache_stats('/items/{name}') == {
+            'hits': 1, 'misses': 1, 'evictions': 0, 'entries': 1}
+
+    def test_middleware_runs_on_cache_hit(self, cached_app):
+        seen = []
+
+        @cached_app.middleware('http')
+        def mymiddleware(event, get_response):
+            seen.append(event.path)
+            response = get_response(event)
+            response.headers['X-User'] = event.headers.get('X-User', '')
+            return response
+
+        with Client(cached_app) as c:
+            first = c.http.get('/items/foo', headers={'X-User': 'a'})
+            second = c.http.get('/items/foo', headers={'X-User': 'b'})
+        assert seen == ['/items/{name}', '/items/{name}']
+        assert cached_app.calls == ['foo']
+        # Headers added by middleware aren't cached.
+        assert first.headers['X-User'] == 'a'
+        assert second.headers['X-User'] == 'b'
+
+    def test_rejecting_middleware_rejects_cache_hit(self, cached_app):
+        @cached_app.middleware('http')
+        def auth(event, get_response):
+            if event.headers.get('Authorization') != 'secret':
+                return app.Response(body={'Code': 'Unauthorized'},
+                                    status_code=401)
+            return get_response(event)
+
+        with Client(cached_app) as c:
+            authorized = c.http.get('/items/foo',
+                                    headers={'Authorization': 'secret'})
+            rejected = c.http.get('/items/foo')
+        assert authorized.status_code == 200
+        assert rejected.status_code == 401
+        assert rejected.json_body == {'Code': 'Unauthorized'}
+
+    def test_cache_hit_is_compressed_per_request(self):
+        demo = app.Chalice('app-name')
+        demo.api.binary_types.append('application/json')
+        demo.register_middleware(app.CompressionMiddleware(), 'http')
+        calls = []
+
+        @demo.route('/', cache=app.CacheConfig(ttl=60))
+        def index():
+            calls.append('index')
+            return {'data': 'a' * 2000}
+
+        gzip_headers = {'Accept': 'application/json',
+                        'Accept-Encoding': 'gzip'}
+        with Client(demo) as c:
+            compressed = c.http.get('/', headers=gzip_headers)
+            plain = c.http.get('/', headers={'Accept': 'application/json'})
+            compressed_hit = c.http.get('/', headers=gzip_headers)
+        assert calls == ['index']
+        assert compressed.headers['Content-Encoding'] == 'gzip'
+        assert json.loads(gzip.decompress(compressed.body)) == {
+            'data': 'a' * 2000}
+        assert 'Content-Encoding' not in plain.headers
+        assert json.loads(plain.body) == {'data': 'a' * 2000}
+        assert compressed_hit.headers['Content-Encoding'] == 'gzip'
+        assert compressed_hit.body == compressed.body
+
+    def test_cached_binary_response_requires_binary_accept(self):
+        demo = app.Chalice('app-name')
+
+        @demo.route('/image', cache=app.CacheConfig(ttl=60))
+        def image():
+            return app.Response(body=b'\x89PNG',
+                                headers={'Content-Type': 'image/png'})
+
+        with Client(demo) as c:
+            binary = c.http.get('/image', headers={'Accept': 'image/png'})
+            text = c.http.get('/image', headers={'Accept': 'text/plain'})
+        assert binary.status_code == 200
+        assert binary.body == b'\x89PNG'
+        assert text.status_code == 400
+
+    def test_cache_key_includes_vary_on_values(self, cached_app):
+        with Client(cached_app) as c:
+            c.http.get('/items/foo')
+            c.http.get('/items/bar')
+            c.http.get('/items/foo?page=2')
+            c.http.get('/items/foo', headers={'Accept-Language': 'fr'})
+            # Headers that aren't in vary_on are ignored.
+            c.http.get('/items/foo', headers={'Accept-Language': 'fr',
+                                              'X-Other': 'value'})
+        assert cached_app.calls == ['foo', 'bar', 'foo', 'foo']
+
+    def test_evicts_least_recently_used(self, cached_app):
+        with Client(cached_app) as c:
+            c.http.get('/items/a')
+            c.http.get('/items/b')
+            c.http.get('/items/a')
+            c.http.get('/items/c')
+            c.http.get('/items/a')
+            c.http.get('/items/b')
+        assert cached_app.calls == ['a', 'b', 'c', 'b']
+        assert cached_app.get_cache_stats('/items/{name}')['evictions'] == 2
+
+    def test_entries_expire_after_ttl(self, cached_app, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(app.time, 'monotonic', lambda: now[0])
+        with Client(cached_app) as c:
+            c.http.get('/items/foo')
+            now[0] += 59
+            c.http.get('/items/foo')
+            now[0] += 2
+            c.http.get('/items/foo')
+        assert cached_app.calls == ['foo', 'foo']
+
+    def test_does_not_cache_errors(self, cached_app):
+        with Client(cached_app) as c:
+            assert c.http.get('/error').status_code == 404
+            assert c.http.get('/error').status_code == 404
+        assert cached_app.calls == ['error', 'error']
+
+    def test_can_invalidate_cache(self, cached_app):
+        with Client(cached_app) as c:
+            c.http.get('/items/foo')
+            cached_app.invalidate_cache('/items/{name}')
+            c.http.get('/items/foo')
+            cached_app.invalidate_cache()
+            c.http.get('/items/foo')
+            cached_app.invalidate_cache('/etag')
+            c.http.get('/items/foo')
+        assert cached_app.calls == ['foo', 'foo', 'foo']
+
+    def test_cached_response_honors_if_none_match(self, cached_app):
+        with Client(cached_app) as c:
+            etag = c.http.get('/etag').headers['ETag']
+            response = c.http.get('/etag', headers={'If-None-Match': etag})
+            stale = c.http.get('/etag', headers={'If-None-Match': '"stale"'})
+        assert response.status_code == 304
+        assert response.body == b''
+        assert stale.status_code == 200
+        assert stale.json_body == {'hello': 'world'}
+        assert cached_app.calls == ['etag']
+
+    def test_cached_response_is_copied(self, cached_app, create_event):
+        event = create_event('/items/{name}', 'GET', {'name': 'foo'})
+        first = cached_app(event, context=None)
+        first['headers']['X-Modified'] = 'true'
+        second = cached_app(event, context=None)
+        assert 'X-Modified' not in second['headers']
+
+    def test_only_get_requests_are_cached(self):
+        demo = app.Chalice('app-name')
+        calls = []
+
+        @demo.route('/', methods=['POST'], cache=app.CacheConfig(ttl=60))
+        def index():
+            calls.append(1)
+            return {}
+
+        with Client(demo) as c:
+            c.http.post('/')
+            c.http.post('/')
+        assert len(calls) == 2
+
+    def test_get_cache_stats_requires_cache(self, sample_app):
+        with pytest.raises(ValueError):
+            sample_app.get_cache_stats('/')
+
+    @pytest.mark.parametrize('kwargs', [
+        {'ttl': 0},
+        {'ttl': 10, 'max_entries': 0},
+        {'ttl': 10, 'vary_on': ['page']},
+        {'ttl': 10, 'vary_on': ['query:']},
+    ])
+    def test_validates_cache_config(self, kwargs):
+        with pytest.raises(ValueError):
+            app.CacheConfig(**kwargs)
+
+    def test_cache_config_equality(self):
+        assert app.CacheConfig(ttl=10) == app.CacheConfig(ttl=10)
+        assert app.CacheConfig(ttl=10) != app.CacheConfig(ttl=5)
+
+
+class TestMetrics(object):
+    @fixture
+    def metrics_app(self):
+        demo = app.Chalice('metrics-app')
+        demo.metrics_config = app.MetricsConfig(
+            namespace='MyApp', dimensions={'Stage': 'dev'})
+
+        @demo.route('/items/{name}', methods=['GET', 'POST'])
+        def item(name):
+            if name == 'missing':
+                raise NotFoundError(name)
+            return {'name': name}
+
+        @demo.on_sqs_message(queue='myqueue')
+        def handle_sqs(event):
+            pass
+
+        @demo.lambda_function()
+        def fails(event, context):
+            raise RuntimeError("failed")
+
+        demo.fails = fails
+        return demo
+
+    def get_metric_lines(self, capsys):
+        return [json.loads(line) for line in
+                capsys.readouterr().out.splitlines()
+                if line.startswith('{"')]
+
+    def test_no_metrics_emitted_by_default(self, sample_app, capsys):
+        with Client(sample_app) as c:
+            c.http.get('/')
+        assert self.get_metric_lines(capsys) == []
+
+    def test_emits_one_emf_line_per_request(self, metrics_app, capsys):
+        with Client(metrics_app) as c:
+            c.http.post('/items/foo', body='{"a": 1}',
+                        headers={'Content-Type': 'application/json'})
+        metrics = self.get_metric_lines(capsys)
+        assert len(metrics) == 1
+        record = metrics[0]
+        assert record['Service'] == 'metrics-app'
+        assert record['Handler'] == 'POST /items/{name}'
+        assert record['Stage'] == 'dev'
+        assert record['StatusCode'] == 200
+        assert record['ColdStart'] == 1
+        assert record['Status2xx'] == 1
+        assert record['Status4xx'] == 0
+        assert record['RequestSize'] == 8
+        assert record['ResponseSize'] == len(b'{"name":"foo"}')
+        assert record['Latency'] >= record['SerializationLatency'] >= 0
+        emf = record['_aws']['CloudWatchMetrics'][0]
+        assert emf['Namespace'] == 'MyApp'
+        assert emf['Dimensions'] == [['Stage', 'Service', 'Handler']]
+        metric_names = [m['Name'] for m in emf['Metrics']]
+        for name in metric_names:
+            assert name in record
+        assert {'Name': 'Latency', 'Unit': 'Milliseconds'} in emf['Metrics']
+        assert 'StatusCode' not in metric_names
+
+    def test_cold_start_only_reported_once(self, metrics_app, capsys):
+        with Client(metrics_app) as c:
+            c.http.get('/items/foo')
+            c.http.get('/items/missing')
+            c.lambda_.invoke(
+                'handle_sqs', c.events.generate_sqs_event(['a', 'b']))
+        first, second, sqs = self.get_metric_lines(capsys)
+        assert first['ColdStart'] == 1
+        assert second['ColdStart'] == 0
+        assert second['Status4xx'] == 1
+        assert second['StatusCode'] == 404
+        assert sqs['ColdStart'] == 0
+        assert sqs['Handler'] == 'handle_sqs'
+        assert sqs['RecordCount'] == 2
+        assert sqs['Errors'] == 0
+
+    def test_errors_are_recorded_and_reraised(self, metrics_app, capsys):
+        with pytest.raises(RuntimeError):
+            metrics_app.fails({}, context=None)
+        record, = self.get_metric_lines(capsys)
+        assert record['Handler'] == 'fails'
+        assert record['Errors'] == 1
+
+    def test_records_cache_hits(self, capsys):
+        demo = app.Chalice('metrics-app')
+        demo.metrics_config = app.MetricsConfig()
+
+        @demo.route('/', cache=app.CacheConfig(ttl=60))
+        def index():
+            return {}
+
+        with Client(demo) as c:
+            c.http.get('/')
+            c.http.get('/')
+        miss, hit = self.get_metric_lines(capsys)
+        assert miss['CacheHit'] is False
+        assert hit['CacheHit'] is True
+
+    def test_websocket_metrics(self, create_websocket_event, capsys):
+        demo = app.Chalice('metrics-app')
+        demo.metrics_config = app.MetricsConfig()
+
+        @demo.on_ws_message()
+        def message(event):
+            return {'statusCode': 400}
+
+        message(create_websocket_event('$default', body='hello'),
+                context=None)
+        record, = self.get_metric_lines(capsys)
+        assert record['Handler'] == 'message'
+        assert record['MessageSize'] == 5
+        assert record['StatusCode'] == 400
+        assert record['Status4xx'] == 1
+
+    def test_blueprint_handlers_use_app_metrics(self, capsys):
+        demo = app.Chalice('metrics-app')
+        demo.metrics_config = app.MetricsConfig()
+        blueprint = app.Blueprint('bp')
+
+        @blueprint.lambda_function()
+        def bp_function(event, context):
+            return {}
+
+        demo.register_blueprint(blueprint)
+        bp_function({}, context=None)
+        record, = self.get_metric_lines(capsys)
+        assert record['Handler'] == 'bp_function'
+
+
+class RecordingInstrumentation(app.Instrumentation):
+    def __init__(self):
+        self.calls = []
+
+    def on_phase_start(self, phase, info):
+        info['started'] = True
+        self.calls.append(('start', phase))
+
+    def on_phase_end(self, phase, info, error):
+        assert info['started']
+        self.calls.append(('end', phase, type(error).__name__
+                           if error is not None else None))
+
+
+class TestInstrumentation(object):
+    @fixture
+    def recorder(self):
+        return RecordingInstrumentation()
+
+    def test_rest_api_phases(self, recorder):
+        demo = app.Chalice('app-name')
+        demo.register_instrumentation(recorder)
+
+        @demo.middleware('http')
+        def my_middleware(event, get_response):
+            return get_response(event)
+
+        @demo.route('/')
+        def index():
+            return {'hello': 'world'}
+
+        with Client(demo) as c:
+            c.http.get('/')
+        assert recorder.calls == [
+            ('start', 'invocation'),
+            ('start', 'request_parse'),
+            ('end', 'request_parse', None),
+            ('start', 'middleware'),
+            ('start', 'view'),
+            ('end', 'view', None),
+            ('start', 'response_validation'),
+            ('end', 'response_validation', None),
+            ('end', 'middleware', None),
+            ('start', 'serialization'),
+            ('end', 'serialization', None),
+            ('end', 'invocation', None),
+        ]
+
+    def test_view_errors_are_passed_to_hooks(self, recorder):
+        demo = app.Chalice('app-name')
+        demo.register_instrumentation(recorder)
+
+        @demo.route('/')
+        def index():
+            raise NotFoundError("missing")
+
+        with Client(demo) as c:
+            response = c.http.get('/')
+        assert response.status_code == 404
+        assert ('end', 'view', 'NotFoundError') in recorder.calls
+
+    def test_async_phases(self, recorder):
+        demo = app.Chalice('app-name')
+        demo.register_instrumentation(recorder)
+
+        @demo.middleware('http')
+        async def my_middleware(event, get_response):
+            return await get_response(event)
+
+        @demo.route('/')
+        async def index():
+            return {'hello': 'world'}
+
+        with Client(demo) as c:
+            assert c.http.get('/').json_body == {'hello': 'world'}
+        phases = [call[1] for call in recorder.calls if call[0] == 'start']
+        assert phases == ['invocation', 'request_parse', 'middleware',
+                          'view', 'response_validation', 'serialization']
+
+    def test_event_source_phases(self, recorder):
+        demo = app.Chalice('app-name')
+        demo.register_instrumentation(recorder)
+
+        @demo.middleware('all')
+        def my_middleware(event, get_response):
+            return get_response(event)
+
+        @demo.on_sns_message(topic='mytopic')
+        def handler(event):
+            raise RuntimeError("failed")
+
+        with Client(demo) as c:
+            with pytest.raises(RuntimeError):
+                c.lambda_.invoke(
+                    'handler', c.events.generate_sns_event('hello'))
+        assert recorder.calls == [
+            ('start', 'invocation'),
+            ('start', 'middleware'),
+            ('start', 'view'),
+            ('end', 'view', 'RuntimeError'),
+            ('end', 'middleware', 'RuntimeError'),
+            ('end', 'invocation', 'RuntimeError'),
+        ]
+
+    def test_authorizer_phase(self, recorder):
+        demo = app.Chalice('app-name')
+        demo.register_instrumentation(recorder)
+
+        @demo.authorizer()
+        def auth(auth_request):
+            return app.AuthResponse(routes=['/'], principal_id='user')
+
+        auth.with_scopes(['scope'])
+        auth({'type': 'TOKEN', 'authorizationToken': 'token',
+              'methodArn': 'arn:aws:execute-api:us-west-2:123:api/dev/GET/'},
+             None)
+        assert recorder.calls == [('start', 'auth'), ('end', 'auth', None)]
+
+    def test_blueprint_handlers_use_app_instrumentation(self, recorder):
+        demo = app.Chalice('app-name')
+        demo.register_instrumentation(recorder)
+        blueprint = app.Blueprint('bp')
+
+        @blueprint.lambda_function()
+        def bp_function(event, context):
+            return {}
+
+        demo.register_blueprint(blueprint)
+        bp_function({}, context=None)
+        assert recorder.calls == [
+            ('start', 'invocation'),
+            ('start', 'view'),
+            ('end', 'view', None),
+            ('end', 'invocation', None),
+        ]
+
+    def test_no_hooks_called_until_registered(self, recorder):
+        demo = app.Chalice('app-name')
+
+        @demo.route('/')
+        def index():
+            return {}
+
+        with Client(demo) as c:
+            c.http.get('/')
+            assert recorder.calls == []
+            demo.register_instrumentation(recorder)
+            c.http.get('/')
+        assert recorder.calls[0] == ('start', 'invocation')
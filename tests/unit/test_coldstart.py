@@ -0,0 +1,78 @@
+import io
+
+from chalice.coldstart import ColdStartReport
+from chalice.coldstart import ImportRecord
+from chalice.coldstart import PackageStats
+from chalice.coldstart import display_report
+from chalice.coldstart import parse_import_times
+
+
+IMPORT_TIME_OUTPUT = '''\
+import time: self [us] | cumulative | imported package
+import time:       100 |        100 | encodings
+import time:       200 |        200 |     botocore.compat
+import time:       300 |        500 |   botocore
+import time:        50 |         50 |   json
+import time:      1000 |       1550 | app
+'''
+
+
+def test_can_parse_import_times():
+    records = parse_import_times(IMPORT_TIME_OUTPUT)
+    assert [r.name for r in records] == ['encodings', 'app']
+    app = records[1]
+    assert app.self_us == 1000
+    assert app.cumulative_us == 1550
+    assert [r.name for r in app.children] == ['botocore', 'json']
+    botocore = app.children[0]
+    assert botocore.depth == 1
+    assert [r.name for r in botocore.children] == ['botocore.compat']
+    assert botocore.children[0].top_level_package == 'botocore'
+
+
+def test_parse_ignores_other_output():
+    records = parse_import_times(
+        'Traceback (most recent call last):\n' + IMPORT_TIME_OUTPUT)
+    assert len(records) == 2
+
+
+def test_can_walk_import_tree():
+    app = parse_import_times(IMPORT_TIME_OUTPUT)[1]
+    assert [r.name for r in app.walk()] == [
+        'app', 'botocore', 'botocore.compat', 'json']
+
+
+def test_display_report():
+    root = parse_import_times(IMPORT_TIME_OUTPUT)[1]
+    botocore = PackageStats(name='botocore', import_us=500,
+                            module_count=2, size=2048)
+    report = ColdStartReport(
+        root=root,
+        packages=[PackageStats(name='app', import_us=1000, module_count=1,
+                               size=100),
+                  botocore,
+                  PackageStats(name='json', import_us=50, module_count=1)],
+        unused=[botocore],
+    )
+    stream = io.StringIO()
+    display_report(report, stream, max_depth=1, min_ms=0.1)
+    output = stream.getvalue()
+    assert 'Total import time: 1.6 ms (4 modules)' in output
+    assert '0.5    botocore\n' in output
+    # Deeper than max_depth.
+    assert 'botocore.compat' not in output
+    assert 'botocore                                0.5        2' in output
+    # Below min_ms and not in the deployment package.
+    assert 'json     ' not in output
+    assert '  botocore (0.5 ms)\n' in output
+
+
+def test_report_totals():
+    report = ColdStartReport(
+        root=ImportRecord(name='app', self_us=10, cumulative_us=10, depth=0),
+        packages=[], unused=[])
+    assert report.total_us == 10
+    assert report.module_count == 1
+    stream = io.StringIO()
+    display_report(report, stream)
+    assert 'Heavy packages' not in stream.getvalue()
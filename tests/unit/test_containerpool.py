@@ -0,0 +1,430 @@
+import io
+import json
+import sys
+import threading
+
+import pytest
+
+from chalice.config import Config
+from chalice.containerpool import ContainerError
+from chalice.containerpool import ContainerPool
+from chalice.containerpool import ContainerTimeoutError
+from chalice.containerpool import InvocationReport
+from chalice.containerpool import LambdaContainer
+from chalice.containerpool import ThrottledError
+from chalice.containerruntime import run_container
+
+
+APP_SOURCE = """
+from chalice import Chalice
+
+app = Chalice(app_name='containerapp')
+
+
+@app.route('/')
+def index():
+    return {'request_id': app.lambda_context.aws_request_id}
+"""
+
+
+@pytest.fixture
+def clean_import_state(monkeypatch):
+    # run_container() imports the app module in this process.
+    monkeypatch.setattr(sys, 'path', list(sys.path))
+    monkeypatch.delitem(sys.modules, 'app', raising=False)
+    yield
+    sys.modules.pop('app', None)
+
+
+class FakeContainer(object):
+    def __init__(self, error=None):
+        self.is_started = False
+        self.stopped = False
+        self.invocations = []
+        self._error = error
+        self.before_invoke = None
+
+    def invoke(self, event, request_id):
+        if self.before_invoke is not None:
+            self.before_invoke()
+        self.invocations.append((event, request_id))
+        if self._error is not None:
+            raise self._error
+        result = {'response': {'statusCode': 200}, 'duration_ms': 1.0}
+        if not self.is_started:
+            self.is_started = True
+            result['init_duration_ms'] = 10.0
+        return result
+
+    def stop(self):
+        self.stopped = True
+
+
+class FakeContainerFactory(object):
+    def __init__(self, error=None):
+        self.containers = []
+        self._error = error
+
+    def __call__(self):
+        container = FakeContainer(self._error)
+        self.containers.append(container)
+        return container
+
+
+class FakeProcess(object):
+    def __init__(self, output):
+        self.stdin = io.BytesIO()
+        self.stdout = io.BytesIO(output)
+        self.returncode = 1
+        self.killed = False
+
+    def wait(self):
+        return self.returncode
+
+    def kill(self):
+        self.killed = True
+
+
+class HungProcess(FakeProcess):
+    # An invocation that never writes a result until it's killed.
+    def __init__(self):
+        super(HungProcess, self).__init__(b'')
+        self._killed = threading.Event()
+        self.stdout = self
+
+    def readline(self):
+        self._killed.wait(5)
+        return b''
+
+    def kill(self):
+        super(HungProcess, self).kill()
+        self._killed.set()
+
+
+class ImmediateTimer(object):
+    # Fires as soon as it's started, as if the invocation had already
+    # run for the whole timeout.
+    def __init__(self, interval, function):
+        self.interval = interval
+        self.function = function
+        self.cancelled = False
+
+    def start(self):
+        self.function()
+
+    def cancel(self):
+        self.cancelled = True
+
+
+def test_first_invocation_is_cold_start():
+    factory = FakeContainerFactory()
+    pool = ContainerPool(factory)
+    response, report = pool.invoke({'foo': 'bar'}, 'request-1')
+    assert response == {'statusCode': 200}
+    assert report.cold_start
+    assert report.init_duration_ms == 10.0
+    assert factory.containers[0].invocations == [({'foo': 'bar'},
+                                                  'request-1')]
+
+
+def test_idle_containers_are_reused():
+    factory = FakeContainerFactory()
+    pool = ContainerPool(factory)
+    pool.invoke({}, 'request-1')
+    _, report = pool.invoke({}, 'request-2')
+    assert not report.cold_start
+    assert report.init_duration_ms is None
+    assert len(factory.containers) == 1
+    assert pool.get_stats() == {
+        'invocations': 2, 'cold_starts': 1, 'throttles': 0, 'errors': 0,
+        'timeouts': 0, 'containers': 1, 'idle': 1,
+    }
+
+
+def test_throttles_when_reserved_concurrency_reached():
+    factory = FakeContainerFactory()
+    pool = ContainerPool(factory, max_containers=1)
+    results = []
+
+    def invoke_concurrently():
+        # The second request comes in while the only container is busy
+        # with the first one.
+        factory.containers[0].before_invoke = None
+        try:
+            pool.invoke({}, 'request-2')
+        except ThrottledError:
+            results.append('throttled')
+
+    original_factory = pool._container_factory
+
+    def factory_with_busy_container():
+        container = original_factory()
+        container.before_invoke = invoke_concurrently
+        return container
+
+    pool._container_factory = factory_with_busy_container
+    pool.invoke({}, 'request-1')
+    assert results == ['throttled']
+    assert pool.get_stats()['throttles'] == 1
+    # Once the container is idle again it handles the next request.
+    _, report = pool.invoke({}, 'request-3')
+    assert not report.cold_start
+
+
+def test_zero_reserved_concurrency_throttles_every_request():
+    pool = ContainerPool(FakeContainerFactory(), max_containers=0)
+    with pytest.raises(ThrottledError):
+        pool.invoke({}, 'request-1')
+
+
+def test_no_limit_without_reserved_concurrency():
+    factory = FakeContainerFactory()
+    pool = ContainerPool(factory)
+    barrier = threading.Barrier(3, timeout=5)
+
+    def invoke():
+        pool.invoke({}, 'request')
+
+    original_factory = pool._container_factory
+
+    def factory_with_barrier():
+        container = original_factory()
+        container.before_invoke = barrier.wait
+        return container
+
+    pool._container_factory = factory_with_barrier
+    threads = [threading.Thread(target=invoke) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(factory.containers) == 3
+    assert pool.get_stats()['cold_starts'] == 3
+
+
+def test_failed_container_is_discarded():
+    factory = FakeContainerFactory(error=ContainerError('exited'))
+    pool = ContainerPool(factory, max_containers=1)
+    with pytest.raises(ContainerError):
+        pool.invoke({}, 'request-1')
+    assert factory.containers[0].stopped
+    # The failed container doesn't count towards the reserved concurrency.
+    with pytest.raises(ContainerError):
+        pool.invoke({}, 'request-2')
+    assert len(factory.containers) == 2
+    assert pool.get_stats()['errors'] == 2
+
+
+def test_shutdown_stops_containers():
+    factory = FakeContainerFactory()
+    pool = ContainerPool(factory)
+    pool.invoke({}, 'request-1')
+    pool.shutdown()
+    assert factory.containers[0].stopped
+    assert pool.get_stats()['containers'] == 0
+
+
+def test_pool_from_config_uses_reserved_concurrency():
+    config = Config.create(project_dir='/tmp/app', reserved_concurrency=2)
+    pool = ContainerPool.from_config(config)
+    assert pool.max_containers == 2
+
+
+def test_report_format():
+    report = InvocationReport(request_id='abcd', cold_start=True,
+                              latency_ms=120.5, duration_ms=1.25,
+                              init_duration_ms=100.0)
+    assert report.format() == (
+        'REPORT RequestId: abcd\tDuration: 1.25 ms\t'
+        'Init Duration: 100.00 ms\tLatency: 120.50 ms\tCold Start')
+    report = InvocationReport(request_id='abcd', cold_start=False,
+                              latency_ms=2.0, duration_ms=1.0)
+    assert report.format() == (
+        'REPORT RequestId: abcd\tDuration: 1.00 ms\t'
+        'Latency: 2.00 ms\tWarm')
+
+
+def test_container_sends_invocation_to_process():
+    calls = []
+    result = {'response': {'statusCode': 200}, 'duration_ms': 1.0}
+    process = FakeProcess(json.dumps(result).encode('utf-8') + b'\n')
+
+    def popen(*args, **kwargs):
+        calls.append((args, kwargs))
+        return process
+
+    config = Config.create(project_dir='/tmp/app', lambda_timeout=10,
+                           environment_variables={'FOO': 'bar'})
+    container = LambdaContainer('/tmp/app', config, popen=popen)
+    assert not container.is_started
+    assert container.invoke({'foo': 'bar'}, 'request-1') == result
+    assert container.is_started
+    assert calls[0][0][0][-1] == '/tmp/app'
+    assert calls[0][1]['env']['FOO'] == 'bar'
+    message = json.loads(process.stdin.getvalue().decode('utf-8'))
+    assert message['event'] == {'foo': 'bar'}
+    assert message['request_id'] == 'request-1'
+    assert message['timeout_ms'] == 10000
+
+
+def test_container_is_killed_after_timeout():
+    process = HungProcess()
+    timers = []
+
+    def timer_factory(interval, function):
+        timers.append(ImmediateTimer(interval, function))
+        return timers[-1]
+
+    config = Config.create(project_dir='/tmp/app', lambda_timeout=3)
+    container = LambdaContainer('/tmp/app', config,
+                                popen=lambda *args, **kwargs: process,
+                                timer_factory=timer_factory)
+    with pytest.raises(ContainerTimeoutError) as e:
+        container.invoke({}, 'request-1')
+    assert str(e.value) == 'Task timed out after 3.00 seconds'
+    assert process.killed
+    assert timers[0].interval == 3
+    assert timers[0].cancelled
+
+
+def test_timer_is_cancelled_when_invocation_finishes():
+    timers = []
+
+    def timer_factory(interval, function):
+        timers.append(threading.Timer(interval, function))
+        return timers[-1]
+
+    result = {'response': {'statusCode': 200}, 'duration_ms': 1.0}
+    process = FakeProcess(json.dumps(result).encode('utf-8') + b'\n')
+    container = LambdaContainer('/tmp/app', Config.create(),
+                                popen=lambda *args, **kwargs: process,
+                                timer_factory=timer_factory)
+    assert container.invoke({}, 'request-1') == result
+    # The default timeout is the same one used when deploying.
+    assert timers[0].interval == 60
+    assert timers[0].finished.is_set()
+    assert not process.killed
+
+
+def test_timed_out_container_is_discarded():
+    factory = FakeContainerFactory(
+        error=ContainerTimeoutError('Task timed out after 3.00 seconds'))
+    pool = ContainerPool(factory, max_containers=1)
+    with pytest.raises(ContainerTimeoutError):
+        pool.invoke({}, 'request-1')
+    assert factory.containers[0].stopped
+    stats = pool.get_stats()
+    assert stats['timeouts'] == 1
+    # A timeout is only counted once.
+    assert stats['errors'] == 0
+    assert stats['containers'] == 0
+
+
+def test_response_read_before_timeout_is_returned():
+    timers = []
+    result = {'response': {'statusCode': 200}, 'duration_ms': 1.0}
+
+    class LateTimeoutProcess(FakeProcess):
+        # The timer fires after the response was read but before the
+        # invocation is marked as finished.
+        def __init__(self, output):
+            super(LateTimeoutProcess, self).__init__(output)
+            self._output, self.stdout = self.stdout, self
+
+        def readline(self):
+            line = self._output.readline()
+            timers[0].function()
+            return line
+
+    def timer_factory(interval, function):
+        timers.append(threading.Timer(interval, function))
+        return timers[-1]
+
+    process = LateTimeoutProcess(json.dumps(result).encode('utf-8') + b'\n')
+    container = LambdaContainer('/tmp/app', Config.create(),
+                                popen=lambda *args, **kwargs: process,
+                                timer_factory=timer_factory)
+    assert container.invoke({}, 'request-1') == result
+    assert process.killed
+    # The killed process is replaced on the next invocation.
+    assert not container.is_started
+
+
+def test_timer_does_nothing_after_invocation_finishes():
+    timers = []
+
+    def timer_factory(interval, function):
+        timers.append(threading.Timer(interval, function))
+        return timers[-1]
+
+    result = {'response': {'statusCode': 200}, 'duration_ms': 1.0}
+    process = FakeProcess(json.dumps(result).encode('utf-8') + b'\n')
+    container = LambdaContainer('/tmp/app', Config.create(),
+                                popen=lambda *args, **kwargs: process,
+                                timer_factory=timer_factory)
+    assert container.invoke({}, 'request-1') == result
+    timers[0].function()
+    assert not process.killed
+    assert container.is_started
+
+
+def test_container_error_when_process_exits():
+    container = LambdaContainer('/tmp/app', Config.create(),
+                                popen=lambda *args, **kwargs: FakeProcess(b''))
+    with pytest.raises(ContainerError):
+        container.invoke({}, 'request-1')
+
+
+def test_run_container_imports_app_once(tmpdir, clean_import_state):
+    tmpdir.join('app.py').write(APP_SOURCE)
+    event = {
+        'requestContext': {'resourcePath': '/', 'httpMethod': 'GET'},
+        'headers': {}, 'multiValueQueryStringParameters': None,
+        'pathParameters': None, 'stageVariables': None, 'body': None,
+    }
+    messages = b''.join(
+        json.dumps({'event': event, 'request_id': request_id,
+                    'function_name': 'api_handler', 'memory_size': 128,
+                    'timeout_ms': 60000}).encode('utf-8') + b'\n'
+        for request_id in ('request-1', 'request-2'))
+    output = io.BytesIO()
+    run_container(str(tmpdir), io.BytesIO(messages), output)
+    results = [json.loads(line) for line in
+               output.getvalue().decode('utf-8').splitlines()]
+    assert 'init_duration_ms' in results[0]
+    assert 'init_duration_ms' not in results[1]
+    assert [json.loads(r['response']['body'])['request_id']
+            for r in results] == ['request-1', 'request-2']
+
+
+def test_run_container_stops_when_app_cannot_be_imported(tmpdir,
+                                                         clean_import_state):
+    tmpdir.join('app.py').write('raise RuntimeError("bad app")')
+    message = json.dumps({'event': {}, 'request_id': 'request-1',
+                          'function_name': 'api_handler',
+                          'memory_size': 128, 'timeout_ms': 60000}) + '\n'
+    output = io.BytesIO()
+    run_container(str(tmpdir), io.BytesIO(message.encode('utf-8') * 2),
+                  output)
+    results = output.getvalue().decode('utf-8').splitlines()
+    assert len(results) == 1
+    assert json.loads(results[0]) == {'error': 'RuntimeError: bad app'}
+
+
+def test_run_container_reports_unserializable_response(tmpdir,
+                                                       clean_import_state):
+    tmpdir.join('app.py').write(
+        'def app(event, context):\n'
+        '    return {"statusCode": 200, "body": event["body"].encode()}\n')
+    messages = b''.join(
+        json.dumps({'event': {'body': body}, 'request_id': 'request-1',
+                    'function_name': 'api_handler', 'memory_size': 128,
+                    'timeout_ms': 60000}).encode('utf-8') + b'\n'
+        for body in ('first', 'second'))
+    output = io.BytesIO()
+    run_container(str(tmpdir), io.BytesIO(messages), output)
+    results = [json.loads(line) for line in
+               output.getvalue().decode('utf-8').splitlines()]
+    # The container keeps handling invocations after the error.
+    assert len(results) == 2
+    assert all(r['error'].startswith('TypeError: ') for r in results)
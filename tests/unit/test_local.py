@@ -1,6 +1,9 @@
 import re
 import json
 import decimal
+import socket
+import threading
+from http.client import HTTPConnection
 from unittest import mock
 
 import pytest
@@ -11,6 +14,7 @@ from six.moves.BaseHTTPServer import HTTPServer
 from chalice import app
 from chalice import local, BadRequestError, CORSConfig
 from chalice import Response
+from chalice import StreamingResponse
 from chalice import IAMAuthorizer
 from chalice import CognitoUserPoolAuthorizer
 from chalice.config import Config
@@ -22,6 +26,13 @@ from chalice.local import NotAuthorizedError
 from chalice.local import ForbiddenError
 from chalice.local import InvalidAuthorizerError
 from chalice.local import LocalDevServer
+from chalice.local import TooManyRequestsError
+from chalice.local import BadGatewayError
+from chalice.containerpool import ContainerError
+from chalice.containerpool import ContainerPool
+from chalice.containerpool import ThrottledError
+from chalice.localevents import EventSourcePump
+from chalice.localevents import EventSourceServer
 
 
 AWS_REQUEST_ID_PATTERN = re.compile(
@@ -177,6 +188,23 @@ def sample_app():
                             'Set-Cookie': ['CookieA=ValueA', 'CookieB=ValueB']
                         })
 
+    @demo.route('/stream')
+    def stream():
+        def generate():
+            yield 'first\n'
+            yield b''
+            yield b'second\n'
+        return StreamingResponse(generate(),
+                                 headers={'Content-Type': 'text/plain'})
+
+    @demo.route('/stream-error')
+    def stream_error():
+        def generate():
+            yield 'first\n'
+            raise RuntimeError('Error while streaming')
+        return StreamingResponse(generate(),
+                                 headers={'Content-Type': 'text/plain'})
+
     return demo
 
 
@@ -583,6 +611,34 @@ def test_multi_value_header(handler):
     assert 'Set-Cookie: CookieB=ValueB' in response
 
 
+def test_streaming_response_uses_chunked_encoding(handler):
+    set_current_request(handler, method='GET', path='/stream')
+    handler.do_GET()
+    value = handler.wfile.getvalue()
+    headers, body = value.split(b'\r\n\r\n', 1)
+    header_lines = headers.splitlines()
+    assert b'Transfer-Encoding: chunked' in header_lines
+    assert b'Content-Type: text/plain' in header_lines
+    assert not any(line.startswith(b'Content-Length')
+                   for line in header_lines)
+    # Empty chunks are skipped because a zero length chunk would end
+    # the response.
+    assert body == b'6\r\nfirst\n\r\n7\r\nsecond\n\r\n0\r\n\r\n'
+
+
+def test_streaming_response_error_closes_connection(handler):
+    set_current_request(handler, method='GET', path='/stream-error')
+    errors = []
+    handler.log_error = lambda *args: errors.append(args)
+    handler.do_GET()
+    body = handler.wfile.getvalue().split(b'\r\n\r\n', 1)[1]
+    # There's no terminating chunk so the client can tell the response
+    # was incomplete.
+    assert body == b'6\r\nfirst\n\r\n'
+    assert handler.close_connection
+    assert errors
+
+
 @pytest.mark.parametrize('actual_url,matched_url', [
     ('/foo', '/foo'),
     ('/foo/', '/foo'),
@@ -610,6 +666,40 @@ def test_can_match_exact_route(actual_url, matched_url):
             matcher.match_route(actual_url)
 
 
+@pytest.mark.parametrize('actual_url,matched_url,captured', [
+    ('/a/b/c', '/a/b/c', {}),
+    # The static segment 'b' doesn't lead to a route so the capture is
+    # used instead.
+    ('/a/b/d', '/a/{x}/d', {'x': 'b'}),
+    ('/a/z/d', '/a/{x}/d', {'x': 'z'}),
+    ('/a/b/c/e', '/a/{x}/{y}/e', {'x': 'b', 'y': 'c'}),
+    ('/users/me', '/users/me', {}),
+    ('/users/123', '/users/{id}', {'id': '123'}),
+    ('/', '/', {}),
+])
+def test_route_matcher_prefers_static_segments(actual_url, matched_url,
+                                               captured):
+    matcher = local.RouteMatcher([
+        '/', '/a/{x}/d', '/a/b/c', '/a/{x}/{y}/e', '/users/{id}',
+        '/users/me',
+    ])
+    match = matcher.match_route(actual_url)
+    assert match.route == matched_url
+    assert match.captured == captured
+
+
+def test_route_matcher_with_many_routes():
+    route_urls = ['/resource-%s/{id}/item-%s' % (i % 50, i)
+                  for i in range(2000)]
+    matcher = local.RouteMatcher(route_urls)
+    match = matcher.match_route('/resource-7/abc/item-1007?x=1')
+    assert match.route == '/resource-7/{id}/item-1007'
+    assert match.captured == {'id': 'abc'}
+    assert match.query_params == {'x': ['1']}
+    with pytest.raises(ValueError):
+        matcher.match_route('/resource-8/abc/item-1007')
+
+
 def test_lambda_event_contains_source_ip():
     converter = local.LambdaEventConverter(
         local.RouteMatcher(['/foo/bar']))
@@ -788,6 +878,31 @@ class TestLocalGateway(object):
         body = json.loads(response['body'])
         assert body['foo'] == 'bar'
 
+    def test_invokes_app_through_call(self, create_event):
+        class HeaderChalice(app.Chalice):
+            def __call__(self, event, context):
+                response = super(HeaderChalice, self).__call__(
+                    event, context)
+                response['headers']['X-Called'] = '1'
+                return response
+
+        demo = HeaderChalice('app-name')
+
+        @demo.route('/stream')
+        def stream():
+            return StreamingResponse(iter(['first\n', 'second\n']))
+
+        gateway = LocalGateway(demo, Config())
+        response = gateway.handle_request('GET', '/stream', {}, '')
+        assert response['headers']['X-Called'] == '1'
+        # The body is still streamed.
+        assert list(response['body']) == [b'first\n', b'second\n']
+        # Invoking the app directly still joins the chunks, as it would
+        # in Lambda.
+        lambda_response = demo(create_event('/stream', 'GET', {}),
+                               LambdaContext('api_handler', 128))
+        assert lambda_response['body'] == 'first\nsecond\n'
+
     def test_does_populate_context(self):
         demo = app.Chalice('app-name')
 
@@ -899,8 +1014,64 @@ class TestLocalGateway(object):
         exception_body = str(ei.value.body)
         assert 'Authorization=foobar' in exception_body
 
+    def test_invokes_view_in_container_pool(self, sample_app):
+        pool = mock.Mock(spec=ContainerPool)
+        pool.invoke.return_value = ({'statusCode': 200, 'body': 'ok'}, None)
+        gateway = LocalGateway(sample_app, Config(), container_pool=pool)
+        response = gateway.handle_request('GET', '/index', {}, '')
+        assert response == {'statusCode': 200, 'body': 'ok'}
+        event, request_id = pool.invoke.call_args[0]
+        assert event['requestContext']['resourcePath'] == '/index'
+        assert AWS_REQUEST_ID_PATTERN.match(request_id)
+
+    def test_throttled_invocation_returns_429(self, sample_app):
+        pool = mock.Mock(spec=ContainerPool)
+        pool.invoke.side_effect = ThrottledError()
+        gateway = LocalGateway(sample_app, Config(), container_pool=pool)
+        with pytest.raises(TooManyRequestsError) as ei:
+            gateway.handle_request('GET', '/index', {}, '')
+        assert ei.value.CODE == 429
+        assert ei.value.headers['x-amzn-ErrorType'] == \
+            'TooManyRequestsException'
+        assert json.loads(ei.value.body) == {'message': 'Too Many Requests'}
+
+    def test_container_error_returns_502(self, sample_app):
+        pool = mock.Mock(spec=ContainerPool)
+        pool.invoke.side_effect = ContainerError('exited')
+        gateway = LocalGateway(sample_app, Config(), container_pool=pool)
+        with pytest.raises(BadGatewayError) as ei:
+            gateway.handle_request('GET', '/index', {}, '')
+        assert ei.value.CODE == 502
+
 
 class TestLocalBuiltinAuthorizers(object):
+    def test_cached_authorizer_called_once_per_token(self):
+        demo = app.Chalice('app-name')
+        calls = []
+
+        @demo.authorizer(cache_results=True)
+        def auth(auth_request):
+            calls.append(auth_request.token)
+            return app.AuthResponse(routes=['/a/*'], principal_id='user')
+
+        @demo.route('/a/{name}', authorizer=auth)
+        def a(name):
+            return {'principal': demo.current_request.context[
+                'authorizer']['principalId']}
+
+        @demo.route('/b', authorizer=auth)
+        def b():
+            return {}
+
+        gateway = LocalGateway(demo, Config())
+        for name in ('one', 'two'):
+            response = gateway.handle_request(
+                'GET', '/a/%s' % name, {'Authorization': 'token'}, '')
+            assert json.loads(response['body']) == {'principal': 'user'}
+        with pytest.raises(ForbiddenError):
+            gateway.handle_request('GET', '/b', {'Authorization': 'token'}, '')
+        assert calls == ['token']
+
     def test_can_authorize_empty_path(self, lambda_context_args,
                                       demo_app_auth, create_event):
         # Ensures that / routes work since that is a special case in the
@@ -1221,3 +1392,76 @@ class TestLocalDevServer(object):
         )
 
         assert server.server.daemon_threads
+
+    def test_shares_one_gateway_across_handlers(self, sample_app):
+        handler_kwargs = []
+
+        def handler_cls(*args, **kwargs):
+            handler_kwargs.append(kwargs)
+
+        server = LocalDevServer(
+            sample_app, Config(), '0.0.0.0', 8000,
+            handler_cls=handler_cls,
+            server_cls=lambda address, handler: handler,
+        )
+        server.server(None, ('127.0.0.1', 2000), None)
+        server.server(None, ('127.0.0.1', 2001), None)
+
+        assert isinstance(server.local_gateway, local.LocalGateway)
+        assert [kwargs['local_gateway'] for kwargs in handler_kwargs] == [
+            server.local_gateway, server.local_gateway]
+
+    def test_can_serve_on_bound_socket(self, sample_app):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(('127.0.0.1', 0))
+        sock.listen(5)
+        server = LocalDevServer(sample_app, Config(), '127.0.0.1', 0,
+                                sock=sock)
+        assert server.server.socket is sock
+        assert server.server.server_address == sock.getsockname()
+        thread = threading.Thread(target=server.server.handle_request)
+        thread.start()
+        connection = HTTPConnection(*sock.getsockname())
+        try:
+            connection.request('GET', '/index')
+            response = connection.getresponse()
+            assert json.loads(response.read()) == {'hello': 'world'}
+        finally:
+            connection.close()
+            thread.join()
+            server.server.server_close()
+
+    def test_handler_uses_provided_gateway(self, sample_app):
+        gateway = local.LocalGateway(sample_app, Config())
+        handler = ChaliceStubbedHandler(
+            None, ('127.0.0.1', 2000), None, app_object=sample_app,
+            config=Config(), local_gateway=gateway)
+        assert handler.local_gateway is gateway
+
+    def test_shutdown_stops_container_pool(self, sample_app):
+        http_server = mock.Mock(spec=HTTPServer)
+        pool = mock.Mock(spec=ContainerPool)
+        server = LocalDevServer(
+            sample_app, Config(), '0.0.0.0', 8000,
+            server_cls=lambda *args: http_server,
+            container_pool=pool,
+        )
+        server.shutdown()
+        http_server.shutdown.assert_called_with()
+        pool.shutdown.assert_called_with()
+
+    def test_runs_event_source_server(self, sample_app):
+        http_server = mock.Mock(spec=HTTPServer)
+        event_source_server = mock.Mock(spec=EventSourceServer)
+        event_source_server.endpoint_url = 'http://127.0.0.1:8001'
+        event_source_server.pump = mock.Mock(spec=EventSourcePump)
+        event_source_server.pump.sources = [('sqs', 'queue')]
+        server = LocalDevServer(
+            sample_app, Config(), '0.0.0.0', 8000,
+            server_cls=lambda *args: http_server,
+            event_source_server=event_source_server,
+        )
+        server.serve_forever()
+        event_source_server.start.assert_called_with()
+        server.shutdown()
+        event_source_server.shutdown.assert_called_with()
@@ -0,0 +1,298 @@
+import json
+import threading
+import time
+from http.client import HTTPConnection
+
+import pytest
+
+from chalice import Chalice
+from chalice.localevents import EventSourcePump
+from chalice.localevents import EventSourceServer
+from chalice.localevents import EventSourceStats
+from chalice.localevents import InvalidRecordError
+from chalice.localevents import UnknownEventSourceError
+from chalice.localevents import _RecordBuffer
+
+
+STREAM_ARN = (
+    'arn:aws:dynamodb:us-west-2:12345:table/MyTable/stream/'
+    '2020-09-28T16:49:14.209'
+)
+
+
+@pytest.fixture
+def event_app():
+    app = Chalice('event-app')
+    app.batches = []
+
+    @app.on_sqs_message(queue='queue', batch_size=5)
+    def on_sqs(event):
+        app.batches.append(('sqs', [record.body for record in event]))
+
+    @app.on_kinesis_record(stream='stream', batch_size=10)
+    def on_kinesis(event):
+        app.batches.append(('kinesis', [record.data for record in event]))
+
+    @app.on_dynamodb_record(stream_arn=STREAM_ARN, batch_size=2)
+    def on_dynamodb(event):
+        app.batches.append(
+            ('dynamodb', [record.deserialize_keys() for record in event]))
+
+    return app
+
+
+def post_json(url, path, body):
+    host, port = url[len('http://'):].split(':')
+    connection = HTTPConnection(host, int(port))
+    try:
+        connection.request('POST', path, body=json.dumps(body))
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def test_sqs_messages_are_sent_in_batches(event_app):
+    with EventSourcePump(event_app) as pump:
+        pump.send_sqs_messages('queue', ['m%s' % i for i in range(12)])
+        assert pump.wait_until_idle(timeout=5)
+    bodies = [body for _, batch in event_app.batches for body in batch]
+    assert bodies == ['m%s' % i for i in range(12)]
+    assert all(len(batch) <= 5 for _, batch in event_app.batches)
+
+
+def test_kinesis_records_are_decoded_by_handler(event_app):
+    with EventSourcePump(event_app) as pump:
+        pump.put_kinesis_records('stream', [b'foo', b'bar'])
+        assert pump.wait_until_idle(timeout=5)
+    assert event_app.batches == [('kinesis', [b'foo', b'bar'])]
+
+
+def test_dynamodb_records_can_use_table_name(event_app):
+    with EventSourcePump(event_app) as pump:
+        pump.put_dynamodb_records(
+            'MyTable', [{'Keys': {'id': {'S': 'a'}}}])
+        pump.put_dynamodb_records(
+            STREAM_ARN, [{'Keys': {'id': {'S': 'b'}}}])
+        assert pump.wait_until_idle(timeout=5)
+    keys = [key for _, batch in event_app.batches for key in batch]
+    assert keys == [{'id': 'a'}, {'id': 'b'}]
+
+
+def test_unknown_source_raises_error(event_app):
+    pump = EventSourcePump(event_app)
+    with pytest.raises(UnknownEventSourceError):
+        pump.send_sqs_messages('other-queue', ['foo'])
+    with pytest.raises(UnknownEventSourceError):
+        pump.put_records('sns', 'topic', ['foo'])
+
+
+@pytest.mark.parametrize('source_type,name,records', [
+    ('sqs', 'queue', ['a', {'a': 1}]),
+    ('sqs', 'queue', [1]),
+    ('kinesis', 'stream', [['a']]),
+    ('dynamodb', 'MyTable', ['a']),
+])
+def test_invalid_records_are_rejected(event_app, source_type, name,
+                                      records):
+    with EventSourcePump(event_app) as pump:
+        with pytest.raises(InvalidRecordError):
+            pump.put_records(source_type, name, records)
+        assert pump.wait_until_idle(timeout=5)
+    # None of the records are put.
+    assert event_app.batches == []
+
+
+def test_lists_sources(event_app):
+    assert EventSourcePump(event_app).sources == [
+        ('dynamodb', 'MyTable'), ('kinesis', 'stream'), ('sqs', 'queue')]
+
+
+def test_batching_window_fills_batches():
+    app = Chalice('event-app')
+    batches = []
+
+    @app.on_sqs_message(queue='queue', batch_size=10,
+                        maximum_batching_window_in_seconds=1)
+    def on_sqs(event):
+        batches.append(len(list(event)))
+
+    with EventSourcePump(app) as pump:
+        for i in range(10):
+            pump.send_sqs_messages('queue', [str(i)])
+        assert pump.wait_until_idle(timeout=5)
+        stats = pump.get_stats()[0]
+    assert batches == [10]
+    assert stats.fill_ratio == 1.0
+
+
+def test_every_stream_handler_gets_every_record():
+    app = Chalice('event-app')
+    received = []
+
+    @app.on_kinesis_record(stream='stream')
+    def first(event):
+        received.append(('first', len(list(event))))
+
+    @app.on_kinesis_record(stream='stream')
+    def second(event):
+        received.append(('second', len(list(event))))
+
+    with EventSourcePump(app) as pump:
+        pump.put_kinesis_records('stream', [b'a', b'b'])
+        assert pump.wait_until_idle(timeout=5)
+    assert sorted(received) == [('first', 2), ('second', 2)]
+
+
+def test_queue_handlers_share_messages():
+    app = Chalice('event-app')
+    received = []
+
+    @app.on_sqs_message(queue='queue')
+    def first(event):
+        received.extend(record.body for record in event)
+
+    @app.on_sqs_message(queue='queue')
+    def second(event):
+        received.extend(record.body for record in event)
+
+    with EventSourcePump(app) as pump:
+        pump.send_sqs_messages('queue', ['a', 'b', 'c'])
+        assert pump.wait_until_idle(timeout=5)
+    assert sorted(received) == ['a', 'b', 'c']
+
+
+def test_failed_records_are_counted():
+    app = Chalice('event-app')
+
+    @app.on_sqs_message(queue='errors', batch_size=2)
+    def errors(event):
+        raise RuntimeError("failed")
+
+    @app.on_sqs_message(queue='partial', batch_size=2,
+                        report_batch_item_failures=True, per_record=True)
+    def partial(record):
+        if record.body == 'bad':
+            raise RuntimeError("failed")
+
+    with EventSourcePump(app) as pump:
+        pump.send_sqs_messages('errors', ['a', 'b'])
+        pump.send_sqs_messages('partial', ['good', 'bad'])
+        assert pump.wait_until_idle(timeout=5)
+        stats = {s.name: s for s in pump.get_stats()}
+    assert stats['errors'].failed_records == 2
+    assert stats['partial'].failed_records == 1
+    assert stats['partial'].records == 2
+
+
+def test_shutdown_drains_buffered_records():
+    app = Chalice('event-app')
+    received = []
+
+    @app.on_sqs_message(queue='queue', batch_size=10,
+                        maximum_batching_window_in_seconds=300)
+    def on_sqs(event):
+        received.extend(record.body for record in event)
+
+    pump = EventSourcePump(app)
+    pump.start()
+    pump.send_sqs_messages('queue', ['a'])
+    pump.shutdown()
+    assert received == ['a']
+
+
+def test_record_buffer_waits_for_batching_window():
+    buffer = _RecordBuffer()
+    buffer.put([{'id': 1}])
+    start = time.monotonic()
+    assert buffer.get_batch(10, 0.2) == [{'id': 1}]
+    assert time.monotonic() - start >= 0.2
+
+
+def test_record_buffer_returns_full_batch_immediately():
+    buffer = _RecordBuffer()
+    buffer.put([{'id': i} for i in range(3)])
+    assert buffer.get_batch(2, 300) == [{'id': 0}, {'id': 1}]
+
+
+def test_record_buffer_returns_nothing_once_closed():
+    buffer = _RecordBuffer()
+    thread = threading.Thread(target=buffer.close)
+    thread.start()
+    assert buffer.get_batch(1, 0) == []
+    thread.join()
+
+
+def test_stats():
+    stats = EventSourceStats(
+        source_type='sqs', name='queue', handler_name='handler',
+        batch_size=10, records=15, batches=2, elapsed=3.0,
+        latencies_ms=[float(i) for i in range(1, 101)])
+    assert stats.records_per_second == 5.0
+    assert stats.fill_ratio == 0.75
+    assert stats.percentile(50) == 50.0
+    assert stats.percentile(99) == 99.0
+    assert stats.to_dict()['latency_ms'] == {
+        'p50': 50.0, 'p90': 90.0, 'p99': 99.0, 'max': 100.0}
+    assert stats.format() == (
+        'sqs queue (handler): 15 records (0 failed) in 2 batches, '
+        '5.0 records/s, fill ratio 0.75, latency p50 50.00 ms, '
+        'p90 90.00 ms, p99 99.00 ms')
+
+
+def test_empty_stats():
+    stats = EventSourceStats(source_type='sqs', name='queue',
+                             handler_name='handler', batch_size=10)
+    assert stats.records_per_second == 0.0
+    assert stats.fill_ratio == 0.0
+    assert stats.percentile(50) == 0.0
+
+
+def test_can_put_records_over_http(event_app):
+    with EventSourceServer(EventSourcePump(event_app)) as server:
+        url = server.endpoint_url
+        assert post_json(url, '/sqs/queue', ['a', 'b']) == (
+            200, {'records': 2})
+        assert post_json(url, '/kinesis/stream', ['c']) == (
+            200, {'records': 1})
+        assert post_json(url, '/dynamodb/MyTable',
+                         [{'Keys': {'id': {'S': 'd'}}}]) == (
+            200, {'records': 1})
+        assert server.pump.wait_until_idle(timeout=5)
+        connection = HTTPConnection(*server.server.server_address)
+        connection.request('GET', '/stats')
+        stats = json.loads(connection.getresponse().read())
+        connection.close()
+    assert sorted(event_app.batches) == [
+        ('dynamodb', [{'id': 'd'}]), ('kinesis', [b'c']),
+        ('sqs', ['a', 'b'])]
+    assert [(s['source_type'], s['records']) for s in stats['sources']] == [
+        ('dynamodb', 1), ('kinesis', 1), ('sqs', 2)]
+
+
+def test_http_errors(event_app):
+    with EventSourceServer(EventSourcePump(event_app)) as server:
+        url = server.endpoint_url
+        status, body = post_json(url, '/sqs/unknown', ['a'])
+        assert status == 404
+        assert 'unknown' in body['message']
+        status, _ = post_json(url, '/sqs/queue', {'not': 'a list'})
+        assert status == 400
+
+
+def test_http_rejects_invalid_records(event_app):
+    with EventSourceServer(EventSourcePump(event_app)) as server:
+        url = server.endpoint_url
+        assert post_json(url, '/sqs/queue', [{'a': 1}]) == (
+            400, {'message': 'SQS messages must be strings, record 0 is '
+                             'dict'})
+        assert post_json(url, '/kinesis/stream', ['a', 1]) == (
+            400, {'message': 'Kinesis records must be strings, record 1 is '
+                             'int'})
+        assert post_json(url, '/dynamodb/MyTable', ['a']) == (
+            400, {'message': 'DynamoDB records must be JSON objects, '
+                             'record 0 is str'})
+        # The server keeps handling requests after rejecting one.
+        assert post_json(url, '/sqs/queue', ['a']) == (200, {'records': 1})
+        assert server.pump.wait_until_idle(timeout=5)
+    assert event_app.batches == [('sqs', ['a'])]
@@ -774,6 +774,23 @@ class TestTerraformTemplate(TemplateTestBase):
                    'scaling_config': {'maximum_concurrency': 2}
         }
 
+    def test_can_package_sqs_handler_with_batch_item_failures(
+            self, sample_app):
+        @sample_app.on_sqs_message(queue='foo', batch_size=5,
+                                   report_batch_item_failures=True)
+        def handler(record):
+            pass
+
+        config = Config.create(chalice_app=sample_app,
+                               project_dir='.',
+                               app_name='sample_app',
+                               api_gateway_stage='api')
+        template = self.generate_template(config)
+        mapping = template['resource']['aws_lambda_event_source_mapping'][
+            'handler-sqs-event-source']
+        assert mapping['function_response_types'] == [
+            'ReportBatchItemFailures']
+
     def test_sqs_arn_does_not_use_fn_sub(self, sample_app):
         @sample_app.on_sqs_message(queue_arn='arn:foo:bar', batch_size=5)
         def handler(event):
@@ -820,6 +837,28 @@ class TestTerraformTemplate(TemplateTestBase):
                    'maximum_batching_window_in_seconds': 0
                }
 
+    def test_can_package_stream_options(self, sample_app):
+        @sample_app.on_kinesis_record(stream='mystream',
+                                      report_batch_item_failures=True,
+                                      bisect_batch_on_function_error=True,
+                                      maximum_retry_attempts=3,
+                                      parallelization_factor=10)
+        def handler(record):
+            pass
+
+        config = Config.create(chalice_app=sample_app,
+                               project_dir='.',
+                               app_name='sample_app',
+                               api_gateway_stage='api')
+        template = self.generate_template(config)
+        mapping = template['resource']['aws_lambda_event_source_mapping'][
+            'handler-kinesis-event-source']
+        assert mapping['function_response_types'] == [
+            'ReportBatchItemFailures']
+        assert mapping['bisect_batch_on_function_error'] is True
+        assert mapping['maximum_retry_attempts'] == 3
+        assert mapping['parallelization_factor'] == 10
+
     def test_can_package_dynamodb_handler(self, sample_app):
         @sample_app.on_dynamodb_record(stream_arn='arn:aws:...:stream',
                                        batch_size=5,
@@ -1795,6 +1834,22 @@ class TestSAMTemplate(TemplateTestBase):
             }
         }
 
+    def test_can_package_sqs_handler_with_batch_item_failures(
+            self, sample_app):
+        @sample_app.on_sqs_message(queue='foo', batch_size=5,
+                                   report_batch_item_failures=True)
+        def handler(record):
+            pass
+
+        config = Config.create(chalice_app=sample_app,
+                               project_dir='.',
+                               api_gateway_stage='api')
+        template = self.generate_template(config)
+        properties = template['Resources']['Handler']['Properties'][
+            'Events']['HandlerSqsEventSource']['Properties']
+        assert properties['FunctionResponseTypes'] == [
+            'ReportBatchItemFailures']
+
     def test_sqs_arn_does_not_use_fn_sub(self, sample_app):
         @sample_app.on_sqs_message(queue_arn='arn:foo:bar', batch_size=5)
         def handler(event):
@@ -1843,6 +1898,27 @@ class TestSAMTemplate(TemplateTestBase):
             }
         }
 
+    def test_can_package_stream_options(self, sample_app):
+        @sample_app.on_dynamodb_record(stream_arn='arn:aws:...:stream',
+                                       report_batch_item_failures=True,
+                                       bisect_batch_on_function_error=True,
+                                       maximum_retry_attempts=0,
+                                       parallelization_factor=2)
+        def handler(record):
+            pass
+
+        config = Config.create(chalice_app=sample_app,
+                               project_dir='.',
+                               api_gateway_stage='api')
+        template = self.generate_template(config)
+        properties = template['Resources']['Handler']['Properties'][
+            'Events']['HandlerDynamodbEventSource']['Properties']
+        assert properties['FunctionResponseTypes'] == [
+            'ReportBatchItemFailures']
+        assert properties['BisectBatchOnFunctionError'] is True
+        assert properties['MaximumRetryAttempts'] == 0
+        assert properties['ParallelizationFactor'] == 2
+
     def test_can_package_dynamodb_handler(self, sample_app):
         @sample_app.on_dynamodb_record(stream_arn='arn:aws:...:stream',
                                        batch_size=5)
@@ -4,7 +4,10 @@ import json
 import pytest
 
 from chalice.test import Client, FunctionNotFoundError
+from chalice.test import StreamingHTTPResponse
 from chalice import Response, BadRequestError, Chalice, Blueprint, AuthResponse
+from chalice import StreamingResponse
+from chalice.app import JSONCodec
 
 
 def test_can_make_http_request(sample_app):
@@ -53,6 +56,26 @@ def test_can_provide_http_headers(sample_app):
         assert response.json_body == {'value': 'foo'}
 
 
+def test_http_response_uses_app_json_codec():
+    class RecordingCodec(JSONCodec):
+        calls = []
+
+        def loads(self, data):
+            self.calls.append(data)
+            return super(RecordingCodec, self).loads(data)
+
+    codec = RecordingCodec()
+    app = Chalice('test-app', json_codec=codec)
+
+    @app.route('/')
+    def index():
+        return {'hello': 'world'}
+
+    with Client(app) as client:
+        assert client.http.get('/').json_body == {'hello': 'world'}
+    assert codec.calls == [b'{"hello":"world"}']
+
+
 def test_can_return_error_message(sample_app):
     @sample_app.route('/error')
     def error():
@@ -82,6 +105,92 @@ def test_can_return_binary_data(sample_app):
         assert response.json_body is None
 
 
+def test_can_read_streaming_response_incrementally(sample_app):
+    produced = []
+
+    @sample_app.route('/stream')
+    def stream():
+        def generate():
+            for i in range(3):
+                produced.append(i)
+                yield '%s\n' % i
+        return StreamingResponse(generate(),
+                                 headers={'Content-Type': 'text/plain'})
+
+    with Client(sample_app) as client:
+        response = client.http.get('/stream', stream=True)
+        assert response.status_code == 200
+        assert response.headers['Content-Type'] == 'text/plain'
+        assert produced == []
+        chunks = response.iter_chunks()
+        assert next(chunks) == b'0\n'
+        assert produced == [0]
+        # Reading the body reads the remaining chunks, the chunks that
+        # were already read aren't kept.
+        assert response.body == b'1\n2\n'
+        assert produced == [0, 1, 2]
+        assert list(response.iter_chunks()) == [b'1\n2\n']
+
+
+def test_streaming_response_body_can_be_read_as_json(sample_app):
+    @sample_app.route('/stream')
+    def stream():
+        return StreamingResponse(iter(['{"hello":', b' "world"}']))
+
+    with Client(sample_app) as client:
+        response = client.http.get('/stream', stream=True)
+        assert isinstance(response, StreamingHTTPResponse)
+        assert response.json_body == {'hello': 'world'}
+        assert response.body == b'{"hello": "world"}'
+
+
+def test_stream_returns_streaming_response_for_any_view(sample_app):
+    @sample_app.route('/error')
+    def error():
+        raise BadRequestError('bad request')
+
+    with Client(sample_app) as client:
+        response = client.http.get('/', stream=True)
+        assert isinstance(response, StreamingHTTPResponse)
+        assert list(response.iter_chunks()) == [b'{}']
+        response = client.http.get('/error', stream=True)
+        assert isinstance(response, StreamingHTTPResponse)
+        assert response.status_code == 400
+        response = client.http.get('/unknown', stream=True)
+        assert isinstance(response, StreamingHTTPResponse)
+        assert response.status_code == 403
+
+
+def test_streaming_response_is_read_if_not_streaming(sample_app):
+    @sample_app.route('/stream')
+    def stream():
+        return StreamingResponse(iter(['{"hello":', b' "world"}']))
+
+    with Client(sample_app) as client:
+        response = client.http.get('/stream')
+        assert response.body == b'{"hello": "world"}'
+        assert response.json_body == {'hello': 'world'}
+
+
+def test_client_invokes_app_through_call():
+    class HeaderChalice(Chalice):
+        def __call__(self, event, context):
+            response = super(HeaderChalice, self).__call__(event, context)
+            response['headers']['X-Called'] = '1'
+            return response
+
+    app = HeaderChalice('test-app')
+
+    @app.route('/stream')
+    def stream():
+        return StreamingResponse(iter(['first\n', 'second\n']))
+
+    with Client(app) as client:
+        response = client.http.get('/stream', stream=True)
+        assert response.headers['X-Called'] == '1'
+        assert list(response.iter_chunks()) == [b'first\n', b'second\n']
+
+
 def test_can_access_env_vars_in_rest_api(sample_app, tmpdir):
     fake_config = {
         "version": "2.0",
@@ -144,6 +253,26 @@ def test_can_test_authorizers(sample_app):
         assert response.json_body == {'success': True}
 
 
+def test_can_test_async_authorizers(sample_app):
+    @sample_app.authorizer()
+    async def myauth(event):
+        if event.token == 'allow':
+            return AuthResponse(['*'], principal_id='id')
+        return AuthResponse([], principal_id='id')
+
+    @sample_app.route('/needs-auth', authorizer=myauth)
+    async def needs_auth():
+        return {'success': True}
+
+    with Client(sample_app) as client:
+        response = client.http.get('/needs-auth',
+                                   headers={'Authorization': 'allow'})
+        assert response.json_body == {'success': True}
+        response = client.http.get('/needs-auth',
+                                   headers={'Authorization': 'deny'})
+        assert response.status_code == 403
+
+
 # Tests for pure lambda and event handlers.
 
 def test_can_invoke_pure_lambda_function():